@@ -1,22 +1,105 @@
 from flask import Flask
-from app.extensions import db
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.extensions import db, cache_credores
 from app.routes.credores import bp as credores_bp
 from app.routes.certidoes import bp as certidoes_bp
 from app.routes.mock_api import bp as mock_api_bp
 from app.routes.web import bp as web_bp
+from app.routes.agregados import bp as agregados_bp
+from app.routes.precificacao import bp as precificacao_bp
+from app.routes.tarefas import bp as tarefas_bp
+from app.routes.uploads import bp as uploads_bp
+from app.routes.arquivos import bp as arquivos_bp
+from app.services.provedores_certidoes import cliente_certidoes
+from app.services.blobs import armazenamento_blobs
+from app.services.arquivos import armazenamento_arquivos
+from app.services.derivados import gerador_derivados
+from app.services.esquema import atualizar_esquema
+from app.services.exportacao import MARGEM_MARCA_SEGUNDOS
+from app.utils.uploads import RequisicaoUpload, responder_grande_demais
+from app.utils.validacao_arquivos import TAMANHO_MAXIMO
+from app.cli import registrar_comandos
+from app.jobs.revalidar_certidoes import init_scheduler
 import os
 
 def create_app(test_config=None):
     app = Flask(__name__, 
                 static_folder='static',
                 template_folder='templates')
+    # Arquivos do multipart gravados direto no destino, validados durante a leitura
+    app.request_class = RequisicaoUpload
+    # Upload interrompido no limite de tamanho, sem ler o resto do corpo
+    app.register_error_handler(RequestEntityTooLarge, responder_grande_demais)
     
     # Configuração padrão
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_key_insecure'),
         SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', 'sqlite:///mercatorio.db'),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
-        UPLOAD_FOLDER=os.path.join(os.getcwd(), 'uploads')
+        UPLOAD_FOLDER=os.path.join(os.getcwd(), 'uploads'),
+        # Acima disso o restante do arquivo enviado é descartado e o upload recusado
+        UPLOAD_TAMANHO_MAXIMO=int(os.environ.get('UPLOAD_TAMANHO_MAXIMO', TAMANHO_MAXIMO)),
+        # Uploads retomáveis (tus, /api/uploads): limite, prazo sem atividade até a
+        # limpeza e segundos até um PATCH interrompido liberar o upload
+        UPLOADS_RETOMAVEIS_TAMANHO_MAXIMO=int(os.environ.get('UPLOADS_RETOMAVEIS_TAMANHO_MAXIMO', 500 * 1024 * 1024)),
+        UPLOADS_RETOMAVEIS_VALIDADE_HORAS=int(os.environ.get('UPLOADS_RETOMAVEIS_VALIDADE_HORAS', 24)),
+        UPLOADS_RETOMAVEIS_TIMEOUT_SEGUNDOS=int(os.environ.get('UPLOADS_RETOMAVEIS_TIMEOUT_SEGUNDOS', 60)),
+        INGESTAO_TAMANHO_LOTE=int(os.environ.get('INGESTAO_TAMANHO_LOTE', 1000)),
+        LISTAGEM_TAMANHO_PAGINA=int(os.environ.get('LISTAGEM_TAMANHO_PAGINA', 50)),
+        LISTAGEM_TAMANHO_MAXIMO=int(os.environ.get('LISTAGEM_TAMANHO_MAXIMO', 500)),
+        BUSCA_TAMANHO_PAGINA=int(os.environ.get('BUSCA_TAMANHO_PAGINA', 10)),
+        # Credores alterados nesse intervalo antes da marca da exportação saem de novo na seguinte
+        EXPORTACAO_MARGEM_SEGUNDOS=int(os.environ.get('EXPORTACAO_MARGEM_SEGUNDOS', MARGEM_MARCA_SEGUNDOS)),
+        CACHE_CREDORES_MAX_ITENS=int(os.environ.get('CACHE_CREDORES_MAX_ITENS', 1024)),
+        CACHE_CREDORES_BACKEND=os.environ.get('CACHE_CREDORES_BACKEND'),
+        CACHE_CREDORES_TTL=int(os.environ.get('CACHE_CREDORES_TTL', 300)),
+        CACHE_CREDORES_MAX_VARIANTES=int(os.environ.get('CACHE_CREDORES_MAX_VARIANTES', 16)),
+        INDICES_CORRECAO_PASTA=os.environ.get(
+            'INDICES_CORRECAO_PASTA', os.path.join(os.path.dirname(__file__), 'data', 'indices')),
+        CERTIDOES_API_URL=os.environ.get('CERTIDOES_API_URL', 'http://localhost:5000/api/certidoes'),
+        CERTIDOES_MAX_CONEXOES=int(os.environ.get('CERTIDOES_MAX_CONEXOES', 16)),
+        # Requisições por segundo a cada provedor (None = sem limite); por tipo em CERTIDOES_PROVEDORES
+        CERTIDOES_TAXA=float(os.environ['CERTIDOES_TAXA']) if os.environ.get('CERTIDOES_TAXA') else None,
+        # Cache das respostas dos provedores; TTLs por tipo (segundos) em CERTIDOES_CACHE_TTL
+        CERTIDOES_CACHE_TTL_NEGATIVO=int(os.environ.get('CERTIDOES_CACHE_TTL_NEGATIVO', 30)),
+        CERTIDOES_CACHE_MAX_ITENS=int(os.environ.get('CERTIDOES_CACHE_MAX_ITENS', 10000)),
+        # Endpoint de consulta em lote dos provedores (ex.: http://localhost:5000/api/certidoes/lote);
+        # sem ele, cada CPF/CNPJ é consultado em uma requisição própria
+        CERTIDOES_LOTE_URL=os.environ.get('CERTIDOES_LOTE_URL'),
+        CERTIDOES_LOTE_TAMANHO=int(os.environ.get('CERTIDOES_LOTE_TAMANHO', 100)),
+        CERTIDOES_LOTE_ESPERA=float(os.environ.get('CERTIDOES_LOTE_ESPERA', 0.05)),
+        REVALIDACAO_TAMANHO_LOTE=int(os.environ.get('REVALIDACAO_TAMANHO_LOTE', 200)),
+        REVALIDACAO_WORKERS=int(os.environ.get('REVALIDACAO_WORKERS', 4)),
+        REVALIDACAO_JANELA_SEGUNDOS=int(os.environ['REVALIDACAO_JANELA_SEGUNDOS'])
+            if os.environ.get('REVALIDACAO_JANELA_SEGUNDOS') else None,
+        # Renovação por vencimento e heartbeats agendados dentro do processo web (requer APScheduler);
+        # com vários processos, só o líder renova. Alternativa: `flask certidoes agendador`
+        AGENDADOR_ATIVO=os.environ.get('AGENDADOR_ATIVO', '').lower() in ('1', 'true', 'sim'),
+        VALIDADE_INTERVALO_MINUTOS=int(os.environ.get('VALIDADE_INTERVALO_MINUTOS', 5)),
+        VALIDADE_DISPERSAO_HORAS=int(os.environ.get('VALIDADE_DISPERSAO_HORAS', 24)),
+        COORDENACAO_HEARTBEAT_SEGUNDOS=int(os.environ.get('COORDENACAO_HEARTBEAT_SEGUNDOS', 30)),
+        # Nó sem heartbeat há mais que isso sai da divisão de shards
+        COORDENACAO_HEARTBEAT_VALIDADE=int(os.environ.get('COORDENACAO_HEARTBEAT_VALIDADE', 90)),
+        COORDENACAO_DURACAO_LEASE_SEGUNDOS=int(os.environ.get('COORDENACAO_DURACAO_LEASE_SEGUNDOS', 300)),
+        # Conteúdo das certidões: 'arquivos' (em BLOBS_PASTA, padrão UPLOAD_FOLDER/blobs) ou 'banco'
+        BLOBS_BACKEND=os.environ.get('BLOBS_BACKEND', 'arquivos'),
+        BLOBS_PASTA=os.environ.get('BLOBS_PASTA'),
+        # Documentos e certidões enviados, um arquivo por SHA-256 (padrão UPLOAD_FOLDER/arquivos)
+        ARQUIVOS_PASTA=os.environ.get('ARQUIVOS_PASTA'),
+        # Downloads: 'sendfile' (pelo app), 'x-accel-redirect' (nginx, location interna
+        # ARQUIVOS_ACCEL_PREFIXO apontando para ARQUIVOS_PASTA) ou 'x-sendfile' (Apache)
+        ARQUIVOS_ENVIO=os.environ.get('ARQUIVOS_ENVIO', 'sendfile'),
+        ARQUIVOS_ACCEL_PREFIXO=os.environ.get('ARQUIVOS_ACCEL_PREFIXO', '/_arquivos'),
+        # Miniaturas e prévias (padrão UPLOAD_FOLDER/derivados), geradas por um pool
+        # de processos após o upload; 0 gera na própria requisição
+        DERIVADOS_PASTA=os.environ.get('DERIVADOS_PASTA'),
+        DERIVADOS_WORKERS=int(os.environ.get('DERIVADOS_WORKERS', 2)),
+        # Fila de tarefas: tentativas, espera exponencial (base e teto, em segundos)
+        # e prazo após o qual a tarefa de um worker morto volta para a fila
+        TAREFAS_MAX_TENTATIVAS=int(os.environ.get('TAREFAS_MAX_TENTATIVAS', 5)),
+        TAREFAS_BACKOFF_SEGUNDOS=float(os.environ.get('TAREFAS_BACKOFF_SEGUNDOS', 10)),
+        TAREFAS_BACKOFF_MAXIMO=float(os.environ.get('TAREFAS_BACKOFF_MAXIMO', 600)),
+        TAREFAS_TIMEOUT_SEGUNDOS=int(os.environ.get('TAREFAS_TIMEOUT_SEGUNDOS', 300))
     )
     
     # Sobrescrever com configuração de teste se fornecida
@@ -28,15 +111,31 @@ def create_app(test_config=None):
     
     # Inicializar extensões
     db.init_app(app)
+    cache_credores.init_app(app)
+    cliente_certidoes.init_app(app)
+    armazenamento_blobs.init_app(app)
+    armazenamento_arquivos.init_app(app)
+    gerador_derivados.init_app(app)
     
     # Registrar blueprints
     app.register_blueprint(credores_bp)
     app.register_blueprint(certidoes_bp)
     app.register_blueprint(mock_api_bp)
     app.register_blueprint(web_bp)
+    app.register_blueprint(agregados_bp)
+    app.register_blueprint(precificacao_bp)
+    app.register_blueprint(tarefas_bp)
+    app.register_blueprint(uploads_bp)
+    app.register_blueprint(arquivos_bp)
     
-    # Criar tabelas do banco de dados
+    # Comandos de linha de comando (flask agregados ...)
+    registrar_comandos(app)
+    
+    # Criar tabelas do banco de dados e acrescentar as colunas novas em bancos antigos
     with app.app_context():
-        db.create_all()
+        atualizar_esquema()
+    
+    if app.config['AGENDADOR_ATIVO']:
+        init_scheduler(app)
     
     return app
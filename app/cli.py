@@ -0,0 +1,148 @@
+# app/cli.py
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.services.agregados import reconstruir_agregados
+from app.services.busca import reindexar_credores
+from app.jobs.revalidar_certidoes import configurar_agendamento, revalidar_certidoes
+from app.jobs.agendador_validade import AgendadorValidade
+from app.services.coordenacao import interpretar_shard
+from app.services.blobs import migrar_conteudo_legado
+from app.services.arquivos import coletar_arquivos, migrar_arquivos_legados
+from app.services.derivados import coletar_derivados, gerar_derivados_pendentes
+from app.services.certidoes import consolidar_certidoes
+from app.services.tarefas import executar_worker, processar_pendentes
+from app.services.uploads_retomaveis import limpar_uploads
+
+agregados_cli = AppGroup('agregados', help='Tabelas de resumo da carteira.')
+busca_cli = AppGroup('busca', help='Índice de busca de credores.')
+certidoes_cli = AppGroup('certidoes', help='Jobs de certidões.')
+blobs_cli = AppGroup('blobs', help='Armazenamento de conteúdo por hash.')
+tarefas_cli = AppGroup('tarefas', help='Fila de tarefas em segundo plano.')
+arquivos_cli = AppGroup('arquivos', help='Documentos e certidões enviados, guardados por hash.')
+
+@agregados_cli.command('reconstruir')
+@click.option('--tamanho-lote', default=1000, show_default=True, help='Credores recalculados por vez.')
+def reconstruir_agregados_comando(tamanho_lote):
+    """Recalcula os agregados do zero e informa divergências."""
+    divergencias = reconstruir_agregados(tamanho_lote=tamanho_lote)
+    if not divergencias:
+        click.echo('Agregados reconstruídos: nenhuma divergência encontrada.')
+        return
+    click.echo(f'Agregados reconstruídos: {len(divergencias)} divergência(s) corrigida(s).')
+    for d in divergencias:
+        click.echo(f"  {d['secao']}[{d['grupo']}].{d['campo']}: incremental={d['incremental']} recalculado={d['recalculado']}")
+
+@busca_cli.command('reindexar')
+@click.option('--tamanho-lote', default=1000, show_default=True, help='Credores processados por vez.')
+def reindexar_busca_comando(tamanho_lote):
+    """Preenche as colunas normalizadas e reconstrói o índice de busca."""
+    atualizados = reindexar_credores(tamanho_lote=tamanho_lote)
+    click.echo(f'Índice de busca reconstruído ({atualizados} credor(es) normalizado(s)).')
+
+@certidoes_cli.command('revalidar')
+@click.option('--tamanho-lote', type=int, default=None, help='Credores por lote/transação (padrão: REVALIDACAO_TAMANHO_LOTE).')
+@click.option('--reiniciar', is_flag=True, help='Ignora o checkpoint de uma execução interrompida.')
+@click.option('--workers', type=int, default=None, help='Threads em paralelo (padrão: REVALIDACAO_WORKERS).')
+@click.option('--janela-segundos', type=int, default=None,
+              help='Prazo da execução; o restante fica para a próxima (padrão: REVALIDACAO_JANELA_SEGUNDOS).')
+@click.option('--shard', default=None,
+              help="Parte dos credores a processar: 'i/n' (id % n == i) ou 'auto' (pelos nós vivos).")
+def revalidar_certidoes_comando(tamanho_lote, reiniciar, workers, janela_segundos, shard):
+    """Revalida as certidões de origem API, retomando do último checkpoint."""
+    config = current_app.config
+    try:
+        shard = interpretar_shard(shard)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--shard')
+    relatorio = revalidar_certidoes(
+        tamanho_lote=tamanho_lote or config['REVALIDACAO_TAMANHO_LOTE'],
+        reiniciar=reiniciar,
+        workers=workers or config['REVALIDACAO_WORKERS'],
+        janela_segundos=janela_segundos or config['REVALIDACAO_JANELA_SEGUNDOS'],
+        shard=shard
+    )
+    if not relatorio['executado']:
+        click.echo(f"{relatorio['shard']} já está em execução em outro processo.")
+        return
+    click.echo(f"Vazão: {relatorio['credores_por_segundo']} credores/s")
+    if not relatorio['concluido']:
+        click.echo('Janela encerrada antes do fim: a próxima execução retoma do checkpoint.')
+
+@certidoes_cli.command('renovar-vencendo')
+def renovar_vencendo_comando():
+    """Renova agora, sem jitter, as certidões API na janela de renovação."""
+    relatorio = AgendadorValidade(dispersao=timedelta(0), horizonte=timedelta(0)).executar()
+    click.echo(f"Renovação por vencimento: {relatorio['credores']} credor(es), "
+               f"{relatorio['certidoes_atualizadas']} certidão(ões), {relatorio['erros']} erro(s)")
+
+@certidoes_cli.command('agendador')
+def agendador_comando():
+    """Executa em primeiro plano a renovação por vencimento e os heartbeats (processo dedicado)."""
+    try:
+        from apscheduler.schedulers.blocking import BlockingScheduler
+    except ImportError:
+        raise click.ClickException('APScheduler não instalado (pip install -r requirements.txt).')
+    scheduler = configurar_agendamento(current_app._get_current_object(), BlockingScheduler())
+    click.echo('Agendador de certidões iniciado; Ctrl+C para encerrar.')
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+@certidoes_cli.command('consolidar')
+@click.option('--tamanho-lote', default=500, show_default=True, help='Grupos (credor, tipo, origem) por transação.')
+def consolidar_certidoes_comando(tamanho_lote):
+    """Deixa uma certidão atual por credor, tipo e origem e move as demais para o histórico."""
+    movidas = consolidar_certidoes(tamanho_lote=tamanho_lote)
+    click.echo(f'{movidas} certidão(ões) movida(s) para o histórico; índice único garantido.')
+
+@blobs_cli.command('migrar')
+@click.option('--tamanho-lote', default=500, show_default=True, help='Certidões migradas por transação.')
+def migrar_blobs_comando(tamanho_lote):
+    """Move o conteúdo base64 legado das certidões para o armazenamento por hash."""
+    migradas = migrar_conteudo_legado(tamanho_lote=tamanho_lote)
+    click.echo(f'Conteúdo de {migradas} certidão(ões) migrado para o armazenamento por hash.')
+
+@arquivos_cli.command('migrar')
+def migrar_arquivos_comando():
+    """Move os arquivos de uploads/credor_<id>/ para o armazenamento por hash."""
+    migrados, ausentes = migrar_arquivos_legados()
+    click.echo(f'{migrados} arquivo(s) migrado(s); {ausentes} caminho(s) sem arquivo em disco.')
+
+@arquivos_cli.command('coletar')
+def coletar_arquivos_comando():
+    """Apaga os arquivos que nenhum documento ou certidão referencia mais."""
+    click.echo(f'{coletar_arquivos()} arquivo(s) sem referência apagado(s).')
+    click.echo(f'{coletar_derivados()} miniatura(s)/prévia(s) de arquivos apagados removida(s).')
+
+@arquivos_cli.command('gerar-derivados')
+def gerar_derivados_comando():
+    """Gera as miniaturas e prévias que faltam (ex.: arquivos enviados antes do pipeline)."""
+    click.echo(f'Derivados gerados para {gerar_derivados_pendentes()} arquivo(s).')
+
+@arquivos_cli.command('limpar-uploads')
+@click.option('--validade-horas', type=int, default=None,
+              help='Horas sem atividade (padrão: UPLOADS_RETOMAVEIS_VALIDADE_HORAS).')
+def limpar_uploads_comando(validade_horas):
+    """Remove os uploads retomáveis abandonados e suas partes já recebidas."""
+    click.echo(f'{limpar_uploads(validade_horas)} upload(s) retomável(is) removido(s).')
+
+@tarefas_cli.command('worker')
+@click.option('--uma-vez', is_flag=True, help='Executa as tarefas disponíveis e encerra.')
+@click.option('--intervalo', default=1.0, show_default=True, help='Segundos entre consultas com a fila vazia.')
+def worker_tarefas_comando(uma_vez, intervalo):
+    """Executa as tarefas da fila (ex.: buscas de certidões)."""
+    if uma_vez:
+        click.echo(f'{processar_pendentes()} tarefa(s) executada(s).')
+        return
+    executar_worker(intervalo_ocioso=intervalo)
+
+def registrar_comandos(app):
+    app.cli.add_command(agregados_cli)
+    app.cli.add_command(busca_cli)
+    app.cli.add_command(certidoes_cli)
+    app.cli.add_command(blobs_cli)
+    app.cli.add_command(tarefas_cli)
+    app.cli.add_command(arquivos_cli)
@@ -2,7 +2,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
+from app.services.cache import CacheCredores
 
 db = SQLAlchemy()
 ma = Marshmallow()
 migrate = Migrate()
+cache_credores = CacheCredores()
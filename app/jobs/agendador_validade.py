@@ -0,0 +1,149 @@
+"""
+Revalidação incremental de certidões guiada pelo vencimento, no projeto Mercatório.
+Em vez de reconsultar todas as certidões de origem API a cada 24 horas,
+cada certidão entra em uma fila de prioridade (heap) com o instante em que
+deve ser renovada: alguns dias antes de expira_em, com um jitter aleatório
+que espalha as renovações ao longo do dia. A cada execução, apenas as
+certidões cujo instante chegou são consultadas, e só nos provedores dos
+tipos que venceram.
+"""
+import heapq
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select
+from app.extensions import db, cache_credores
+from app.models.certidao import Certidao, OrigemCertidao, TipoCertidao
+from app.models.credor import Credor
+from app.jobs.revalidar_certidoes import revalidar_credor
+from app.services.provedores_certidoes import cliente_certidoes
+
+# Quanto antes do vencimento a certidão passa a ser renovada
+ANTECEDENCIA_RENOVACAO = {
+    TipoCertidao.FEDERAL: timedelta(days=15),
+    TipoCertidao.ESTADUAL: timedelta(days=7),
+    TipoCertidao.MUNICIPAL: timedelta(days=7),
+    TipoCertidao.TRABALHISTA: timedelta(days=15),
+}
+# O jitter nunca empurra a renovação para depois deste limite antes do vencimento
+MARGEM_MINIMA = timedelta(days=1)
+DISPERSAO_PADRAO = timedelta(days=1)
+# Certidões que entram na janela de renovação até este prazo são planejadas já
+HORIZONTE_PLANEJAMENTO = timedelta(days=1)
+
+class AgendadorValidade:
+    """
+    Fila de prioridade de renovações, por instante agendado.
+
+    O banco continua sendo a fonte da verdade: a fila só guarda o que vence
+    no horizonte de planejamento e pode ser reconstruída a qualquer momento
+    (ex.: após reiniciar o processo).
+    """
+
+    def __init__(self, dispersao=DISPERSAO_PADRAO, horizonte=HORIZONTE_PLANEJAMENTO,
+                 antecedencia=None, aleatorio=None):
+        self.dispersao = dispersao
+        self.horizonte = horizonte
+        self.antecedencia = antecedencia or ANTECEDENCIA_RENOVACAO
+        self.aleatorio = aleatorio or random.Random()
+        self._fila = []
+        self._agendadas = set()
+
+    def __len__(self):
+        return len(self._fila)
+
+    def instante_renovacao(self, agora, tipo, expira_em):
+        """
+        Sorteia quando renovar: a partir da entrada na janela de renovação
+        (ou de agora, se já passou), espalhado por até `dispersao`, sem
+        ultrapassar expira_em - MARGEM_MINIMA.
+        """
+        if expira_em is None:
+            inicio, limite = agora, agora + self.dispersao
+        else:
+            inicio = max(agora, expira_em - self.antecedencia[tipo])
+            limite = expira_em - MARGEM_MINIMA
+        fim = max(inicio, min(inicio + self.dispersao, limite))
+        return inicio + (fim - inicio) * self.aleatorio.random()
+
+    def planejar(self, agora):
+        """
+        Agenda as certidões API que entram na janela de renovação até
+        agora + horizonte (e as sem validade conhecida).
+
+        Returns:
+            int: certidões agendadas nesta chamada
+        """
+        limite = agora + max(self.antecedencia.values()) + self.horizonte
+        consulta = (
+            select(Certidao.id, Certidao.tipo, Certidao.expira_em)
+            .where(Certidao.origem == OrigemCertidao.API,
+                   or_(Certidao.expira_em.is_(None), Certidao.expira_em <= limite))
+        )
+        agendadas = 0
+        for certidao_id, tipo, expira_em in db.session.execute(consulta):
+            if certidao_id in self._agendadas:
+                continue
+            if expira_em is not None and expira_em - self.antecedencia[tipo] > agora + self.horizonte:
+                continue
+            heapq.heappush(self._fila, (self.instante_renovacao(agora, tipo, expira_em), certidao_id))
+            self._agendadas.add(certidao_id)
+            agendadas += 1
+        return agendadas
+
+    def retirar_vencidas(self, agora):
+        """Remove da fila e retorna os ids cujo instante de renovação chegou."""
+        ids = []
+        while self._fila and self._fila[0][0] <= agora:
+            _, certidao_id = heapq.heappop(self._fila)
+            self._agendadas.discard(certidao_id)
+            ids.append(certidao_id)
+        return ids
+
+    def executar(self, agora=None):
+        """
+        Planeja, retira as renovações devidas e consulta os provedores só
+        para os tipos vencendo de cada credor.
+
+        Returns:
+            dict: relatório (credores consultados, certidões atualizadas, erros, pendentes)
+        """
+        agora = agora or datetime.utcnow()
+        self.planejar(agora)
+        ids = self.retirar_vencidas(agora)
+
+        por_credor = defaultdict(list)
+        if ids:
+            for certidao in db.session.scalars(select(Certidao).where(Certidao.id.in_(ids))):
+                # Renovada por outro caminho desde o planejamento: nada a fazer
+                if certidao.expira_em is not None and certidao.expira_em - self.antecedencia[certidao.tipo] > agora:
+                    continue
+                por_credor[certidao.credor_id].append(certidao)
+
+        documentos = dict(db.session.execute(
+            select(Credor.id, Credor.cpf_cnpj).where(Credor.id.in_(list(por_credor)))
+        ).all()) if por_credor else {}
+
+        resultados = cliente_certidoes.buscar_varios({
+            documentos[credor_id]: {c.tipo for c in certidoes} for credor_id, certidoes in por_credor.items()
+        })
+        certidoes_atualizadas = erros = 0
+        alterados = set()
+        for credor_id, certidoes in por_credor.items():
+            cpf_cnpj = documentos[credor_id]
+            atualizadas, falhas = revalidar_credor(cpf_cnpj, certidoes, resultados[cpf_cnpj])
+            for tipo, erro in falhas.items():
+                print(f"[JOB] Erro ao renovar certidão {tipo} de {cpf_cnpj}: {erro}")
+            if atualizadas:
+                alterados.add(credor_id)
+            certidoes_atualizadas += atualizadas
+            erros += len(falhas)
+        db.session.commit()
+        cache_credores.invalidar(*alterados)
+
+        return {
+            'credores': len(por_credor),
+            'certidoes_atualizadas': certidoes_atualizadas,
+            'erros': erros,
+            'pendentes': len(self)
+        }
@@ -0,0 +1,44 @@
+"""
+Busca das certidões de um credor nos provedores, executada pela fila de
+tarefas (app/services/tarefas.py) em vez de dentro da requisição HTTP.
+"""
+from app.extensions import db, cache_credores
+from app.models.certidao import OrigemCertidao, StatusCertidao, TipoCertidao
+from app.models.credor import Credor
+from app.services.certidoes import registrar_certidao
+from app.services.provedores_certidoes import cliente_certidoes
+from app.services.tarefas import tarefa
+
+TIPO_TAREFA = 'buscar_certidoes'
+
+class FalhaProvedores(RuntimeError):
+    """Nenhum provedor respondeu; a tarefa é tentada de novo após o backoff."""
+
+@tarefa(TIPO_TAREFA)
+def buscar_certidoes_credor(credor_id):
+    """
+    Consulta todos os provedores e grava as certidões obtidas.
+
+    Returns:
+        dict: total gravado e erros por tipo (provedores que falharam não
+        impedem o registro dos demais)
+    """
+    credor = db.session.get(Credor, credor_id)
+    if credor is None:
+        return {'total': 0, 'erros': {}, 'mensagem': 'Credor não encontrado'}
+
+    resultado = cliente_certidoes.buscar(credor.cpf_cnpj)
+    if resultado.falhou:
+        raise FalhaProvedores(f'Erro ao consultar certidões: {resultado.erros}')
+
+    for cert in resultado.certidoes:
+        registrar_certidao(
+            credor.id,
+            TipoCertidao(cert["tipo"]),
+            OrigemCertidao.API,
+            StatusCertidao(cert["status"]),
+            conteudo_base64=cert["conteudo_base64"]
+        )
+    db.session.commit()
+    cache_credores.invalidar(credor.id)
+    return {'total': len(resultado.certidoes), 'erros': resultado.erros}
@@ -1,44 +1,388 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import joinedload
-from app.extensions import db
+"""
+Revalidação periódica das certidões obtidas via API no projeto Mercatório.
+Percorre os credores em lotes por chave (id crescente), consulta os
+provedores e grava cada lote em sua própria transação, junto com o
+checkpoint do job: uma execução interrompida é retomada a partir do último
+lote gravado, e a memória usada depende do tamanho do lote, não da carteira.
+
+Com mais de um worker, os lotes são distribuídos por uma fila limitada a N
+threads; a taxa de cada provedor é controlada pelo token bucket do cliente
+de certidões, compartilhado por todas elas. Cada execução roda sob um
+lease no banco (um por shard), para que réplicas não revalidem os mesmos
+credores ao mesmo tempo.
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import exists, select
+from flask import current_app
+from app.extensions import db, cache_credores
 from app.models.certidao import Certidao, OrigemCertidao, StatusCertidao, TipoCertidao
+from app.models.checkpoint_job import CheckpointJob
 from app.models.credor import Credor
-from datetime import datetime
-import requests
+from app.services.certidoes import substituir_certidao
+from app.services.provedores_certidoes import cliente_certidoes
+from app.services.coordenacao import executar_como_lider, manter_lease, registrar_heartbeat, remover_no
+
+NOME_JOB = 'revalidar_certidoes'
+TAMANHO_LOTE_REVALIDACAO = 200
+# Lease do líder da renovação por vencimento, em intervalos do agendamento
+FATOR_LEASE_LIDER = 3
+
+def _proximo_lote(ultimo_id, tamanho_lote, shard=None):
+    """
+    Próximos credores (id, cpf_cnpj) com certidões de origem API, após ultimo_id.
 
-def revalidar_certidoes():
-    print("[JOB] Revalidando certidões...")
+    Com shard=(índice, total), só os credores com id % total == índice.
+    """
+    possui_certidao_api = exists().where(
+        Certidao.credor_id == Credor.id,
+        Certidao.origem == OrigemCertidao.API
+    )
+    consulta = select(Credor.id, Credor.cpf_cnpj).where(Credor.id > ultimo_id, possui_certidao_api)
+    if shard is not None:
+        indice, total = shard
+        consulta = consulta.where(Credor.id % total == indice)
+    return db.session.execute(consulta.order_by(Credor.id).limit(tamanho_lote)).all()
 
-    credores = Credor.query.options(joinedload(Credor.certidoes)).all()
+def _certidoes_api_por_credor(credores_ids, tamanho_lote):
+    """Certidões API do lote, agrupadas por credor."""
+    consulta = (
+        select(Certidao)
+        .where(Certidao.credor_id.in_(credores_ids), Certidao.origem == OrigemCertidao.API)
+        .execution_options(yield_per=tamanho_lote)
+    )
+    grupos = {}
+    for certidao in db.session.scalars(consulta):
+        grupos.setdefault(certidao.credor_id, []).append(certidao)
+    return grupos
 
-    for credor in credores:
-        certs_api = [c for c in credor.certidoes if c.origem == OrigemCertidao.API]
+def revalidar_credor(cpf_cnpj, certidoes, resultado=None):
+    """
+    Consulta os provedores dos tipos que o credor possui e atualiza as certidões.
 
-        if not certs_api:
-            continue
+    Args:
+        resultado: ResultadoConsulta já obtida (ex.: por buscar_varios); se
+            None, os provedores são consultados agora
 
-        try:
-            res = requests.get("http://localhost:5000/api/certidoes", params={"cpf_cnpj": credor.cpf_cnpj})
-            dados = res.json()
-        except Exception as e:
-            print(f"[JOB] Erro ao consultar certidões de {credor.cpf_cnpj}: {str(e)}")
-            continue
+    Returns:
+        tuple: (quantidade de certidões atualizadas, erros por tipo)
+    """
+    if resultado is None:
+        resultado = cliente_certidoes.buscar(cpf_cnpj, tipos={c.tipo for c in certidoes})
+    atualizadas = 0
+    for nova in resultado.certidoes:
+        tipo = TipoCertidao(nova["tipo"])
+        for cert in certidoes:
+            if cert.tipo == tipo:
+                substituir_certidao(cert, StatusCertidao(nova["status"]), conteudo_base64=nova["conteudo_base64"])
+                atualizadas += 1
+    return atualizadas, resultado.erros
 
-        for nova in dados.get("certidoes", []):
-            tipo = TipoCertidao(nova["tipo"])
-            status = StatusCertidao(nova["status"])
+def _processar_lote(lote, tamanho_lote):
+    """
+    Revalida um lote de credores na sessão atual, sem fazer commit.
 
-            for cert in certs_api:
-                if cert.tipo == tipo:
-                    cert.status = status
-                    cert.conteudo_base64 = nova["conteudo_base64"]
-                    cert.recebida_em = datetime.utcnow()
+    Returns:
+        tuple: (certidões atualizadas, erros de provedores, ids dos credores alterados)
+    """
+    certidoes = _certidoes_api_por_credor([credor_id for credor_id, _ in lote], tamanho_lote)
+    # O lote inteiro é consultado de uma vez (em lotes, nos provedores que os aceitam)
+    resultados = cliente_certidoes.buscar_varios({
+        cpf_cnpj: {c.tipo for c in certidoes.get(credor_id, [])} for credor_id, cpf_cnpj in lote
+    })
+    alterados = set()
+    atualizadas_lote = erros = 0
+    for credor_id, cpf_cnpj in lote:
+        atualizadas, falhas = revalidar_credor(cpf_cnpj, certidoes.get(credor_id, []), resultados[cpf_cnpj])
+        for tipo, erro in falhas.items():
+            print(f"[JOB] Erro ao consultar certidão {tipo} de {cpf_cnpj}: {erro}")
+        if atualizadas:
+            alterados.add(credor_id)
+        atualizadas_lote += atualizadas
+        erros += len(falhas)
+    return atualizadas_lote, erros, alterados
 
+def _carregar_checkpoint(nome, reiniciar):
+    """Retoma a execução interrompida ou começa uma nova."""
+    checkpoint = db.session.get(CheckpointJob, nome)
+    if checkpoint is None:
+        checkpoint = CheckpointJob(nome=nome)
+        db.session.add(checkpoint)
+    if reiniciar or checkpoint.iniciado_em is None or checkpoint.concluido_em is not None:
+        checkpoint.ultimo_id = 0
+        checkpoint.processados = 0
+        checkpoint.iniciado_em = datetime.utcnow()
+        checkpoint.concluido_em = None
+    checkpoint.atualizado_em = datetime.utcnow()
     db.session.commit()
-    print("[JOB] Certidões revalidadas com sucesso")
+    return checkpoint
+
+def _avancar_checkpoint(nome, ultimo_id, processados):
+    checkpoint = db.session.get(CheckpointJob, nome)
+    checkpoint.ultimo_id = ultimo_id
+    checkpoint.processados += processados
+    checkpoint.atualizado_em = datetime.utcnow()
+    return checkpoint
+
+def nome_execucao(shard=None):
+    """Nome do checkpoint e do lease da execução (um por shard)."""
+    return NOME_JOB if shard is None else f'{NOME_JOB}:{shard[0]}/{shard[1]}'
+
+class _Execucao:
+    """Parâmetros e totais de uma execução do job."""
+
+    def __init__(self, tamanho_lote, shard, prazo, lease):
+        self.nome = nome_execucao(shard)
+        self.tamanho_lote = tamanho_lote
+        self.shard = shard
+        self.prazo = prazo
+        self.lease = lease
+        self.credores = 0
+        self.certidoes_atualizadas = 0
+        self.erros = 0
+
+    def deve_parar(self):
+        """Fim da janela, ou lease assumido por outro processo."""
+        return (self.prazo is not None and time.monotonic() >= self.prazo) or self.lease.perdido.is_set()
+
+    def proximo_lote(self, ultimo_id):
+        return _proximo_lote(ultimo_id, self.tamanho_lote, self.shard)
+
+    def somar(self, credores, atualizadas, erros):
+        self.credores += credores
+        self.certidoes_atualizadas += atualizadas
+        self.erros += erros
+
+def _executar_serial(execucao, ultimo_id):
+    """Processa os lotes na thread atual. Retorna True se parou antes do fim."""
+    while True:
+        if execucao.deve_parar():
+            return True
+        lote = execucao.proximo_lote(ultimo_id)
+        if not lote:
+            return False
+
+        atualizadas, erros, alterados = _processar_lote(lote, execucao.tamanho_lote)
+        # Lote e checkpoint na mesma transação: ou os dois ficam gravados, ou nenhum
+        _avancar_checkpoint(execucao.nome, lote[-1].id, len(lote))
+        db.session.commit()
+        cache_credores.invalidar(*alterados)
+        ultimo_id = lote[-1].id
+        execucao.somar(len(lote), atualizadas, erros)
+
+def _worker(app, fila, concluidos, tamanho_lote):
+    with app.app_context():
+        while True:
+            item = fila.get()
+            if item is None:
+                return
+            sequencia, lote = item
+            try:
+                atualizadas, erros, alterados = _processar_lote(lote, tamanho_lote)
+                db.session.commit()
+                cache_credores.invalidar(*alterados)
+                concluidos.put((sequencia, lote, (atualizadas, erros), None))
+            except Exception as e:
+                db.session.rollback()
+                concluidos.put((sequencia, lote, None, e))
+            finally:
+                db.session.remove()
+
+class _Marcador:
+    """
+    Avança o checkpoint só até o último lote de uma sequência sem lacunas.
+
+    No modo paralelo, cada worker grava seu lote e o checkpoint é gravado
+    depois, pela thread coordenadora; como os lotes terminam fora de ordem,
+    um lote pendente antes de outro já concluído precisa ser refeito se a
+    execução cair (refazer um lote gravado é inofensivo: a revalidação é
+    idempotente).
+    """
+
+    def __init__(self, execucao):
+        self.execucao = execucao
+        self.proxima = 0
+        self.prontos = {}
+        self.falha = None
+
+    def registrar(self, sequencia, lote, resultado, erro):
+        if erro is not None:
+            self.falha = self.falha or erro
+            return
+        self.prontos[sequencia] = (lote, resultado)
+        avancou = None
+        while self.proxima in self.prontos:
+            lote, (atualizadas, erros) = self.prontos.pop(self.proxima)
+            self.execucao.somar(len(lote), atualizadas, erros)
+            avancou = _avancar_checkpoint(self.execucao.nome, lote[-1].id, len(lote))
+            self.proxima += 1
+        if avancou is not None:
+            db.session.commit()
+
+def _executar_paralelo(execucao, ultimo_id, workers):
+    """Distribui os lotes entre `workers` threads. Retorna True se parou antes do fim."""
+    app = current_app._get_current_object()
+    fila = queue.Queue(maxsize=workers * 2)
+    concluidos = queue.Queue()
+    threads = [
+        threading.Thread(target=_worker, args=(app, fila, concluidos, execucao.tamanho_lote),
+                         name=f'revalidacao-{i}', daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    marcador = _Marcador(execucao)
+
+    def drenar(bloquear=False):
+        while True:
+            try:
+                marcador.registrar(*concluidos.get(block=bloquear, timeout=0.05 if bloquear else None))
+            except queue.Empty:
+                return
+
+    interrompido = False
+    sequencia = 0
+    try:
+        while marcador.falha is None:
+            if execucao.deve_parar():
+                interrompido = True
+                break
+            lote = execucao.proximo_lote(ultimo_id)
+            # Encerra a transação de leitura para não segurar o banco entre lotes
+            db.session.commit()
+            if not lote:
+                break
+            while True:
+                drenar()
+                try:
+                    # Fila limitada: a leitura de lotes acompanha a vazão dos workers
+                    fila.put((sequencia, lote), timeout=0.05)
+                    break
+                except queue.Full:
+                    continue
+            ultimo_id = lote[-1].id
+            sequencia += 1
+    finally:
+        for _ in threads:
+            fila.put(None)
+        while any(thread.is_alive() for thread in threads):
+            drenar(bloquear=True)
+        drenar()
+
+    if marcador.falha is not None:
+        raise marcador.falha
+    return interrompido
+
+def revalidar_certidoes(tamanho_lote=TAMANHO_LOTE_REVALIDACAO, reiniciar=False, workers=1, janela_segundos=None,
+                        shard=None):
+    """
+    Revalida as certidões de origem API de todos os credores (ou de um shard).
+
+    A execução ocorre sob um lease no banco: se outro processo já estiver
+    revalidando o mesmo shard, esta chamada retorna sem fazer nada.
+
+    Args:
+        tamanho_lote: credores por lote (e por transação)
+        reiniciar: ignora o checkpoint de uma execução interrompida
+        workers: threads processando lotes em paralelo (1 = na thread atual)
+        janela_segundos: prazo da execução; ao atingi-lo, nenhum lote novo é
+            iniciado e a próxima execução retoma do checkpoint
+        shard: (índice, total) para dividir os credores entre nós, cada
+            shard com seu próprio checkpoint
+
+    Returns:
+        dict: relatório da execução (credores, certidões, erros, vazão)
+    """
+    nome = nome_execucao(shard)
+    duracao_lease = timedelta(seconds=current_app.config.get('COORDENACAO_DURACAO_LEASE_SEGUNDOS', 300))
+    with manter_lease(nome, duracao_lease) as lease:
+        if lease is None:
+            print(f"[JOB] {nome} já está em execução em outro processo")
+            return {'executado': False, 'shard': nome}
+
+        checkpoint = _carregar_checkpoint(nome, reiniciar)
+        retomado_de = checkpoint.ultimo_id
+        print(f"[JOB] Revalidando certidões ({nome}, a partir do credor {retomado_de}, {workers} worker(s))...")
+
+        inicio = time.monotonic()
+        execucao = _Execucao(tamanho_lote, shard, inicio + janela_segundos if janela_segundos else None, lease)
+        if workers > 1:
+            interrompido = _executar_paralelo(execucao, retomado_de, workers)
+        else:
+            interrompido = _executar_serial(execucao, retomado_de)
+
+        if not interrompido:
+            checkpoint = db.session.get(CheckpointJob, nome)
+            checkpoint.concluido_em = datetime.utcnow()
+            db.session.commit()
+
+    segundos = time.monotonic() - inicio
+    relatorio = {
+        'executado': True,
+        'shard': nome,
+        'retomado_de': retomado_de,
+        'workers': workers,
+        'concluido': not interrompido,
+        'credores': execucao.credores,
+        'certidoes_atualizadas': execucao.certidoes_atualizadas,
+        'erros': execucao.erros,
+        'segundos': round(segundos, 3),
+        'credores_por_segundo': round(execucao.credores / segundos, 1) if segundos else None
+    }
+    situacao = 'revalidadas' if not interrompido else 'parcialmente revalidadas (fim da janela ou lease perdido)'
+    print(f"[JOB] Certidões {situacao}: {execucao.credores} credor(es), {execucao.certidoes_atualizadas} "
+          f"certidão(ões) em {relatorio['segundos']}s ({relatorio['credores_por_segundo']} credores/s), "
+          f"{execucao.erros} erro(s)")
+    return relatorio
+
+def configurar_agendamento(app, scheduler):
+    """Registra no scheduler do APScheduler a renovação por vencimento e os heartbeats."""
+    from app.jobs.agendador_validade import AgendadorValidade
+
+    # Renovação guiada pelo vencimento: a cada poucos minutos, só as
+    # certidões cujo instante de renovação (com jitter) já chegou. A
+    # revalidação completa fica disponível em `flask certidoes revalidar`.
+    # Com vários workers/containers, só o processo líder (dono do lease)
+    # executa a renovação; os demais apenas publicam heartbeats.
+    agendador = AgendadorValidade(dispersao=timedelta(hours=app.config.get('VALIDADE_DISPERSAO_HORAS', 24)))
+    intervalo = timedelta(minutes=app.config.get('VALIDADE_INTERVALO_MINUTOS', 5))
+    # O líder mantém o lease entre as execuções: com ele vencendo junto com o
+    # intervalo, qualquer atraso do scheduler passaria a liderança a outro nó
+    duracao_lease = max(timedelta(seconds=app.config.get('COORDENACAO_DURACAO_LEASE_SEGUNDOS', 300)),
+                        FATOR_LEASE_LIDER * intervalo)
+
+    def executar():
+        with app.app_context():
+            relatorio = executar_como_lider('renovacao_validade', agendador.executar, duracao_lease)
+            if relatorio and relatorio['credores']:
+                print(f"[JOB] Renovação por vencimento: {relatorio}")
+
+    def heartbeat():
+        with app.app_context():
+            registrar_heartbeat()
+
+    def sair():
+        with app.app_context():
+            remover_no()
+
+    heartbeat()
+    atexit.register(sair)
+    scheduler.add_job(func=executar, trigger="interval", seconds=intervalo.total_seconds())
+    scheduler.add_job(func=heartbeat, trigger="interval", seconds=app.config.get('COORDENACAO_HEARTBEAT_SEGUNDOS', 30))
+    return scheduler
 
 def init_scheduler(app):
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(func=revalidar_certidoes, trigger="interval", hours=24)
+    """
+    Inicia o agendamento em segundo plano no próprio processo web, com
+    AGENDADOR_ATIVO. Para um processo dedicado: `flask certidoes agendador`.
+    """
+    # Dependência usada apenas pelo agendamento
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = configurar_agendamento(app, BackgroundScheduler())
     scheduler.start()
     app.scheduler = scheduler
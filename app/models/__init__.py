@@ -3,11 +3,30 @@
 from .credor import Credor
 from .precatorio import Precatorio
 from .documento_pessoal import DocumentoPessoal
-from .certidao import Certidao
+from .certidao import Certidao, CertidaoHistorico
+from .resumo import ResumoForo, ResumoAnoPublicacao, ResumoProntidao
+from .checkpoint_job import CheckpointJob
+from .coordenacao import LeaseJob, NoAtivo
+from .blob import ConteudoBlob
+from .arquivo import ArquivoArmazenado
+from .tarefa import Tarefa
+from .upload_retomavel import UploadRetomavel
+from . import versionamento  # registra o incremento de versão dos credores
 
 __all__ = [
     "Credor",
     "Precatorio",
     "DocumentoPessoal",
-    "Certidao"
+    "Certidao",
+    "CertidaoHistorico",
+    "ResumoForo",
+    "ResumoAnoPublicacao",
+    "ResumoProntidao",
+    "CheckpointJob",
+    "LeaseJob",
+    "NoAtivo",
+    "ConteudoBlob",
+    "ArquivoArmazenado",
+    "Tarefa",
+    "UploadRetomavel"
 ]
@@ -0,0 +1,17 @@
+# app/models/arquivo.py
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.extensions import db
+
+class ArquivoArmazenado(db.Model):
+    """
+    Arquivo enviado (documento pessoal ou certidão manual), guardado uma
+    única vez pelo SHA-256. `referencias` conta as linhas que apontam para
+    ele pelo arquivo_url; com zero, o arquivo pode ser coletado.
+    """
+    __tablename__ = "arquivos_armazenados"
+    hash = Column(String(64), primary_key=True)
+    tamanho = Column(Integer, nullable=False)
+    tipo_mime = Column(String(100), nullable=True)
+    referencias = Column(Integer, nullable=False, default=0)
+    criado_em = Column(DateTime, server_default=func.now(), nullable=False)
@@ -0,0 +1,12 @@
+# app/models/blob.py
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from sqlalchemy.sql import func
+from app.extensions import db
+
+class ConteudoBlob(db.Model):
+    """Conteúdo binário guardado uma única vez, identificado pelo SHA-256 (backend 'banco')."""
+    __tablename__ = "conteudos_blobs"
+    hash = Column(String(64), primary_key=True)
+    tamanho = Column(Integer, nullable=False)
+    dados = Column(LargeBinary, nullable=False)
+    criado_em = Column(DateTime, server_default=func.now(), nullable=False)
@@ -1,5 +1,7 @@
 # app/models/certidao.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Enum
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Index, event, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -21,6 +23,17 @@ class StatusCertidao(str, enum.Enum):
     INVALIDA = "invalida"
     PENDENTE = "pendente"
 
+# Prazo de validade de cada tipo de certidão, contado a partir da emissão
+VALIDADE_CERTIDOES = {
+    TipoCertidao.FEDERAL: timedelta(days=180),
+    TipoCertidao.ESTADUAL: timedelta(days=60),
+    TipoCertidao.MUNICIPAL: timedelta(days=90),
+    TipoCertidao.TRABALHISTA: timedelta(days=180),
+}
+
+def calcular_expiracao(tipo, recebida_em):
+    return recebida_em + VALIDADE_CERTIDOES[TipoCertidao(tipo)]
+
 class Certidao(db.Model):
     __tablename__ = "certidoes"
     id = Column(Integer, primary_key=True, index=True)
@@ -28,9 +41,83 @@ class Certidao(db.Model):
     tipo = Column(Enum(TipoCertidao), nullable=False)
     origem = Column(Enum(OrigemCertidao), nullable=False)
     arquivo_url = Column(String(255), nullable=True)
-    conteudo_base64 = Column(Text, nullable=True)
+    # Conteúdo no armazenamento endereçado por hash (app/services/blobs.py);
+    # a linha guarda só o SHA-256 e o tamanho em bytes
+    conteudo_hash = Column(String(64), nullable=True, index=True)
+    tamanho = Column(Integer, nullable=True)
     status = Column(Enum(StatusCertidao), nullable=False)
     recebida_em = Column(DateTime, server_default=func.now(), nullable=False)
+    # Fim da validade; preenchido a partir do tipo e de recebida_em (ver abaixo)
+    expira_em = Column(DateTime, nullable=True)
     
     # Relacionamento
     credor = relationship("Credor", back_populates="certidoes")
+
+    # Filtro por status na listagem de credores e carga das certidões de um credor
+    __table_args__ = (
+        Index("ix_certidoes_credor_status", "credor_id", "status"),
+        # Só a versão atual de cada certidão; as anteriores vão para certidoes_historico
+        Index("uq_certidoes_credor_tipo_origem", "credor_id", "tipo", "origem", unique=True),
+        # Busca das certidões próximas do vencimento (ver app/jobs/agendador_validade.py)
+        Index("ix_certidoes_origem_expira_em", "origem", "expira_em"),
+    )
+
+    @property
+    def conteudo(self):
+        """Bytes da certidão, lidos do armazenamento apenas quando acessados."""
+        if self.conteudo_hash is None:
+            return None
+        from app.services.blobs import armazenamento_blobs
+        return armazenamento_blobs.ler(self.conteudo_hash)
+
+    @conteudo.setter
+    def conteudo(self, dados):
+        if dados is None:
+            self.conteudo_hash = self.tamanho = None
+            return
+        from app.services.blobs import armazenamento_blobs
+        self.conteudo_hash, self.tamanho = armazenamento_blobs.guardar(dados)
+
+    @property
+    def conteudo_base64(self):
+        """Conteúdo em base64, como recebido dos provedores e exposto pela API."""
+        dados = self.conteudo
+        return base64.b64encode(dados).decode() if dados is not None else None
+
+    @conteudo_base64.setter
+    def conteudo_base64(self, texto):
+        from app.services.blobs import decodificar_base64
+        self.conteudo = decodificar_base64(texto) if texto is not None else None
+
+class CertidaoHistorico(db.Model):
+    """Versão substituída de uma certidão (tabela só de inclusão; ver app/services/certidoes.py)."""
+    __tablename__ = "certidoes_historico"
+    id = Column(Integer, primary_key=True)
+    # Linha atual em certidoes, da qual esta versão foi substituída
+    certidao_id = Column(Integer, nullable=False)
+    credor_id = Column(Integer, ForeignKey("credores.id"), nullable=False)
+    tipo = Column(Enum(TipoCertidao), nullable=False)
+    origem = Column(Enum(OrigemCertidao), nullable=False)
+    status = Column(Enum(StatusCertidao), nullable=False)
+    arquivo_url = Column(String(255), nullable=True)
+    conteudo_hash = Column(String(64), nullable=True)
+    tamanho = Column(Integer, nullable=True)
+    recebida_em = Column(DateTime, nullable=False)
+    expira_em = Column(DateTime, nullable=True)
+    substituida_em = Column(DateTime, nullable=False)
+
+    # Paginação do histórico de um credor, do mais recente para o mais antigo
+    __table_args__ = (
+        Index("ix_certidoes_historico_credor_id", "credor_id", "id"),
+    )
+
+@event.listens_for(Certidao, "before_insert")
+@event.listens_for(Certidao, "before_update")
+def definir_expiracao(mapper, connection, certidao):
+    """Recalcula expira_em quando a certidão é emitida de novo, salvo se informado explicitamente."""
+    estado = inspect(certidao)
+    if estado.attrs.expira_em.history.has_changes():
+        return
+    reemitida = estado.attrs.recebida_em.history.has_changes() or estado.attrs.tipo.history.has_changes()
+    if certidao.expira_em is None or reemitida:
+        certidao.expira_em = calcular_expiracao(certidao.tipo, certidao.recebida_em or datetime.utcnow())
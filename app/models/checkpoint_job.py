@@ -0,0 +1,14 @@
+# app/models/checkpoint_job.py
+from sqlalchemy import Column, Integer, String, DateTime
+from app.extensions import db
+
+class CheckpointJob(db.Model):
+    """Progresso de um job em lotes, para retomar de onde parou após uma falha."""
+    __tablename__ = "checkpoints_jobs"
+    nome = Column(String(100), primary_key=True)
+    # Maior id já processado (iteração por chave, em ordem crescente)
+    ultimo_id = Column(Integer, nullable=False, default=0)
+    processados = Column(Integer, nullable=False, default=0)
+    iniciado_em = Column(DateTime, nullable=True)
+    atualizado_em = Column(DateTime, nullable=True)
+    concluido_em = Column(DateTime, nullable=True)
@@ -0,0 +1,18 @@
+# app/models/coordenacao.py
+from sqlalchemy import Column, String, DateTime
+from app.extensions import db
+
+class LeaseJob(db.Model):
+    """Trava com prazo: só o dono executa o job até expira_em (ver app/services/coordenacao.py)."""
+    __tablename__ = "leases_jobs"
+    nome = Column(String(100), primary_key=True)
+    dono = Column(String(255), nullable=False)
+    expira_em = Column(DateTime, nullable=False)
+    adquirido_em = Column(DateTime, nullable=False)
+
+class NoAtivo(db.Model):
+    """Processo vivo, anunciado por heartbeat; base da divisão (shards) dos credores."""
+    __tablename__ = "nos_ativos"
+    no_id = Column(String(255), primary_key=True)
+    heartbeat_em = Column(DateTime, nullable=False, index=True)
+    iniciado_em = Column(DateTime, nullable=False)
@@ -1,7 +1,18 @@
 # app/models/credor.py
-from sqlalchemy import Column, Integer, String
-from sqlalchemy.orm import relationship
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship, validates
 from app.extensions import db
+from app.utils.normalizacao import normalizar_texto, somente_digitos
+
+# Defaults sensíveis ao contexto: também preenchem as colunas de busca em
+# INSERTs em massa feitos sem o ORM (ex.: ingestão em lote)
+def _padrao_nome_busca(contexto):
+    return normalizar_texto(contexto.get_current_parameters()['nome'])
+
+def _padrao_documento_digitos(contexto):
+    return somente_digitos(contexto.get_current_parameters()['cpf_cnpj'])
 
 class Credor(db.Model):
     __tablename__ = "credores"
@@ -10,8 +21,30 @@ class Credor(db.Model):
     cpf_cnpj = Column(String(14), unique=True, nullable=False, index=True)
     email = Column(String(255), nullable=False)
     telefone = Column(String(20), nullable=False)
+    # Versão da representação do credor, incrementada a cada escrita nele ou
+    # em seus precatórios, documentos e certidões (ver app/models/versionamento.py)
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
+    # Default no Python para manter a precisão de microssegundos (usado como marca d'água)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False, index=True)
+    # Estado de prontidão das certidões, mantido por app/services/agregados.py
+    prontidao = Column(String(20), nullable=False, default="sem_certidoes", server_default="sem_certidoes")
+    # Colunas de busca: nome sem acentos/caixa e CPF/CNPJ só com dígitos (ver app/services/busca.py)
+    nome_busca = Column(String(255), nullable=True, default=_padrao_nome_busca, index=True)
+    documento_digitos = Column(String(14), nullable=True, default=_padrao_documento_digitos, index=True)
     
     # Relacionamentos
     precatorios = relationship("Precatorio", back_populates="credor", cascade="all, delete-orphan")
     documentos = relationship("DocumentoPessoal", back_populates="credor", cascade="all, delete-orphan")
     certidoes = relationship("Certidao", back_populates="credor", cascade="all, delete-orphan")
+    # Versões substituídas das certidões; fora do detalhe do credor (paginado à parte)
+    historico_certidoes = relationship("CertidaoHistorico", cascade="all, delete-orphan")
+
+    @validates('nome')
+    def _atualizar_nome_busca(self, chave, valor):
+        self.nome_busca = normalizar_texto(valor)
+        return valor
+
+    @validates('cpf_cnpj')
+    def _atualizar_documento_digitos(self, chave, valor):
+        self.documento_digitos = somente_digitos(valor)
+        return valor
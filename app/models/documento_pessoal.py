@@ -13,7 +13,7 @@ class TipoDocumento(str, enum.Enum):
 class DocumentoPessoal(db.Model):
     __tablename__ = "documentos_pessoais"
     id = Column(Integer, primary_key=True, index=True)
-    credor_id = Column(Integer, ForeignKey("credores.id"), nullable=False)
+    credor_id = Column(Integer, ForeignKey("credores.id"), nullable=False, index=True)
     tipo = Column(Enum(TipoDocumento), nullable=False)
     arquivo_url = Column(String(255), nullable=False)
     enviado_em = Column(DateTime, server_default=func.now(), nullable=False)
@@ -6,7 +6,7 @@ from app.extensions import db
 class Precatorio(db.Model):
     __tablename__ = "precatorios"
     id = Column(Integer, primary_key=True, index=True)
-    credor_id = Column(Integer, ForeignKey("credores.id"), nullable=False)
+    credor_id = Column(Integer, ForeignKey("credores.id"), nullable=False, index=True)
     numero_precatorio = Column(String(50), nullable=False, index=True)
     valor_nominal = Column(Float, nullable=False)
     foro = Column(String(100), nullable=False)
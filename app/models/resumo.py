@@ -0,0 +1,22 @@
+# app/models/resumo.py
+from sqlalchemy import Column, Integer, String, Float
+from app.extensions import db
+
+class ResumoForo(db.Model):
+    __tablename__ = "resumo_foros"
+    foro = Column(String(100), primary_key=True)
+    quantidade_precatorios = Column(Integer, nullable=False, default=0)
+    valor_total = Column(Float, nullable=False, default=0.0)
+
+class ResumoAnoPublicacao(db.Model):
+    __tablename__ = "resumo_anos_publicacao"
+    ano = Column(Integer, primary_key=True, autoincrement=False)
+    quantidade_precatorios = Column(Integer, nullable=False, default=0)
+    valor_total = Column(Float, nullable=False, default=0.0)
+
+class ResumoProntidao(db.Model):
+    __tablename__ = "resumo_prontidao"
+    # Estado de prontidão das certidões do credor (ver app/services/agregados.py)
+    estado = Column(String(20), primary_key=True)
+    quantidade_credores = Column(Integer, nullable=False, default=0)
+    valor_total = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,35 @@
+# app/models/tarefa.py
+import enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum, JSON, Index
+from sqlalchemy.sql import func
+from app.extensions import db
+
+class StatusTarefa(str, enum.Enum):
+    PENDENTE = "pendente"
+    EXECUTANDO = "executando"
+    CONCLUIDA = "concluida"
+    FALHOU = "falhou"
+
+class Tarefa(db.Model):
+    """Tarefa da fila persistente, executada por `flask tarefas worker` (ver app/services/tarefas.py)."""
+    __tablename__ = "tarefas"
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String(100), nullable=False)
+    parametros = Column(JSON, nullable=False, default=dict)
+    status = Column(Enum(StatusTarefa), nullable=False, default=StatusTarefa.PENDENTE)
+    tentativas = Column(Integer, nullable=False, default=0)
+    max_tentativas = Column(Integer, nullable=False)
+    # Só é reservada a partir deste instante (backoff entre tentativas)
+    disponivel_em = Column(DateTime, nullable=False)
+    # Worker que reservou a tarefa; reserva antiga demais indica worker morto
+    reservada_por = Column(String(255), nullable=True)
+    reservada_em = Column(DateTime, nullable=True)
+    resultado = Column(JSON, nullable=True)
+    erro = Column(Text, nullable=True)
+    criada_em = Column(DateTime, server_default=func.now(), nullable=False)
+    concluida_em = Column(DateTime, nullable=True)
+
+    # Próxima tarefa disponível
+    __table_args__ = (
+        Index("ix_tarefas_status_disponivel_em", "status", "disponivel_em"),
+    )
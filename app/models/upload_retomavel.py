@@ -0,0 +1,38 @@
+# app/models/upload_retomavel.py
+import enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Enum, JSON, Index
+from sqlalchemy.sql import func
+from app.extensions import db
+
+class DestinoUpload(str, enum.Enum):
+    DOCUMENTO = "documento"
+    CERTIDAO = "certidao"
+
+class UploadRetomavel(db.Model):
+    """
+    Upload enviado em partes (protocolo tus, ver app/services/uploads_retomaveis.py).
+    O conteúdo fica em UPLOAD_FOLDER/.parciais/<id> até completar `tamanho`.
+    """
+    __tablename__ = "uploads_retomaveis"
+    id = Column(String(32), primary_key=True)
+    credor_id = Column(Integer, ForeignKey("credores.id"), nullable=False)
+    destino = Column(Enum(DestinoUpload), nullable=False)
+    # Campos do formulário de upload (tipo e, para certidões, status)
+    metadados = Column(JSON, nullable=False, default=dict)
+    nome_arquivo = Column(String(255), nullable=False)
+    tamanho = Column(Integer, nullable=False)
+    # Bytes confirmados ao cliente: o próximo PATCH continua daqui
+    recebido = Column(Integer, nullable=False, default=0)
+    # PATCH em andamento; reserva antiga demais indica conexão perdida
+    recebendo_desde = Column(DateTime, nullable=True)
+    criado_em = Column(DateTime, server_default=func.now(), nullable=False)
+    atualizado_em = Column(DateTime, nullable=False)
+    concluido_em = Column(DateTime, nullable=True)
+    # Documento ou certidão criado ao completar
+    resultado_id = Column(Integer, nullable=True)
+    erro = Column(Text, nullable=True)
+
+    # Limpeza dos uploads abandonados
+    __table_args__ = (
+        Index("ix_uploads_retomaveis_atualizado_em", "atualizado_em"),
+    )
@@ -0,0 +1,42 @@
+# app/models/versionamento.py
+from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, update
+from app.extensions import db
+from .credor import Credor
+from .precatorio import Precatorio
+from .documento_pessoal import DocumentoPessoal
+from .certidao import Certidao
+
+FILHOS_CREDOR = (Precatorio, DocumentoPessoal, Certidao)
+
+def _credor_id(obj):
+    if isinstance(obj, Credor):
+        return obj.id
+    if obj.credor_id is not None:
+        return obj.credor_id
+    return obj.credor.id if obj.credor is not None else None
+
+@event.listens_for(db.session, "before_flush")
+def incrementar_versao_credores(session, flush_context, instances):
+    """Incrementa versao/atualizado_em dos credores afetados pelo flush."""
+    alterados = chain(
+        session.new,
+        (obj for obj in session.dirty if session.is_modified(obj)),
+        session.deleted
+    )
+    credores_ids = {
+        _credor_id(obj) for obj in alterados
+        if isinstance(obj, FILHOS_CREDOR + (Credor,))
+    }
+    # Credores novos (ainda sem id) já nascem com a versão inicial
+    credores_ids.discard(None)
+    if not credores_ids:
+        return
+
+    session.execute(
+        update(Credor)
+        .where(Credor.id.in_(credores_ids))
+        .values(versao=Credor.versao + 1, atualizado_em=datetime.utcnow())
+        .execution_options(synchronize_session="evaluate")
+    )
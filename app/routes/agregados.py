@@ -0,0 +1,9 @@
+from flask import Blueprint, jsonify
+from app.services.agregados import ler_agregados
+
+bp = Blueprint('agregados', __name__, url_prefix='/api/agregados')
+
+@bp.route('', methods=['GET'])
+def obter_agregados():
+    # Lê apenas as tabelas de resumo, mantidas a cada escrita
+    return jsonify(ler_agregados()), 200
@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify, send_file
+from app.services.derivados import gerador_derivados
+
+# Arquivos armazenados por hash: miniaturas e prévias para as páginas
+bp = Blueprint('arquivos', __name__, url_prefix='/api/arquivos')
+
+# O derivado é endereçado pelo hash do original, então nunca muda
+CACHE_DERIVADOS_SEGUNDOS = 365 * 24 * 3600
+
+@bp.route('/<arquivo_id>/<variante>', methods=['GET'])
+def baixar_derivado(arquivo_id, variante):
+    # variante: 'miniatura' (256 px) ou 'previa' (1280 px), em JPEG
+    caminho = gerador_derivados.caminho(arquivo_id, variante)
+    if caminho is None:
+        return jsonify({'erro': 'Prévia não disponível para este arquivo'}), 404
+
+    response = send_file(caminho, mimetype='image/jpeg', etag=f'{arquivo_id}-{variante}',
+                         max_age=CACHE_DERIVADOS_SEGUNDOS, conditional=True)
+    response.cache_control.immutable = True
+    return response
@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
-import requests
-from app.extensions import db
+from flask import Blueprint, Response, request, jsonify, current_app, url_for
+from app.extensions import db, cache_credores
 from app.models.certidao import Certidao, OrigemCertidao, StatusCertidao, TipoCertidao
 from app.models.credor import Credor
-from datetime import datetime
-from werkzeug.utils import secure_filename
-import os
-from app.utils.validacao_arquivos import validar_arquivo
+from app.services.arquivos import armazenamento_arquivos
+from app.services.derivados import gerador_derivados
+from app.utils.uploads import ArquivoInvalido
+from app.utils.validacao_arquivos import detectar_tipo_mime
+from app.services.provedores_certidoes import cliente_certidoes
+from app.services.blobs import BlobNaoEncontrado
+from app.schemas.credor_schema import historico_certidoes_schema
+from app.services.certidoes import listar_historico, registrar_certidao
+from app.services.tarefas import enfileirar
+from app.jobs.buscar_certidoes import TIPO_TAREFA as TIPO_TAREFA_BUSCA
 
 # Alterado o prefixo para /api/credores para evitar conflito com rotas web
 bp = Blueprint('certidoes', __name__, url_prefix='/api/credores')
@@ -18,28 +23,89 @@ def buscar_certidoes_automaticamente(credor_id):
     if not credor:
         return jsonify({'erro': 'Credor não encontrado'}), 404
 
+    # A consulta aos provedores fica com o worker da fila (flask tarefas worker):
+    # a requisição não espera pelos emissores
+    tarefa = enfileirar(TIPO_TAREFA_BUSCA, credor_id=credor.id)
+    status_url = url_for('tarefas.obter_tarefa', tarefa_id=tarefa.id)
+    return jsonify({
+        'mensagem': 'Busca de certidões agendada',
+        'tarefa_id': tarefa.id,
+        'status_url': status_url
+    }), 202, {'Location': status_url}
+
+
+@bp.route('/certidoes/cache', methods=['GET'])
+def estatisticas_cache_certidoes():
+    """Acertos do cache de respostas dos provedores, por tipo (deste processo)."""
+    return jsonify(cliente_certidoes.estatisticas_cache())
+
+
+@bp.route('/<int:credor_id>/certidoes/historico', methods=['GET'])
+def listar_historico_certidoes(credor_id):
+    # Versões substituídas, da mais recente para a mais antiga (a atual fica em /api/credores/<id>)
+    if not db.session.get(Credor, credor_id):
+        return jsonify({'erro': 'Credor não encontrado'}), 404
+
+    limite_maximo = current_app.config['LISTAGEM_TAMANHO_MAXIMO']
     try:
-        response = requests.get(f"http://localhost:5000/api/certidoes", params={"cpf_cnpj": credor.cpf_cnpj})
-        data = response.json()
-    except Exception as e:
-        return jsonify({'erro': 'Erro ao consultar certidões mockadas', 'detalhes': str(e)}), 500
-
-    certidoes_salvas = []
-    for cert in data.get("certidoes", []):
-        certidao = Certidao(
-            credor_id=credor.id,
-            tipo=TipoCertidao(cert["tipo"]),
-            status=StatusCertidao(cert["status"]),
-            origem=OrigemCertidao.API,
-            conteudo_base64=cert["conteudo_base64"],
-            recebida_em=datetime.utcnow()
-        )
-        db.session.add(certidao)
-        certidoes_salvas.append(certidao)
+        tipo = TipoCertidao(request.args['tipo']) if 'tipo' in request.args else None
+        origem = OrigemCertidao(request.args['origem']) if 'origem' in request.args else None
+    except ValueError:
+        return jsonify({'erro': 'tipo ou origem inválido'}), 400
+    try:
+        cursor = request.args.get('cursor', type=int)
+        limite = int(request.args.get('limite', current_app.config['LISTAGEM_TAMANHO_PAGINA']))
+    except ValueError:
+        return jsonify({'erro': 'limite inválido'}), 400
+
+    if not 1 <= limite <= limite_maximo:
+        return jsonify({'erro': f'limite deve estar entre 1 e {limite_maximo}'}), 400
+
+    historico, proximo_cursor = listar_historico(credor_id, tipo, origem, cursor=cursor, limite=limite)
+
+    return jsonify({
+        'historico': historico_certidoes_schema.dump(historico),
+        'proximo_cursor': proximo_cursor,
+        'limite': limite
+    }), 200
 
-    db.session.commit()
-    return jsonify({'mensagem': 'Certidões buscadas e salvas com sucesso', 'total': len(certidoes_salvas)}), 201
 
+@bp.route('/<int:credor_id>/certidoes/<int:certidao_id>/conteudo', methods=['GET'])
+def baixar_conteudo_certidao(credor_id, certidao_id):
+    certidao = db.session.get(Certidao, certidao_id)
+    if not certidao or certidao.credor_id != credor_id:
+        return jsonify({'erro': 'Certidão não encontrada'}), 404
+    if certidao.conteudo_hash is None:
+        return jsonify({'erro': 'Certidão sem conteúdo armazenado'}), 404
+
+    # O hash identifica o conteúdo: se o cliente já tem esta versão, o
+    # armazenamento nem é lido
+    if certidao.conteudo_hash in request.if_none_match:
+        resposta = Response(status=304)
+        resposta.set_etag(certidao.conteudo_hash)
+        return resposta
+
+    try:
+        dados = certidao.conteudo
+    except BlobNaoEncontrado:
+        return jsonify({'erro': 'Conteúdo da certidão não encontrado no armazenamento'}), 404
+
+    resposta = Response(dados, mimetype=detectar_tipo_mime(dados))
+    resposta.set_etag(certidao.conteudo_hash)
+    return resposta.make_conditional(request)
+
+
+@bp.route('/<int:credor_id>/certidoes/<int:certidao_id>/arquivo', methods=['GET'])
+def baixar_arquivo_certidao(credor_id, certidao_id):
+    # Arquivo enviado manualmente; o conteúdo vindo da API fica em /conteudo
+    certidao = db.session.get(Certidao, certidao_id)
+    if not certidao or certidao.credor_id != credor_id:
+        return jsonify({'erro': 'Certidão não encontrada'}), 404
+    response = armazenamento_arquivos.enviar(certidao.arquivo_url, f'certidao-{certidao.tipo.value}-{certidao.id}',
+                                             request.args.get('v'))
+    if response is None:
+        return jsonify({'erro': 'Certidão sem arquivo armazenado'}), 404
+    return response
 
 @bp.route('/<int:credor_id>/certidoes', methods=['POST'])
 def upload_certidao_manual(credor_id):
@@ -54,30 +120,25 @@ def upload_certidao_manual(credor_id):
 
     if not tipo or not status:
         return jsonify({'erro': 'Campos obrigatórios: tipo e status'}), 400
+    # Validados antes de guardar o arquivo: um campo inválido não deixa arquivo para trás
+    try:
+        tipo, status = TipoCertidao(tipo), StatusCertidao(status)
+    except ValueError:
+        return jsonify({'erro': 'tipo ou status inválido'}), 400
 
-    certidao = Certidao(
-        credor_id=credor.id,
-        tipo=TipoCertidao(tipo),
-        status=StatusCertidao(status),
-        origem=OrigemCertidao.MANUAL,
-        recebida_em=datetime.utcnow()
-    )
-
+    arquivo_url = None
     if arquivo:
-        # Nova validação de arquivo (conteúdo e tamanho)
-        valido, mensagem = validar_arquivo(arquivo)
-        if not valido:
-            return jsonify({'erro': mensagem}), 400
-
-        filename = secure_filename(arquivo.filename)
-        path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"credor_{credor_id}", "certidoes")
-        os.makedirs(path, exist_ok=True)
-
-        full_path = os.path.join(path, filename)
-        arquivo.save(full_path)
-        certidao.arquivo_url = full_path
+        # Tipo, extensão e tamanho já apurados enquanto o upload era recebido
+        try:
+            arquivo_url = armazenamento_arquivos.guardar_upload(arquivo)
+        except ArquivoInvalido as e:
+            return jsonify({'erro': str(e)}), 400
 
-    db.session.add(certidao)
+    # Substitui a certidão manual anterior do mesmo tipo, que vai para o histórico
+    certidao = registrar_certidao(credor.id, tipo, OrigemCertidao.MANUAL, status, arquivo_url=arquivo_url)
     db.session.commit()
+    cache_credores.invalidar(credor.id)
+    # Miniatura e prévia geradas em segundo plano
+    gerador_derivados.agendar(arquivo_url)
 
     return jsonify({'mensagem': 'Certidão manual enviada com sucesso', 'certidao_id': certidao.id}), 201
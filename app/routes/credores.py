@@ -1,13 +1,30 @@
-import os
+import hashlib
+import json
 from datetime import datetime
-from werkzeug.utils import secure_filename
-from flask import Blueprint, request, jsonify, current_app
-from app.extensions import db
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from sqlalchemy import select
+from app.extensions import db, cache_credores
 from app.models.credor import Credor
 from app.models.precatorio import Precatorio
 from app.models.documento_pessoal import DocumentoPessoal, TipoDocumento
-from app.schemas.credor_schema import CredorSchema
-from app.utils.validacao_arquivos import validar_arquivo, TAMANHO_MAXIMO
+from app.schemas.credor_schema import credores_resumo_schema
+from app.services.arquivos import armazenamento_arquivos
+from app.services.derivados import gerador_derivados
+from app.utils.uploads import ArquivoInvalido
+from app.services.ingestao import ingerir_registros, ler_csv, ler_ndjson
+from app.services.exportacao import calcular_marca, exportar_credores, normalizar_instante
+from app.services.correcao import IndiceDesconhecido, obter_indice
+from app.services.busca import buscar_credores as buscar_pagina_credores
+from app.services.detalhe_credor import ParametroInvalido, interpretar_parametros, serializar_credor
+from app.services.listagem import FiltroInvalido, interpretar_filtros, listar_credores as listar_pagina_credores
+
+# Formatos aceitos pela ingestão em lote
+FORMATOS_LOTE = {
+    'application/x-ndjson': ler_ndjson,
+    'application/ndjson': ler_ndjson,
+    'application/jsonl': ler_ndjson,
+    'text/csv': ler_csv
+}
 
 # Alterado o prefixo para /api/credores para evitar conflito com rotas web
 bp = Blueprint('credores', __name__, url_prefix='/api/credores')
@@ -61,21 +78,156 @@ def criar_credor():
         db.session.rollback()
         return jsonify({'erro': f'Erro ao cadastrar: {str(e)}'}), 500
 
+@bp.route('', methods=['GET'])
+def listar_credores():
+    limite_maximo = current_app.config['LISTAGEM_TAMANHO_MAXIMO']
+    try:
+        filtros = interpretar_filtros(request.args)
+        cursor = request.args.get('cursor', type=int)
+        limite = int(request.args.get('limite', current_app.config['LISTAGEM_TAMANHO_PAGINA']))
+    except (FiltroInvalido, ValueError) as e:
+        return jsonify({'erro': str(e) if isinstance(e, FiltroInvalido) else 'limite inválido'}), 400
+    
+    if not 1 <= limite <= limite_maximo:
+        return jsonify({'erro': f'limite deve estar entre 1 e {limite_maximo}'}), 400
+    
+    credores, proximo_cursor = listar_pagina_credores(filtros, cursor=cursor, limite=limite)
+    
+    return jsonify({
+        'credores': credores_resumo_schema.dump(credores),
+        'proximo_cursor': proximo_cursor,
+        'limite': limite
+    }), 200
+
+@bp.route('/busca', methods=['GET'])
+def buscar_credores():
+    # Type-ahead: nome (sem acentos/caixa) e/ou CPF/CNPJ (só dígitos), por relevância
+    limite_maximo = current_app.config['LISTAGEM_TAMANHO_MAXIMO']
+    try:
+        pagina = int(request.args.get('pagina', 1))
+        limite = int(request.args.get('limite', current_app.config['BUSCA_TAMANHO_PAGINA']))
+    except ValueError:
+        return jsonify({'erro': 'pagina e limite devem ser números inteiros'}), 400
+    
+    if pagina < 1 or not 1 <= limite <= limite_maximo:
+        return jsonify({'erro': f'pagina deve ser >= 1 e limite entre 1 e {limite_maximo}'}), 400
+    
+    resultados, tem_mais = buscar_pagina_credores(request.args.get('q', ''), pagina=pagina, limite=limite)
+    
+    return jsonify({
+        'resultados': resultados,
+        'pagina': pagina,
+        'limite': limite,
+        'tem_mais': tem_mais
+    }), 200
+
+@bp.route('/exportar', methods=['GET'])
+def exportar_carteira():
+    # Sincronização incremental: ?updated_since=<ISO 8601> (UTC)
+    atualizado_desde = None
+    if request.args.get('updated_since'):
+        try:
+            # Com fuso (ex.: ...Z ou -03:00), convertido para UTC
+            atualizado_desde = normalizar_instante(datetime.fromisoformat(request.args['updated_since']))
+        except ValueError:
+            return jsonify({'erro': 'updated_since deve estar no formato ISO 8601'}), 400
+    
+    # Valores corrigidos opcionais: ?correcao=<índice> (ex.: ipca_e)
+    correcao = None
+    if request.args.get('correcao'):
+        try:
+            correcao = obter_indice(request.args['correcao'])
+        except IndiceDesconhecido as e:
+            return jsonify({'erro': str(e)}), 400
+    
+    # Marca d'água a ser usada como updated_since na próxima sincronização,
+    # lida dos dados antes da exportação
+    marca = calcular_marca(atualizado_desde, current_app.config['EXPORTACAO_MARGEM_SEGUNDOS'])
+    
+    response = Response(
+        stream_with_context(exportar_credores(atualizado_desde, correcao=correcao)),
+        mimetype='application/x-ndjson'
+    )
+    if marca is not None:
+        response.headers['X-Exportacao-Marca'] = marca.isoformat()
+    return response
+
+@bp.route('/lote', methods=['POST'])
+def criar_credores_em_lote():
+    # Corpo lido em streaming: NDJSON (um credor por linha) ou CSV com cabeçalho
+    leitor = FORMATOS_LOTE.get(request.mimetype)
+    if not leitor:
+        return jsonify({'erro': 'Formato não suportado. Use application/x-ndjson ou text/csv'}), 415
+    
+    resultados = ingerir_registros(
+        leitor(request.stream),
+        tamanho_lote=current_app.config['INGESTAO_TAMANHO_LOTE']
+    )
+    
+    def relatorio():
+        # Mesmo objeto JSON de antes, enviado à medida que cada lote é gravado:
+        # os resultados primeiro e os totais no fim, sem guardar o relatório
+        total = criados = 0
+        yield '{"resultados": ['
+        for resultado in resultados:
+            yield (', ' if total else '') + json.dumps(resultado)
+            total += 1
+            criados += resultado['status'] == 'criado'
+        yield f'], "total": {total}, "criados": {criados}, "erros": {total - criados}}}\n'
+    
+    return Response(stream_with_context(relatorio()), mimetype='application/json'), 200
+
 @bp.route('/<int:credor_id>', methods=['GET'])
 def obter_credor(credor_id):
-    # Substituído Model.query.get() por db.session.get() para evitar warning de deprecated
-    credor = db.session.get(Credor, credor_id)
+    # Recorte opcional via ?fields= e ?include=; base64 das certidões só sob demanda
+    try:
+        campos, relacionamentos, incluir_conteudo, correcao = interpretar_parametros(request.args)
+    except ParametroInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     
-    if not credor:
+    # Versão atual do credor: uma consulta pela chave primária, sem serializar nada
+    versao = db.session.scalar(select(Credor.versao).where(Credor.id == credor_id))
+    if versao is None:
         return jsonify({'erro': 'Credor não encontrado'}), 404
     
-    # Criar schema para serialização
-    credor_schema = CredorSchema()
+    # A correção entra na variante pelo índice, pela série carregada e pelo mês final
+    variante = (campos, relacionamentos, incluir_conteudo, correcao.chave() if correcao else None, versao)
+    etag = gerar_etag(credor_id, variante)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
     
-    # Serializar dados do credor e relacionamentos
-    result = credor_schema.dump(credor)
+    # Relacionamentos carregados com selectinload e schema pré-construído, via cache
+    result = cache_credores.obter(
+        credor_id,
+        variante,
+        lambda: serializar_credor(credor_id, campos, relacionamentos, incluir_conteudo, correcao)
+    )
+    
+    if result is None:
+        return jsonify({'erro': 'Credor não encontrado'}), 404
     
-    return jsonify(result), 200
+    response = jsonify(result)
+    response.set_etag(etag)
+    return response, 200
+
+def gerar_etag(credor_id, variante):
+    """ETag forte do credor: muda com a versão e com o recorte pedido"""
+    recorte = hashlib.sha1(json.dumps(variante[:-1]).encode()).hexdigest()[:12]
+    return f"{credor_id}-{variante[-1]}-{recorte}"
+
+@bp.route('/<int:credor_id>/documentos/<int:documento_id>/arquivo', methods=['GET'])
+def baixar_documento(credor_id, documento_id):
+    # Range, ETag pelo hash e, com ?v=<versão>, cache de um ano
+    documento = db.session.get(DocumentoPessoal, documento_id)
+    if not documento or documento.credor_id != credor_id:
+        return jsonify({'erro': 'Documento não encontrado'}), 404
+    response = armazenamento_arquivos.enviar(documento.arquivo_url, f'{documento.tipo.value}-{documento.id}',
+                                             request.args.get('v'))
+    if response is None:
+        return jsonify({'erro': 'Arquivo do documento não encontrado'}), 404
+    return response
 
 @bp.route('/<int:credor_id>/documentos', methods=['POST'])
 def upload_documento_pessoal(credor_id):
@@ -90,28 +242,31 @@ def upload_documento_pessoal(credor_id):
     tipo = request.form.get('tipo')
     if not tipo:
         return jsonify({'erro': 'Tipo do documento é obrigatório'}), 400
+    try:
+        tipo = TipoDocumento(tipo)
+    except ValueError:
+        return jsonify({'erro': 'Tipo do documento inválido'}), 400
     
     arquivo = request.files['arquivo']
     
-    # Nova validação de arquivo (conteúdo e tamanho)
-    valido, mensagem = validar_arquivo(arquivo)
-    if not valido:
-        return jsonify({'erro': mensagem}), 400
-    
-    filename = secure_filename(arquivo.filename)
-    upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], f"credor_{credor_id}")
-    os.makedirs(upload_dir, exist_ok=True)
-    filepath = os.path.join(upload_dir, filename)
-    arquivo.save(filepath)
+    # Tipo, extensão e tamanho já apurados enquanto o upload era recebido;
+    # o arquivo é guardado pelo hash (reenvios não ocupam disco de novo)
+    try:
+        arquivo_id = armazenamento_arquivos.guardar_upload(arquivo)
+    except ArquivoInvalido as e:
+        return jsonify({'erro': str(e)}), 400
     
     documento = DocumentoPessoal(
         credor_id=credor_id,
-        tipo=TipoDocumento(tipo),
-        arquivo_url=filepath,
+        tipo=tipo,
+        arquivo_url=arquivo_id,
         enviado_em=datetime.utcnow()
     )
     
     db.session.add(documento)
     db.session.commit()
+    cache_credores.invalidar(credor_id)
+    # Miniatura e prévia geradas em segundo plano
+    gerador_derivados.agendar(arquivo_id)
     
     return jsonify({'mensagem': 'Documento enviado com sucesso', 'documento_id': documento.id}), 201
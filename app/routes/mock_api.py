@@ -3,18 +3,45 @@ import base64
 
 bp = Blueprint('mock_api', __name__, url_prefix='/api')
 
+# CPFs/CNPJs aceitos por requisição no endpoint de lote
+TAMANHO_MAXIMO_LOTE = 500
+
+def _certidoes_mock(cpf_cnpj, tipo=None):
+    fake_base64 = base64.b64encode(f"Certidão mock para {cpf_cnpj}".encode()).decode()
+    certidoes = [
+        {"tipo": "federal", "status": "negativa", "conteudo_base64": fake_base64},
+        {"tipo": "trabalhista", "status": "positiva", "conteudo_base64": fake_base64}
+    ]
+
+    # ?tipo= simula o emissor de um único tipo de certidão
+    if tipo:
+        certidoes = [c for c in certidoes if c["tipo"] == tipo] or [
+            {"tipo": tipo, "status": "negativa", "conteudo_base64": fake_base64}
+        ]
+    return certidoes
+
 @bp.route('/certidoes', methods=['GET'])
 def mock_consulta_certidoes():
     cpf_cnpj = request.args.get('cpf_cnpj')
     if not cpf_cnpj:
         return jsonify({'erro': 'Parâmetro cpf_cnpj é obrigatório'}), 400
 
-    fake_base64 = base64.b64encode(f"Certidão mock para {cpf_cnpj}".encode()).decode()
-
     return jsonify({
         "cpf_cnpj": cpf_cnpj,
-        "certidoes": [
-            {"tipo": "federal", "status": "negativa", "conteudo_base64": fake_base64},
-            {"tipo": "trabalhista", "status": "positiva", "conteudo_base64": fake_base64}
-        ]
+        "certidoes": _certidoes_mock(cpf_cnpj, request.args.get('tipo'))
+    })
+
+@bp.route('/certidoes/lote', methods=['POST'])
+def mock_consulta_certidoes_lote():
+    """Consulta em lote: {"cpfs_cnpjs": [...], "tipo": opcional} -> certidões por CPF/CNPJ."""
+    dados = request.get_json(silent=True) or {}
+    cpfs_cnpjs = dados.get('cpfs_cnpjs')
+    if not isinstance(cpfs_cnpjs, list) or not cpfs_cnpjs:
+        return jsonify({'erro': 'Campo cpfs_cnpjs (lista não vazia) é obrigatório'}), 400
+    if len(cpfs_cnpjs) > TAMANHO_MAXIMO_LOTE:
+        return jsonify({'erro': f'Máximo de {TAMANHO_MAXIMO_LOTE} CPFs/CNPJs por lote'}), 400
+
+    tipo = dados.get('tipo')
+    return jsonify({
+        "resultados": {str(cpf_cnpj): _certidoes_mock(cpf_cnpj, tipo) for cpf_cnpj in cpfs_cnpjs}
     })
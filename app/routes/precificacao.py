@@ -0,0 +1,46 @@
+from datetime import date, datetime
+from flask import Blueprint, request, jsonify
+from app.services.precificacao import (
+    Cenario, CenarioInvalido, carregar_carteira, precificar, resumir_precificacao
+)
+
+bp = Blueprint('precificacao', __name__, url_prefix='/api/precificacao')
+
+@bp.route('', methods=['POST'])
+def precificar_carteira():
+    # Precifica a carteira (ou os precatorio_ids pedidos) em um ou mais cenários
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'erro': 'Corpo JSON obrigatório'}), 400
+    
+    try:
+        data_base = datetime.strptime(data['data_base'], '%Y-%m-%d').date() if data.get('data_base') else date.today()
+    except (TypeError, ValueError):
+        return jsonify({'erro': 'data_base deve estar no formato AAAA-MM-DD'}), 400
+    
+    precatorios_ids = data.get('precatorio_ids')
+    if precatorios_ids is not None and not (
+            isinstance(precatorios_ids, list) and all(isinstance(i, int) for i in precatorios_ids)):
+        return jsonify({'erro': 'precatorio_ids deve ser uma lista de inteiros'}), 400
+    
+    # Sem a lista 'cenarios', o próprio corpo descreve um cenário único
+    cenarios_dados = data['cenarios'] if 'cenarios' in data else [data]
+    if not isinstance(cenarios_dados, list) or not cenarios_dados:
+        return jsonify({'erro': 'cenarios deve ser uma lista não vazia'}), 400
+    
+    try:
+        cenarios = [Cenario.de_dict(c, nome_padrao=f'cenario_{i}') for i, c in enumerate(cenarios_dados, start=1)]
+    except CenarioInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+    
+    # A carteira é carregada uma vez e reaproveitada por todos os cenários
+    carteira = carregar_carteira(precatorios_ids)
+    detalhar = bool(data.get('detalhar', False))
+    
+    return jsonify({
+        'data_base': data_base.isoformat(),
+        'cenarios': [
+            resumir_precificacao(carteira, cenario, precificar(carteira, cenario, data_base), detalhar)
+            for cenario in cenarios
+        ]
+    }), 200
@@ -0,0 +1,14 @@
+from flask import Blueprint, jsonify
+from app.extensions import db
+from app.models.tarefa import Tarefa
+from app.services.tarefas import serializar_tarefa
+
+bp = Blueprint('tarefas', __name__, url_prefix='/api/tarefas')
+
+@bp.route('/<int:tarefa_id>', methods=['GET'])
+def obter_tarefa(tarefa_id):
+    # Consultado pelos clientes após um 202 (ex.: buscar-certidoes)
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    if not tarefa:
+        return jsonify({'erro': 'Tarefa não encontrada'}), 404
+    return jsonify(serializar_tarefa(tarefa)), 200
@@ -0,0 +1,106 @@
+from flask import Blueprint, Response, request, jsonify, current_app, url_for
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.upload_retomavel import DestinoUpload, UploadRetomavel
+from app.services.uploads_retomaveis import (ConflitoOffset, UploadEncerrado, UploadGrandeDemais, UploadInvalido,
+                                             UploadNaoEncontrado, cancelar_upload, criar_upload,
+                                             interpretar_metadados, receber_parte, serializar_upload)
+
+# Uploads retomáveis (tus 1.0) para documentos e certidões manuais: o
+# cliente cria o upload, envia partes com PATCH e, se a conexão cair,
+# consulta o offset com HEAD e continua dali
+bp = Blueprint('uploads', __name__, url_prefix='/api')
+
+VERSAO_TUS = '1.0.0'
+TIPO_PARTE = 'application/offset+octet-stream'
+
+@bp.after_request
+def cabecalhos_tus(response):
+    response.headers['Tus-Resumable'] = VERSAO_TUS
+    return response
+
+def _offset(response, upload):
+    response.headers['Upload-Offset'] = str(upload.recebido)
+    response.headers['Upload-Length'] = str(upload.tamanho)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.route('/uploads', methods=['OPTIONS'])
+def opcoes_upload():
+    # Descoberta do tus: versões, extensões e tamanho máximo aceitos
+    response = Response(status=204)
+    response.headers['Tus-Version'] = VERSAO_TUS
+    response.headers['Tus-Extension'] = 'creation,termination'
+    response.headers['Tus-Max-Size'] = str(current_app.config['UPLOADS_RETOMAVEIS_TAMANHO_MAXIMO'])
+    return response
+
+def _criar(credor_id, destino):
+    credor = db.session.get(Credor, credor_id)
+    if not credor:
+        return jsonify({'erro': 'Credor não encontrado'}), 404
+    try:
+        tamanho = int(request.headers['Upload-Length'])
+    except (KeyError, ValueError):
+        return jsonify({'erro': 'Upload-Length obrigatório (inteiro)'}), 400
+
+    try:
+        upload = criar_upload(credor.id, destino, tamanho, interpretar_metadados(request.headers.get('Upload-Metadata')))
+    except UploadGrandeDemais as e:
+        return jsonify({'erro': str(e)}), 413
+    except UploadInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    location = url_for('uploads.consultar_upload', upload_id=upload.id)
+    response = _offset(jsonify({'upload_id': upload.id, 'location': location}), upload)
+    response.headers['Location'] = location
+    return response, 201
+
+@bp.route('/credores/<int:credor_id>/documentos/uploads', methods=['POST'])
+def criar_upload_documento(credor_id):
+    # Upload-Metadata: filename e tipo (base64), como no formulário de /documentos
+    return _criar(credor_id, DestinoUpload.DOCUMENTO)
+
+@bp.route('/credores/<int:credor_id>/certidoes/uploads', methods=['POST'])
+def criar_upload_certidao(credor_id):
+    # Upload-Metadata: filename, tipo e status (base64), como no formulário de /certidoes
+    return _criar(credor_id, DestinoUpload.CERTIDAO)
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+def consultar_upload(upload_id):
+    # Também atende o HEAD do tus (mesmos cabeçalhos, sem corpo)
+    upload = db.session.get(UploadRetomavel, upload_id)
+    if not upload:
+        return jsonify({'erro': 'Upload não encontrado'}), 404
+    return _offset(jsonify(serializar_upload(upload)), upload), 200
+
+@bp.route('/uploads/<upload_id>', methods=['PATCH'])
+def enviar_parte(upload_id):
+    if request.mimetype != TIPO_PARTE:
+        return jsonify({'erro': f'Content-Type deve ser {TIPO_PARTE}'}), 415
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({'erro': 'Upload-Offset obrigatório (inteiro)'}), 400
+
+    try:
+        upload = receber_parte(upload_id, offset, request.stream)
+    except UploadNaoEncontrado:
+        return jsonify({'erro': 'Upload não encontrado'}), 404
+    except UploadEncerrado:
+        return jsonify({'erro': 'Upload já concluído ou recusado'}), 410
+    except ConflitoOffset as e:
+        response = jsonify({'erro': 'Upload-Offset não confere com o recebido', 'recebido': e.recebido})
+        response.headers['Upload-Offset'] = str(e.recebido)
+        return response, 409
+    except UploadInvalido as e:
+        return jsonify({'erro': str(e)}), 400
+
+    return _offset(Response(status=204), upload)
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancelar(upload_id):
+    try:
+        cancelar_upload(upload_id)
+    except UploadNaoEncontrado:
+        return jsonify({'erro': 'Upload não encontrado'}), 404
+    return Response(status=204)
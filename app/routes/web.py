@@ -1,28 +1,47 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 import requests
 import json
-import os
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from app.extensions import db
+from sqlalchemy import select
+from app.extensions import db, cache_credores
 from app.models.credor import Credor
 from app.models.precatorio import Precatorio
 from app.models.documento_pessoal import DocumentoPessoal, TipoDocumento
 from app.models.certidao import Certidao, TipoCertidao, StatusCertidao, OrigemCertidao
+from app.models.arquivo import ArquivoArmazenado
+from app.schemas.credor_schema import RELACIONAMENTOS_CREDOR
+from app.services.detalhe_credor import serializar_credor
+from app.services.busca import buscar_credores
+from app.services.arquivos import versao_arquivo
+from app.services.derivados import gerador_derivados
 
 # Criar blueprint para rotas web sem prefixo para que a home seja acessível em '/'
 bp = Blueprint('web', __name__, url_prefix='')
 
+@bp.app_template_filter('data_br')
+def formatar_data(valor, formato='%d/%m/%Y'):
+    """Formata datas vindas do ORM (datetime) ou do cache (ISO 8601)"""
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    return valor.strftime(formato)
+
+@bp.app_template_filter('versao_arquivo')
+def filtrar_versao_arquivo(arquivo_url):
+    """?v= das URLs de download: com ela, o navegador guarda o arquivo por um ano"""
+    return versao_arquivo(arquivo_url)
+
 @bp.route('/')
 def index():
     """Página inicial com lista de credores"""
     busca = request.args.get('busca', '')
     
     if busca:
-        credores = Credor.query.filter(
-            (Credor.nome.ilike(f'%{busca}%')) | 
-            (Credor.cpf_cnpj.ilike(f'%{busca}%'))
-        ).all()
+        # Busca indexada (FTS5/pg_trgm) em vez de ILIKE '%termo%' com varredura completa
+        resultados, _ = buscar_credores(busca, limite=current_app.config['LISTAGEM_TAMANHO_MAXIMO'])
+        ids = [r['id'] for r in resultados]
+        por_id = {c.id: c for c in Credor.query.filter(Credor.id.in_(ids))}
+        credores = [por_id[i] for i in ids if i in por_id]
     else:
         credores = Credor.query.all()
     
@@ -72,12 +91,24 @@ def novo_credor():
 @bp.route('/credores/<int:credor_id>', methods=['GET'])
 def detalhes_credor(credor_id):
     """Página de detalhes do credor"""
-    credor = db.session.get(Credor, credor_id)
+    # Mesma entrada do cache que GET /api/credores/<id> sem parâmetros: a página
+    # não usa o base64 das certidões (o conteúdo é baixado pelo link)
+    versao = db.session.scalar(select(Credor.versao).where(Credor.id == credor_id))
+    variante = (None, RELACIONAMENTOS_CREDOR, False, None, versao)
+    credor = cache_credores.obter(
+        credor_id,
+        variante,
+        lambda: serializar_credor(credor_id, None, RELACIONAMENTOS_CREDOR, False)
+    ) if versao is not None else None
     if not credor:
         flash("Credor não encontrado", "danger")
         return redirect(url_for('web.index'))
     
-    return render_template('credor/detalhes.html', credor=credor)
+    # Arquivos com miniatura (imagens e, com o pdftoppm, PDFs); os demais só com o link
+    previas = gerador_derivados.com_previa(
+        [d['arquivo_url'] for d in credor.get('documentos', [])] + [c['arquivo_url'] for c in credor.get('certidoes', [])]
+    )
+    return render_template('credor/detalhes.html', credor=credor, previas=previas)
 
 @bp.route('/credores/<int:credor_id>/documentos/novo', methods=['GET', 'POST'])
 def novo_documento(credor_id):
@@ -201,9 +232,8 @@ def buscar_certidoes(credor_id):
         # Chamar a API REST com o novo prefixo /api
         response = requests.post(f"http://localhost:5000/api/credores/{credor_id}/buscar-certidoes")
         
-        if response.status_code == 201:
-            response_data = response.json()
-            flash(f"Certidões buscadas com sucesso! Total: {response_data.get('total', 0)}", "success")
+        if response.status_code == 202:
+            flash("Busca de certidões agendada. As certidões aparecem aqui assim que os emissores responderem.", "success")
         else:
             error_data = response.json()
             flash(f"Erro ao buscar certidões: {error_data.get('erro', 'Erro desconhecido')}", "danger")
@@ -212,21 +242,33 @@ def buscar_certidoes(credor_id):
     
     return redirect(url_for('web.detalhes_credor', credor_id=credor_id))
 
-# Rota para visualizar imagens
-@bp.route('/visualizar-arquivo/<path:arquivo_url>')
-def visualizar_arquivo(arquivo_url):
-    """Visualizar arquivo (imagem ou PDF)"""
-    # Verificar se o arquivo existe
-    if not os.path.exists(arquivo_url):
-        flash("Arquivo não encontrado", "danger")
-        return redirect(url_for('web.index'))
-    
-    # Verificar extensão
-    ext = arquivo_url.rsplit('.', 1)[1].lower() if '.' in arquivo_url else ''
-    
-    # Se for imagem, renderizar página de visualização
-    if ext in ['jpg', 'jpeg', 'png']:
-        return render_template('visualizar_imagem.html', arquivo_url=arquivo_url)
-    
-    # Se for PDF, redirecionar para o arquivo
-    return redirect(url_for('static', filename=arquivo_url))
+def _visualizar(credor_id, arquivo_url, url_original):
+    """Página com a prévia; o original só é baixado quando pedido"""
+    if arquivo_url not in gerador_derivados.com_previa([arquivo_url]):
+        # Sem prévia (PDF sem pdftoppm, caminho antigo): o navegador abre o original
+        return redirect(url_original)
+    registro = db.session.get(ArquivoArmazenado, arquivo_url)
+    return render_template('credor/visualizar_imagem.html', arquivo=registro, credor_id=credor_id,
+                           url_original=url_original)
+
+@bp.route('/credores/<int:credor_id>/documentos/<int:documento_id>')
+def visualizar_documento(credor_id, documento_id):
+    """Visualizar documento pessoal (imagem ou PDF)"""
+    documento = db.session.get(DocumentoPessoal, documento_id)
+    if not documento or documento.credor_id != credor_id:
+        flash("Documento não encontrado", "danger")
+        return redirect(url_for('web.detalhes_credor', credor_id=credor_id))
+    return _visualizar(credor_id, documento.arquivo_url, url_for(
+        'credores.baixar_documento', credor_id=credor_id, documento_id=documento_id,
+        v=versao_arquivo(documento.arquivo_url)))
+
+@bp.route('/credores/<int:credor_id>/certidoes/<int:certidao_id>')
+def visualizar_certidao(credor_id, certidao_id):
+    """Visualizar arquivo de certidão enviada manualmente"""
+    certidao = db.session.get(Certidao, certidao_id)
+    if not certidao or certidao.credor_id != credor_id or not certidao.arquivo_url:
+        flash("Certidão não encontrada", "danger")
+        return redirect(url_for('web.detalhes_credor', credor_id=credor_id))
+    return _visualizar(credor_id, certidao.arquivo_url, url_for(
+        'certidoes.baixar_arquivo_certidao', credor_id=credor_id, certidao_id=certidao_id,
+        v=versao_arquivo(certidao.arquivo_url)))
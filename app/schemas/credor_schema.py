@@ -1,7 +1,8 @@
 from app.models.credor import Credor
 from app.models.precatorio import Precatorio
-from app.models.documento_pessoal import DocumentoPessoal
-from app.models.certidao import Certidao
+from app.models.documento_pessoal import DocumentoPessoal, TipoDocumento
+from app.models.certidao import Certidao, CertidaoHistorico, TipoCertidao, OrigemCertidao, StatusCertidao
+from functools import lru_cache
 from marshmallow import fields
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema as masql
 
@@ -12,17 +13,36 @@ class PrecatorioSchema(masql):
         load_instance = True
 
 class DocumentoPessoalSchema(masql):
+    # Enums serializados pelo valor, para que o resultado seja JSON puro (cacheável)
+    tipo = fields.Enum(TipoDocumento, by_value=True)
+
     class Meta:
         model = DocumentoPessoal
         include_fk = True
         load_instance = True
 
 class CertidaoSchema(masql):
+    tipo = fields.Enum(TipoCertidao, by_value=True)
+    origem = fields.Enum(OrigemCertidao, by_value=True)
+    status = fields.Enum(StatusCertidao, by_value=True)
+    # Lido do armazenamento de blobs só quando o campo é serializado
+    conteudo_base64 = fields.String(dump_only=True)
+
     class Meta:
         model = Certidao
         include_fk = True
         load_instance = True
 
+class CertidaoHistoricoSchema(masql):
+    tipo = fields.Enum(TipoCertidao, by_value=True)
+    origem = fields.Enum(OrigemCertidao, by_value=True)
+    status = fields.Enum(StatusCertidao, by_value=True)
+
+    class Meta:
+        model = CertidaoHistorico
+        include_fk = True
+        load_instance = True
+
 class CredorSchema(masql):
     precatorios = fields.Nested(PrecatorioSchema, many=True)
     documentos = fields.Nested(DocumentoPessoalSchema, many=True, dump_only=True)
@@ -31,3 +51,37 @@ class CredorSchema(masql):
     class Meta:
         model = Credor
         load_instance = True
+        # Colunas internas do índice de busca
+        exclude = ('nome_busca', 'documento_digitos')
+
+# Schema reutilizável para listagens (sem relacionamentos)
+CAMPOS_RESUMO_CREDOR = ('id', 'nome', 'cpf_cnpj', 'email', 'telefone')
+credores_resumo_schema = CredorSchema(many=True, only=CAMPOS_RESUMO_CREDOR)
+historico_certidoes_schema = CertidaoHistoricoSchema(many=True)
+
+RELACIONAMENTOS_CREDOR = ('precatorios', 'documentos', 'certidoes')
+
+@lru_cache(maxsize=64)
+def schema_detalhe_credor(campos=None, relacionamentos=RELACIONAMENTOS_CREDOR, incluir_conteudo=False):
+    """
+    Retorna uma instância reutilizável de CredorSchema para o recorte pedido.
+
+    Montar um schema é caro (introspecção dos modelos e dos campos aninhados),
+    então cada combinação de campos é construída uma única vez e compartilhada
+    entre as requisições.
+
+    Args:
+        campos: tupla com os campos escalares do credor (None para todos)
+        relacionamentos: tupla com os relacionamentos a serializar
+        incluir_conteudo: se True, inclui o conteudo_base64 das certidões
+
+    Returns:
+        CredorSchema
+    """
+    only = None
+    if campos is not None:
+        only = tuple(dict.fromkeys(('id',) + campos + relacionamentos))
+    exclude = tuple(r for r in RELACIONAMENTOS_CREDOR if r not in relacionamentos)
+    if 'certidoes' in relacionamentos and not incluir_conteudo:
+        exclude += ('certidoes.conteudo_base64',)
+    return CredorSchema(only=only, exclude=exclude)
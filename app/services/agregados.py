@@ -0,0 +1,300 @@
+"""
+Agregados da carteira mantidos de forma incremental no projeto Mercatório.
+Totais por foro, por ano de publicação e por estado de prontidão das
+certidões ficam em tabelas de resumo, atualizadas a cada flush que grava
+credores, precatórios ou certidões. A leitura custa O(grupos).
+"""
+import math
+from collections import defaultdict
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import attributes
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.precatorio import Precatorio
+from app.models.certidao import Certidao, StatusCertidao, TipoCertidao
+from app.models.resumo import ResumoForo, ResumoAnoPublicacao, ResumoProntidao
+
+# Estados de prontidão das certidões de um credor
+SEM_CERTIDOES = 'sem_certidoes'
+PENDENTE = 'pendente'
+POSITIVA = 'positiva'
+APTA = 'apta'
+
+def calcular_prontidao(status_por_tipo):
+    """
+    Classifica o credor a partir da certidão mais recente de cada tipo.
+
+    Args:
+        status_por_tipo: dict {TipoCertidao: StatusCertidao}
+
+    Returns:
+        str: 'sem_certidoes', 'positiva' (alguma positiva), 'apta' (todos os
+        tipos com certidão negativa) ou 'pendente' (demais casos)
+    """
+    if not status_por_tipo:
+        return SEM_CERTIDOES
+    if StatusCertidao.POSITIVA in status_por_tipo.values():
+        return POSITIVA
+    if all(status_por_tipo.get(tipo) == StatusCertidao.NEGATIVA for tipo in TipoCertidao):
+        return APTA
+    return PENDENTE
+
+def status_por_credor(conexao, credores_ids):
+    """Status da certidão mais recente de cada tipo, agrupado por credor."""
+    # A certidão reemitida mantém o id (certidoes guarda só a versão atual de
+    # cada origem), então a mais recente entre API e manual vem de recebida_em
+    ordem = func.row_number().over(
+        partition_by=(Certidao.credor_id, Certidao.tipo),
+        order_by=(Certidao.recebida_em.desc(), Certidao.id.desc())
+    ).label('ordem')
+    por_tipo = (
+        select(Certidao.credor_id, Certidao.tipo, Certidao.status, ordem)
+        .where(Certidao.credor_id.in_(credores_ids))
+        .subquery()
+    )
+    consulta = select(por_tipo.c.credor_id, por_tipo.c.tipo, por_tipo.c.status).where(por_tipo.c.ordem == 1)
+    resultado = defaultdict(dict)
+    for credor_id, tipo, status in conexao.execute(consulta):
+        resultado[credor_id][tipo] = status
+    return resultado
+
+class Deltas:
+    """Incrementos pendentes nas tabelas de resumo."""
+
+    def __init__(self):
+        self.foros = defaultdict(lambda: [0, 0.0])
+        self.anos = defaultdict(lambda: [0, 0.0])
+        self.prontidao = defaultdict(lambda: [0, 0.0])
+
+    def precatorio(self, foro, data_publicacao, valor, estado, sinal=1):
+        for grupo, chave in ((self.foros, foro), (self.anos, data_publicacao.year)):
+            grupo[chave][0] += sinal
+            grupo[chave][1] += sinal * valor
+        self.prontidao[estado][1] += sinal * valor
+
+    def credor(self, estado, valor_total=0.0, sinal=1):
+        self.prontidao[estado][0] += sinal
+        self.prontidao[estado][1] += sinal * valor_total
+
+    def aplicar(self, conexao):
+        for modelo, coluna_chave, coluna_quantidade, grupo in (
+            (ResumoForo, 'foro', 'quantidade_precatorios', self.foros),
+            (ResumoAnoPublicacao, 'ano', 'quantidade_precatorios', self.anos),
+            (ResumoProntidao, 'estado', 'quantidade_credores', self.prontidao),
+        ):
+            for chave, (quantidade, valor) in grupo.items():
+                if quantidade or valor:
+                    _incrementar(conexao, modelo.__table__, coluna_chave, chave,
+                                 {coluna_quantidade: quantidade, 'valor_total': valor})
+
+def _incrementar(conexao, tabela, coluna_chave, chave, incrementos):
+    """Soma os incrementos na linha do grupo, criando-a se necessário (upsert)."""
+    dialeto = conexao.dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        if dialeto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+        else:
+            from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+        comando = insert_dialeto(tabela).values({coluna_chave: chave, **incrementos})
+        comando = comando.on_conflict_do_update(
+            index_elements=[coluna_chave],
+            set_={coluna: tabela.c[coluna] + comando.excluded[coluna] for coluna in incrementos}
+        )
+        conexao.execute(comando)
+        return
+
+    atualizados = conexao.execute(
+        update(tabela)
+        .where(tabela.c[coluna_chave] == chave)
+        .values({coluna: tabela.c[coluna] + valor for coluna, valor in incrementos.items()})
+    ).rowcount
+    if not atualizados:
+        conexao.execute(insert(tabela).values({coluna_chave: chave, **incrementos}))
+
+def _valor_anterior(obj, nome):
+    historico = attributes.get_history(obj, nome)
+    if historico.deleted:
+        return historico.deleted[0]
+    return getattr(obj, nome)
+
+def _estados_armazenados(conexao, credores_ids):
+    if not credores_ids:
+        return {}
+    return dict(conexao.execute(select(Credor.id, Credor.prontidao).where(Credor.id.in_(credores_ids))).all())
+
+def atualizar_prontidao(conexao, credores_ids, deltas):
+    """
+    Recalcula a prontidão dos credores e move seus totais entre os estados.
+
+    Returns:
+        dict: {credor_id: novo estado} apenas dos credores que mudaram
+    """
+    armazenados = _estados_armazenados(conexao, credores_ids)
+    if not armazenados:
+        return {}
+
+    status = status_por_credor(conexao, list(armazenados))
+    novos = {}
+    for credor_id, anterior in armazenados.items():
+        estado = calcular_prontidao(status.get(credor_id, {}))
+        if estado != anterior:
+            novos[credor_id] = estado
+
+    if novos:
+        valores = dict(conexao.execute(
+            select(Precatorio.credor_id, func.sum(Precatorio.valor_nominal))
+            .where(Precatorio.credor_id.in_(list(novos)))
+            .group_by(Precatorio.credor_id)
+        ).all())
+        for credor_id, estado in novos.items():
+            valor = valores.get(credor_id) or 0.0
+            deltas.credor(armazenados[credor_id], valor, sinal=-1)
+            deltas.credor(estado, valor)
+            conexao.execute(update(Credor.__table__).where(Credor.id == credor_id).values(prontidao=estado))
+    return novos
+
+@event.listens_for(db.session, "after_flush")
+def atualizar_agregados(session, flush_context):
+    """Deriva os incrementos dos resumos a partir do que foi gravado no flush."""
+    precatorios_novos = [o for o in session.new if isinstance(o, Precatorio)]
+    precatorios_alterados = [o for o in session.dirty if isinstance(o, Precatorio) and session.is_modified(o)]
+    precatorios_removidos = [o for o in session.deleted if isinstance(o, Precatorio)]
+    credores_novos = [o for o in session.new if isinstance(o, Credor)]
+    credores_removidos = [o for o in session.deleted if isinstance(o, Credor)]
+    credores_certidoes = {
+        o.credor_id for o in (*session.new, *session.dirty, *session.deleted) if isinstance(o, Certidao)
+    }
+
+    if not (precatorios_novos or precatorios_alterados or precatorios_removidos
+            or credores_novos or credores_removidos or credores_certidoes):
+        return
+
+    conexao = session.connection()
+    deltas = Deltas()
+
+    for credor in credores_novos:
+        deltas.credor(credor.prontidao or SEM_CERTIDOES)
+    for credor in credores_removidos:
+        deltas.credor(_valor_anterior(credor, 'prontidao'), sinal=-1)
+
+    credores_ids = {p.credor_id for p in precatorios_novos + precatorios_alterados}
+    credores_ids |= {_valor_anterior(p, 'credor_id') for p in precatorios_alterados + precatorios_removidos}
+    estados = _estados_armazenados(conexao, credores_ids)
+    estados.update({c.id: _valor_anterior(c, 'prontidao') for c in credores_removidos})
+
+    for p in precatorios_novos:
+        deltas.precatorio(p.foro, p.data_publicacao, p.valor_nominal, estados.get(p.credor_id, SEM_CERTIDOES))
+    for p in precatorios_alterados + precatorios_removidos:
+        credor_anterior = _valor_anterior(p, 'credor_id')
+        deltas.precatorio(_valor_anterior(p, 'foro'), _valor_anterior(p, 'data_publicacao'),
+                          _valor_anterior(p, 'valor_nominal'), estados.get(credor_anterior, SEM_CERTIDOES), sinal=-1)
+    for p in precatorios_alterados:
+        deltas.precatorio(p.foro, p.data_publicacao, p.valor_nominal, estados.get(p.credor_id, SEM_CERTIDOES))
+
+    # Com os precatórios já contabilizados no estado antigo, move o credor inteiro
+    removidos_ids = {c.id for c in credores_removidos}
+    atualizar_prontidao(conexao, credores_certidoes - removidos_ids - {None}, deltas)
+    deltas.aplicar(conexao)
+
+def registrar_carga(precatorios):
+    """
+    Contabiliza credores recém-inseridos por INSERT em massa (sem eventos do ORM).
+
+    Args:
+        precatorios: dicts com foro, data_publicacao e valor_nominal, um por
+            credor novo (todos sem certidões)
+    """
+    deltas = Deltas()
+    for precatorio in precatorios:
+        deltas.credor(SEM_CERTIDOES)
+        deltas.precatorio(precatorio['foro'], precatorio['data_publicacao'],
+                          precatorio['valor_nominal'], SEM_CERTIDOES)
+    deltas.aplicar(db.session.connection())
+
+def ler_agregados():
+    """Lê as tabelas de resumo, em O(grupos)."""
+    return {
+        'por_foro': [
+            {'foro': r.foro, 'quantidade_precatorios': r.quantidade_precatorios, 'valor_total': r.valor_total}
+            for r in db.session.scalars(select(ResumoForo).order_by(ResumoForo.foro))
+        ],
+        'por_ano_publicacao': [
+            {'ano': r.ano, 'quantidade_precatorios': r.quantidade_precatorios, 'valor_total': r.valor_total}
+            for r in db.session.scalars(select(ResumoAnoPublicacao).order_by(ResumoAnoPublicacao.ano))
+        ],
+        'por_prontidao': [
+            {'estado': r.estado, 'quantidade_credores': r.quantidade_credores, 'valor_total': r.valor_total}
+            for r in db.session.scalars(select(ResumoProntidao).order_by(ResumoProntidao.estado))
+        ]
+    }
+
+# Campo que identifica o grupo em cada seção de ler_agregados()
+CHAVES_SECOES = {'por_foro': 'foro', 'por_ano_publicacao': 'ano', 'por_prontidao': 'estado'}
+
+def _divergencias(antes, depois):
+    """Compara dois retratos dos agregados, tolerando erro de arredondamento."""
+    divergencias = []
+    for secao, chave in CHAVES_SECOES.items():
+        indice_antes = {linha[chave]: linha for linha in antes[secao]}
+        indice_depois = {linha[chave]: linha for linha in depois[secao]}
+        for grupo in sorted(set(indice_antes) | set(indice_depois), key=str):
+            anterior = indice_antes.get(grupo, {})
+            atual = indice_depois.get(grupo, {})
+            for campo in (c for c in (anterior or atual) if c != chave):
+                incremental, recalculado = anterior.get(campo, 0), atual.get(campo, 0)
+                if not math.isclose(incremental, recalculado, rel_tol=1e-9, abs_tol=1e-6):
+                    divergencias.append({'secao': secao, 'grupo': grupo, 'campo': campo,
+                                         'incremental': incremental, 'recalculado': recalculado})
+    return divergencias
+
+def reconstruir_agregados(tamanho_lote=1000):
+    """
+    Recalcula do zero a prontidão de todos os credores e as tabelas de resumo.
+
+    Serve como verificação de consistência: retorna as diferenças entre os
+    valores mantidos incrementalmente e os recalculados.
+
+    Returns:
+        list: divergências encontradas (vazia se estava consistente)
+    """
+    antes = ler_agregados()
+    conexao = db.session.connection()
+
+    ultimo_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(Credor.id).where(Credor.id > ultimo_id).order_by(Credor.id).limit(tamanho_lote)
+        ).all()
+        if not ids:
+            break
+        status = status_por_credor(conexao, ids)
+        for credor_id, anterior in _estados_armazenados(conexao, ids).items():
+            estado = calcular_prontidao(status.get(credor_id, {}))
+            if estado != anterior:
+                conexao.execute(update(Credor.__table__).where(Credor.id == credor_id).values(prontidao=estado))
+        ultimo_id = ids[-1]
+
+    for modelo in (ResumoForo, ResumoAnoPublicacao, ResumoProntidao):
+        conexao.execute(delete(modelo.__table__))
+
+    ano = func.extract('year', Precatorio.data_publicacao)
+    conexao.execute(insert(ResumoForo.__table__).from_select(
+        ['foro', 'quantidade_precatorios', 'valor_total'],
+        select(Precatorio.foro, func.count(Precatorio.id), func.sum(Precatorio.valor_nominal)).group_by(Precatorio.foro)
+    ))
+    conexao.execute(insert(ResumoAnoPublicacao.__table__).from_select(
+        ['ano', 'quantidade_precatorios', 'valor_total'],
+        select(ano, func.count(Precatorio.id), func.sum(Precatorio.valor_nominal)).group_by(ano)
+    ))
+    conexao.execute(insert(ResumoProntidao.__table__).from_select(
+        ['estado', 'quantidade_credores', 'valor_total'],
+        select(
+            Credor.prontidao,
+            func.count(func.distinct(Credor.id)),
+            func.coalesce(func.sum(Precatorio.valor_nominal), 0.0)
+        ).select_from(Credor).outerjoin(Precatorio, Precatorio.credor_id == Credor.id).group_by(Credor.prontidao)
+    ))
+
+    db.session.commit()
+    db.session.expire_all()
+    return _divergencias(antes, ler_agregados())
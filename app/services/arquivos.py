@@ -0,0 +1,353 @@
+"""
+Armazenamento dos arquivos enviados no projeto Mercatório.
+Documentos pessoais e certidões manuais são guardados uma única vez por
+SHA-256, em ARQUIVOS_PASTA/ab/cd/<hash>, e o arquivo_url das linhas guarda
+esse hash (o id do arquivo). O mesmo PDF reenviado, ou enviado para vários
+credores, ocupa o disco uma vez: o temporário do upload é só descartado.
+Quantas linhas apontam para cada arquivo fica em
+arquivos_armazenados.referencias, mantido a cada flush; `flask arquivos
+coletar` apaga os que ficaram sem referência e os que ficaram em disco sem
+linha (upload desfeito por rollback). Quem grava trava a linha do arquivo
+antes de conferir o disco, e a coleta só confirma a remoção da linha depois
+de apagar o arquivo: um reenvio nunca aproveita um arquivo que está sendo
+apagado. O download, por id do
+documento ou da certidão, usa o hash como ETag e como versão da URL (ver
+app/utils/downloads.py).
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from flask import current_app
+from sqlalchemy import delete, event, select, union, update
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.orm import attributes
+from app.extensions import db
+from app.models.arquivo import ArquivoArmazenado
+from app.models.certidao import Certidao, CertidaoHistorico
+from app.models.documento_pessoal import DocumentoPessoal
+from app.services.blobs import BackendArquivos
+from app.utils.downloads import MODOS_ENVIO, enviar_arquivo
+from app.utils.uploads import TAMANHO_BLOCO, receber_upload
+from app.utils.validacao_arquivos import TAMANHO_AMOSTRA_MIME, TIPOS_PERMITIDOS, detectar_tipo_mime
+
+# Modelos cujo arquivo_url aponta para um arquivo armazenado
+MODELOS_COM_ARQUIVO = (DocumentoPessoal, Certidao, CertidaoHistorico)
+
+_ID_ARQUIVO = re.compile(r'[0-9a-f]{64}')
+# Prefixo do hash usado como versão nas URLs de download (?v=)
+TAMANHO_VERSAO = 16
+# Arquivos em disco sem linha só são apagados depois disso: a linha de um
+# upload em andamento ainda não foi confirmada
+CARENCIA_ORFAOS_SEGUNDOS = 3600
+
+def eh_id_arquivo(arquivo_url):
+    """Se arquivo_url é um id do armazenamento (e não um caminho anterior a ele)."""
+    return bool(arquivo_url) and _ID_ARQUIVO.fullmatch(arquivo_url) is not None
+
+def versao_arquivo(arquivo_url):
+    """Versão do conteúdo para a URL de download; None para caminhos antigos."""
+    return arquivo_url[:TAMANHO_VERSAO] if eh_id_arquivo(arquivo_url) else None
+
+class ArmazenamentoArquivos:
+    """Extensão Flask que guarda os arquivos enviados pelo SHA-256."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ARQUIVOS_PASTA', None)
+        app.config.setdefault('ARQUIVOS_ENVIO', 'sendfile')
+        app.config.setdefault('ARQUIVOS_ACCEL_PREFIXO', '/_arquivos')
+        if app.config['ARQUIVOS_ENVIO'] not in MODOS_ENVIO:
+            raise ValueError(f"ARQUIVOS_ENVIO desconhecido: {app.config['ARQUIVOS_ENVIO']} "
+                             f"(use {', '.join(MODOS_ENVIO)})")
+        pasta = app.config['ARQUIVOS_PASTA'] or os.path.join(app.config['UPLOAD_FOLDER'], 'arquivos')
+        app.extensions['armazenamento_arquivos'] = BackendArquivos(pasta)
+
+    @property
+    def backend(self):
+        return current_app.extensions['armazenamento_arquivos']
+
+    def caminho(self, arquivo_url):
+        """Caminho em disco do arquivo; arquivo_url anteriores ao armazenamento já são caminhos."""
+        if eh_id_arquivo(arquivo_url):
+            return self.backend.caminho(arquivo_url)
+        return arquivo_url
+
+    def enviar(self, arquivo_url, nome_base, versao=None):
+        """
+        Resposta de download do arquivo (ver app/utils/downloads.py).
+
+        Args:
+            nome_base: nome do download, sem extensão
+            versao: ?v= da URL; se conferir com o conteúdo, o cache dura um ano
+
+        Returns:
+            Response, ou None se o arquivo não está em disco
+        """
+        caminho = self.caminho(arquivo_url)
+        if not arquivo_url or not os.path.isfile(caminho):
+            return None
+        if eh_id_arquivo(arquivo_url):
+            registro = db.session.get(ArquivoArmazenado, arquivo_url)
+            tipo_mime = registro.tipo_mime if registro else None
+            extensao = TIPOS_PERMITIDOS.get(tipo_mime, [''])[0]
+            etag = arquivo_url
+        else:
+            # Caminho anterior ao armazenamento: sem hash, vale a ETag do Werkzeug
+            tipo_mime = mimetypes.guess_type(caminho)[0]
+            extensao = os.path.splitext(caminho)[1]
+            etag = None
+        return enviar_arquivo(
+            caminho,
+            tipo_mime or 'application/octet-stream',
+            etag=etag,
+            nome_download=f'{nome_base}{extensao}',
+            imutavel=versao is not None and versao == versao_arquivo(arquivo_url),
+            raiz=self.backend.pasta
+        )
+
+    def guardar_upload(self, arquivo, tamanho_maximo=None):
+        """
+        Valida o arquivo enviado e o guarda, se o conteúdo ainda não existir.
+
+        O registro em arquivos_armazenados entra na sessão atual, sem commit;
+        a referência é contada quando a linha que aponta para o arquivo é
+        gravada.
+
+        Returns:
+            str: id do arquivo (SHA-256), para o arquivo_url
+
+        Raises:
+            ArquivoInvalido: upload recusado pela validação
+        """
+        receptor = receber_upload(arquivo, tamanho_maximo)
+        hash_conteudo = receptor.hash
+        destino = self.backend.caminho(hash_conteudo)
+        try:
+            _registrar(hash_conteudo, receptor.tamanho, receptor.tipo_mime)
+            if not os.path.exists(destino):
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                receptor.mover(destino)
+        finally:
+            # Conteúdo repetido: o temporário é descartado
+            receptor.close()
+        return hash_conteudo
+
+    def guardar_arquivo(self, caminho, hash_conteudo, tamanho, tipo_mime):
+        """
+        Move para o armazenamento um arquivo já validado em disco (no mesmo
+        sistema de arquivos); se o conteúdo já existir, só apaga o original.
+
+        Returns:
+            str: id do arquivo
+        """
+        _registrar(hash_conteudo, tamanho, tipo_mime)
+        destino = self.backend.caminho(hash_conteudo)
+        if os.path.exists(destino):
+            os.remove(caminho)
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(caminho, destino)
+        return hash_conteudo
+
+    def importar(self, caminho):
+        """
+        Copia um arquivo já em disco para o armazenamento (o original fica).
+
+        Returns:
+            str: id do arquivo
+        """
+        with open(caminho, 'rb') as arquivo:
+            amostra = arquivo.read(TAMANHO_AMOSTRA_MIME)
+            arquivo.seek(0)
+            hash_conteudo = calcular_hash_arquivo(arquivo)
+            tamanho = arquivo.tell()
+        _registrar(hash_conteudo, tamanho, detectar_tipo_mime(amostra))
+        destino = self.backend.caminho(hash_conteudo)
+        if not os.path.exists(destino):
+            pasta = os.path.dirname(destino)
+            os.makedirs(pasta, exist_ok=True)
+            # Cópia atômica: o caminho do hash nunca aparece pela metade
+            descritor, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+            os.close(descritor)
+            shutil.copyfile(caminho, temporario)
+            os.replace(temporario, destino)
+        return hash_conteudo
+
+armazenamento_arquivos = ArmazenamentoArquivos()
+
+def calcular_hash_arquivo(arquivo):
+    """SHA-256 de um arquivo aberto, lido em blocos."""
+    soma = hashlib.sha256()
+    for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+        soma.update(bloco)
+    return soma.hexdigest()
+
+def _registrar(hash_conteudo, tamanho, tipo_mime):
+    """
+    Cria a linha do arquivo em arquivos_armazenados, se ainda não existir, e
+    a trava até o fim da transação. Chamado antes de conferir o disco: uma
+    coleta em andamento termina (arquivo apagado) antes, e uma coleta
+    posterior espera o commit, quando a referência já foi contada.
+    """
+    valores = {'hash': hash_conteudo, 'tamanho': tamanho, 'tipo_mime': tipo_mime, 'referencias': 0}
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        insert = insert_sqlite if dialeto == 'sqlite' else insert_postgresql
+        db.session.execute(insert(ArquivoArmazenado).values(**valores).on_conflict_do_nothing(index_elements=['hash']))
+    elif db.session.get(ArquivoArmazenado, hash_conteudo) is None:
+        db.session.add(ArquivoArmazenado(**valores))
+        db.session.flush()
+    # UPDATE sem efeito: só para travar a linha (o ON CONFLICT DO NOTHING não trava)
+    db.session.execute(
+        update(ArquivoArmazenado).where(ArquivoArmazenado.hash == hash_conteudo)
+        .values(tamanho=ArquivoArmazenado.tamanho).execution_options(synchronize_session=False)
+    )
+
+def _somar_referencias(conexao, deltas):
+    tabela = ArquivoArmazenado.__table__
+    for hash_conteudo, delta in deltas.items():
+        if delta:
+            conexao.execute(
+                update(tabela).where(tabela.c.hash == hash_conteudo).values(referencias=tabela.c.referencias + delta)
+            )
+
+@event.listens_for(db.session, "after_flush")
+def contar_referencias(session, flush_context):
+    """Ajusta as referências dos arquivos cujo arquivo_url entrou, mudou ou saiu no flush."""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, MODELOS_COM_ARQUIVO) and eh_id_arquivo(obj.arquivo_url):
+            deltas[obj.arquivo_url] += 1
+    for obj in session.dirty:
+        if isinstance(obj, MODELOS_COM_ARQUIVO):
+            historico = attributes.get_history(obj, 'arquivo_url')
+            for valor in historico.deleted or ():
+                if eh_id_arquivo(valor):
+                    deltas[valor] -= 1
+            for valor in historico.added or ():
+                if eh_id_arquivo(valor):
+                    deltas[valor] += 1
+    for obj in session.deleted:
+        if isinstance(obj, MODELOS_COM_ARQUIVO):
+            historico = attributes.get_history(obj, 'arquivo_url')
+            valor = historico.deleted[0] if historico.deleted else obj.arquivo_url
+            if eh_id_arquivo(valor):
+                deltas[valor] -= 1
+
+    if deltas:
+        _somar_referencias(session.connection(), deltas)
+
+def coletar_arquivos(carencia_segundos=CARENCIA_ORFAOS_SEGUNDOS):
+    """
+    Apaga os arquivos sem referência e os que estão em disco sem linha.
+
+    A linha é removida por DELETE condicional (se uma referência foi gravada
+    depois da consulta, o arquivo fica) e o commit só vem depois de apagar o
+    arquivo: até lá, quem for gravar o mesmo conteúdo espera pela linha.
+    Arquivos sem linha (upload desfeito por rollback) ganham uma antes.
+
+    Args:
+        carencia_segundos: idade mínima de um arquivo sem linha para apagá-lo
+
+    Returns:
+        int: arquivos apagados
+    """
+    apagados = _registrar_sem_linha(carencia_segundos)
+    candidatos = db.session.scalars(
+        select(ArquivoArmazenado.hash).where(ArquivoArmazenado.referencias <= 0)
+    ).all()
+    for hash_conteudo in candidatos:
+        removido = db.session.execute(
+            delete(ArquivoArmazenado)
+            .where(ArquivoArmazenado.hash == hash_conteudo, ArquivoArmazenado.referencias <= 0)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if removido:
+            try:
+                os.remove(armazenamento_arquivos.caminho(hash_conteudo))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                db.session.rollback()
+                raise
+            apagados += 1
+        db.session.commit()
+    return apagados
+
+def _registrar_sem_linha(carencia_segundos):
+    """
+    Dá uma linha, sem referências, aos arquivos antigos que estão em disco
+    sem linha, para que a coleta os apague pelo mesmo DELETE condicional;
+    temporários antigos de cópias interrompidas são apagados direto.
+
+    Returns:
+        int: temporários apagados
+    """
+    limite = time.time() - carencia_segundos
+    apagados = 0
+    for raiz, _, nomes in os.walk(armazenamento_arquivos.backend.pasta):
+        antigos = {}
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            try:
+                if os.path.getmtime(caminho) >= limite:
+                    continue
+                if nome.startswith('.tmp-'):
+                    os.remove(caminho)
+                    apagados += 1
+                elif eh_id_arquivo(nome):
+                    antigos[nome] = os.path.getsize(caminho)
+            except FileNotFoundError:
+                pass
+        if not antigos:
+            continue
+        existentes = set(db.session.scalars(
+            select(ArquivoArmazenado.hash).where(ArquivoArmazenado.hash.in_(antigos))
+        ))
+        for hash_conteudo, tamanho in antigos.items():
+            if hash_conteudo not in existentes:
+                _registrar(hash_conteudo, tamanho, None)
+        db.session.commit()
+    return apagados
+
+def migrar_arquivos_legados():
+    """
+    Move para o armazenamento os arquivos gravados antes dele
+    (uploads/credor_<id>/<nome>), trocando o caminho pelo id em todas as
+    linhas que apontavam para ele.
+
+    Returns:
+        tuple: (arquivos migrados, caminhos que não existem mais em disco)
+    """
+    caminhos = db.session.scalars(union(*(
+        select(modelo.arquivo_url).where(modelo.arquivo_url.is_not(None)) for modelo in MODELOS_COM_ARQUIVO
+    ))).all()
+    migrados = ausentes = 0
+    for caminho in caminhos:
+        if eh_id_arquivo(caminho):
+            continue
+        if not os.path.isfile(caminho):
+            ausentes += 1
+            continue
+        hash_conteudo = armazenamento_arquivos.importar(caminho)
+        # UPDATE em massa não passa pelo flush: as referências são somadas aqui
+        referencias = 0
+        for modelo in MODELOS_COM_ARQUIVO:
+            referencias += db.session.execute(
+                update(modelo).where(modelo.arquivo_url == caminho).values(arquivo_url=hash_conteudo)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        _somar_referencias(db.session.connection(), {hash_conteudo: referencias})
+        db.session.commit()
+        os.remove(caminho)
+        migrados += 1
+    return migrados, ausentes
@@ -0,0 +1,181 @@
+"""
+Armazenamento endereçado por conteúdo no projeto Mercatório.
+O conteúdo das certidões é guardado uma única vez por SHA-256, em bytes
+(não em base64), fora da tabela certidoes: as linhas guardam apenas o hash
+e o tamanho, e o conteúdo só é lido quando alguém o pede. Revalidações que
+devolvem o mesmo documento não gravam nada de novo.
+
+Backends:
+    'arquivos': um arquivo por hash em BLOBS_PASTA (ab/cd/abcd...)
+    'banco': tabela conteudos_blobs, na mesma transação da certidão
+"""
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+from flask import current_app
+from sqlalchemy import inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from app.extensions import db
+from app.models.blob import ConteudoBlob
+
+TAMANHO_LOTE_MIGRACAO = 500
+
+class BlobNaoEncontrado(LookupError):
+    """Hash sem conteúdo correspondente no armazenamento."""
+
+def calcular_hash(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+def decodificar_base64(texto):
+    """Bytes de um conteúdo base64; texto que não for base64 válido é guardado como está (UTF-8)."""
+    try:
+        return base64.b64decode(texto, validate=True)
+    except (binascii.Error, ValueError):
+        return texto.encode()
+
+class BackendArquivos:
+    """Um arquivo por hash, em subpastas pelos primeiros caracteres."""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def caminho(self, hash_conteudo):
+        return os.path.join(self.pasta, hash_conteudo[:2], hash_conteudo[2:4], hash_conteudo)
+
+    def existe(self, hash_conteudo):
+        return os.path.exists(self.caminho(hash_conteudo))
+
+    def gravar(self, hash_conteudo, dados):
+        """Grava o conteúdo se ainda não existir. Retorna True se gravou."""
+        destino = self.caminho(hash_conteudo)
+        if os.path.exists(destino):
+            return False
+        pasta = os.path.dirname(destino)
+        os.makedirs(pasta, exist_ok=True)
+        # Escrita atômica: leitores nunca veem um arquivo pela metade
+        descritor, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, destino)
+        return True
+
+    def ler(self, hash_conteudo):
+        try:
+            with open(self.caminho(hash_conteudo), 'rb') as arquivo:
+                return arquivo.read()
+        except FileNotFoundError:
+            raise BlobNaoEncontrado(hash_conteudo)
+
+class BackendBanco:
+    """
+    Tabela conteudos_blobs. A gravação usa a sessão atual, sem commit: o
+    conteúdo é confirmado junto com a certidão que o referencia.
+    """
+
+    def existe(self, hash_conteudo):
+        return db.session.scalar(select(ConteudoBlob.hash).where(ConteudoBlob.hash == hash_conteudo)) is not None
+
+    def gravar(self, hash_conteudo, dados):
+        """Grava o conteúdo se ainda não existir. Retorna True se gravou."""
+        valores = {'hash': hash_conteudo, 'tamanho': len(dados), 'dados': dados}
+        dialeto = db.session.get_bind().dialect.name
+        if dialeto in ('sqlite', 'postgresql'):
+            insert = insert_sqlite if dialeto == 'sqlite' else insert_postgresql
+            # Gravações concorrentes do mesmo conteúdo não falham a transação
+            resultado = db.session.execute(
+                insert(ConteudoBlob).values(**valores).on_conflict_do_nothing(index_elements=['hash'])
+            )
+            return resultado.rowcount == 1
+        if self.existe(hash_conteudo):
+            return False
+        db.session.add(ConteudoBlob(**valores))
+        return True
+
+    def ler(self, hash_conteudo):
+        dados = db.session.scalar(select(ConteudoBlob.dados).where(ConteudoBlob.hash == hash_conteudo))
+        if dados is None:
+            raise BlobNaoEncontrado(hash_conteudo)
+        return dados
+
+class ArmazenamentoBlobs:
+    """Extensão Flask que guarda e lê conteúdos pelo SHA-256."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('BLOBS_BACKEND', 'arquivos')
+        app.config.setdefault('BLOBS_PASTA', None)
+        backend = app.config['BLOBS_BACKEND']
+        if backend == 'arquivos':
+            pasta = app.config['BLOBS_PASTA'] or os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
+            app.extensions['armazenamento_blobs'] = BackendArquivos(pasta)
+        elif backend == 'banco':
+            app.extensions['armazenamento_blobs'] = BackendBanco()
+        else:
+            raise ValueError(f"BLOBS_BACKEND desconhecido: {backend} (use 'arquivos' ou 'banco')")
+
+    @property
+    def backend(self):
+        return current_app.extensions['armazenamento_blobs']
+
+    def guardar(self, dados):
+        """
+        Guarda o conteúdo (uma única vez por hash).
+
+        Returns:
+            tuple: (hash SHA-256 em hexadecimal, tamanho em bytes)
+        """
+        hash_conteudo = calcular_hash(dados)
+        self.backend.gravar(hash_conteudo, dados)
+        return hash_conteudo, len(dados)
+
+    def ler(self, hash_conteudo):
+        """
+        Raises:
+            BlobNaoEncontrado: se o hash não estiver no armazenamento
+        """
+        return self.backend.ler(hash_conteudo)
+
+armazenamento_blobs = ArmazenamentoBlobs()
+
+def migrar_conteudo_legado(tamanho_lote=TAMANHO_LOTE_MIGRACAO):
+    """
+    Move para o armazenamento o conteúdo ainda guardado na coluna antiga
+    certidoes.conteudo_base64 (bancos criados antes do armazenamento por
+    hash), criando as colunas conteudo_hash e tamanho se faltarem. A coluna
+    antiga é esvaziada, não removida.
+
+    Returns:
+        int: certidões migradas
+    """
+    colunas = {c['name'] for c in inspect(db.engine).get_columns('certidoes')}
+    if 'conteudo_base64' not in colunas:
+        return 0
+    for nome, tipo in (('conteudo_hash', 'VARCHAR(64)'), ('tamanho', 'INTEGER')):
+        if nome not in colunas:
+            db.session.execute(text(f'ALTER TABLE certidoes ADD COLUMN {nome} {tipo}'))
+    db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_certidoes_conteudo_hash ON certidoes (conteudo_hash)'))
+    db.session.commit()
+
+    migradas = 0
+    while True:
+        lote = db.session.execute(
+            text('SELECT id, conteudo_base64 FROM certidoes WHERE conteudo_base64 IS NOT NULL ORDER BY id LIMIT :limite'),
+            {'limite': tamanho_lote}
+        ).all()
+        if not lote:
+            return migradas
+        for certidao_id, conteudo_base64 in lote:
+            hash_conteudo, tamanho = armazenamento_blobs.guardar(decodificar_base64(conteudo_base64))
+            db.session.execute(
+                text('UPDATE certidoes SET conteudo_hash = :hash, tamanho = :tamanho, conteudo_base64 = NULL '
+                     'WHERE id = :id'),
+                {'hash': hash_conteudo, 'tamanho': tamanho, 'id': certidao_id}
+            )
+        db.session.commit()
+        migradas += len(lote)
@@ -0,0 +1,203 @@
+"""
+Busca de credores por nome e CPF/CNPJ no projeto Mercatório.
+Os termos são comparados com as colunas normalizadas do credor (nome sem
+acentos e caixa, documento só com dígitos), usando o índice de cada banco:
+FTS5 com tokenizer trigram no SQLite e pg_trgm no PostgreSQL. Em outros
+bancos (ou SQLite sem trigram) a busca cai para prefixo em índice B-tree.
+"""
+import sqlite3
+from sqlalchemy import DDL, and_, case, column, event, func, literal, or_, select, table, text, update
+from app.extensions import db
+from app.models.credor import Credor
+from app.services.esquema import acrescentar_colunas
+from app.utils.normalizacao import normalizar_texto, somente_digitos
+
+# Tamanho mínimo de um termo no índice trigram
+TAMANHO_MINIMO_TRIGRAMA = 3
+
+credores_fts = table('credores_fts', column('rowid'))
+
+def _sqlite_com_trigram(ddl, target, bind, **kw):
+    return bind.dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34, 0)
+
+# SQLite: tabela FTS5 de conteúdo externo sobre credores, mantida por triggers
+# (cobre também INSERTs em massa feitos fora do ORM)
+DDL_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS credores_fts USING fts5(
+        nome_busca, documento_digitos, content='credores', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS credores_fts_ai AFTER INSERT ON credores BEGIN
+        INSERT INTO credores_fts(rowid, nome_busca, documento_digitos)
+        VALUES (new.id, new.nome_busca, new.documento_digitos);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS credores_fts_ad AFTER DELETE ON credores BEGIN
+        INSERT INTO credores_fts(credores_fts, rowid, nome_busca, documento_digitos)
+        VALUES ('delete', old.id, old.nome_busca, old.documento_digitos);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS credores_fts_au AFTER UPDATE OF nome_busca, documento_digitos ON credores BEGIN
+        INSERT INTO credores_fts(credores_fts, rowid, nome_busca, documento_digitos)
+        VALUES ('delete', old.id, old.nome_busca, old.documento_digitos);
+        INSERT INTO credores_fts(rowid, nome_busca, documento_digitos)
+        VALUES (new.id, new.nome_busca, new.documento_digitos);
+    END""",
+]
+
+# PostgreSQL: índices GIN de trigramas nas colunas normalizadas
+DDL_POSTGRESQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_credores_nome_busca_trgm ON credores USING gin (nome_busca gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_credores_documento_digitos_trgm ON credores USING gin (documento_digitos gin_trgm_ops)",
+]
+
+for comando in DDL_SQLITE:
+    event.listen(Credor.__table__, 'after_create', DDL(comando).execute_if(callable_=_sqlite_com_trigram))
+event.listen(Credor.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS credores_fts').execute_if(dialect='sqlite'))
+for comando in DDL_POSTGRESQL:
+    event.listen(Credor.__table__, 'after_create', DDL(comando).execute_if(dialect='postgresql'))
+
+def criar_indice_busca(conexao):
+    """
+    Cria o que faltar do índice de busca num banco existente: tabela FTS5 e
+    triggers no SQLite, índices pg_trgm no PostgreSQL. No banco novo, o mesmo
+    DDL roda no after_create da tabela credores.
+    """
+    if conexao.dialect.name == 'postgresql':
+        comandos = DDL_POSTGRESQL
+    elif _sqlite_com_trigram(None, None, conexao):
+        comandos = DDL_SQLITE
+    else:
+        return
+    for comando in comandos:
+        conexao.execute(text(comando))
+
+def _possui_fts(conexao):
+    return conexao.dialect.name == 'sqlite' and conexao.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'credores_fts'")
+    ).first() is not None
+
+def interpretar_termo(termo):
+    """
+    Separa o termo digitado em palavras do nome e dígitos de documento.
+
+    Returns:
+        tuple: (lista de palavras normalizadas, dígitos ou '')
+    """
+    # Só palavras inteiramente numéricas compõem o documento: '123.456.789-00'
+    # vira '12345678900', mas os dígitos de 'Lote2' continuam parte do nome
+    palavras = normalizar_texto(termo or '').split()
+    digitos = ''.join(p for p in palavras if p.isdigit())
+    return [p for p in palavras if not p.isdigit()], digitos
+
+def _faixa_prefixo(coluna, prefixo):
+    """Prefixo como intervalo, que usa o índice B-tree em qualquer banco."""
+    return and_(coluna >= prefixo, coluna < prefixo + '\uffff')
+
+def _consulta_fts(palavras, digitos):
+    """Consulta FTS5; retorna None se nenhum termo tiver tamanho suficiente."""
+    termos = [f'nome_busca : "{p}"' for p in palavras if len(p) >= TAMANHO_MINIMO_TRIGRAMA]
+    if len(digitos) >= TAMANHO_MINIMO_TRIGRAMA:
+        termos.append(f'documento_digitos : "{digitos}"')
+    if not termos:
+        return None
+
+    consulta = (
+        select(Credor.id, Credor.nome, Credor.cpf_cnpj)
+        .join(credores_fts, credores_fts.c.rowid == Credor.id)
+        .where(text('credores_fts MATCH :expressao').bindparams(expressao=' AND '.join(termos)))
+    )
+    # Palavras curtas demais para o trigram filtram por substring do nome
+    for palavra in palavras:
+        if len(palavra) < TAMANHO_MINIMO_TRIGRAMA:
+            consulta = consulta.where(Credor.nome_busca.contains(palavra, autoescape=True))
+    return consulta.order_by(*_prioridade_prefixo(palavras, digitos), text('bm25(credores_fts)'), Credor.id)
+
+def _consulta_trigramas_postgresql(palavras, digitos):
+    consulta = select(Credor.id, Credor.nome, Credor.cpf_cnpj)
+    for palavra in palavras:
+        consulta = consulta.where(Credor.nome_busca.contains(palavra, autoescape=True))
+    if digitos:
+        consulta = consulta.where(Credor.documento_digitos.contains(digitos, autoescape=True))
+    similaridade = func.similarity(Credor.nome_busca, ' '.join(palavras)) if palavras else literal(0)
+    return consulta.order_by(*_prioridade_prefixo(palavras, digitos), similaridade.desc(), Credor.id)
+
+def _consulta_prefixo(palavras, digitos):
+    consulta = select(Credor.id, Credor.nome, Credor.cpf_cnpj)
+    if palavras:
+        consulta = consulta.where(_faixa_prefixo(Credor.nome_busca, ' '.join(palavras)))
+    if digitos:
+        consulta = consulta.where(_faixa_prefixo(Credor.documento_digitos, digitos))
+    return consulta.order_by(Credor.nome_busca, Credor.id)
+
+def _prioridade_prefixo(palavras, digitos):
+    """Resultados que começam com o termo digitado aparecem primeiro."""
+    condicoes = []
+    if palavras:
+        condicoes.append(_faixa_prefixo(Credor.nome_busca, ' '.join(palavras)))
+    if digitos:
+        condicoes.append(_faixa_prefixo(Credor.documento_digitos, digitos))
+    return [case((or_(*condicoes), 0), else_=1)] if condicoes else []
+
+def buscar_credores(termo, pagina=1, limite=10):
+    """
+    Busca credores por nome e/ou CPF/CNPJ, com resultados ordenados por relevância.
+
+    Args:
+        termo: texto digitado (nome, com ou sem acentos, e/ou documento com ou sem máscara)
+        pagina: página de resultados, a partir de 1
+        limite: resultados por página
+
+    Returns:
+        tuple: (lista de dicts com id, nome e cpf_cnpj; se há próxima página)
+    """
+    palavras, digitos = interpretar_termo(termo)
+    if not palavras and not digitos:
+        return [], False
+
+    conexao = db.session.connection()
+    consulta = None
+    if _possui_fts(conexao):
+        consulta = _consulta_fts(palavras, digitos)
+    elif conexao.dialect.name == 'postgresql':
+        consulta = _consulta_trigramas_postgresql(palavras, digitos)
+    if consulta is None:
+        consulta = _consulta_prefixo(palavras, digitos)
+
+    linhas = db.session.execute(consulta.limit(limite + 1).offset((pagina - 1) * limite)).all()
+    resultados = [{'id': l.id, 'nome': l.nome, 'cpf_cnpj': l.cpf_cnpj} for l in linhas[:limite]]
+    return resultados, len(linhas) > limite
+
+def reindexar_credores(tamanho_lote=1000):
+    """
+    Preenche as colunas de busca de credores antigos e reconstrói o índice FTS5.
+    Em bancos anteriores à busca, cria antes as colunas, a tabela FTS5 e os
+    triggers (ou os índices pg_trgm).
+
+    Returns:
+        int: quantidade de credores cujas colunas de busca foram preenchidas
+    """
+    acrescentar_colunas(Credor.__table__)
+
+    # UPDATE direto (sem o ORM): colunas derivadas não alteram a versão do credor
+    atualizados = 0
+    ultimo_id = 0
+    while True:
+        linhas = db.session.execute(
+            select(Credor.id, Credor.nome, Credor.cpf_cnpj, Credor.nome_busca, Credor.documento_digitos)
+            .where(Credor.id > ultimo_id).order_by(Credor.id).limit(tamanho_lote)
+        ).all()
+        if not linhas:
+            break
+        for linha in linhas:
+            colunas = {'nome_busca': normalizar_texto(linha.nome), 'documento_digitos': somente_digitos(linha.cpf_cnpj)}
+            if (linha.nome_busca, linha.documento_digitos) != tuple(colunas.values()):
+                db.session.execute(update(Credor.__table__).where(Credor.id == linha.id).values(**colunas))
+                atualizados += 1
+        ultimo_id = linhas[-1].id
+        db.session.commit()
+
+    # Só depois das colunas preenchidas: os triggers removeriam do FTS5 linhas que ele nunca teve
+    conexao = db.session.connection()
+    criar_indice_busca(conexao)
+    if _possui_fts(conexao):
+        conexao.execute(text("INSERT INTO credores_fts(credores_fts) VALUES ('rebuild')"))
+        db.session.commit()
+    return atualizados
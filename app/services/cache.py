@@ -0,0 +1,248 @@
+"""
+Cache de leitura da representação de credores no projeto Mercatório.
+Combina um LRU em memória (limitado em quantidade de itens) com um backend
+compartilhado opcional entre processos, invalidado explicitamente pelos
+caminhos de escrita. Cargas concorrentes do mesmo credor são coalescidas.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+class CacheLRU:
+    """Dicionário com limite de itens e descarte do menos usado recentemente."""
+
+    def __init__(self, max_itens=1024):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def __len__(self):
+        return len(self._itens)
+
+class BackendMemoriaLocal:
+    """
+    Substituto local de um backend compartilhado (ex.: Redis).
+
+    Implementa a mesma interface mínima usada pelo cache (get, set com TTL e
+    incr), guardando tudo em memória do processo. Útil em desenvolvimento e
+    testes; em produção, use um backend realmente compartilhado.
+    """
+
+    def __init__(self):
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic() + ttl if ttl else None)
+
+    def incr(self, chave):
+        with self._lock:
+            valor = int(self._dados.get(chave, (0, None))[0]) + 1
+            self._dados[chave] = (valor, None)
+            return valor
+
+def criar_backend(url):
+    """
+    Cria o backend compartilhado a partir da configuração.
+
+    Args:
+        url: None (desligado), 'memoria' ou uma URL redis://
+
+    Returns:
+        backend ou None
+    """
+    if not url:
+        return None
+    if url == 'memoria':
+        return BackendMemoriaLocal()
+    if url.startswith(('redis://', 'rediss://')):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Pacote redis não instalado para CACHE_CREDORES_BACKEND')
+        return redis.Redis.from_url(url, decode_responses=True)
+    raise ValueError(f'Backend de cache desconhecido: {url}')
+
+class SingleFlight:
+    """
+    Coalesce chamadas concorrentes com a mesma chave.
+
+    A primeira thread executa a função; as demais aguardam e recebem o mesmo
+    resultado (ou a mesma exceção).
+    """
+
+    class _Chamada:
+        def __init__(self):
+            self.concluida = threading.Event()
+            self.resultado = None
+            self.erro = None
+
+    def __init__(self):
+        self._chamadas = {}
+        self._lock = threading.Lock()
+
+    def executar(self, chave, funcao):
+        with self._lock:
+            chamada = self._chamadas.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = self._chamadas[chave] = self._Chamada()
+
+        if not lider:
+            chamada.concluida.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = funcao()
+            return chamada.resultado
+        except Exception as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._chamadas[chave]
+            chamada.concluida.set()
+
+class _EstadoCache:
+    """Estado do cache de credores de uma aplicação."""
+
+    def __init__(self, max_itens, backend, ttl, max_variantes):
+        # Uma entrada por credor: (geração compartilhada, {variante: valor})
+        self.lru = CacheLRU(max_itens)
+        self.max_variantes = max_variantes
+        self.backend = backend
+        self.ttl = ttl
+        self.voo_unico = SingleFlight()
+        # Sequência da última invalidação de cada credor: impede que uma carga
+        # iniciada antes de uma escrita grave no cache um valor desatualizado
+        self.invalidacoes = CacheLRU(max_itens)
+        self.sequencia = 0
+        self.lock = threading.Lock()
+
+class CacheCredores:
+    """
+    Cache read-through da representação de detalhe dos credores.
+
+    Cada variante (recorte de fields/include) é guardada separadamente sob a
+    entrada do credor, até CACHE_CREDORES_MAX_VARIANTES por credor (as mais
+    antigas saem primeiro, ex.: as de versões anteriores). A invalidação de um credor descarta todas as suas
+    variantes, localmente e, se configurado, no backend compartilhado (por
+    incremento de geração, o que também invalida o LRU dos outros processos).
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_CREDORES_MAX_ITENS', 1024)
+        app.config.setdefault('CACHE_CREDORES_BACKEND', None)
+        app.config.setdefault('CACHE_CREDORES_TTL', 300)
+        app.config.setdefault('CACHE_CREDORES_MAX_VARIANTES', 16)
+        app.extensions['cache_credores'] = _EstadoCache(
+            app.config['CACHE_CREDORES_MAX_ITENS'],
+            criar_backend(app.config['CACHE_CREDORES_BACKEND']),
+            app.config['CACHE_CREDORES_TTL'],
+            app.config['CACHE_CREDORES_MAX_VARIANTES']
+        )
+
+    @property
+    def _estado(self):
+        return current_app.extensions['cache_credores']
+
+    def _geracao_compartilhada(self, estado, credor_id):
+        if estado.backend is None:
+            return 0
+        return int(estado.backend.get(f'credor:{credor_id}:geracao') or 0)
+
+    def _guardar_local(self, estado, credor_id, geracao, variante, valor):
+        item = estado.lru.get(credor_id)
+        variantes = dict(item[1]) if item is not None and item[0] == geracao else {}
+        variantes.pop(variante, None)
+        variantes[variante] = valor
+        # Sem backend a geração não muda: o limite é o que impede a entrada de crescer
+        while len(variantes) > estado.max_variantes:
+            del variantes[next(iter(variantes))]
+        estado.lru.set(credor_id, (geracao, variantes))
+
+    def obter(self, credor_id, variante, carregar):
+        """
+        Retorna a representação em cache ou a carrega com carregar().
+
+        Args:
+            credor_id: id do credor
+            variante: tupla hashable que identifica o recorte serializado
+            carregar: função sem argumentos que retorna o dict (ou None)
+
+        Returns:
+            dict ou None se o credor não existir (ausências não são guardadas)
+        """
+        estado = self._estado
+        geracao = self._geracao_compartilhada(estado, credor_id)
+
+        item = estado.lru.get(credor_id)
+        if item is not None and item[0] == geracao and variante in item[1]:
+            return item[1][variante]
+
+        chave_compartilhada = f'credor:{credor_id}:g{geracao}:{json.dumps(variante)}'
+        if estado.backend is not None:
+            serializado = estado.backend.get(chave_compartilhada)
+            if serializado is not None:
+                valor = json.loads(serializado)
+                self._guardar_local(estado, credor_id, geracao, variante, valor)
+                return valor
+
+        def carregar_e_guardar():
+            with estado.lock:
+                inicio = estado.sequencia
+            valor = carregar()
+            if valor is None:
+                return None
+            if (estado.invalidacoes.get(credor_id) or 0) <= inicio:
+                self._guardar_local(estado, credor_id, geracao, variante, valor)
+                if estado.backend is not None:
+                    estado.backend.set(chave_compartilhada, json.dumps(valor), estado.ttl)
+            return valor
+
+        return estado.voo_unico.executar((credor_id, variante), carregar_e_guardar)
+
+    def invalidar(self, *credores_ids):
+        """Descarta todas as variantes em cache dos credores informados."""
+        estado = self._estado
+        for credor_id in set(credores_ids):
+            with estado.lock:
+                estado.sequencia += 1
+                estado.invalidacoes.set(credor_id, estado.sequencia)
+            if estado.backend is not None:
+                estado.backend.incr(f'credor:{credor_id}:geracao')
+            estado.lru.delete(credor_id)
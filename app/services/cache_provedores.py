@@ -0,0 +1,115 @@
+"""
+Cache das respostas dos provedores de certidões no projeto Mercatório.
+Consultas repetidas do mesmo CPF/CNPJ (duplo clique em "buscar certidões",
+o job logo depois de uma busca manual) reaproveitam a última resposta de
+cada provedor por um TTL próprio do tipo de certidão. Falhas também são
+guardadas, por pouco tempo, para não insistir em um emissor fora do ar; e
+consultas simultâneas da mesma chave compartilham uma única chamada.
+"""
+import threading
+import time
+from app.models.certidao import TipoCertidao
+from app.services.cache import CacheLRU, SingleFlight
+
+# Segundos que a resposta de cada provedor é reaproveitada
+TTL_PADRAO = {
+    TipoCertidao.FEDERAL.value: 6 * 3600,
+    TipoCertidao.ESTADUAL.value: 3600,
+    TipoCertidao.MUNICIPAL.value: 3600,
+    TipoCertidao.TRABALHISTA.value: 6 * 3600,
+}
+TTL_NEGATIVO_PADRAO = 30
+MAX_ITENS_PADRAO = 10000
+
+CONTADORES = ('consultas', 'acertos', 'acertos_negativos', 'chamadas')
+
+class CacheRespostas:
+    """
+    Respostas por (tipo, cpf_cnpj), com TTL por tipo e cache negativo.
+
+    Contadores por tipo:
+        consultas: pedidos recebidos
+        acertos / acertos_negativos: atendidos pelo cache (sucesso / falha guardada)
+        chamadas: consultas de fato feitas ao provedor; as demais foram
+            coalescidas com uma chamada em andamento
+    """
+
+    def __init__(self, ttls=None, ttl_negativo=TTL_NEGATIVO_PADRAO, max_itens=MAX_ITENS_PADRAO):
+        self.ttls = {**TTL_PADRAO, **(ttls or {})}
+        self.ttl_negativo = ttl_negativo
+        self.lru = CacheLRU(max_itens)
+        self.voo_unico = SingleFlight()
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def contar(self, tipo, contador):
+        tipo = TipoCertidao(tipo).value
+        with self._lock:
+            por_tipo = self._contadores.setdefault(tipo, dict.fromkeys(CONTADORES, 0))
+            por_tipo[contador] += 1
+
+    def obter(self, tipo, cpf_cnpj):
+        """
+        Resposta em cache, contando a consulta.
+
+        Returns:
+            tuple: (certidões, exceção) com um dos dois None, ou None se não
+            houver resposta válida guardada
+        """
+        tipo = TipoCertidao(tipo).value
+        self.contar(tipo, 'consultas')
+        item = self.lru.get((tipo, cpf_cnpj))
+        if item is None or item[0] <= time.monotonic():
+            return None
+        _, certidoes, erro = item
+        self.contar(tipo, 'acertos_negativos' if erro is not None else 'acertos')
+        return (list(certidoes) if certidoes is not None else None), erro
+
+    def guardar(self, tipo, cpf_cnpj, certidoes=None, erro=None):
+        """Guarda a resposta do provedor (ou a falha, pelo TTL negativo)."""
+        tipo = TipoCertidao(tipo).value
+        ttl = self.ttl_negativo if erro is not None else self.ttls.get(tipo)
+        if ttl:
+            self.lru.set((tipo, cpf_cnpj), (time.monotonic() + ttl,
+                                            list(certidoes) if erro is None else None, erro))
+
+    def consultar(self, tipo, cpf_cnpj, funcao):
+        """
+        Retorna a resposta em cache ou chama funcao() (uma vez por chave,
+        mesmo com consultas simultâneas).
+
+        Raises:
+            a exceção de funcao(), também quando vinda do cache negativo
+        """
+        em_cache = self.obter(tipo, cpf_cnpj)
+        if em_cache is not None:
+            certidoes, erro = em_cache
+            if erro is not None:
+                raise erro
+            return certidoes
+
+        def carregar():
+            self.contar(tipo, 'chamadas')
+            try:
+                certidoes = funcao()
+            except Exception as e:
+                self.guardar(tipo, cpf_cnpj, erro=e)
+                raise
+            self.guardar(tipo, cpf_cnpj, certidoes)
+            return certidoes
+
+        return list(self.voo_unico.executar((TipoCertidao(tipo).value, cpf_cnpj), carregar))
+
+    def invalidar(self, cpf_cnpj, tipos=None):
+        """Descarta as respostas guardadas do CPF/CNPJ (de todos os tipos, por padrão)."""
+        for tipo in tipos or TipoCertidao:
+            self.lru.delete((TipoCertidao(tipo).value, cpf_cnpj))
+
+    def estatisticas(self):
+        """Contadores e taxa de acerto por tipo, para ajustar os TTLs."""
+        with self._lock:
+            contadores = {tipo: dict(valores) for tipo, valores in self._contadores.items()}
+        for valores in contadores.values():
+            atendidas = valores['acertos'] + valores['acertos_negativos']
+            valores['taxa_acerto'] = round(atendidas / valores['consultas'], 4) if valores['consultas'] else None
+        return contadores
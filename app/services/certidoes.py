@@ -0,0 +1,149 @@
+"""
+Registro das certidões dos credores no projeto Mercatório.
+A tabela certidoes guarda só a versão atual de cada (credor, tipo, origem),
+garantida por índice único: uma nova emissão atualiza a linha existente e a
+versão substituída vai para certidoes_historico, que só recebe inclusões.
+As consultas frequentes (detalhe, listagem, jobs) leem uma tabela de
+tamanho limitado, e o histórico é paginado à parte.
+"""
+from datetime import datetime
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.certidao import Certidao, CertidaoHistorico
+
+TAMANHO_LOTE_CONSOLIDACAO = 500
+
+def _copia_historico(certidao, substituida_em):
+    """Versão atual da certidão como linha do histórico."""
+    return CertidaoHistorico(
+        certidao_id=certidao.id,
+        credor_id=certidao.credor_id,
+        tipo=certidao.tipo,
+        origem=certidao.origem,
+        status=certidao.status,
+        arquivo_url=certidao.arquivo_url,
+        conteudo_hash=certidao.conteudo_hash,
+        tamanho=certidao.tamanho,
+        recebida_em=certidao.recebida_em,
+        expira_em=certidao.expira_em,
+        substituida_em=substituida_em
+    )
+
+def substituir_certidao(certidao, status, conteudo_base64=None, arquivo_url=None, recebida_em=None):
+    """
+    Grava uma nova emissão sobre a linha atual da certidão.
+
+    A versão anterior vai para o histórico quando o status, o conteúdo ou o
+    arquivo mudam; uma reemissão idêntica só renova recebida_em (e a
+    validade).
+
+    Returns:
+        bool: se a versão anterior foi arquivada
+    """
+    recebida_em = recebida_em or datetime.utcnow()
+    anterior = _copia_historico(certidao, recebida_em)
+
+    certidao.status = status
+    certidao.conteudo_base64 = conteudo_base64
+    certidao.arquivo_url = arquivo_url
+    certidao.recebida_em = recebida_em
+
+    arquivada = (certidao.status, certidao.conteudo_hash, certidao.arquivo_url) != \
+        (anterior.status, anterior.conteudo_hash, anterior.arquivo_url)
+    if arquivada:
+        db.session.add(anterior)
+    return arquivada
+
+def registrar_certidao(credor_id, tipo, origem, status, conteudo_base64=None, arquivo_url=None, recebida_em=None):
+    """
+    Insere a certidão ou, se o credor já tiver uma do mesmo tipo e origem,
+    substitui a atual (sem commit).
+
+    Returns:
+        Certidao: a linha atual
+    """
+    atual = select(Certidao).where(Certidao.credor_id == credor_id, Certidao.tipo == tipo, Certidao.origem == origem)
+    certidao = db.session.scalars(atual).one_or_none()
+    if certidao is not None:
+        substituir_certidao(certidao, status, conteudo_base64, arquivo_url, recebida_em)
+        return certidao
+
+    nova = Certidao(credor_id=credor_id, tipo=tipo, origem=origem, status=status,
+                    conteudo_base64=conteudo_base64, arquivo_url=arquivo_url,
+                    recebida_em=recebida_em or datetime.utcnow())
+    try:
+        # Savepoint: se outro processo inseriu a mesma certidão depois da consulta,
+        # só a inserção é desfeita, não o restante da transação
+        with db.session.begin_nested():
+            db.session.add(nova)
+    except IntegrityError:
+        certidao = db.session.scalars(atual).one_or_none()
+        if certidao is None:
+            raise
+        substituir_certidao(certidao, status, conteudo_base64, arquivo_url, recebida_em)
+        return certidao
+    return nova
+
+def listar_historico(credor_id, tipo=None, origem=None, cursor=None, limite=50):
+    """
+    Página do histórico de certidões do credor, da substituição mais recente
+    para a mais antiga (paginação por cursor sobre o id).
+
+    Returns:
+        tuple: (lista de CertidaoHistorico, próximo cursor ou None)
+    """
+    consulta = select(CertidaoHistorico).where(CertidaoHistorico.credor_id == credor_id)
+    if tipo is not None:
+        consulta = consulta.where(CertidaoHistorico.tipo == tipo)
+    if origem is not None:
+        consulta = consulta.where(CertidaoHistorico.origem == origem)
+    if cursor is not None:
+        consulta = consulta.where(CertidaoHistorico.id < cursor)
+
+    itens = list(db.session.scalars(consulta.order_by(CertidaoHistorico.id.desc()).limit(limite + 1)))
+    proximo_cursor = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo_cursor = itens[-1].id
+    return itens, proximo_cursor
+
+def consolidar_certidoes(tamanho_lote=TAMANHO_LOTE_CONSOLIDACAO):
+    """
+    Prepara bancos criados antes do índice único: mantém em certidoes só a
+    versão mais recente de cada (credor, tipo, origem), move as demais para
+    o histórico e cria o índice.
+
+    Returns:
+        int: certidões movidas para o histórico
+    """
+    movidas = 0
+    while True:
+        grupos = db.session.execute(
+            select(Certidao.credor_id, Certidao.tipo, Certidao.origem)
+            .group_by(Certidao.credor_id, Certidao.tipo, Certidao.origem)
+            .having(func.count() > 1)
+            .limit(tamanho_lote)
+        ).all()
+        if not grupos:
+            break
+        for credor_id, tipo, origem in grupos:
+            versoes = list(db.session.scalars(
+                select(Certidao)
+                .where(Certidao.credor_id == credor_id, Certidao.tipo == tipo, Certidao.origem == origem)
+                .order_by(Certidao.recebida_em.desc(), Certidao.id.desc())
+            ))
+            # Cada versão antiga foi substituída quando chegou a seguinte
+            for mais_nova, antiga in zip(versoes, versoes[1:]):
+                copia = _copia_historico(antiga, mais_nova.recebida_em)
+                copia.certidao_id = versoes[0].id
+                db.session.add(copia)
+                db.session.delete(antiga)
+            movidas += len(versoes) - 1
+        db.session.commit()
+
+    db.session.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_certidoes_credor_tipo_origem ON certidoes (credor_id, tipo, origem)'
+    ))
+    db.session.commit()
+    return movidas
@@ -0,0 +1,206 @@
+"""
+Coordenação de jobs entre processos no projeto Mercatório.
+Com vários workers do gunicorn em vários containers, cada processo teria
+seu próprio agendador. Um lease no banco (trava com prazo, renovada pelo
+dono) garante que um único processo execute cada job; a troca de dono é
+uma UPDATE condicional, atômica em qualquer banco. Os processos também
+publicam heartbeats, e a lista de nós vivos divide o espaço de ids de
+credores em shards disjuntos (id % total == índice).
+"""
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from app.extensions import db
+from app.models.coordenacao import LeaseJob, NoAtivo
+
+DURACAO_LEASE_PADRAO = timedelta(minutes=5)
+# Nó sem heartbeat há mais que isso é considerado morto
+VALIDADE_HEARTBEAT = timedelta(seconds=90)
+
+_identificador = None
+
+def identificador_no():
+    """Identificador deste processo: host, pid e um sufixo aleatório."""
+    global _identificador
+    if _identificador is None or not _identificador.startswith(f'{socket.gethostname()}:{os.getpid()}:'):
+        # Recalculado após fork (ex.: workers do gunicorn com preload)
+        _identificador = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+    return _identificador
+
+def adquirir_lease(nome, dono=None, duracao=DURACAO_LEASE_PADRAO, agora=None):
+    """
+    Adquire ou renova o lease `nome` para `dono`.
+
+    Só tem sucesso se o lease estiver livre, vencido ou já for do mesmo dono.
+
+    Returns:
+        bool: se `dono` é o dono do lease até agora + duracao
+    """
+    dono = dono or identificador_no()
+    agora = agora or datetime.utcnow()
+    resultado = db.session.execute(
+        update(LeaseJob)
+        .where(LeaseJob.nome == nome, (LeaseJob.dono == dono) | (LeaseJob.expira_em < agora))
+        .values(dono=dono, expira_em=agora + duracao, adquirido_em=agora)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 1:
+        db.session.commit()
+        return True
+    db.session.rollback()
+
+    if db.session.get(LeaseJob, nome) is not None:
+        return False
+    try:
+        db.session.add(LeaseJob(nome=nome, dono=dono, expira_em=agora + duracao, adquirido_em=agora))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # Outro processo criou o lease ao mesmo tempo
+        db.session.rollback()
+        return False
+
+def liberar_lease(nome, dono=None):
+    """Libera o lease, se ainda for de `dono`."""
+    db.session.execute(
+        update(LeaseJob)
+        .where(LeaseJob.nome == nome, LeaseJob.dono == (dono or identificador_no()))
+        .values(expira_em=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+class Lease:
+    def __init__(self, nome, dono):
+        self.nome = nome
+        self.dono = dono
+        # Marcado pela thread de renovação se outro processo assumir o lease
+        self.perdido = threading.Event()
+
+@contextmanager
+def _renovando(nome, dono, duracao):
+    """Renova o lease já adquirido a cada duracao/3 enquanto o bloco executa."""
+    lease = Lease(nome, dono)
+    app = current_app._get_current_object()
+    parar = threading.Event()
+
+    def renovar():
+        with app.app_context():
+            try:
+                while not parar.wait(duracao.total_seconds() / 3):
+                    if not adquirir_lease(nome, dono, duracao):
+                        lease.perdido.set()
+                        return
+            finally:
+                db.session.remove()
+
+    renovacao = threading.Thread(target=renovar, name=f'lease-{nome}', daemon=True)
+    renovacao.start()
+    try:
+        yield lease
+    finally:
+        parar.set()
+        renovacao.join()
+
+@contextmanager
+def manter_lease(nome, duracao=DURACAO_LEASE_PADRAO, dono=None):
+    """
+    Executa o bloco como dono do lease, renovando-o em segundo plano.
+
+    Produz None se o lease estiver com outro processo; caso contrário, um
+    Lease cujo evento `perdido` indica que a renovação falhou. O lease é
+    liberado ao sair do bloco.
+    """
+    dono = dono or identificador_no()
+    if not adquirir_lease(nome, dono, duracao):
+        yield None
+        return
+
+    with _renovando(nome, dono, duracao) as lease:
+        try:
+            yield lease
+        finally:
+            if not lease.perdido.is_set():
+                liberar_lease(nome, dono)
+
+def executar_como_lider(nome, funcao, duracao=DURACAO_LEASE_PADRAO):
+    """
+    Executa funcao() só no processo líder do job `nome`.
+
+    Durante a execução o lease é renovado em segundo plano, então uma
+    execução mais longa que `duracao` não o perde para outro processo. Ao
+    final ele não é liberado: o líder o renova a cada execução e continua
+    líder enquanto estiver vivo (o intervalo entre execuções deve ser bem
+    menor que `duracao`).
+
+    Returns:
+        resultado de funcao(), ou None se outro processo for o líder
+    """
+    dono = identificador_no()
+    if not adquirir_lease(nome, dono, duracao):
+        return None
+    with _renovando(nome, dono, duracao):
+        return funcao()
+
+def registrar_heartbeat(no_id=None, agora=None):
+    """Anuncia (ou renova) este processo na lista de nós vivos."""
+    no_id = no_id or identificador_no()
+    agora = agora or datetime.utcnow()
+    no = db.session.get(NoAtivo, no_id)
+    if no is None:
+        db.session.add(NoAtivo(no_id=no_id, heartbeat_em=agora, iniciado_em=agora))
+    else:
+        no.heartbeat_em = agora
+    db.session.commit()
+
+def remover_no(no_id=None):
+    db.session.execute(delete(NoAtivo).where(NoAtivo.no_id == (no_id or identificador_no())))
+    db.session.commit()
+
+def nos_ativos(agora=None, validade=VALIDADE_HEARTBEAT):
+    """Ids dos nós com heartbeat recente, em ordem estável."""
+    agora = agora or datetime.utcnow()
+    return list(db.session.scalars(
+        select(NoAtivo.no_id).where(NoAtivo.heartbeat_em >= agora - validade).order_by(NoAtivo.no_id)
+    ))
+
+def shard_do_no(no_id=None, agora=None, validade=VALIDADE_HEARTBEAT):
+    """
+    Shard deste nó entre os nós vivos.
+
+    Todos os nós que consultarem a mesma lista chegam à mesma divisão, sem
+    sobreposição; a divisão muda quando nós entram ou saem.
+
+    Returns:
+        tuple: (índice, total)
+    """
+    no_id = no_id or identificador_no()
+    nos = nos_ativos(agora, validade)
+    if no_id not in nos:
+        nos = sorted(nos + [no_id])
+    return nos.index(no_id), len(nos)
+
+def interpretar_shard(valor):
+    """
+    Converte 'i/n' em (i, n), 'auto' no shard deste nó entre os vivos, ou
+    vazio em None (sem divisão).
+
+    Raises:
+        ValueError: se o formato for inválido
+    """
+    if not valor:
+        return None
+    if valor == 'auto':
+        registrar_heartbeat()
+        return shard_do_no(validade=timedelta(seconds=current_app.config['COORDENACAO_HEARTBEAT_VALIDADE']))
+    indice, _, total = valor.partition('/')
+    indice, total = int(indice), int(total)
+    if total < 1 or not 0 <= indice < total:
+        raise ValueError('Shard deve ser i/n com 0 <= i < n')
+    return indice, total
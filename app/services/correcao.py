@@ -0,0 +1,99 @@
+"""
+Índices de correção monetária (IPCA-E, SELIC) no projeto Mercatório.
+As séries mensais são lidas de arquivos CSV locais e convertidas em um
+array de fatores acumulados; o fator entre dois meses quaisquer é a razão
+entre duas posições desse array, sem percorrer os meses intermediários.
+"""
+import csv
+import hashlib
+import os
+from datetime import date
+from functools import lru_cache
+import numpy as np
+from flask import current_app
+
+class IndiceDesconhecido(ValueError):
+    """Índice de correção sem arquivo correspondente."""
+
+class SerieInvalida(ValueError):
+    """Arquivo de índice mal formado."""
+
+class IndiceCorrecao:
+    """
+    Série mensal de um índice, com fatores acumulados pré-calculados.
+
+    `acumulados[k]` é o fator do início da primeira competência até o início
+    da competência k; a correção de um valor do mês m0 até o mês m1 aplica
+    as variações de m0 (inclusive) a m1 (exclusive). Datas fora da série
+    são limitadas às suas pontas (sem índice, sem correção).
+    """
+
+    def __init__(self, nome, competencias, variacoes_percentuais):
+        competencias = np.asarray(competencias, dtype='datetime64[M]')
+        if not len(competencias):
+            raise SerieInvalida(f'Índice {nome} sem competências')
+        if np.any(np.diff(competencias).astype(np.int64) != 1):
+            raise SerieInvalida(f'Índice {nome} com competências fora de sequência ou com lacunas')
+
+        self.nome = nome
+        self.competencia_inicial = competencias[0]
+        self.competencia_final = competencias[-1]
+        taxas = 1.0 + np.asarray(variacoes_percentuais, dtype=np.float64) / 100
+        self.acumulados = np.concatenate(([1.0], np.cumprod(taxas)))
+        self.assinatura = hashlib.sha1(self.acumulados.tobytes()).hexdigest()[:12]
+
+    def _posicoes(self, datas):
+        meses = np.asarray(datas, dtype='datetime64[D]').astype('datetime64[M]')
+        return np.clip((meses - self.competencia_inicial).astype(np.int64), 0, len(self.acumulados) - 1)
+
+    def fatores(self, datas_iniciais, data_final=None):
+        """Fator de correção de cada data inicial até data_final (padrão: hoje)."""
+        final = self.acumulados[self._posicoes(data_final or date.today())]
+        return final / self.acumulados[self._posicoes(datas_iniciais)]
+
+    def fator(self, data_inicial, data_final=None):
+        return float(self.fatores([data_inicial], data_final)[0])
+
+    def chave(self, data_final=None):
+        """Identifica o resultado da correção até data_final (para cache e ETag)."""
+        return (self.nome, self.assinatura, int(self._posicoes(data_final or date.today())))
+
+def ler_serie(nome, caminho):
+    """Lê um CSV com colunas competencia (AAAA-MM) e variacao_percentual."""
+    competencias = []
+    variacoes = []
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        for numero, linha in enumerate(csv.DictReader(arquivo), start=2):
+            try:
+                competencias.append(np.datetime64(linha['competencia'].strip(), 'M'))
+                variacoes.append(float(linha['variacao_percentual'].replace(',', '.')))
+            except (AttributeError, KeyError, ValueError):
+                raise SerieInvalida(f'{os.path.basename(caminho)}, linha {numero}: valor inválido')
+    ordem = np.argsort(competencias)
+    return IndiceCorrecao(nome, np.array(competencias)[ordem], np.array(variacoes)[ordem])
+
+@lru_cache(maxsize=32)
+def _carregar_indice(caminho, modificado_em):
+    # modificado_em faz parte da chave: o arquivo é relido quando muda
+    return ler_serie(os.path.splitext(os.path.basename(caminho))[0].lower(), caminho)
+
+def indices_disponiveis():
+    pasta = current_app.config['INDICES_CORRECAO_PASTA']
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(os.path.splitext(n)[0].lower() for n in os.listdir(pasta) if n.lower().endswith('.csv'))
+
+def obter_indice(nome):
+    """
+    Retorna o índice de correção pelo nome (ex.: 'ipca_e', 'selic').
+
+    Raises:
+        IndiceDesconhecido: se não houver arquivo para o índice
+    """
+    nome = (nome or '').strip().lower()
+    caminho = os.path.join(current_app.config['INDICES_CORRECAO_PASTA'], f'{nome}.csv')
+    if nome not in indices_disponiveis():
+        raise IndiceDesconhecido(
+            f"Índice de correção desconhecido: {nome or '(vazio)'}. Disponíveis: {', '.join(indices_disponiveis())}"
+        )
+    return _carregar_indice(caminho, os.path.getmtime(caminho))
@@ -0,0 +1,284 @@
+"""
+Miniaturas e prévias dos arquivos enviados no projeto Mercatório.
+Os scans de documentos têm vários megabytes: as páginas mostram derivados
+em JPEG gerados com Pillow, a 'miniatura' (lado maior de 256 px) no detalhe
+do credor e a 'previa' (1280 px) na visualização, e o original só é baixado
+quando pedido. Os derivados ficam em DERIVADOS_PASTA/ab/cd/<hash>-<variante>.jpg,
+pelo hash do original: conteúdo repetido é processado uma única vez.
+
+Depois do upload, a geração vai para um pool de processos (DERIVADOS_WORKERS;
+com 0, é feita na própria requisição), fora do worker web e do GIL. PDFs
+ganham a prévia da primeira página quando o pdftoppm (poppler-utils) está
+instalado; sem ele, só o original. Derivado que falta (arquivo anterior ao
+pipeline, pool reiniciado) é gerado na primeira vez que é pedido.
+"""
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from app.extensions import db
+from app.models.arquivo import ArquivoArmazenado
+from app.services.arquivos import armazenamento_arquivos, eh_id_arquivo
+
+# Lado maior, em pixels, de cada derivado
+VARIANTES = {'miniatura': 256, 'previa': 1280}
+QUALIDADE_JPEG = 82
+WORKERS_PADRAO = 2
+TIMEOUT_PDF = 60
+# Espera por uma geração já em andamento antes de gerar na requisição
+ESPERA_EM_ANDAMENTO = 30
+TAMANHO_LOTE = 500
+
+def renderizador_pdf():
+    """Caminho do pdftoppm, se instalado."""
+    return shutil.which('pdftoppm')
+
+def caminho_derivado(pasta, hash_conteudo, variante):
+    return os.path.join(pasta, hash_conteudo[:2], hash_conteudo[2:4], f'{hash_conteudo}-{variante}.jpg')
+
+def _primeira_pagina(origem, pasta_temporaria):
+    """Primeira página do PDF rasterizada pelo pdftoppm, já no tamanho da prévia."""
+    prefixo = os.path.join(pasta_temporaria, 'pagina')
+    subprocess.run(
+        [renderizador_pdf(), '-f', '1', '-l', '1', '-singlefile', '-jpeg',
+         '-scale-to', str(max(VARIANTES.values())), origem, prefixo],
+        check=True, capture_output=True, timeout=TIMEOUT_PDF
+    )
+    return prefixo + '.jpg'
+
+def _abrir(origem, tipo_mime, pasta_temporaria):
+    """Imagem RGB do original (ou da primeira página do PDF), na orientação do EXIF."""
+    if tipo_mime == 'application/pdf':
+        origem = _primeira_pagina(origem, pasta_temporaria)
+    with Image.open(origem) as imagem:
+        # JPEG: decodificado já reduzido (escala do DCT), sem o scan inteiro em memória
+        imagem.draft('RGB', (max(VARIANTES.values()),) * 2)
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode in ('RGBA', 'LA', 'P'):
+            # Transparência sobre fundo branco (o JPEG não tem canal alfa)
+            imagem = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, 'white')
+            fundo.paste(imagem, mask=imagem.getchannel('A'))
+            return fundo
+        return imagem.convert('RGB')
+
+def _gravar(imagem, destino):
+    pasta = os.path.dirname(destino)
+    os.makedirs(pasta, exist_ok=True)
+    # Escrita atômica: leitores nunca veem um derivado pela metade
+    descritor, temporario = tempfile.mkstemp(dir=pasta, prefix='.tmp-')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            imagem.save(arquivo, 'JPEG', quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+def gerar_derivados(origem, hash_conteudo, tipo_mime, pasta):
+    """
+    Gera os derivados que ainda não existem. Roda nos processos do pool:
+    recebe só caminhos e valores, sem app nem sessão.
+
+    Returns:
+        list: variantes geradas (vazia se nada faltava ou o arquivo não pôde ser lido)
+    """
+    faltando = sorted(
+        (v for v in VARIANTES if not os.path.exists(caminho_derivado(pasta, hash_conteudo, v))),
+        key=VARIANTES.get, reverse=True
+    )
+    if not faltando or (tipo_mime == 'application/pdf' and renderizador_pdf() is None):
+        return []
+    with tempfile.TemporaryDirectory(prefix='derivados-') as pasta_temporaria:
+        try:
+            imagem = _abrir(origem, tipo_mime, pasta_temporaria)
+        except (OSError, Image.DecompressionBombError, subprocess.SubprocessError):
+            return []
+        # Da maior para a menor: cada redução parte da anterior
+        for variante in faltando:
+            lado = VARIANTES[variante]
+            imagem.thumbnail((lado, lado), Image.LANCZOS)
+            _gravar(imagem, caminho_derivado(pasta, hash_conteudo, variante))
+    return faltando
+
+class _EstadoDerivados:
+    def __init__(self, pasta, workers):
+        self.pasta = pasta
+        self.workers = workers
+        self.executor = None
+        self.em_andamento = {}
+        self.trava = threading.Lock()
+
+    def _submeter(self, argumentos):
+        if self.executor is None:
+            # spawn: os processos não herdam conexões do banco nem as threads do worker web
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            return self.executor.submit(gerar_derivados, *argumentos)
+        except BrokenProcessPool:
+            # Um processo morreu (ex.: memória); o pool é recriado
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.executor.submit(gerar_derivados, *argumentos)
+
+    def enviar(self, hash_conteudo, argumentos, logger):
+        """Future da geração; a mesma, se o arquivo já estiver no pool."""
+        with self.trava:
+            futuro = self.em_andamento.get(hash_conteudo)
+            if futuro is not None:
+                return futuro
+            futuro = self._submeter(argumentos)
+            self.em_andamento[hash_conteudo] = futuro
+
+        def concluir(f):
+            with self.trava:
+                self.em_andamento.pop(hash_conteudo, None)
+            if not f.cancelled() and f.exception() is not None:
+                logger.error('Falha ao gerar derivados de %s: %r', hash_conteudo, f.exception())
+
+        futuro.add_done_callback(concluir)
+        return futuro
+
+class GeradorDerivados:
+    """Extensão Flask que gera e localiza as miniaturas e prévias dos arquivos."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DERIVADOS_PASTA', None)
+        app.config.setdefault('DERIVADOS_WORKERS', WORKERS_PADRAO)
+        pasta = app.config['DERIVADOS_PASTA'] or os.path.join(app.config['UPLOAD_FOLDER'], 'derivados')
+        app.extensions['gerador_derivados'] = _EstadoDerivados(pasta, app.config['DERIVADOS_WORKERS'])
+
+    @property
+    def _estado(self):
+        return current_app.extensions['gerador_derivados']
+
+    def suporta(self, tipo_mime):
+        """Se há como gerar miniatura e prévia para o tipo."""
+        if not tipo_mime:
+            return False
+        return tipo_mime.startswith('image/') or (tipo_mime == 'application/pdf' and renderizador_pdf() is not None)
+
+    def com_previa(self, arquivo_urls):
+        """Quais dos arquivo_url são arquivos armazenados com miniatura e prévia."""
+        ids = {url for url in arquivo_urls if eh_id_arquivo(url)}
+        if not ids:
+            return set()
+        linhas = db.session.execute(
+            select(ArquivoArmazenado.hash, ArquivoArmazenado.tipo_mime).where(ArquivoArmazenado.hash.in_(ids))
+        )
+        return {hash_conteudo for hash_conteudo, tipo_mime in linhas if self.suporta(tipo_mime)}
+
+    def _pendente(self, estado, hash_conteudo):
+        return not all(os.path.exists(caminho_derivado(estado.pasta, hash_conteudo, v)) for v in VARIANTES)
+
+    def _agendar(self, estado, hash_conteudo, tipo_mime):
+        if not self.suporta(tipo_mime) or not self._pendente(estado, hash_conteudo):
+            return None
+        argumentos = (armazenamento_arquivos.caminho(hash_conteudo), hash_conteudo, tipo_mime, estado.pasta)
+        if estado.workers <= 0:
+            futuro = Future()
+            futuro.set_result(gerar_derivados(*argumentos))
+            return futuro
+        return estado.enviar(hash_conteudo, argumentos, current_app.logger)
+
+    def agendar(self, arquivo_id):
+        """
+        Envia ao pool a geração dos derivados de um arquivo recém-guardado.
+        Chamado depois do commit: a requisição não espera o resultado.
+
+        Returns:
+            Future com as variantes geradas, ou None se não há o que gerar
+        """
+        if not eh_id_arquivo(arquivo_id):
+            return None
+        registro = db.session.get(ArquivoArmazenado, arquivo_id)
+        if registro is None:
+            return None
+        return self._agendar(self._estado, arquivo_id, registro.tipo_mime)
+
+    def caminho(self, arquivo_id, variante):
+        """
+        Caminho do derivado em disco, gerado agora se ainda não existir.
+
+        Returns:
+            str, ou None se o arquivo não tem essa variante
+        """
+        if variante not in VARIANTES or not eh_id_arquivo(arquivo_id):
+            return None
+        estado = self._estado
+        destino = caminho_derivado(estado.pasta, arquivo_id, variante)
+        if os.path.exists(destino):
+            return destino
+
+        futuro = estado.em_andamento.get(arquivo_id)
+        if futuro is not None:
+            try:
+                futuro.result(timeout=ESPERA_EM_ANDAMENTO)
+            except Exception:
+                pass
+        if not os.path.exists(destino):
+            registro = db.session.get(ArquivoArmazenado, arquivo_id)
+            origem = armazenamento_arquivos.caminho(arquivo_id)
+            if registro is None or not self.suporta(registro.tipo_mime) or not os.path.exists(origem):
+                return None
+            gerar_derivados(origem, arquivo_id, registro.tipo_mime, estado.pasta)
+        return destino if os.path.exists(destino) else None
+
+gerador_derivados = GeradorDerivados()
+
+def gerar_derivados_pendentes(tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera, no pool, os derivados que faltam de todos os arquivos armazenados
+    (ex.: enviados antes do pipeline) e espera terminar.
+
+    Returns:
+        int: arquivos com derivados gerados
+    """
+    estado = gerador_derivados._estado
+    consulta = (
+        select(ArquivoArmazenado.hash, ArquivoArmazenado.tipo_mime)
+        .execution_options(yield_per=tamanho_lote)
+    )
+    futuros = [gerador_derivados._agendar(estado, h, tipo_mime) for h, tipo_mime in db.session.execute(consulta)]
+    return sum(1 for futuro in futuros if futuro is not None and futuro.result())
+
+def coletar_derivados():
+    """
+    Apaga os derivados cujo original saiu do armazenamento (`flask arquivos coletar`).
+
+    Returns:
+        int: derivados apagados
+    """
+    pasta = gerador_derivados._estado.pasta
+    apagados = 0
+    for raiz, _, nomes in os.walk(pasta):
+        por_hash = {}
+        for nome in nomes:
+            hash_conteudo = nome.split('-', 1)[0]
+            if eh_id_arquivo(hash_conteudo):
+                por_hash.setdefault(hash_conteudo, []).append(nome)
+        if not por_hash:
+            continue
+        existentes = set(db.session.scalars(
+            select(ArquivoArmazenado.hash).where(ArquivoArmazenado.hash.in_(por_hash))
+        ))
+        for hash_conteudo, nomes_derivados in por_hash.items():
+            if hash_conteudo in existentes:
+                continue
+            for nome in nomes_derivados:
+                try:
+                    os.remove(os.path.join(raiz, nome))
+                    apagados += 1
+                except FileNotFoundError:
+                    pass
+    return apagados
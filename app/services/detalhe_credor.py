@@ -0,0 +1,104 @@
+"""
+Serialização do detalhe de um credor no projeto Mercatório.
+Carrega os relacionamentos pedidos com selectinload (uma consulta por
+relacionamento, em vez de uma carga preguiçosa por acesso) e serializa com
+schemas pré-construídos, aceitando recortes via ?fields= e ?include=.
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from app.extensions import db
+from app.models.credor import Credor
+from app.schemas.credor_schema import CredorSchema, RELACIONAMENTOS_CREDOR, schema_detalhe_credor
+from app.services.correcao import IndiceDesconhecido, obter_indice
+
+CAMPOS_CREDOR = tuple(nome for nome in CredorSchema().fields if nome not in RELACIONAMENTOS_CREDOR)
+
+# Valor de ?include= que acrescenta o conteúdo base64 das certidões
+INCLUIR_CONTEUDO = 'certidoes.conteudo_base64'
+
+class ParametroInvalido(ValueError):
+    """Valor desconhecido em ?fields=, ?include= ou ?correcao=."""
+
+def _lista(valor):
+    return tuple(dict.fromkeys(item.strip() for item in valor.split(',') if item.strip()))
+
+def interpretar_parametros(args):
+    """
+    Interpreta ?fields=, ?include= e ?correcao= da requisição.
+
+    Sem ?include=, todos os relacionamentos são serializados, mas o conteúdo
+    base64 das certidões (lido do armazenamento de blobs) fica de fora. Para
+    recebê-lo, inclua 'certidoes.conteudo_base64'. Com ?correcao=<índice> (ex.: ipca_e), cada
+    precatório ganha o campo valor_corrigido até hoje.
+
+    Returns:
+        tuple: (campos ou None, relacionamentos, incluir_conteudo, IndiceCorrecao ou None)
+
+    Raises:
+        ParametroInvalido: se algum nome não for reconhecido
+    """
+    campos = None
+    if 'fields' in args:
+        pedidos = _lista(args['fields'])
+        desconhecidos = [c for c in pedidos if c not in CAMPOS_CREDOR]
+        if desconhecidos:
+            raise ParametroInvalido(f"Campos desconhecidos em fields: {', '.join(desconhecidos)}")
+        # Ordem canônica: permutações de ?fields= são o mesmo recorte (schema, cache e ETag)
+        campos = tuple(c for c in CAMPOS_CREDOR if c in pedidos)
+
+    relacionamentos = RELACIONAMENTOS_CREDOR
+    incluir_conteudo = False
+    if 'include' in args:
+        pedidos = _lista(args['include'])
+        incluir_conteudo = INCLUIR_CONTEUDO in pedidos
+        if incluir_conteudo:
+            pedidos += ('certidoes',)
+        desconhecidos = [r for r in pedidos if r not in RELACIONAMENTOS_CREDOR + (INCLUIR_CONTEUDO,)]
+        if desconhecidos:
+            raise ParametroInvalido(f"Relacionamentos desconhecidos em include: {', '.join(desconhecidos)}")
+        # Mantém a ordem canônica para reaproveitar o mesmo schema em cache
+        relacionamentos = tuple(r for r in RELACIONAMENTOS_CREDOR if r in pedidos)
+
+    correcao = None
+    if 'correcao' in args:
+        try:
+            correcao = obter_indice(args['correcao'])
+        except IndiceDesconhecido as e:
+            raise ParametroInvalido(str(e))
+        if 'precatorios' not in relacionamentos:
+            relacionamentos = tuple(r for r in RELACIONAMENTOS_CREDOR if r in relacionamentos + ('precatorios',))
+
+    return campos, relacionamentos, incluir_conteudo, correcao
+
+def carregar_credor(credor_id, relacionamentos=RELACIONAMENTOS_CREDOR):
+    """
+    Carrega o credor com os relacionamentos pedidos já populados.
+
+    Returns:
+        Credor ou None
+    """
+    opcoes = [selectinload(getattr(Credor, nome)) for nome in relacionamentos]
+    consulta = select(Credor).where(Credor.id == credor_id).options(*opcoes)
+    return db.session.scalars(consulta).one_or_none()
+
+def serializar_credor(credor_id, campos=None, relacionamentos=RELACIONAMENTOS_CREDOR, incluir_conteudo=False,
+                      correcao=None):
+    """
+    Monta a representação JSON do credor para o recorte pedido.
+
+    Args:
+        correcao: IndiceCorrecao opcional; acrescenta valor_corrigido aos precatórios
+
+    Returns:
+        dict ou None se o credor não existir
+    """
+    credor = carregar_credor(credor_id, relacionamentos)
+    if credor is None:
+        return None
+    resultado = schema_detalhe_credor(campos, relacionamentos, incluir_conteudo).dump(credor)
+
+    if correcao is not None and credor.precatorios:
+        fatores = correcao.fatores([p.data_publicacao for p in credor.precatorios])
+        for item, precatorio, fator in zip(resultado['precatorios'], credor.precatorios, fatores):
+            item['valor_corrigido'] = round(precatorio.valor_nominal * float(fator), 2)
+    return resultado
@@ -0,0 +1,123 @@
+"""
+Atualização do esquema de bancos existentes no projeto Mercatório.
+O db.create_all() só cria tabelas que não existem: num banco criado por uma
+versão anterior, as colunas novas das tabelas antigas ficariam faltando e a
+primeira consulta falharia ("no such column"). Aqui as colunas e os índices
+que faltam são acrescentados (ALTER TABLE ... ADD COLUMN) e os valores
+derivados dos registros antigos são preenchidos. Cada passo confere o banco
+antes, então rodar de novo não altera nada.
+"""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.schema import DefaultClause
+from app.extensions import db
+from app.models.certidao import Certidao, calcular_expiracao
+from app.models.credor import Credor
+from app.services.agregados import reconstruir_agregados
+
+TAMANHO_LOTE = 1000
+TABELAS_AGREGADOS = {'resumo_foros', 'resumo_anos_publicacao', 'resumo_prontidao'}
+
+def _padrao_literal(coluna):
+    """DEFAULT constante da coluna, se houver (ADD COLUMN não aceita expressões no SQLite)."""
+    padrao = coluna.server_default
+    if isinstance(padrao, DefaultClause) and isinstance(padrao.arg, str):
+        return padrao.arg
+    return None
+
+def _acrescentar_coluna(tabela, coluna):
+    tipo = coluna.type.compile(dialect=db.engine.dialect)
+    comando = f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'
+    padrao = _padrao_literal(coluna)
+    if padrao is not None:
+        comando += " DEFAULT '{}'".format(padrao.replace("'", "''"))
+    # Sempre anulável: registros antigos são preenchidos depois, e o ORM já exige o valor nos novos
+    try:
+        db.session.execute(text(comando))
+        db.session.commit()
+    except DBAPIError:
+        # Outro processo (ex.: outro worker subindo junto) pode ter acrescentado antes
+        db.session.rollback()
+        if coluna.name not in {c['name'] for c in inspect(db.engine).get_columns(tabela.name)}:
+            raise
+
+def acrescentar_colunas(tabela):
+    """
+    Acrescenta à tabela as colunas do modelo que faltam no banco.
+
+    Returns:
+        list: nomes das colunas acrescentadas
+    """
+    existentes = {c['name'] for c in inspect(db.engine).get_columns(tabela.name)}
+    faltando = [coluna for coluna in tabela.columns if coluna.name not in existentes]
+    for coluna in faltando:
+        _acrescentar_coluna(tabela, coluna)
+    return [coluna.name for coluna in faltando]
+
+def _criar_indices(tabela):
+    for indice in tabela.indexes:
+        try:
+            indice.create(db.engine, checkfirst=True)
+        except IntegrityError:
+            # Índice único sobre dados repetidos (certidões anteriores à tabela de histórico)
+            current_app.logger.warning(
+                'Índice %s não criado: há registros repetidos; execute `flask certidoes consolidar`.', indice.name
+            )
+        except DBAPIError:
+            if indice.name not in {i['name'] for i in inspect(db.engine).get_indexes(tabela.name)}:
+                raise
+
+def _preencher_expiracao(tamanho_lote):
+    # UPDATE direto: sem eventos do ORM nem mudança de versão do credor
+    ultimo_id = 0
+    while True:
+        linhas = db.session.execute(
+            select(Certidao.id, Certidao.tipo, Certidao.recebida_em)
+            .where(Certidao.id > ultimo_id, Certidao.expira_em.is_(None), Certidao.recebida_em.isnot(None))
+            .order_by(Certidao.id).limit(tamanho_lote)
+        ).all()
+        if not linhas:
+            return
+        for linha in linhas:
+            db.session.execute(update(Certidao.__table__).where(Certidao.id == linha.id).values(
+                expira_em=calcular_expiracao(linha.tipo, linha.recebida_em)
+            ))
+        ultimo_id = linhas[-1].id
+        db.session.commit()
+
+def atualizar_esquema(tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria as tabelas que faltam e atualiza as existentes para o modelo atual.
+    Chamado pelo create_app; num banco já atualizado só inspeciona.
+
+    Returns:
+        dict: colunas acrescentadas por tabela (vazio se nada mudou)
+    """
+    tabelas_antes = set(inspect(db.engine).get_table_names())
+    db.create_all()
+
+    acrescentadas = {}
+    for tabela in db.metadata.sorted_tables:
+        if tabela.name not in tabelas_antes:
+            continue
+        colunas = acrescentar_colunas(tabela)
+        if colunas:
+            acrescentadas[tabela.name] = colunas
+        _criar_indices(tabela)
+
+    novas_credores = set(acrescentadas.get('credores', ()))
+    if 'atualizado_em' in novas_credores:
+        db.session.execute(update(Credor.__table__).where(Credor.atualizado_em.is_(None))
+                           .values(atualizado_em=datetime.utcnow()))
+        db.session.commit()
+    if 'expira_em' in acrescentadas.get('certidoes', ()):
+        _preencher_expiracao(tamanho_lote)
+    if novas_credores & {'nome_busca', 'documento_digitos'}:
+        # Import tardio: a busca usa acrescentar_colunas deste módulo
+        from app.services.busca import reindexar_credores
+        reindexar_credores(tamanho_lote=tamanho_lote)
+    if 'prontidao' in novas_credores or (TABELAS_AGREGADOS - tabelas_antes and 'credores' in tabelas_antes):
+        reconstruir_agregados(tamanho_lote=tamanho_lote)
+    return acrescentadas
@@ -0,0 +1,120 @@
+"""
+Exportação em streaming da carteira no projeto Mercatório.
+Percorre os credores com yield_per (cursor do lado do servidor quando o
+banco suporta) e, para cada lote, carrega precatórios, metadados de
+documentos e status de certidões com uma consulta por tabela. A memória
+usada depende apenas do tamanho do lote, não da carteira.
+
+A marca d'água da sincronização incremental vem dos próprios dados (o maior
+atualizado_em gravado, menos uma margem), não do relógio de quem exporta:
+um credor alterado numa transação que ainda não tinha sido confirmada no
+momento da leitura tem atualizado_em anterior à leitura e seria pulado.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from sqlalchemy import func, select
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.precatorio import Precatorio
+from app.models.documento_pessoal import DocumentoPessoal
+from app.models.certidao import Certidao
+
+TAMANHO_LOTE_EXPORTACAO = 500
+# Prazo, após o atualizado_em, para a transação que alterou o credor ser confirmada
+MARGEM_MARCA_SEGUNDOS = 60
+
+COLUNAS_CREDOR = (Credor.id, Credor.nome, Credor.cpf_cnpj, Credor.email, Credor.telefone,
+                  Credor.versao, Credor.atualizado_em)
+COLUNAS_PRECATORIO = (Precatorio.id, Precatorio.credor_id, Precatorio.numero_precatorio,
+                      Precatorio.valor_nominal, Precatorio.foro, Precatorio.data_publicacao)
+COLUNAS_DOCUMENTO = (DocumentoPessoal.id, DocumentoPessoal.credor_id, DocumentoPessoal.tipo,
+                     DocumentoPessoal.arquivo_url, DocumentoPessoal.enviado_em)
+# Apenas metadados: o conteúdo das certidões fica no armazenamento de blobs
+COLUNAS_CERTIDAO = (Certidao.id, Certidao.credor_id, Certidao.tipo, Certidao.origem,
+                    Certidao.status, Certidao.recebida_em, Certidao.expira_em,
+                    Certidao.conteudo_hash, Certidao.tamanho)
+
+def _json_padrao(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Enum):
+        return valor.value
+    raise TypeError(f'Tipo não serializável: {type(valor).__name__}')
+
+def normalizar_instante(valor):
+    """Instante com fuso convertido para UTC sem fuso, como em atualizado_em."""
+    if valor is not None and valor.tzinfo is not None:
+        return valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor
+
+def calcular_marca(atualizado_desde=None, margem_segundos=MARGEM_MARCA_SEGUNDOS):
+    """
+    Marca d'água para o updated_since da próxima sincronização, calculada
+    antes da leitura: o maior atualizado_em já gravado, menos a margem.
+    Credores alterados dentro da margem são exportados de novo na próxima
+    vez (o consumidor substitui pelo id), em vez de se perderem.
+
+    Returns:
+        datetime, ou atualizado_desde se não houver credores (None sem nenhum)
+    """
+    maior = db.session.scalar(select(func.max(Credor.atualizado_em)))
+    if maior is None:
+        return atualizado_desde
+    marca = maior - timedelta(seconds=margem_segundos)
+    # Nunca anterior à marca recebida: a carteira não regride entre sincronizações
+    return marca if atualizado_desde is None else max(marca, atualizado_desde)
+
+def _agrupar_por_credor(colunas, credores_ids):
+    """Carrega as linhas filhas dos credores do lote, agrupadas por credor_id."""
+    tabela = colunas[0].class_
+    consulta = select(*colunas).where(tabela.credor_id.in_(credores_ids)).order_by(tabela.id)
+    grupos = defaultdict(list)
+    for linha in db.session.execute(consulta):
+        item = linha._asdict()
+        grupos[item.pop('credor_id')].append(item)
+    return grupos
+
+def _corrigir_valores(precatorios, correcao):
+    """Acrescenta valor_corrigido a todos os precatórios do lote de uma vez."""
+    itens = [item for grupo in precatorios.values() for item in grupo]
+    if not itens:
+        return
+    fatores = correcao.fatores([item['data_publicacao'] for item in itens])
+    for item, fator in zip(itens, fatores):
+        item['valor_corrigido'] = round(item['valor_nominal'] * float(fator), 2)
+
+def exportar_credores(atualizado_desde=None, tamanho_lote=TAMANHO_LOTE_EXPORTACAO, correcao=None):
+    """
+    Gera a carteira como NDJSON, um credor por linha.
+
+    Args:
+        atualizado_desde: se informado, exporta apenas credores com
+            atualizado_em posterior (sincronização incremental)
+        tamanho_lote: quantidade de credores lidos por vez
+        correcao: IndiceCorrecao opcional; acrescenta valor_corrigido aos precatórios
+
+    Yields:
+        str: linha NDJSON com o credor, precatórios, documentos e certidões
+    """
+    consulta = select(*COLUNAS_CREDOR).order_by(Credor.id)
+    atualizado_desde = normalizar_instante(atualizado_desde)
+    if atualizado_desde is not None:
+        consulta = consulta.where(Credor.atualizado_em > atualizado_desde)
+
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho_lote))
+    for lote in resultado.partitions():
+        credores_ids = [linha.id for linha in lote]
+        precatorios = _agrupar_por_credor(COLUNAS_PRECATORIO, credores_ids)
+        if correcao is not None:
+            _corrigir_valores(precatorios, correcao)
+        documentos = _agrupar_por_credor(COLUNAS_DOCUMENTO, credores_ids)
+        certidoes = _agrupar_por_credor(COLUNAS_CERTIDAO, credores_ids)
+
+        for linha in lote:
+            credor = linha._asdict()
+            credor['precatorios'] = precatorios.get(linha.id, [])
+            credor['documentos'] = documentos.get(linha.id, [])
+            credor['certidoes'] = certidoes.get(linha.id, [])
+            yield json.dumps(credor, default=_json_padrao, ensure_ascii=False) + '\n'
@@ -0,0 +1,232 @@
+"""
+Ingestão em lote de credores e precatórios no projeto Mercatório.
+Lê NDJSON ou CSV de forma incremental, valida linha a linha e grava em
+transações agrupadas, produzindo um relatório por linha.
+"""
+import codecs
+import csv
+import json
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.precatorio import Precatorio
+from app.services.agregados import registrar_carga
+
+# Quantidade de linhas gravadas por transação
+TAMANHO_LOTE_PADRAO = 1000
+
+CAMPOS_CREDOR = ('nome', 'cpf_cnpj', 'email', 'telefone')
+CAMPOS_PRECATORIO = ('numero_precatorio', 'valor_nominal', 'foro', 'data_publicacao')
+
+# Erros do banco atribuíveis a uma linha (CPF/CNPJ repetido, valor grande
+# demais para a coluna no PostgreSQL): viram erro da linha, não do lote
+ERROS_DE_LINHA = (IntegrityError, DataError)
+
+class LinhaInvalida(Exception):
+    """Erro de validação de uma linha do lote."""
+
+def ler_ndjson(linhas):
+    """
+    Converte um iterável de linhas NDJSON em dicionários.
+
+    Cada linha segue o mesmo formato de POST /api/credores. Linhas com JSON
+    inválido são repassadas como LinhaInvalida para entrarem no relatório.
+    Linhas em branco são puladas, mas contam na numeração.
+
+    Yields:
+        tuple: (número da linha no arquivo, dict ou LinhaInvalida)
+    """
+    for numero, linha in enumerate(linhas, start=1):
+        if not linha.strip():
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError as e:
+            yield numero, LinhaInvalida(f'JSON inválido: {str(e)}')
+            continue
+        if not isinstance(registro, dict):
+            yield numero, LinhaInvalida('Cada linha deve ser um objeto JSON')
+            continue
+        yield numero, registro
+
+def ler_csv(linhas):
+    """
+    Converte um iterável de linhas CSV (com cabeçalho) em dicionários.
+
+    As colunas do precatório vêm achatadas na mesma linha do credor
+    (numero_precatorio, valor_nominal, foro, data_publicacao).
+
+    Yields:
+        tuple: (número da linha no arquivo, contando o cabeçalho, dict)
+    """
+    texto = codecs.iterdecode(linhas, 'utf-8-sig')
+    leitor = csv.DictReader(texto)
+    for registro in leitor:
+        # line_num: última linha física lida (campos com quebra de linha ocupam várias)
+        yield leitor.line_num, {
+            **{k: registro.get(k) for k in CAMPOS_CREDOR},
+            'precatorio': {k: registro.get(k) for k in CAMPOS_PRECATORIO}
+        }
+
+def validar_registro(registro):
+    """
+    Valida e normaliza um registro de credor com seu precatório.
+
+    Returns:
+        tuple: (dados do credor, dados do precatório)
+
+    Raises:
+        LinhaInvalida: se algum campo estiver ausente ou inválido
+    """
+    if not all(registro.get(k) for k in CAMPOS_CREDOR):
+        raise LinhaInvalida('Dados incompletos para o credor')
+
+    precatorio = registro.get('precatorio')
+    if not isinstance(precatorio, dict) or not all(precatorio.get(k) not in (None, '') for k in CAMPOS_PRECATORIO):
+        raise LinhaInvalida('Dados incompletos para o precatório')
+
+    cpf_cnpj = str(registro['cpf_cnpj']).strip()
+    if len(cpf_cnpj) > 14:
+        raise LinhaInvalida('CPF/CNPJ deve ter no máximo 14 caracteres')
+    # Mesmos limites das colunas: no PostgreSQL o excesso falharia o INSERT
+    for modelo, dados, campo in ((Credor, registro, 'nome'), (Credor, registro, 'email'),
+                                 (Credor, registro, 'telefone'), (Precatorio, precatorio, 'numero_precatorio'),
+                                 (Precatorio, precatorio, 'foro')):
+        limite = modelo.__table__.c[campo].type.length
+        if len(str(dados[campo])) > limite:
+            raise LinhaInvalida(f'{campo} deve ter no máximo {limite} caracteres')
+
+    try:
+        valor_nominal = float(precatorio['valor_nominal'])
+    except (TypeError, ValueError):
+        raise LinhaInvalida('valor_nominal inválido')
+
+    try:
+        data_publicacao = datetime.strptime(str(precatorio['data_publicacao']), '%Y-%m-%d')
+    except ValueError:
+        raise LinhaInvalida('data_publicacao deve estar no formato AAAA-MM-DD')
+
+    credor = {
+        'nome': str(registro['nome']),
+        'cpf_cnpj': cpf_cnpj,
+        'email': str(registro['email']),
+        'telefone': str(registro['telefone'])
+    }
+    dados_precatorio = {
+        'numero_precatorio': str(precatorio['numero_precatorio']),
+        'valor_nominal': valor_nominal,
+        'foro': str(precatorio['foro']),
+        'data_publicacao': data_publicacao
+    }
+    return credor, dados_precatorio
+
+def _gravar_lote(pendentes):
+    """
+    Grava um lote validado em uma única transação.
+
+    Args:
+        pendentes: lista de (linha, dados do credor, dados do precatório)
+
+    Returns:
+        list: resultados por linha
+    """
+    credores_ids = db.session.scalars(
+        insert(Credor).returning(Credor.id, sort_by_parameter_order=True),
+        [credor for _, credor, _ in pendentes]
+    ).all()
+
+    precatorios_ids = db.session.scalars(
+        insert(Precatorio).returning(Precatorio.id, sort_by_parameter_order=True),
+        [{**precatorio, 'credor_id': credor_id}
+         for (_, _, precatorio), credor_id in zip(pendentes, credores_ids)]
+    ).all()
+
+    # INSERT em massa não dispara os eventos do ORM: contabiliza os resumos aqui
+    registrar_carga([precatorio for _, _, precatorio in pendentes])
+    db.session.commit()
+
+    return [
+        {'linha': linha, 'status': 'criado', 'credor_id': credor_id, 'precatorio_id': precatorio_id}
+        for (linha, _, _), credor_id, precatorio_id in zip(pendentes, credores_ids, precatorios_ids)
+    ]
+
+def _gravar_individualmente(pendentes):
+    """Grava linha a linha, usado quando o lote inteiro falha (ex.: corrida de CPF/CNPJ)."""
+    resultados = []
+    for item in pendentes:
+        try:
+            resultados.extend(_gravar_lote([item]))
+        except ERROS_DE_LINHA as e:
+            db.session.rollback()
+            resultados.append({'linha': item[0], 'status': 'erro', 'erro': f'Erro ao cadastrar: {str(e.orig)}'})
+    return resultados
+
+def _processar_lote(pendentes):
+    """Descarta CPF/CNPJ já cadastrados e grava o restante do lote."""
+    existentes = set(db.session.scalars(
+        select(Credor.cpf_cnpj).where(Credor.cpf_cnpj.in_([c['cpf_cnpj'] for _, c, _ in pendentes]))
+    ))
+
+    resultados = []
+    validos = []
+    for item in pendentes:
+        if item[1]['cpf_cnpj'] in existentes:
+            resultados.append({'linha': item[0], 'status': 'erro', 'erro': 'CPF/CNPJ já cadastrado'})
+        else:
+            validos.append(item)
+
+    if validos:
+        try:
+            resultados.extend(_gravar_lote(validos))
+        except ERROS_DE_LINHA:
+            db.session.rollback()
+            resultados.extend(_gravar_individualmente(validos))
+
+    resultados.sort(key=lambda r: r['linha'])
+    return resultados
+
+def ingerir_registros(registros, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Valida e grava registros de forma incremental, em lotes.
+
+    Uma linha inválida gera apenas uma entrada de erro no relatório; as
+    demais linhas do lote continuam sendo gravadas.
+
+    Args:
+        registros: iterável de (número da linha, dict ou LinhaInvalida), como
+            os de ler_ndjson e ler_csv, na ordem de leitura
+        tamanho_lote: quantidade de linhas por transação
+
+    Yields:
+        dict: resultado de cada linha, em ordem
+    """
+    pendentes = []
+    erros = []
+    vistos = set()
+
+    def descarregar():
+        resultados = sorted(erros + (_processar_lote(pendentes) if pendentes else []),
+                            key=lambda r: r['linha'])
+        pendentes.clear()
+        erros.clear()
+        return resultados
+
+    for linha, registro in registros:
+        try:
+            if isinstance(registro, LinhaInvalida):
+                raise registro
+            credor, precatorio = validar_registro(registro)
+            if credor['cpf_cnpj'] in vistos:
+                raise LinhaInvalida('CPF/CNPJ duplicado no lote')
+        except LinhaInvalida as e:
+            erros.append({'linha': linha, 'status': 'erro', 'erro': str(e)})
+        else:
+            vistos.add(credor['cpf_cnpj'])
+            pendentes.append((linha, credor, precatorio))
+
+        if len(pendentes) + len(erros) >= tamanho_lote:
+            yield from descarregar()
+
+    yield from descarregar()
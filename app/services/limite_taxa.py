@@ -0,0 +1,51 @@
+"""
+Limitação de taxa (token bucket) no projeto Mercatório.
+Usada para respeitar a cota de requisições de cada provedor de certidões,
+compartilhada por todas as threads do processo.
+"""
+import threading
+import time
+
+class TokenBucket:
+    """
+    Balde de fichas: `taxa` fichas por segundo, acumulando até `capacidade`.
+
+    A capacidade permite rajadas curtas; em regime, a vazão fica limitada à
+    taxa. Seguro para uso concorrente.
+    """
+
+    def __init__(self, taxa, capacidade=None, relogio=time.monotonic, dormir=time.sleep):
+        if taxa <= 0:
+            raise ValueError('A taxa do token bucket deve ser positiva')
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or max(self.taxa, 1.0))
+        self._relogio = relogio
+        self._dormir = dormir
+        self._fichas = self.capacidade
+        self._ultimo = relogio()
+        self._lock = threading.Lock()
+
+    def tentar_adquirir(self):
+        """
+        Consome uma ficha, se houver.
+
+        Returns:
+            float: 0 se a ficha foi consumida, ou os segundos até haver uma
+        """
+        with self._lock:
+            agora = self._relogio()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+            if self._fichas >= 1:
+                self._fichas -= 1
+                return 0.0
+            return (1 - self._fichas) / self.taxa
+
+    def adquirir(self):
+        """Bloqueia até consumir uma ficha."""
+        while True:
+            espera = self.tentar_adquirir()
+            if not espera:
+                return
+            # Dorme fora do lock para não bloquear as demais threads
+            self._dormir(espera)
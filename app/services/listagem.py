@@ -0,0 +1,119 @@
+"""
+Listagem paginada de credores no projeto Mercatório.
+Usa paginação por cursor (keyset) sobre Credor.id, de forma que o custo de
+cada página independe da posição na tabela.
+"""
+from datetime import datetime
+from sqlalchemy import select
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.precatorio import Precatorio
+from app.models.certidao import Certidao, StatusCertidao
+
+class FiltroInvalido(ValueError):
+    """Parâmetro de filtro ou paginação inválido."""
+
+def _data(valor, nome):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise FiltroInvalido(f'{nome} deve estar no formato AAAA-MM-DD')
+
+def _numero(valor, nome, tipo=float):
+    try:
+        return tipo(valor)
+    except ValueError:
+        raise FiltroInvalido(f'{nome} inválido')
+
+def interpretar_filtros(args):
+    """
+    Converte os parâmetros da requisição em filtros tipados.
+
+    Args:
+        args: MultiDict com os parâmetros da query string
+
+    Returns:
+        dict: filtros presentes (foro, valor_min, valor_max, publicacao_inicio,
+        publicacao_fim, status_certidao)
+
+    Raises:
+        FiltroInvalido: se algum parâmetro não puder ser interpretado
+    """
+    filtros = {}
+    if args.get('foro'):
+        filtros['foro'] = args['foro']
+    if args.get('valor_min'):
+        filtros['valor_min'] = _numero(args['valor_min'], 'valor_min')
+    if args.get('valor_max'):
+        filtros['valor_max'] = _numero(args['valor_max'], 'valor_max')
+    if args.get('publicacao_inicio'):
+        filtros['publicacao_inicio'] = _data(args['publicacao_inicio'], 'publicacao_inicio')
+    if args.get('publicacao_fim'):
+        filtros['publicacao_fim'] = _data(args['publicacao_fim'], 'publicacao_fim')
+    if args.get('status_certidao'):
+        try:
+            filtros['status_certidao'] = StatusCertidao(args['status_certidao'])
+        except ValueError:
+            raise FiltroInvalido('status_certidao inválido')
+    return filtros
+
+def aplicar_filtros(consulta, filtros):
+    """
+    Aplica os filtros de precatório e certidão como subconsultas EXISTS.
+
+    Todos os filtros de precatório precisam ser atendidos pelo mesmo
+    precatório do credor.
+    """
+    condicoes_precatorio = []
+    if 'foro' in filtros:
+        condicoes_precatorio.append(Precatorio.foro == filtros['foro'])
+    if 'valor_min' in filtros:
+        condicoes_precatorio.append(Precatorio.valor_nominal >= filtros['valor_min'])
+    if 'valor_max' in filtros:
+        condicoes_precatorio.append(Precatorio.valor_nominal <= filtros['valor_max'])
+    if 'publicacao_inicio' in filtros:
+        condicoes_precatorio.append(Precatorio.data_publicacao >= filtros['publicacao_inicio'])
+    if 'publicacao_fim' in filtros:
+        condicoes_precatorio.append(Precatorio.data_publicacao <= filtros['publicacao_fim'])
+
+    if condicoes_precatorio:
+        consulta = consulta.where(
+            select(Precatorio.id)
+            .where(Precatorio.credor_id == Credor.id, *condicoes_precatorio)
+            .exists()
+        )
+
+    if 'status_certidao' in filtros:
+        consulta = consulta.where(
+            select(Certidao.id)
+            .where(Certidao.credor_id == Credor.id, Certidao.status == filtros['status_certidao'])
+            .exists()
+        )
+
+    return consulta
+
+def listar_credores(filtros, cursor=None, limite=50):
+    """
+    Retorna uma página de credores ordenada por id.
+
+    Args:
+        filtros: dicionário produzido por interpretar_filtros
+        cursor: último id da página anterior (None para a primeira página)
+        limite: tamanho da página
+
+    Returns:
+        tuple: (lista de credores, próximo cursor ou None)
+    """
+    consulta = aplicar_filtros(select(Credor), filtros)
+    if cursor is not None:
+        consulta = consulta.where(Credor.id > cursor)
+
+    # Busca um registro a mais para saber se existe próxima página
+    credores = db.session.scalars(consulta.order_by(Credor.id).limit(limite + 1)).all()
+
+    proximo_cursor = None
+    if len(credores) > limite:
+        credores = credores[:limite]
+        proximo_cursor = credores[-1].id
+
+    return credores, proximo_cursor
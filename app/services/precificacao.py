@@ -0,0 +1,210 @@
+"""
+Precificação vetorizada da carteira de precatórios no projeto Mercatório.
+Os precatórios são carregados em arrays colunares (NumPy) e o preço de
+compra descontado de todos eles é calculado de uma vez, sem laço em
+Python por precatório, para cada cenário de curva de juros e de prazos de
+pagamento por foro.
+"""
+from datetime import date
+import numpy as np
+from sqlalchemy import select
+from app.extensions import db
+from app.models.precatorio import Precatorio
+from app.services.correcao import IndiceDesconhecido, obter_indice
+
+# Prazo entre a publicação e o pagamento quando o foro não tem tabela própria
+ATRASO_PADRAO_MESES = 24
+DIAS_POR_ANO = 365.25
+TAMANHO_LOTE_CARGA = 10000
+
+class CenarioInvalido(ValueError):
+    """Curva de desconto ou tabela de prazos mal formada."""
+
+class CarteiraColunar:
+    """
+    Precatórios em arrays paralelos, um elemento por precatório.
+
+    O foro é guardado como categoria: `foros` tem os nomes distintos e
+    `indices_foro` aponta, para cada precatório, a posição do seu foro.
+    """
+
+    def __init__(self, ids, credores_ids, valores, datas_publicacao, foros, indices_foro):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.credores_ids = np.asarray(credores_ids, dtype=np.int64)
+        self.valores = np.asarray(valores, dtype=np.float64)
+        self.datas_publicacao = np.asarray(datas_publicacao, dtype='datetime64[D]')
+        self.foros = list(foros)
+        self.indices_foro = np.asarray(indices_foro, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.ids)
+
+def carregar_carteira(precatorios_ids=None, tamanho_lote=TAMANHO_LOTE_CARGA):
+    """
+    Lê os precatórios (só as colunas necessárias) para uma CarteiraColunar.
+
+    Args:
+        precatorios_ids: se informado, carrega apenas esses precatórios
+        tamanho_lote: linhas lidas por vez do cursor
+
+    Returns:
+        CarteiraColunar
+    """
+    consulta = select(Precatorio.id, Precatorio.credor_id, Precatorio.valor_nominal,
+                      Precatorio.data_publicacao, Precatorio.foro).order_by(Precatorio.id)
+    if precatorios_ids is not None:
+        consulta = consulta.where(Precatorio.id.in_(precatorios_ids))
+
+    codigos_foro = {}
+    partes = []
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamanho_lote))
+    for lote in resultado.partitions():
+        ids, credores_ids, valores, datas, foros = zip(*lote)
+        partes.append((
+            np.array(ids, dtype=np.int64),
+            np.array(credores_ids, dtype=np.int64),
+            np.array(valores, dtype=np.float64),
+            np.array([d.date() for d in datas], dtype='datetime64[D]'),
+            np.array([codigos_foro.setdefault(f, len(codigos_foro)) for f in foros], dtype=np.intp)
+        ))
+
+    if not partes:
+        vazio = np.array([], dtype=np.int64)
+        return CarteiraColunar(vazio, vazio, vazio, vazio, [], vazio)
+
+    ids, credores_ids, valores, datas, indices_foro = (np.concatenate(coluna) for coluna in zip(*partes))
+    return CarteiraColunar(ids, credores_ids, valores, datas, list(codigos_foro), indices_foro)
+
+class CurvaDesconto:
+    """Taxas anuais (juros compostos) por prazo em anos, interpoladas linearmente."""
+
+    def __init__(self, prazos_anos, taxas):
+        self.prazos_anos = np.asarray(prazos_anos, dtype=np.float64)
+        self.taxas = np.asarray(taxas, dtype=np.float64)
+        if self.prazos_anos.ndim != 1 or not len(self.prazos_anos) or self.prazos_anos.shape != self.taxas.shape:
+            raise CenarioInvalido('A curva precisa de listas prazos_anos e taxas não vazias e de mesmo tamanho')
+        if np.any(np.diff(self.prazos_anos) <= 0):
+            raise CenarioInvalido('prazos_anos da curva deve ser estritamente crescente')
+        if np.any(self.taxas <= -1):
+            raise CenarioInvalido('As taxas da curva devem ser maiores que -1')
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Aceita {'taxa': 0.12} (curva plana) ou {'prazos_anos': [...], 'taxas': [...]}."""
+        if not isinstance(dados, dict):
+            raise CenarioInvalido('curva deve ser um objeto')
+        try:
+            if 'taxa' in dados:
+                prazos, taxas = [0.0], [float(dados['taxa'])]
+            else:
+                prazos, taxas = [float(p) for p in dados['prazos_anos']], [float(t) for t in dados['taxas']]
+        except (KeyError, TypeError, ValueError):
+            raise CenarioInvalido('curva deve ter taxa ou prazos_anos e taxas numéricos')
+        return cls(prazos, taxas)
+
+    def fatores(self, prazos_anos):
+        """Fator de desconto (1 + taxa(prazo)) ** -prazo para cada prazo."""
+        taxas = np.interp(prazos_anos, self.prazos_anos, self.taxas)
+        return np.power(1.0 + taxas, -prazos_anos)
+
+class TabelaAtrasos:
+    """Meses entre a publicação e o pagamento, por foro."""
+
+    def __init__(self, atrasos_por_foro=None, atraso_padrao_meses=ATRASO_PADRAO_MESES):
+        try:
+            self.atrasos_por_foro = {str(f): float(m) for f, m in (atrasos_por_foro or {}).items()}
+            self.atraso_padrao_meses = float(atraso_padrao_meses)
+        except (AttributeError, TypeError, ValueError):
+            raise CenarioInvalido('atrasos_por_foro deve mapear foros para números de meses')
+        if self.atraso_padrao_meses < 0 or any(m < 0 for m in self.atrasos_por_foro.values()):
+            raise CenarioInvalido('Os atrasos de pagamento não podem ser negativos')
+
+    def meses(self, foros):
+        """Atraso de cada foro da lista, na mesma ordem."""
+        return np.array([self.atrasos_por_foro.get(f, self.atraso_padrao_meses) for f in foros],
+                        dtype=np.float64)
+
+class Cenario:
+    """
+    Combinação de curva de desconto e prazos de pagamento a precificar, com
+    correção monetária opcional do valor nominal até a data-base.
+    """
+
+    def __init__(self, nome, curva, atrasos, correcao=None):
+        self.nome = nome
+        self.curva = curva
+        self.atrasos = atrasos
+        self.correcao = correcao
+
+    @classmethod
+    def de_dict(cls, dados, nome_padrao='base'):
+        if not isinstance(dados, dict):
+            raise CenarioInvalido('Cada cenário deve ser um objeto')
+        if 'curva' not in dados:
+            raise CenarioInvalido('Cenário sem curva de desconto')
+        correcao = None
+        if dados.get('indice_correcao'):
+            try:
+                correcao = obter_indice(dados['indice_correcao'])
+            except IndiceDesconhecido as e:
+                raise CenarioInvalido(str(e))
+        return cls(
+            str(dados.get('nome', nome_padrao)),
+            CurvaDesconto.de_dict(dados['curva']),
+            TabelaAtrasos(dados.get('atrasos_por_foro'), dados.get('atraso_padrao_meses', ATRASO_PADRAO_MESES)),
+            correcao
+        )
+
+def precificar(carteira, cenario, data_base=None):
+    """
+    Calcula o preço descontado de todos os precatórios da carteira.
+
+    O pagamento é estimado em data_publicacao + atraso do foro; o valor
+    nominal (corrigido da publicação até data_base, se o cenário tiver
+    índice de correção) é trazido a data_base pela curva no prazo até o
+    pagamento (pagamentos já vencidos têm prazo zero).
+
+    Returns:
+        dict: arrays 'datas_pagamento', 'prazos_anos', 'valores_corrigidos' e 'precos'
+    """
+    data_base = np.datetime64(data_base or date.today(), 'D')
+    valores = carteira.valores
+    if cenario.correcao is not None:
+        valores = valores * cenario.correcao.fatores(carteira.datas_publicacao, data_base)
+    atrasos_dias = np.rint(cenario.atrasos.meses(carteira.foros) * (DIAS_POR_ANO / 12)).astype('timedelta64[D]')
+    datas_pagamento = carteira.datas_publicacao + atrasos_dias[carteira.indices_foro]
+    prazos_anos = np.maximum((datas_pagamento - data_base).astype(np.float64) / DIAS_POR_ANO, 0.0)
+    return {
+        'datas_pagamento': datas_pagamento,
+        'prazos_anos': prazos_anos,
+        'valores_corrigidos': valores,
+        'precos': valores * cenario.curva.fatores(prazos_anos)
+    }
+
+def resumir_precificacao(carteira, cenario, resultado, detalhar=False):
+    """
+    Monta a resposta de um cenário: totais da carteira e, opcionalmente, o
+    preço de cada precatório.
+    """
+    valor_corrigido_total = float(resultado['valores_corrigidos'].sum())
+    preco_total = float(resultado['precos'].sum())
+    resumo = {
+        'nome': cenario.nome,
+        'quantidade': len(carteira),
+        'indice_correcao': cenario.correcao.nome if cenario.correcao else None,
+        'valor_nominal_total': round(float(carteira.valores.sum()), 2),
+        'valor_corrigido_total': round(valor_corrigido_total, 2),
+        'preco_total': round(preco_total, 2),
+        # Desconto sobre o valor corrigido (igual ao nominal quando não há correção)
+        'desconto_medio': round(1 - preco_total / valor_corrigido_total, 6) if valor_corrigido_total else None
+    }
+    if detalhar:
+        resumo['itens'] = [
+            {'precatorio_id': int(i), 'credor_id': int(c), 'valor_nominal': float(v),
+             'valor_corrigido': round(float(vc), 2), 'data_pagamento_estimada': str(d),
+             'prazo_anos': round(float(p), 4), 'preco': round(float(x), 2)}
+            for i, c, v, vc, d, p, x in zip(carteira.ids, carteira.credores_ids, carteira.valores,
+                                            resultado['valores_corrigidos'], resultado['datas_pagamento'],
+                                            resultado['prazos_anos'], resultado['precos'])
+        ]
+    return resumo
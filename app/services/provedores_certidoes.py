@@ -0,0 +1,317 @@
+"""
+Cliente dos emissores de certidões no projeto Mercatório.
+Cada tipo de certidão (federal, estadual, municipal, trabalhista) vem de um
+provedor próprio, com URL e timeouts configuráveis. As consultas de um
+credor são feitas em paralelo em um pool de threads, sobre uma sessão HTTP
+com conexões keep-alive reaproveitadas: a latência total passa a ser a do
+provedor mais lento, não a soma de todos. As respostas passam pelo cache
+de app/services/cache_provedores.py.
+
+Provedores com endpoint de lote (`url_lote`) recebem as consultas agrupadas:
+as pendentes de todos os chamadores (job e buscas interativas) seguem em
+uma única requisição ao atingir o tamanho máximo do lote ou a espera máxima.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from app.models.certidao import TipoCertidao
+from app.services.limite_taxa import TokenBucket
+from app.services.cache_provedores import CacheRespostas, MAX_ITENS_PADRAO, TTL_NEGATIVO_PADRAO
+
+URL_PADRAO = 'http://localhost:5000/api/certidoes'
+# (conexão, leitura) em segundos
+TIMEOUT_PADRAO = (3.05, 15)
+TAMANHO_LOTE_PADRAO = 100
+ESPERA_LOTE_PADRAO = 0.05
+
+class Provedor:
+    """
+    Emissor de um tipo de certidão.
+
+    Com `taxa` (requisições por segundo), as consultas passam por um token
+    bucket próprio do provedor, com rajada de até `rajada` requisições (um
+    lote conta como uma requisição). Com `url_lote`, as consultas são
+    agrupadas em lotes de até `tamanho_lote` CPFs/CNPJs, esperando no máximo
+    `espera_lote` segundos para completar um lote.
+    """
+
+    def __init__(self, tipo, url=URL_PADRAO, timeout=TIMEOUT_PADRAO, taxa=None, rajada=None,
+                 url_lote=None, tamanho_lote=TAMANHO_LOTE_PADRAO, espera_lote=ESPERA_LOTE_PADRAO):
+        self.tipo = tipo
+        self.url = url
+        self.timeout = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        self.limitador = TokenBucket(taxa, rajada) if taxa else None
+        self.url_lote = url_lote
+        self.tamanho_lote = tamanho_lote
+        self.espera_lote = espera_lote
+
+    def consultar(self, sessao, cpf_cnpj):
+        """
+        Consulta o provedor e devolve apenas as certidões do seu tipo.
+
+        Raises:
+            requests.RequestException ou ValueError em falha de rede, timeout,
+            status HTTP de erro ou resposta inválida
+        """
+        if self.limitador is not None:
+            self.limitador.adquirir()
+        response = sessao.get(self.url, params={'cpf_cnpj': cpf_cnpj, 'tipo': self.tipo.value},
+                              timeout=self.timeout)
+        if response.status_code >= 400:
+            raise requests.HTTPError(f'HTTP {response.status_code}')
+        return [c for c in response.json().get('certidoes', []) if c.get('tipo') == self.tipo.value]
+
+    def consultar_lote(self, sessao, cpfs_cnpjs):
+        """
+        Consulta vários CPFs/CNPJs em uma única requisição ao endpoint de lote.
+
+        Returns:
+            dict: CPF/CNPJ -> certidões do tipo do provedor
+
+        Raises:
+            requests.RequestException ou ValueError se o lote inteiro falhar
+        """
+        if self.limitador is not None:
+            self.limitador.adquirir()
+        response = sessao.post(self.url_lote, json={'cpfs_cnpjs': list(cpfs_cnpjs), 'tipo': self.tipo.value},
+                               timeout=self.timeout)
+        if response.status_code >= 400:
+            raise requests.HTTPError(f'HTTP {response.status_code}')
+        resultados = response.json().get('resultados', {})
+        return {
+            cpf_cnpj: [c for c in resultados.get(cpf_cnpj, []) if c.get('tipo') == self.tipo.value]
+            for cpf_cnpj in cpfs_cnpjs
+        }
+
+class AgrupadorLotes:
+    """
+    Junta as consultas pendentes de um provedor com endpoint de lote.
+
+    Uma thread envia o lote quando ele atinge o tamanho máximo ou quando a
+    consulta mais antiga já esperou `espera_lote` segundos. Consultas do
+    mesmo CPF/CNPJ pendentes ou em andamento compartilham o mesmo Future.
+    """
+
+    def __init__(self, provedor, sessao):
+        self.provedor = provedor
+        self.sessao = sessao
+        self._pendentes = {}
+        self._em_andamento = {}
+        self._primeira_pendente = None
+        self._condicao = threading.Condition()
+        self._thread = None
+
+    def enviar(self, cpf_cnpj):
+        """
+        Agenda a consulta do CPF/CNPJ no próximo lote.
+
+        Returns:
+            tuple: (Future com a lista de certidões, se a consulta é nova)
+        """
+        with self._condicao:
+            futuro = self._pendentes.get(cpf_cnpj) or self._em_andamento.get(cpf_cnpj)
+            if futuro is not None:
+                return futuro, False
+            futuro = self._pendentes[cpf_cnpj] = Future()
+            if len(self._pendentes) == 1:
+                self._primeira_pendente = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True,
+                                                name=f'lote-{self.provedor.tipo.value}')
+                self._thread.start()
+            self._condicao.notify()
+            return futuro, True
+
+    def _proximo_lote(self):
+        with self._condicao:
+            while not self._pendentes:
+                self._condicao.wait()
+            while len(self._pendentes) < self.provedor.tamanho_lote:
+                restante = self._primeira_pendente + self.provedor.espera_lote - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicao.wait(restante)
+            lote = dict(list(self._pendentes.items())[:self.provedor.tamanho_lote])
+            for cpf_cnpj in lote:
+                del self._pendentes[cpf_cnpj]
+            self._em_andamento.update(lote)
+            # O que sobrou já esperou: segue no próximo lote sem nova espera
+            return lote
+
+    def _executar(self):
+        while True:
+            lote = self._proximo_lote()
+            try:
+                resultados = self.provedor.consultar_lote(self.sessao, list(lote))
+            except Exception as e:
+                resultados, erro = {}, e
+            else:
+                erro = None
+            with self._condicao:
+                for cpf_cnpj in lote:
+                    del self._em_andamento[cpf_cnpj]
+            for cpf_cnpj, futuro in lote.items():
+                if erro is not None:
+                    futuro.set_exception(erro)
+                else:
+                    futuro.set_result(resultados[cpf_cnpj])
+
+class ResultadoConsulta:
+    """Certidões obtidas e erros por tipo de uma consulta a todos os provedores."""
+
+    def __init__(self):
+        self.certidoes = []
+        self.erros = {}
+
+    @property
+    def falhou(self):
+        """Verdadeiro quando nenhum provedor respondeu."""
+        return not self.certidoes and bool(self.erros)
+
+def montar_provedores(config):
+    """
+    Monta os provedores a partir da configuração.
+
+    CERTIDOES_PROVEDORES pode sobrescrever, por tipo, 'url', 'timeout'
+    (segundos ou [conexão, leitura]), 'taxa' (requisições/s), 'rajada',
+    'url_lote', 'tamanho_lote' e 'espera_lote'; os demais usam
+    CERTIDOES_API_URL, CERTIDOES_TIMEOUT, CERTIDOES_TAXA (sem limite quando
+    None), CERTIDOES_LOTE_URL (sem lotes quando None), CERTIDOES_LOTE_TAMANHO
+    e CERTIDOES_LOTE_ESPERA.
+    """
+    sobrescritas = config.get('CERTIDOES_PROVEDORES') or {}
+    return [
+        Provedor(tipo, **{
+            'url': config.get('CERTIDOES_API_URL', URL_PADRAO),
+            'timeout': config.get('CERTIDOES_TIMEOUT', TIMEOUT_PADRAO),
+            'taxa': config.get('CERTIDOES_TAXA'),
+            'url_lote': config.get('CERTIDOES_LOTE_URL'),
+            'tamanho_lote': config.get('CERTIDOES_LOTE_TAMANHO', TAMANHO_LOTE_PADRAO),
+            'espera_lote': config.get('CERTIDOES_LOTE_ESPERA', ESPERA_LOTE_PADRAO),
+            **sobrescritas.get(tipo.value, {})
+        })
+        for tipo in TipoCertidao
+    ]
+
+class _EstadoCliente:
+    def __init__(self, provedores, max_conexoes, cache):
+        self.provedores = provedores
+        self.cache = cache
+        self.sessao = requests.Session()
+        # Um pool keep-alive por host, com conexões suficientes para as threads
+        adaptador = HTTPAdapter(pool_connections=len(provedores), pool_maxsize=max_conexoes)
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+        self.executor = ThreadPoolExecutor(max_workers=max_conexoes, thread_name_prefix='certidoes')
+        self.agrupadores = {p.tipo: AgrupadorLotes(p, self.sessao) for p in provedores if p.url_lote}
+
+class ClienteCertidoes:
+    """Extensão Flask que consulta todos os provedores de certidões em paralelo."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CERTIDOES_API_URL', URL_PADRAO)
+        app.config.setdefault('CERTIDOES_TIMEOUT', TIMEOUT_PADRAO)
+        app.config.setdefault('CERTIDOES_PROVEDORES', {})
+        app.config.setdefault('CERTIDOES_TAXA', None)
+        app.config.setdefault('CERTIDOES_MAX_CONEXOES', 16)
+        app.config.setdefault('CERTIDOES_LOTE_URL', None)
+        app.config.setdefault('CERTIDOES_LOTE_TAMANHO', TAMANHO_LOTE_PADRAO)
+        app.config.setdefault('CERTIDOES_LOTE_ESPERA', ESPERA_LOTE_PADRAO)
+        app.config.setdefault('CERTIDOES_CACHE_TTL', {})
+        app.config.setdefault('CERTIDOES_CACHE_TTL_NEGATIVO', TTL_NEGATIVO_PADRAO)
+        app.config.setdefault('CERTIDOES_CACHE_MAX_ITENS', MAX_ITENS_PADRAO)
+        app.extensions['cliente_certidoes'] = _EstadoCliente(
+            montar_provedores(app.config),
+            app.config['CERTIDOES_MAX_CONEXOES'],
+            CacheRespostas(app.config['CERTIDOES_CACHE_TTL'], app.config['CERTIDOES_CACHE_TTL_NEGATIVO'],
+                           app.config['CERTIDOES_CACHE_MAX_ITENS'])
+        )
+
+    @property
+    def _estado(self):
+        return current_app.extensions['cliente_certidoes']
+
+    def _consultar(self, estado, provedor, cpf_cnpj):
+        """Future com as certidões de um provedor: do cache, de um lote ou de uma consulta avulsa."""
+        em_cache = estado.cache.obter(provedor.tipo, cpf_cnpj)
+        if em_cache is not None:
+            futuro = Future()
+            certidoes, erro = em_cache
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(certidoes)
+            return futuro
+
+        agrupador = estado.agrupadores.get(provedor.tipo)
+        if agrupador is None:
+            return estado.executor.submit(estado.cache.consultar, provedor.tipo, cpf_cnpj,
+                                          partial(provedor.consultar, estado.sessao, cpf_cnpj))
+
+        futuro, nova = agrupador.enviar(cpf_cnpj)
+        if nova:
+            estado.cache.contar(provedor.tipo, 'chamadas')
+
+            def guardar(concluido):
+                erro = concluido.exception()
+                estado.cache.guardar(provedor.tipo, cpf_cnpj, None if erro else concluido.result(), erro)
+            futuro.add_done_callback(guardar)
+        return futuro
+
+    def buscar_varios(self, consultas):
+        """
+        Consulta vários credores de uma vez: tudo é disparado antes de
+        aguardar, para que os provedores com endpoint de lote recebam as
+        consultas agrupadas.
+
+        Args:
+            consultas: dict CPF/CNPJ -> tipos a consultar (None = todos)
+
+        Returns:
+            dict: CPF/CNPJ -> ResultadoConsulta
+        """
+        estado = self._estado
+        futuros = {
+            cpf_cnpj: {p.tipo: self._consultar(estado, p, cpf_cnpj)
+                       for p in estado.provedores if tipos is None or p.tipo in tipos}
+            for cpf_cnpj, tipos in consultas.items()
+        }
+
+        resultados = {}
+        for cpf_cnpj, por_tipo in futuros.items():
+            resultado = resultados[cpf_cnpj] = ResultadoConsulta()
+            for tipo, futuro in por_tipo.items():
+                try:
+                    resultado.certidoes.extend(futuro.result())
+                except Exception as e:
+                    resultado.erros[tipo.value] = str(e)
+        return resultados
+
+    def buscar(self, cpf_cnpj, tipos=None):
+        """
+        Consulta, em paralelo, os provedores dos tipos pedidos (padrão: todos).
+
+        Falhas de um provedor não interrompem os demais: ficam em
+        ResultadoConsulta.erros, indexadas pelo tipo. Respostas recentes (e
+        falhas muito recentes) vêm do cache, sem nova chamada ao provedor.
+
+        Returns:
+            ResultadoConsulta
+        """
+        return self.buscar_varios({cpf_cnpj: tipos})[cpf_cnpj]
+
+    def invalidar_cache(self, cpf_cnpj, tipos=None):
+        self._estado.cache.invalidar(cpf_cnpj, tipos)
+
+    def estatisticas_cache(self):
+        return self._estado.cache.estatisticas()
+
+cliente_certidoes = ClienteCertidoes()
@@ -0,0 +1,219 @@
+"""
+Fila de tarefas persistente no projeto Mercatório.
+Rotas que dependem de serviços externos lentos (ex.: emissores de
+certidões) só registram uma tarefa e respondem 202; um processo worker
+(`flask tarefas worker`) a executa fora da requisição, com novas
+tentativas e espera exponencial entre elas. A reserva de uma tarefa é uma
+UPDATE condicional, então vários workers podem consumir a mesma fila.
+"""
+import random
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, select, update
+from app.extensions import db
+from app.models.tarefa import StatusTarefa, Tarefa
+from app.services.coordenacao import identificador_no
+
+MAX_TENTATIVAS_PADRAO = 5
+BACKOFF_BASE_PADRAO = 10
+BACKOFF_MAXIMO_PADRAO = 600
+TIMEOUT_RESERVA_PADRAO = 300
+
+# tipo -> função que executa a tarefa
+_executores = {}
+
+class TipoTarefaDesconhecido(LookupError):
+    """Tarefa sem executor registrado."""
+
+def tarefa(tipo):
+    """
+    Registra a função que executa as tarefas de `tipo`.
+
+    A função recebe os parâmetros da tarefa como argumentos nomeados, usa a
+    sessão atual (o worker faz o commit junto com o desfecho, se ela não o
+    fizer antes) e retorna um resultado serializável em JSON. Uma exceção
+    conta como falha da tentativa.
+    """
+    def registrar(funcao):
+        _executores[tipo] = funcao
+        return funcao
+    return registrar
+
+def enfileirar(tipo, max_tentativas=None, **parametros):
+    """
+    Registra uma tarefa para execução pelo worker.
+
+    Returns:
+        Tarefa
+    """
+    if tipo not in _executores:
+        raise TipoTarefaDesconhecido(tipo)
+    nova = Tarefa(
+        tipo=tipo,
+        parametros=parametros,
+        status=StatusTarefa.PENDENTE,
+        tentativas=0,
+        max_tentativas=max_tentativas or current_app.config.get('TAREFAS_MAX_TENTATIVAS', MAX_TENTATIVAS_PADRAO),
+        disponivel_em=datetime.utcnow()
+    )
+    db.session.add(nova)
+    db.session.commit()
+    return nova
+
+def calcular_backoff(tentativas, base=BACKOFF_BASE_PADRAO, maximo=BACKOFF_MAXIMO_PADRAO, aleatorio=random):
+    """Espera antes da próxima tentativa: base * 2^(n-1), limitada, com jitter de ±20%."""
+    espera = min(base * 2 ** (tentativas - 1), maximo)
+    return timedelta(seconds=espera * aleatorio.uniform(0.8, 1.2))
+
+def reservar_proxima(worker=None, agora=None):
+    """
+    Reserva a próxima tarefa disponível para `worker`.
+
+    Também retoma tarefas em execução cuja reserva passou do timeout
+    (worker encerrado no meio da execução).
+
+    Returns:
+        Tarefa ou None se a fila estiver vazia
+    """
+    worker = worker or identificador_no()
+    agora = agora or datetime.utcnow()
+    reserva_vencida = agora - timedelta(seconds=current_app.config.get('TAREFAS_TIMEOUT_SEGUNDOS',
+                                                                       TIMEOUT_RESERVA_PADRAO))
+    reserva_abandonada = (Tarefa.status == StatusTarefa.EXECUTANDO) & (Tarefa.reservada_em < reserva_vencida)
+    # Worker morto na última tentativa: a tarefa falha em vez de ser retomada sem fim
+    db.session.execute(
+        update(Tarefa)
+        .where(reserva_abandonada, Tarefa.tentativas >= Tarefa.max_tentativas)
+        .values(status=StatusTarefa.FALHOU, concluida_em=agora, reservada_por=None, reservada_em=None,
+                erro='Reserva vencida na última tentativa (worker encerrado durante a execução)')
+        .execution_options(synchronize_session=False)
+    )
+    disponivel = or_(
+        (Tarefa.status == StatusTarefa.PENDENTE) & (Tarefa.disponivel_em <= agora),
+        reserva_abandonada & (Tarefa.tentativas < Tarefa.max_tentativas)
+    )
+    while True:
+        candidata = db.session.execute(
+            select(Tarefa.id, Tarefa.status, Tarefa.reservada_em)
+            .where(disponivel)
+            .order_by(Tarefa.disponivel_em, Tarefa.id)
+            .limit(1)
+        ).first()
+        if candidata is None:
+            db.session.commit()
+            return None
+
+        # Só um worker consegue trocar o estado que acabou de ser lido
+        resultado = db.session.execute(
+            update(Tarefa)
+            .where(Tarefa.id == candidata.id, Tarefa.status == candidata.status,
+                   Tarefa.reservada_em.is_(None) if candidata.reservada_em is None
+                   else Tarefa.reservada_em == candidata.reservada_em)
+            .values(status=StatusTarefa.EXECUTANDO, reservada_por=worker, reservada_em=agora,
+                    tentativas=Tarefa.tentativas + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if resultado.rowcount == 1:
+            return db.session.get(Tarefa, candidata.id, populate_existing=True)
+
+def _registrar_desfecho(tarefa_id, reserva, **valores):
+    """
+    Grava o desfecho só se a reserva ainda for deste worker: se ela venceu e
+    outro worker retomou a tarefa, o desfecho é dele.
+
+    Returns:
+        bool: se o desfecho foi gravado
+    """
+    resultado = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == tarefa_id, Tarefa.status == StatusTarefa.EXECUTANDO,
+               Tarefa.reservada_por == reserva[0], Tarefa.reservada_em == reserva[1])
+        .values(reservada_por=None, reservada_em=None, **valores)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 1:
+        db.session.commit()
+        return True
+    db.session.rollback()
+    print(f"[TAREFAS] Tarefa {tarefa_id} retomada por outro worker; desfecho descartado")
+    return False
+
+def executar(tarefa_reservada, agora=None):
+    """
+    Executa uma tarefa já reservada e registra o desfecho.
+
+    Em caso de falha, a tarefa volta para a fila após o backoff, até
+    esgotar max_tentativas.
+    """
+    tarefa_id = tarefa_reservada.id
+    # Valores da reserva lidos antes: um rollback expira o objeto
+    reserva = (tarefa_reservada.reservada_por, tarefa_reservada.reservada_em)
+    tentativas, max_tentativas, tipo = tarefa_reservada.tentativas, tarefa_reservada.max_tentativas, tarefa_reservada.tipo
+    try:
+        executor = _executores.get(tipo)
+        if executor is None:
+            raise TipoTarefaDesconhecido(tipo)
+        resultado = executor(**tarefa_reservada.parametros)
+    except Exception as e:
+        db.session.rollback()
+        erro = f'{type(e).__name__}: {e}'
+        agora = agora or datetime.utcnow()
+        if tentativas >= max_tentativas:
+            desfecho = {'status': StatusTarefa.FALHOU, 'concluida_em': agora}
+        else:
+            config = current_app.config
+            desfecho = {'status': StatusTarefa.PENDENTE, 'disponivel_em': agora + calcular_backoff(
+                tentativas,
+                config.get('TAREFAS_BACKOFF_SEGUNDOS', BACKOFF_BASE_PADRAO),
+                config.get('TAREFAS_BACKOFF_MAXIMO', BACKOFF_MAXIMO_PADRAO)
+            )}
+        if _registrar_desfecho(tarefa_id, reserva, erro=erro, **desfecho):
+            print(f"[TAREFAS] Tarefa {tarefa_id} ({tipo}) falhou na tentativa {tentativas}: {erro}")
+            if current_app.debug:
+                traceback.print_exc()
+        return db.session.get(Tarefa, tarefa_id, populate_existing=True)
+
+    _registrar_desfecho(tarefa_id, reserva, status=StatusTarefa.CONCLUIDA, resultado=resultado, erro=None,
+                        concluida_em=datetime.utcnow())
+    return db.session.get(Tarefa, tarefa_id, populate_existing=True)
+
+def processar_pendentes(worker=None, limite=None):
+    """
+    Executa as tarefas disponíveis até a fila esvaziar (ou `limite` tarefas).
+
+    Returns:
+        int: tarefas executadas
+    """
+    executadas = 0
+    while limite is None or executadas < limite:
+        proxima = reservar_proxima(worker)
+        if proxima is None:
+            break
+        executar(proxima)
+        executadas += 1
+    return executadas
+
+def executar_worker(intervalo_ocioso=1.0, parar=None):
+    """Consome a fila indefinidamente (ou até parar() retornar True)."""
+    worker = identificador_no()
+    print(f"[TAREFAS] Worker {worker} aguardando tarefas...")
+    while parar is None or not parar():
+        if not processar_pendentes(worker):
+            time.sleep(intervalo_ocioso)
+
+def serializar_tarefa(t):
+    return {
+        'id': t.id,
+        'tipo': t.tipo,
+        'status': t.status.value,
+        'tentativas': t.tentativas,
+        'max_tentativas': t.max_tentativas,
+        'resultado': t.resultado,
+        'erro': t.erro,
+        'criada_em': t.criada_em.isoformat() if t.criada_em else None,
+        'disponivel_em': t.disponivel_em.isoformat() if t.disponivel_em else None,
+        'concluida_em': t.concluida_em.isoformat() if t.concluida_em else None
+    }
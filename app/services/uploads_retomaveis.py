@@ -0,0 +1,340 @@
+"""
+Uploads retomáveis no projeto Mercatório (protocolo tus 1.0: creation,
+HEAD e PATCH, mais termination).
+Arquivos grandes (processos, dossiês digitalizados) são enviados em partes:
+cada PATCH acrescenta bytes a UPLOAD_FOLDER/.parciais/<id> a partir do
+offset confirmado, lendo a requisição em blocos, sem juntar o arquivo em
+memória. Se a conexão cair, o que chegou ao disco é confirmado e o cliente
+continua do offset informado pelo HEAD. Tipo e extensão são validados uma
+vez, ao completar, quando o arquivo vai para o armazenamento por hash e o
+documento ou a certidão é criado.
+"""
+import base64
+import binascii
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, select, update
+from werkzeug.exceptions import ClientDisconnected
+from app.extensions import db, cache_credores
+from app.models.certidao import OrigemCertidao, StatusCertidao, TipoCertidao
+from app.models.documento_pessoal import DocumentoPessoal, TipoDocumento
+from app.models.upload_retomavel import DestinoUpload, UploadRetomavel
+from app.services.arquivos import armazenamento_arquivos, calcular_hash_arquivo
+from app.services.certidoes import registrar_certidao
+from app.services.derivados import gerador_derivados
+from app.utils.uploads import TAMANHO_BLOCO
+from app.utils.validacao_arquivos import (TAMANHO_AMOSTRA_MIME, TIPOS_PERMITIDOS, detectar_tipo_mime,
+                                          mensagem_tamanho_excedido, verificar_tipo_mime)
+
+PASTA_PARCIAIS = '.parciais'
+TAMANHO_MAXIMO_PADRAO = 500 * 1024 * 1024
+TIMEOUT_RECEBIMENTO_PADRAO = 60
+# A reserva do PATCH é renovada a cada fração do timeout, enquanto chegam blocos
+FRACAO_RENOVACAO = 3
+VALIDADE_HORAS_PADRAO = 24
+
+class UploadNaoEncontrado(LookupError):
+    """Upload inexistente (ou já removido pela limpeza)."""
+
+class UploadEncerrado(Exception):
+    """Upload já concluído ou recusado: não aceita mais partes."""
+
+class UploadInvalido(ValueError):
+    """Pedido ou arquivo recusado; a mensagem vai para o cliente."""
+
+class UploadGrandeDemais(UploadInvalido):
+    """Upload-Length acima do limite."""
+
+class ConflitoOffset(Exception):
+    """Upload-Offset diferente do confirmado, ou outro PATCH em andamento."""
+
+    def __init__(self, recebido):
+        super().__init__(f'offset atual: {recebido}')
+        self.recebido = recebido
+
+def interpretar_metadados(cabecalho):
+    """
+    Upload-Metadata do tus: pares "chave valor_base64" separados por vírgula.
+
+    Raises:
+        UploadInvalido: valor que não é base64
+    """
+    metadados = {}
+    for par in (cabecalho or '').split(','):
+        if not par.strip():
+            continue
+        chave, _, valor = par.strip().partition(' ')
+        try:
+            metadados[chave] = base64.b64decode(valor, validate=True).decode() if valor else ''
+        except (binascii.Error, UnicodeDecodeError):
+            raise UploadInvalido(f'Upload-Metadata inválido: {chave}')
+    return metadados
+
+def caminho_parcial(upload_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], PASTA_PARCIAIS, upload_id)
+
+def _validar_metadados(destino, metadados):
+    """Campos do formulário equivalente (tipo e, para certidões, status)."""
+    if destino == DestinoUpload.DOCUMENTO and not metadados.get('tipo'):
+        raise UploadInvalido('Tipo do documento é obrigatório')
+    if destino == DestinoUpload.CERTIDAO and not (metadados.get('tipo') and metadados.get('status')):
+        raise UploadInvalido('Campos obrigatórios: tipo e status')
+    try:
+        if destino == DestinoUpload.DOCUMENTO:
+            return {'tipo': TipoDocumento(metadados['tipo']).value}
+        return {'tipo': TipoCertidao(metadados['tipo']).value, 'status': StatusCertidao(metadados['status']).value}
+    except ValueError:
+        raise UploadInvalido('tipo ou status inválido')
+
+def criar_upload(credor_id, destino, tamanho, metadados):
+    """
+    Registra um upload retomável e cria o arquivo parcial vazio.
+
+    Args:
+        metadados: Upload-Metadata já interpretado (filename, tipo, status)
+
+    Returns:
+        UploadRetomavel
+
+    Raises:
+        UploadInvalido / UploadGrandeDemais
+    """
+    tamanho_maximo = current_app.config.get('UPLOADS_RETOMAVEIS_TAMANHO_MAXIMO', TAMANHO_MAXIMO_PADRAO)
+    if tamanho > tamanho_maximo:
+        raise UploadGrandeDemais(mensagem_tamanho_excedido(tamanho, tamanho_maximo))
+    if tamanho < 1:
+        raise UploadInvalido('Upload-Length deve ser maior que zero')
+
+    nome_arquivo = metadados.get('filename') or metadados.get('name')
+    if not nome_arquivo:
+        raise UploadInvalido('Nenhum arquivo selecionado')
+    # Só a extensão agora; o conteúdo é conferido ao completar
+    extensoes_validas = [ext for exts in TIPOS_PERMITIDOS.values() for ext in exts]
+    if os.path.splitext(nome_arquivo)[1].lower() not in extensoes_validas:
+        raise UploadInvalido(f"Extensão de arquivo não permitida. Extensões válidas: {', '.join(extensoes_validas)}")
+
+    upload = UploadRetomavel(
+        id=uuid.uuid4().hex,
+        credor_id=credor_id,
+        destino=destino,
+        metadados=_validar_metadados(destino, metadados),
+        nome_arquivo=nome_arquivo[:255],
+        tamanho=tamanho,
+        recebido=0,
+        atualizado_em=datetime.utcnow()
+    )
+    caminho = caminho_parcial(upload.id)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    open(caminho, 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+def _reservar(upload_id, offset, agora):
+    """Marca o PATCH em andamento, se o offset confere e não há outro recebendo."""
+    timeout = current_app.config.get('UPLOADS_RETOMAVEIS_TIMEOUT_SEGUNDOS', TIMEOUT_RECEBIMENTO_PADRAO)
+    reservado = db.session.execute(
+        update(UploadRetomavel)
+        .where(UploadRetomavel.id == upload_id,
+               UploadRetomavel.recebido == offset,
+               UploadRetomavel.concluido_em.is_(None),
+               UploadRetomavel.erro.is_(None),
+               or_(UploadRetomavel.recebendo_desde.is_(None),
+                   UploadRetomavel.recebendo_desde < agora - timedelta(seconds=timeout)))
+        .values(recebendo_desde=agora)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    upload = db.session.get(UploadRetomavel, upload_id, populate_existing=True)
+    if upload is None:
+        raise UploadNaoEncontrado(upload_id)
+    if not reservado:
+        if upload.concluido_em is not None or upload.erro is not None:
+            raise UploadEncerrado(upload_id)
+        raise ConflitoOffset(upload.recebido)
+    return upload
+
+def _renovar(upload_id, reserva):
+    """
+    Adia o vencimento da reserva do PATCH (recebendo_desde).
+
+    Returns:
+        datetime: a nova reserva, ou None se outro PATCH a tomou
+    """
+    nova = datetime.utcnow()
+    renovada = db.session.execute(
+        update(UploadRetomavel)
+        .where(UploadRetomavel.id == upload_id, UploadRetomavel.recebendo_desde == reserva)
+        .values(recebendo_desde=nova)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return nova if renovada else None
+
+def receber_parte(upload_id, offset, stream, agora=None):
+    """
+    Acrescenta ao upload os bytes de `stream`, a partir de `offset`.
+
+    O que já estiver em disco é confirmado mesmo se a conexão cair no meio.
+    A reserva é renovada durante a leitura, e o offset só é confirmado se ela
+    ainda for deste PATCH. Ao completar o tamanho declarado, o arquivo é
+    validado e guardado.
+
+    Returns:
+        UploadRetomavel: com o novo offset (recebido)
+
+    Raises:
+        UploadNaoEncontrado, UploadEncerrado, ConflitoOffset,
+        UploadInvalido (corpo além do tamanho declarado ou arquivo recusado)
+    """
+    agora = agora or datetime.utcnow()
+    upload = _reservar(upload_id, offset, agora)
+    restante = upload.tamanho - offset
+    timeout = current_app.config.get('UPLOADS_RETOMAVEIS_TIMEOUT_SEGUNDOS', TIMEOUT_RECEBIMENTO_PADRAO)
+    intervalo_renovacao = timedelta(seconds=timeout / FRACAO_RENOVACAO)
+    reserva = agora
+    renovada_em = datetime.utcnow()
+    escrito = 0
+    excedeu = False
+    try:
+        # Sem buffer: nada do que foi escrito com a reserva chega ao disco depois de perdê-la
+        with open(caminho_parcial(upload_id), 'r+b', buffering=0) as parcial:
+            # Bytes gravados por um PATCH interrompido e não confirmados são descartados
+            parcial.truncate(offset)
+            parcial.seek(offset)
+            try:
+                for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b''):
+                    # Conferida antes de escrever: a leitura pode ter parado por mais
+                    # que o timeout e outro PATCH já estar escrevendo no arquivo
+                    if datetime.utcnow() - renovada_em >= intervalo_renovacao:
+                        reserva = _renovar(upload_id, reserva)
+                        if reserva is None:
+                            break
+                        renovada_em = datetime.utcnow()
+                    if escrito + len(bloco) > restante:
+                        bloco = bloco[:restante - escrito]
+                        excedeu = True
+                    parcial.write(bloco)
+                    escrito += len(bloco)
+                    if excedeu:
+                        break
+            finally:
+                # Só confirma o offset do que chegou ao disco
+                parcial.flush()
+                os.fsync(parcial.fileno())
+    except ClientDisconnected:
+        pass
+    finally:
+        confirmado = reserva is not None and db.session.execute(
+            update(UploadRetomavel)
+            .where(UploadRetomavel.id == upload_id, UploadRetomavel.recebendo_desde == reserva)
+            .values(recebido=offset + escrito, recebendo_desde=None, atualizado_em=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        db.session.refresh(upload)
+
+    if not confirmado:
+        raise ConflitoOffset(upload.recebido)
+    if excedeu:
+        raise UploadInvalido('Corpo maior que o restante do Upload-Length')
+    if upload.recebido == upload.tamanho:
+        concluir_upload(upload)
+    return upload
+
+def concluir_upload(upload):
+    """
+    Valida o arquivo completo (uma leitura, para hash e tipo), guarda-o no
+    armazenamento e cria o documento ou a certidão.
+
+    Raises:
+        UploadInvalido: conteúdo não permitido; o upload fica com o erro
+    """
+    caminho = caminho_parcial(upload.id)
+    with open(caminho, 'rb') as arquivo:
+        amostra = arquivo.read(TAMANHO_AMOSTRA_MIME)
+        arquivo.seek(0)
+        hash_conteudo = calcular_hash_arquivo(arquivo)
+    tipo_mime = detectar_tipo_mime(amostra)
+    valido, mensagem = verificar_tipo_mime(tipo_mime, upload.nome_arquivo)
+    if not valido:
+        os.remove(caminho)
+        upload.erro = mensagem
+        db.session.commit()
+        raise UploadInvalido(mensagem)
+
+    arquivo_id = armazenamento_arquivos.guardar_arquivo(caminho, hash_conteudo, upload.tamanho, tipo_mime)
+    if upload.destino == DestinoUpload.DOCUMENTO:
+        resultado = DocumentoPessoal(
+            credor_id=upload.credor_id,
+            tipo=TipoDocumento(upload.metadados['tipo']),
+            arquivo_url=arquivo_id,
+            enviado_em=datetime.utcnow()
+        )
+        db.session.add(resultado)
+    else:
+        resultado = registrar_certidao(
+            upload.credor_id,
+            TipoCertidao(upload.metadados['tipo']),
+            OrigemCertidao.MANUAL,
+            StatusCertidao(upload.metadados['status']),
+            arquivo_url=arquivo_id
+        )
+    db.session.flush()
+    upload.resultado_id = resultado.id
+    upload.concluido_em = datetime.utcnow()
+    db.session.commit()
+    cache_credores.invalidar(upload.credor_id)
+    gerador_derivados.agendar(arquivo_id)
+
+def _remover(upload):
+    try:
+        os.remove(caminho_parcial(upload.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(upload)
+
+def cancelar_upload(upload_id):
+    """Descarta o upload e o que já foi recebido (tus termination)."""
+    upload = db.session.get(UploadRetomavel, upload_id)
+    if upload is None:
+        raise UploadNaoEncontrado(upload_id)
+    _remover(upload)
+    db.session.commit()
+
+def limpar_uploads(validade_horas=None, agora=None):
+    """
+    Remove os uploads sem atividade há mais de `validade_horas`
+    (abandonados no meio, recusados ou concluídos).
+
+    Returns:
+        int: uploads removidos
+    """
+    validade_horas = validade_horas or current_app.config.get('UPLOADS_RETOMAVEIS_VALIDADE_HORAS',
+                                                              VALIDADE_HORAS_PADRAO)
+    limite = (agora or datetime.utcnow()) - timedelta(hours=validade_horas)
+    antigos = db.session.scalars(
+        select(UploadRetomavel).where(
+            UploadRetomavel.atualizado_em < limite,
+            or_(UploadRetomavel.recebendo_desde.is_(None), UploadRetomavel.recebendo_desde < limite)
+        )
+    ).all()
+    for upload in antigos:
+        _remover(upload)
+    db.session.commit()
+    return len(antigos)
+
+def serializar_upload(u):
+    return {
+        'id': u.id,
+        'credor_id': u.credor_id,
+        'destino': u.destino.value,
+        'nome_arquivo': u.nome_arquivo,
+        'tamanho': u.tamanho,
+        'recebido': u.recebido,
+        'concluido': u.concluido_em is not None,
+        'resultado_id': u.resultado_id,
+        'erro': u.erro
+    }
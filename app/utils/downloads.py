@@ -0,0 +1,79 @@
+"""
+Envio de arquivos grandes no projeto Mercatório.
+Documentos e certidões são servidos com ETag forte (o SHA-256 do conteúdo),
+Range/If-Range (o leitor de PDF do navegador abre a primeira página sem
+esperar o resto) e cache longo quando a URL traz a versão do conteúdo.
+
+Modos (ARQUIVOS_ENVIO):
+    'sendfile': o próprio app envia o arquivo pelo wsgi.file_wrapper
+        (sendfile(2), sem cópia, no gunicorn); Range tratado pelo Werkzeug
+    'x-accel-redirect': nginx; ARQUIVOS_ACCEL_PREFIXO é a location
+        `internal` que aponta para a pasta do armazenamento
+    'x-sendfile': Apache (mod_xsendfile) ou lighttpd, pelo caminho em disco
+Nos dois últimos o worker só responde os cabeçalhos: o servidor web envia o
+arquivo e trata o Range, sem prender um worker Python durante o download.
+"""
+import os
+from flask import Response, current_app, request, send_file
+
+MODOS_ENVIO = ('sendfile', 'x-accel-redirect', 'x-sendfile')
+# URLs com ?v=<versão do conteúdo> nunca mudam de conteúdo
+CACHE_VERSIONADO_SEGUNDOS = 365 * 24 * 3600
+
+def _uri_interna(caminho, raiz):
+    """URI do arquivo na location interna do nginx, se ele estiver sob a raiz."""
+    if not raiz:
+        return None
+    relativo = os.path.relpath(caminho, raiz)
+    if relativo.startswith(os.pardir):
+        return None
+    return current_app.config['ARQUIVOS_ACCEL_PREFIXO'].rstrip('/') + '/' + relativo.replace(os.sep, '/')
+
+def _cabecalhos_cache(response, imutavel):
+    # Documentos pessoais: só o cache do navegador, nunca o de proxies compartilhados
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if imutavel:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = CACHE_VERSIONADO_SEGUNDOS
+        response.cache_control.immutable = True
+    else:
+        # URL sem versão: o conteúdo pode mudar; revalidar custa um 304
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+        response.expires = None
+
+def enviar_arquivo(caminho, tipo_mime, etag=None, nome_download=None, imutavel=False, raiz=None):
+    """
+    Resposta com o arquivo em disco, conforme ARQUIVOS_ENVIO.
+
+    Args:
+        etag: ETag forte (hash do conteúdo); None usa a do Werkzeug (mtime e tamanho)
+        imutavel: a URL identifica o conteúdo, então o cache pode durar um ano
+        raiz: pasta mapeada pela location interna do nginx (x-accel-redirect)
+    """
+    modo = current_app.config.get('ARQUIVOS_ENVIO', 'sendfile')
+    uri_interna = _uri_interna(caminho, raiz) if modo == 'x-accel-redirect' else None
+
+    if uri_interna is not None or modo == 'x-sendfile':
+        response = Response(mimetype=tipo_mime)
+        if etag:
+            response.set_etag(etag)
+        # Só If-None-Match aqui: o Range fica com o servidor web
+        response.make_conditional(request)
+        if response.status_code != 304:
+            if uri_interna is not None:
+                response.headers['X-Accel-Redirect'] = uri_interna
+            else:
+                response.headers['X-Sendfile'] = caminho
+    else:
+        response = send_file(caminho, mimetype=tipo_mime, etag=etag if etag else True, conditional=True)
+
+    if response.status_code == 200:
+        # O leitor de PDF do navegador só pede partes se o servidor anunciar
+        response.accept_ranges = 'bytes'
+
+    if nome_download:
+        response.headers.set('Content-Disposition', 'inline', filename=nome_download)
+    _cabecalhos_cache(response, imutavel)
+    return response
@@ -0,0 +1,29 @@
+"""
+Utilitários de normalização de texto no projeto Mercatório.
+Usados para indexar e buscar credores sem depender de acentos, caixa ou
+pontuação de CPF/CNPJ.
+"""
+import re
+import unicodedata
+
+def normalizar_texto(texto):
+    """
+    Remove acentos, converte para minúsculas e colapsa pontuação em espaços.
+
+    Args:
+        texto: texto livre (ex.: nome do credor)
+
+    Returns:
+        str: texto normalizado, ex.: "José  D'Ávila" -> "jose d avila"
+    """
+    if texto is None:
+        return None
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(re.split(r'[^0-9a-z]+', sem_acentos.casefold())).strip()
+
+def somente_digitos(texto):
+    """Mantém apenas os dígitos (ex.: CPF/CNPJ com ou sem máscara)."""
+    if texto is None:
+        return None
+    return re.sub(r'\D', '', texto)
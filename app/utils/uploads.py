@@ -0,0 +1,175 @@
+"""
+Recebimento de arquivos enviados no projeto Mercatório.
+O corpo da requisição é lido uma única vez: à medida que o parser multipart
+do Werkzeug entrega os blocos do arquivo, eles são gravados direto em um
+temporário na pasta de uploads, somando tamanho e SHA-256 e guardando os
+primeiros bytes para a detecção do tipo. A validação só confere o que já foi
+calculado e o temporário é renomeado para o destino (ver
+app/services/arquivos.py), sem reler o conteúdo.
+Passado o limite de tamanho, a leitura é interrompida (413): o restante do
+corpo não é lido nem gravado.
+"""
+import hashlib
+import os
+import tempfile
+from flask import Request, current_app, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.utils.validacao_arquivos import (TAMANHO_AMOSTRA_MIME, TAMANHO_MAXIMO, detectar_tipo_mime,
+                                          mensagem_tamanho_excedido, verificar_tipo_mime)
+
+# Temporários dos uploads em andamento, dentro de UPLOAD_FOLDER (mesmo
+# sistema de arquivos do destino, então mover é só renomear)
+PASTA_RECEBENDO = '.recebendo'
+TAMANHO_BLOCO = 64 * 1024
+
+class ArquivoInvalido(ValueError):
+    """Upload recusado (vazio, grande demais ou de tipo não permitido)."""
+
+class ReceptorArquivo:
+    """
+    Destino dos blocos de um arquivo enviado: grava, conta e calcula o hash
+    em uma passada. Também é legível (read/seek), como o temporário que o
+    Werkzeug usaria, para quem ainda trata o upload como arquivo comum.
+    """
+
+    def __init__(self, pasta, tamanho_maximo=TAMANHO_MAXIMO):
+        os.makedirs(pasta, exist_ok=True)
+        descritor, self.caminho_temporario = tempfile.mkstemp(dir=pasta)
+        self._arquivo = os.fdopen(descritor, 'w+b')
+        self.tamanho_maximo = tamanho_maximo
+        self.tamanho = 0
+        self._hash = hashlib.sha256()
+        self._amostra = b''
+        self._tipo_mime = None
+        self._movido = False
+
+    @property
+    def excedido(self):
+        return self.tamanho > self.tamanho_maximo
+
+    @property
+    def hash(self):
+        return self._hash.hexdigest()
+
+    @property
+    def tipo_mime(self):
+        if self._tipo_mime is None:
+            self._tipo_mime = detectar_tipo_mime(self._amostra)
+        return self._tipo_mime
+
+    @property
+    def closed(self):
+        return self._arquivo.closed
+
+    def write(self, dados):
+        """
+        Raises:
+            RequestEntityTooLarge: passado o limite; o temporário é apagado e
+            o parser para, sem ler o restante do corpo
+        """
+        self.tamanho += len(dados)
+        if self.excedido:
+            self.close()
+            raise RequestEntityTooLarge(
+                f"Arquivo muito grande (máximo: {self.tamanho_maximo/1024/1024:.1f}MB)")
+        if len(self._amostra) < TAMANHO_AMOSTRA_MIME:
+            self._amostra += dados[:TAMANHO_AMOSTRA_MIME - len(self._amostra)]
+        self._hash.update(dados)
+        self._arquivo.write(dados)
+        return len(dados)
+
+    def read(self, *args):
+        return self._arquivo.read(*args)
+
+    def readline(self, *args):
+        return self._arquivo.readline(*args)
+
+    def seek(self, *args):
+        return self._arquivo.seek(*args)
+
+    def tell(self):
+        return self._arquivo.tell()
+
+    def flush(self):
+        self._arquivo.flush()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def mover(self, destino):
+        """Fecha o temporário e o renomeia para `destino`."""
+        self._arquivo.close()
+        os.replace(self.caminho_temporario, destino)
+        self._movido = True
+
+    def close(self):
+        """Fecha e, se o arquivo não foi aproveitado, apaga o temporário."""
+        self._arquivo.close()
+        if not self._movido:
+            try:
+                os.remove(self.caminho_temporario)
+            except FileNotFoundError:
+                pass
+
+def responder_grande_demais(e):
+    """Resposta JSON para o 413 do receptor, como os demais erros de upload."""
+    return jsonify({'erro': e.description}), 413
+
+def pasta_recebendo():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], PASTA_RECEBENDO)
+
+class RequisicaoUpload(Request):
+    """Request que grava os arquivos do multipart por ReceptorArquivo."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return ReceptorArquivo(pasta_recebendo(), current_app.config['UPLOAD_TAMANHO_MAXIMO'])
+
+def _receptor(arquivo):
+    """ReceptorArquivo do upload; arquivos que não vieram do parser são copiados em uma passada."""
+    if isinstance(arquivo.stream, ReceptorArquivo):
+        return arquivo.stream
+    receptor = ReceptorArquivo(pasta_recebendo(), current_app.config['UPLOAD_TAMANHO_MAXIMO'])
+    try:
+        for bloco in iter(lambda: arquivo.stream.read(TAMANHO_BLOCO), b''):
+            receptor.write(bloco)
+    except RequestEntityTooLarge as e:
+        raise ArquivoInvalido(e.description)
+    except Exception:
+        receptor.close()
+        raise
+    return receptor
+
+def receber_upload(arquivo, tamanho_maximo=None):
+    """
+    Valida o arquivo enviado com o que foi apurado durante a leitura.
+
+    Args:
+        arquivo: FileStorage da requisição
+        tamanho_maximo: limite em bytes (padrão: UPLOAD_TAMANHO_MAXIMO)
+
+    Returns:
+        ReceptorArquivo: com tamanho, hash e tipo MIME; quem recebe move o
+        temporário para o destino (mover) ou o descarta (close)
+
+    Raises:
+        ArquivoInvalido: com a mensagem para o cliente; o temporário é apagado
+    """
+    if not arquivo or arquivo.filename == '':
+        raise ArquivoInvalido("Nenhum arquivo selecionado")
+
+    receptor = _receptor(arquivo)
+    tamanho_maximo = min(tamanho_maximo or receptor.tamanho_maximo, receptor.tamanho_maximo)
+    if receptor.tamanho > tamanho_maximo:
+        receptor.close()
+        raise ArquivoInvalido(mensagem_tamanho_excedido(receptor.tamanho, tamanho_maximo))
+    valido, mensagem = verificar_tipo_mime(receptor.tipo_mime, arquivo.filename)
+    if not valido:
+        receptor.close()
+        raise ArquivoInvalido(mensagem)
+    return receptor
@@ -0,0 +1,65 @@
+"""
+Benchmark da precificação vetorizada (app/services/precificacao.py).
+
+Gera uma carteira sintética em memória e mede o tempo de precificá-la em
+alguns cenários. Uso:
+
+    python benchmarks/bench_precificacao.py --quantidade 1000000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.precificacao import (  # noqa: E402
+    CarteiraColunar, Cenario, CurvaDesconto, TabelaAtrasos, precificar
+)
+
+FOROS = ['TJSP', 'TJRJ', 'TJMG', 'TRF1', 'TRF3', 'TRF4', 'TJRS', 'TJPR']
+
+def carteira_sintetica(quantidade, semente=42):
+    gerador = np.random.default_rng(semente)
+    inicio = np.datetime64('2015-01-01', 'D')
+    return CarteiraColunar(
+        ids=np.arange(1, quantidade + 1),
+        credores_ids=gerador.integers(1, quantidade // 2 + 2, quantidade),
+        valores=gerador.lognormal(11, 1.2, quantidade),
+        datas_publicacao=inicio + gerador.integers(0, 365 * 10, quantidade).astype('timedelta64[D]'),
+        foros=FOROS,
+        indices_foro=gerador.integers(0, len(FOROS), quantidade)
+    )
+
+def cenarios():
+    curva = CurvaDesconto([0.5, 1, 2, 3, 5, 10], [0.105, 0.11, 0.115, 0.12, 0.125, 0.13])
+    atrasos = {'TJSP': 48, 'TJRJ': 36, 'TRF1': 18, 'TRF3': 18, 'TRF4': 18}
+    return [
+        Cenario('plana_12', CurvaDesconto([0.0], [0.12]), TabelaAtrasos(atrasos)),
+        Cenario('curva', curva, TabelaAtrasos(atrasos)),
+        Cenario('curva_atraso_estressado', curva, TabelaAtrasos({f: m * 1.5 for f, m in atrasos.items()}, 36))
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quantidade', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    carteira = carteira_sintetica(args.quantidade)
+    print(f'Carteira sintética: {len(carteira):,} precatórios em {time.perf_counter() - inicio:.2f}s')
+
+    for cenario in cenarios():
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            resultado = precificar(carteira, cenario, data_base='2024-06-30')
+            tempos.append(time.perf_counter() - inicio)
+        melhor = min(tempos)
+        print(f'{cenario.nome:>26}: {melhor:.3f}s ({len(carteira) / melhor:,.0f} precatórios/s), '
+              f'preço total {resultado["precos"].sum():,.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import pytest
 import os
+import random
 import tempfile
 import shutil
 from app import create_app
@@ -12,12 +13,15 @@ from datetime import datetime
 
 @pytest.fixture(scope="module")
 def test_app():
-    app = create_app()
-    app.config.update({
+    # Configuração passada ao create_app para que o banco em memória seja usado
+    # de fato (o engine é criado no init_app, antes de qualquer app.config.update)
+    app = create_app({
         "TESTING": True,
         "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
         "UPLOAD_FOLDER": tempfile.mkdtemp(),
-        "WTF_CSRF_ENABLED": False
+        "WTF_CSRF_ENABLED": False,
+        # Miniaturas e prévias geradas na própria requisição, sem pool de processos
+        "DERIVADOS_WORKERS": 0
     })
     
     with app.app_context():
@@ -50,6 +54,22 @@ def credor_exemplo(session):
     session.commit()
     return credor
 
+@pytest.fixture()
+def credor_factory(session):
+    """
+    Cria e grava credores com CPF/CNPJ único. Qualquer campo pode ser
+    sobrescrito, inclusive relacionamentos (precatorios=[...], certidoes=[...]).
+    """
+    def criar(nome="Credor Teste", **campos):
+        campos.setdefault("cpf_cnpj", f"{random.randint(10000000000, 99999999999)}")
+        campos.setdefault("email", "credor@example.com")
+        campos.setdefault("telefone", "11999999999")
+        credor = Credor(nome=nome, **campos)
+        session.add(credor)
+        session.commit()
+        return credor
+    return criar
+
 @pytest.fixture()
 def precatorio_exemplo(session, credor_exemplo):
     precatorio = Precatorio(
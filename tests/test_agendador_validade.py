@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+import requests
+from app.extensions import db
+from app.jobs.agendador_validade import AgendadorValidade, MARGEM_MINIMA
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao, VALIDADE_CERTIDOES
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
+
+@pytest.fixture()
+def provedor(monkeypatch):
+    """Registra (cpf_cnpj, tipo) de cada consulta aos provedores."""
+    consultas = []
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        consultas.append((params["cpf_cnpj"], params["tipo"]))
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "negativa", "conteudo_base64": "eA=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+    return consultas
+
+def criar_certidao(credor_factory, tipo, expira_em):
+    certidao = Certidao(tipo=tipo, origem=OrigemCertidao.API, status=StatusCertidao.NEGATIVA,
+                        recebida_em=expira_em - VALIDADE_CERTIDOES[tipo], expira_em=expira_em)
+    credor_factory("Credor Validade", certidoes=[certidao])
+    return certidao
+
+def test_expiracao_calculada_pelo_tipo(session, credor_factory):
+    """Testa expira_em na criação e na reemissão da certidão."""
+    emissao = datetime(2024, 1, 1)
+    certidao = Certidao(tipo=TipoCertidao.ESTADUAL, origem=OrigemCertidao.API,
+                        status=StatusCertidao.NEGATIVA, recebida_em=emissao)
+    credor_factory("Credor Expiração", certidoes=[certidao])
+    assert certidao.expira_em == emissao + timedelta(days=60)
+
+    certidao.recebida_em = datetime(2024, 3, 1)
+    session.commit()
+    assert certidao.expira_em == datetime(2024, 3, 1) + timedelta(days=60)
+
+def test_jitter_respeita_a_margem_do_vencimento():
+    """Testa que as renovações se espalham sem passar do limite antes do vencimento."""
+    agendador = AgendadorValidade(aleatorio=random.Random(7))
+    agora = datetime(2024, 1, 1)
+    perto = agora + timedelta(days=1, hours=6)
+
+    instantes = [agendador.instante_renovacao(agora, TipoCertidao.FEDERAL, agora + timedelta(days=10))
+                 for _ in range(200)]
+    assert min(instantes) >= agora
+    assert max(instantes) <= agora + timedelta(days=1)
+    assert max(instantes) - min(instantes) > timedelta(hours=20)
+
+    for _ in range(50):
+        assert agendador.instante_renovacao(agora, TipoCertidao.FEDERAL, perto) <= perto - MARGEM_MINIMA
+
+def test_renova_apenas_o_que_esta_vencendo(session, provedor, credor_factory):
+    """Testa que só o tipo dentro da janela de renovação é consultado."""
+    agora = datetime.utcnow()
+    longe = criar_certidao(credor_factory, TipoCertidao.FEDERAL, agora + timedelta(days=100))
+    vencendo = criar_certidao(credor_factory, TipoCertidao.ESTADUAL, agora + timedelta(days=3))
+
+    relatorio = AgendadorValidade(dispersao=timedelta(0)).executar(agora)
+
+    assert (vencendo.credor.cpf_cnpj, "estadual") in provedor
+    assert all(cpf != longe.credor.cpf_cnpj for cpf, _ in provedor)
+    assert relatorio["certidoes_atualizadas"] >= 1
+    assert db.session.get(Certidao, vencendo.id).expira_em > agora + timedelta(days=59)
+
+def test_chamadas_caem_uma_ordem_de_grandeza_sem_certidoes_vencidas(session, provedor, credor_factory):
+    """Simula 30 dias de execuções a cada 6 horas com validades espalhadas."""
+    gerador = random.Random(42)
+    inicio = datetime.utcnow()
+    certidoes = [
+        criar_certidao(credor_factory, TipoCertidao.FEDERAL, inicio + timedelta(days=gerador.uniform(2, 180)))
+        for _ in range(20)
+    ]
+    ids = [c.id for c in certidoes]
+    cpfs = {c.credor.cpf_cnpj for c in certidoes}
+    agendador = AgendadorValidade(aleatorio=gerador)
+
+    for passo in range(30 * 4):
+        agora = inicio + timedelta(hours=6 * passo)
+        agendador.executar(agora)
+        expiracoes = db.session.scalars(db.select(Certidao.expira_em).where(Certidao.id.in_(ids)))
+        assert min(expiracoes) > agora
+
+    chamadas = sum(1 for cpf, _ in provedor if cpf in cpfs)
+    # A revalidação diária completa faria 20 certidões x 30 dias = 600 chamadas
+    assert 0 < chamadas <= 600 / 10
@@ -0,0 +1,95 @@
+import json
+import random
+from datetime import datetime
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.precatorio import Precatorio
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+from app.models.resumo import ResumoForo
+from app.services.agregados import reconstruir_agregados
+
+def generate_unique_cpf():
+    """Gera um CPF único para testes"""
+    return f"{random.randint(10000000000, 99999999999)}"
+
+def agregados(client):
+    response = client.get('/api/agregados')
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+def grupo(dados, secao, chave, valor):
+    return next((g for g in dados[secao] if g[chave] == valor), None)
+
+def test_agregados_incrementais_por_foro_ano_e_prontidao(client, session, credor_factory):
+    """Testa que escritas de precatórios e certidões atualizam os resumos."""
+    foro = f"FORO-{random.randint(0, 10**9)}"
+    antes = agregados(client)
+
+    credor = credor_factory("Credor Agregado", precatorios=[
+        Precatorio(numero_precatorio="1", valor_nominal=1000.0, foro=foro, data_publicacao=datetime(2021, 3, 1)),
+        Precatorio(numero_precatorio="2", valor_nominal=500.0, foro=foro, data_publicacao=datetime(2022, 3, 1))
+    ])
+
+    dados = agregados(client)
+    assert grupo(dados, "por_foro", "foro", foro) == {
+        "foro": foro, "quantidade_precatorios": 2, "valor_total": 1500.0
+    }
+    sem_certidoes = grupo(dados, "por_prontidao", "estado", "sem_certidoes")
+    sem_certidoes_antes = grupo(antes, "por_prontidao", "estado", "sem_certidoes") or {
+        "quantidade_credores": 0, "valor_total": 0.0
+    }
+    assert sem_certidoes["quantidade_credores"] == sem_certidoes_antes["quantidade_credores"] + 1
+
+    for tipo in TipoCertidao:
+        session.add(Certidao(credor_id=credor.id, tipo=tipo, origem=OrigemCertidao.API,
+                             status=StatusCertidao.NEGATIVA, recebida_em=datetime.utcnow()))
+    session.commit()
+
+    dados = agregados(client)
+    apta = grupo(dados, "por_prontidao", "estado", "apta")
+    assert apta["quantidade_credores"] >= 1
+    assert apta["valor_total"] >= 1500.0
+    assert db.session.get(Credor, credor.id).prontidao == "apta"
+
+    precatorio = credor.precatorios[0]
+    precatorio.valor_nominal = 2000.0
+    session.commit()
+
+    dados = agregados(client)
+    assert grupo(dados, "por_foro", "foro", foro)["valor_total"] == 2500.0
+
+    assert reconstruir_agregados() == []
+
+def test_agregados_contabilizam_ingestao_em_lote(client):
+    """Testa que o INSERT em massa da ingestão também alimenta os resumos."""
+    foro = f"FORO-{random.randint(0, 10**9)}"
+    linhas = [
+        json.dumps({
+            "nome": "Credor Lote", "cpf_cnpj": generate_unique_cpf(), "email": "lote@example.com",
+            "telefone": "11999999999",
+            "precatorio": {"numero_precatorio": "1", "valor_nominal": 300.0,
+                           "foro": foro, "data_publicacao": "2020-01-01"}
+        })
+        for _ in range(3)
+    ]
+    # O relatório é enviado em streaming: a ingestão acontece enquanto ele é lido
+    client.post('/api/credores/lote', data="\n".join(linhas), content_type='application/x-ndjson').get_data()
+
+    dados = agregados(client)
+    assert grupo(dados, "por_foro", "foro", foro)["quantidade_precatorios"] == 3
+    assert reconstruir_agregados() == []
+
+def test_reconstrucao_corrige_divergencias(client, session, test_app, credor_factory):
+    """Testa que a reconstrução recalcula os resumos e aponta o que estava divergente."""
+    foro = f"FORO-{random.randint(0, 10**9)}"
+    credor_factory("Credor Divergente", precatorios=[
+        Precatorio(numero_precatorio="1", valor_nominal=100.0, foro=foro, data_publicacao=datetime(2020, 1, 1))
+    ])
+
+    db.session.get(ResumoForo, foro).valor_total = 999.0
+    session.commit()
+
+    resultado = test_app.test_cli_runner().invoke(args=["agregados", "reconstruir"])
+
+    assert "1 divergência(s)" in resultado.output
+    assert grupo(agregados(client), "por_foro", "foro", foro)["valor_total"] == 100.0
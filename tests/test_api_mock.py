@@ -83,16 +83,22 @@ def test_buscar_certidoes_automaticamente(client, session, monkeypatch):
     
     # Aplicar o patch
     import requests
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(requests.Session, "get", mock_get)
     
     # Fazer a requisição
     response = client.post(f'/api/credores/{credor.id}/buscar-certidoes')
     
-    assert response.status_code == 201
+    assert response.status_code == 202
     response_data = json.loads(response.data)
     assert "mensagem" in response_data
-    assert "total" in response_data
-    assert response_data["total"] == 2
+    assert response.headers["Location"] == response_data["status_url"]
+    
+    # A busca é executada pelo worker da fila
+    from app.services.tarefas import processar_pendentes
+    assert processar_pendentes() == 1
+    tarefa = json.loads(client.get(response_data["status_url"]).data)
+    assert tarefa["status"] == "concluida"
+    assert tarefa["resultado"]["total"] == 2
     
     # Verificar se as certidões foram salvas no banco
     from app.models.certidao import Certidao, OrigemCertidao
@@ -137,12 +143,18 @@ def test_buscar_certidoes_erro_api(client, session, monkeypatch):
     
     # Aplicar o patch
     import requests
-    monkeypatch.setattr(requests, "get", mock_get_error)
+    monkeypatch.setattr(requests.Session, "get", mock_get_error)
     
     # Fazer a requisição
     response = client.post(f'/api/credores/{credor.id}/buscar-certidoes')
     
-    assert response.status_code == 500
-    response_data = json.loads(response.data)
-    assert "erro" in response_data
-    assert "Erro ao consultar certidões mockadas" in response_data["erro"]
+    assert response.status_code == 202
+    tarefa_id = json.loads(response.data)["tarefa_id"]
+    
+    # A falha de todos os provedores devolve a tarefa à fila, com backoff
+    from app.services.tarefas import processar_pendentes
+    assert processar_pendentes() == 1
+    response_data = json.loads(client.get(f'/api/tarefas/{tarefa_id}').data)
+    assert response_data["status"] == "pendente"
+    assert response_data["tentativas"] == 1
+    assert "Erro ao consultar certidões" in response_data["erro"]
@@ -0,0 +1,194 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from werkzeug.datastructures import FileStorage
+from app import create_app
+from app.extensions import db
+from app.models.arquivo import ArquivoArmazenado
+from app.models.certidao import Certidao
+from app.services import arquivos
+from app.models.documento_pessoal import DocumentoPessoal, TipoDocumento
+from app.services.arquivos import armazenamento_arquivos, coletar_arquivos, migrar_arquivos_legados
+
+def pdf_unico():
+    return b"%PDF-1.5\n" + os.urandom(16).hex().encode()
+
+def enviar_documento(client, credor_id, conteudo, nome="documento.pdf"):
+    response = client.post(f"/api/credores/{credor_id}/documentos", content_type="multipart/form-data", data={
+        "tipo": "identidade",
+        "arquivo": FileStorage(stream=io.BytesIO(conteudo), filename=nome, content_type="application/pdf")
+    })
+    assert response.status_code == 201
+    return json.loads(response.data)["documento_id"]
+
+def test_reenvio_do_mesmo_arquivo_nao_ocupa_disco(client, session, credor_factory):
+    """Testa que o mesmo PDF enviado para dois credores é guardado uma vez, com duas referências."""
+    conteudo = pdf_unico()
+    primeiro = enviar_documento(client, credor_factory("Credor Arquivos").id, conteudo, "rg.pdf")
+    segundo = enviar_documento(client, credor_factory("Credor Arquivos").id, conteudo, "identidade.pdf")
+
+    documentos = [session.get(DocumentoPessoal, i) for i in (primeiro, segundo)]
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+    assert [d.arquivo_url for d in documentos] == [hash_conteudo, hash_conteudo]
+    caminho = armazenamento_arquivos.caminho(hash_conteudo)
+    assert caminho.endswith(os.path.join(hash_conteudo[:2], hash_conteudo[2:4], hash_conteudo))
+    assert os.listdir(os.path.dirname(caminho)) == [hash_conteudo]
+    registro = session.get(ArquivoArmazenado, hash_conteudo)
+    assert (registro.referencias, registro.tamanho, registro.tipo_mime) == (2, len(conteudo), "application/pdf")
+
+def test_mesmo_nome_nao_sobrescreve(client, session, credor_factory):
+    credor = credor_factory("Credor Arquivos")
+    primeiro = enviar_documento(client, credor.id, pdf_unico())
+    segundo = enviar_documento(client, credor.id, pdf_unico())
+
+    caminhos = [armazenamento_arquivos.caminho(session.get(DocumentoPessoal, i).arquivo_url)
+                for i in (primeiro, segundo)]
+    assert caminhos[0] != caminhos[1]
+    assert all(os.path.exists(c) for c in caminhos)
+
+def test_coleta_apaga_so_arquivos_sem_referencia(client, session, credor_factory):
+    """Testa a contagem de referências ao remover e trocar arquivos, e a coleta dos órfãos."""
+    credor = credor_factory("Credor Arquivos")
+    compartilhado, exclusivo = pdf_unico(), pdf_unico()
+    mantido = session.get(DocumentoPessoal, enviar_documento(client, credor.id, compartilhado))
+    removido = session.get(DocumentoPessoal, enviar_documento(client, credor.id, compartilhado))
+    trocado = session.get(DocumentoPessoal, enviar_documento(client, credor.id, exclusivo))
+
+    session.delete(removido)
+    trocado.arquivo_url = mantido.arquivo_url
+    session.commit()
+
+    assert session.get(ArquivoArmazenado, mantido.arquivo_url).referencias == 2
+    hash_exclusivo = hashlib.sha256(exclusivo).hexdigest()
+    assert session.get(ArquivoArmazenado, hash_exclusivo).referencias == 0
+
+    assert coletar_arquivos() >= 1
+    assert not os.path.exists(armazenamento_arquivos.caminho(hash_exclusivo))
+    assert session.get(ArquivoArmazenado, hash_exclusivo) is None
+    assert os.path.exists(armazenamento_arquivos.caminho(mantido.arquivo_url))
+
+def test_certidao_substituida_mantem_o_arquivo_no_historico(client, session, credor_factory):
+    credor = credor_factory("Credor Arquivos")
+    arquivos = [pdf_unico(), pdf_unico()]
+    for conteudo in arquivos:
+        response = client.post(f"/api/credores/{credor.id}/certidoes", content_type="multipart/form-data", data={
+            "tipo": "federal",
+            "status": "negativa",
+            "arquivo": FileStorage(stream=io.BytesIO(conteudo), filename="certidao.pdf",
+                                   content_type="application/pdf")
+        })
+        assert response.status_code == 201
+
+    hashes = [hashlib.sha256(c).hexdigest() for c in arquivos]
+    assert session.get(Certidao, json.loads(response.data)["certidao_id"]).arquivo_url == hashes[1]
+    # A versão anterior continua referenciada pelo histórico
+    assert [session.get(ArquivoArmazenado, h).referencias for h in hashes] == [1, 1]
+
+def test_migracao_de_arquivos_legados(session, test_app, credor_factory):
+    """Testa que caminhos gravados antes do armazenamento viram ids e o arquivo antigo sai de uploads/."""
+    credor = credor_factory("Credor Arquivos")
+    pasta = os.path.join(test_app.config["UPLOAD_FOLDER"], f"credor_{credor.id}")
+    os.makedirs(pasta, exist_ok=True)
+    legado = os.path.join(pasta, "identidade.pdf")
+    conteudo = pdf_unico()
+    with open(legado, "wb") as arquivo:
+        arquivo.write(conteudo)
+    documentos = [DocumentoPessoal(credor_id=credor.id, tipo=TipoDocumento.IDENTIDADE, arquivo_url=caminho,
+                                   enviado_em=datetime.utcnow())
+                  for caminho in (legado, legado, os.path.join(pasta, "apagado.pdf"))]
+    session.add_all(documentos)
+    session.commit()
+
+    migrados, ausentes = migrar_arquivos_legados()
+
+    assert migrados >= 1 and ausentes >= 1
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+    session.expire_all()
+    assert [session.get(DocumentoPessoal, d.id).arquivo_url for d in documentos[:2]] == [hash_conteudo] * 2
+    assert session.get(ArquivoArmazenado, hash_conteudo).referencias == 2
+    assert not os.path.exists(legado)
+    with open(armazenamento_arquivos.caminho(hash_conteudo), "rb") as arquivo:
+        assert arquivo.read() == conteudo
+
+def test_tipo_invalido_nao_guarda_o_arquivo(client, session, credor_factory):
+    credor = credor_factory("Credor Arquivos")
+    conteudo = pdf_unico()
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+    for url, campos in ((f"/api/credores/{credor.id}/documentos", {"tipo": "bogus"}),
+                        (f"/api/credores/{credor.id}/certidoes", {"tipo": "bogus", "status": "negativa"})):
+        response = client.post(url, content_type="multipart/form-data", data={
+            **campos,
+            "arquivo": FileStorage(stream=io.BytesIO(conteudo), filename="doc.pdf", content_type="application/pdf")
+        })
+        assert response.status_code == 400
+    assert not os.path.exists(armazenamento_arquivos.caminho(hash_conteudo))
+    assert session.get(ArquivoArmazenado, hash_conteudo) is None
+
+def test_coleta_apaga_arquivos_antigos_sem_linha(session):
+    """Testa que arquivos deixados em disco por um upload desfeito são coletados depois da carência."""
+    antigo, recente = (hashlib.sha256(pdf_unico()).hexdigest() for _ in range(2))
+    for hash_conteudo in (antigo, recente):
+        caminho = armazenamento_arquivos.caminho(hash_conteudo)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(b"%PDF-1.5\n")
+    temporario = os.path.join(os.path.dirname(armazenamento_arquivos.caminho(antigo)), ".tmp-interrompido")
+    open(temporario, "wb").close()
+    duas_horas_atras = time.time() - 7200
+    for caminho in (armazenamento_arquivos.caminho(antigo), temporario):
+        os.utime(caminho, (duas_horas_atras, duas_horas_atras))
+
+    assert coletar_arquivos() >= 2
+    assert not os.path.exists(armazenamento_arquivos.caminho(antigo))
+    assert not os.path.exists(temporario)
+    assert os.path.exists(armazenamento_arquivos.caminho(recente))
+    assert session.get(ArquivoArmazenado, antigo) is None
+
+def test_reenvio_durante_a_coleta_nao_perde_o_arquivo(tmp_path, monkeypatch):
+    """
+    Testa o reenvio de um arquivo sem referências enquanto a coleta o apaga:
+    o upload espera a coleta terminar e grava o arquivo de novo.
+    """
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'mercatorio.db'}",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads")
+    })
+    conteudo = pdf_unico()
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+
+    def enviar():
+        with app.app_context():
+            arquivo = FileStorage(stream=io.BytesIO(conteudo), filename="rg.pdf", content_type="application/pdf")
+            db.session.add(DocumentoPessoal(credor_id=1, tipo=TipoDocumento.IDENTIDADE, enviado_em=datetime.utcnow(),
+                                            arquivo_url=armazenamento_arquivos.guardar_upload(arquivo)))
+            db.session.commit()
+
+    remover = os.remove
+    def remover_com_reenvio(caminho):
+        # O reenvio chega enquanto a coleta apaga o arquivo
+        if caminho == caminho_arquivo:
+            reenvio.start()
+            reenvio.join(0.5)
+        remover(caminho)
+
+    with app.app_context():
+        db.session.execute(db.text("INSERT INTO credores (id, nome, cpf_cnpj, email, telefone) "
+                                   "VALUES (1, 'Credor', '1', 'c@example.com', '1')"))
+        armazenamento_arquivos.guardar_upload(
+            FileStorage(stream=io.BytesIO(conteudo), filename="rg.pdf", content_type="application/pdf"))
+        db.session.commit()
+        caminho_arquivo = armazenamento_arquivos.caminho(hash_conteudo)
+        reenvio = threading.Thread(target=enviar)
+        monkeypatch.setattr(arquivos.os, "remove", remover_com_reenvio)
+        coletar_arquivos()
+        reenvio.join()
+        monkeypatch.undo()
+
+        assert os.path.exists(caminho_arquivo)
+        assert db.session.get(ArquivoArmazenado, hash_conteudo).referencias == 1
+        db.engine.dispose()
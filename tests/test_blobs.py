@@ -0,0 +1,78 @@
+import base64
+import os
+from datetime import datetime
+from sqlalchemy import func, select, text
+from app.extensions import db
+from app.models.blob import ConteudoBlob
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+from app.services.blobs import BackendBanco, armazenamento_blobs, calcular_hash
+
+PDF = b"%PDF-1.4\n% certidao de teste\n"
+
+def criar_certidao(credor_factory, conteudo_base64):
+    certidao = Certidao(tipo=TipoCertidao.FEDERAL, origem=OrigemCertidao.API, status=StatusCertidao.NEGATIVA,
+                        conteudo_base64=conteudo_base64, recebida_em=datetime.utcnow())
+    return credor_factory("Credor Blob", certidoes=[certidao]), certidao
+
+def test_conteudo_identico_guardado_uma_vez(session, credor_factory):
+    """Testa que a linha guarda só hash e tamanho e que conteúdos iguais ocupam um único arquivo."""
+    conteudo_base64 = base64.b64encode(PDF).decode()
+    _, primeira = criar_certidao(credor_factory, conteudo_base64)
+    _, segunda = criar_certidao(credor_factory, conteudo_base64)
+
+    assert primeira.conteudo_hash == segunda.conteudo_hash == calcular_hash(PDF)
+    assert primeira.tamanho == len(PDF)
+    caminho = armazenamento_blobs.backend.caminho(primeira.conteudo_hash)
+    assert os.listdir(os.path.dirname(caminho)) == [primeira.conteudo_hash]
+
+    session.expire_all()
+    certidao = session.get(Certidao, segunda.id)
+    assert certidao.conteudo == PDF
+    assert certidao.conteudo_base64 == conteudo_base64
+
+def test_backend_banco_deduplica(session):
+    """Testa que o backend de banco grava cada hash uma única vez."""
+    backend = BackendBanco()
+    hash_conteudo = calcular_hash(b"conteudo repetido")
+
+    assert backend.gravar(hash_conteudo, b"conteudo repetido")
+    assert not backend.gravar(hash_conteudo, b"conteudo repetido")
+    session.commit()
+
+    assert backend.ler(hash_conteudo) == b"conteudo repetido"
+    total = session.scalar(select(func.count()).select_from(ConteudoBlob).where(ConteudoBlob.hash == hash_conteudo))
+    assert total == 1
+
+def test_download_do_conteudo(client, session, credor_factory):
+    """Testa o download sob demanda, com ETag pelo hash e 304 para a mesma versão."""
+    credor, certidao = criar_certidao(credor_factory, base64.b64encode(PDF).decode())
+    url = f"/api/credores/{credor.id}/certidoes/{certidao.id}/conteudo"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == PDF
+    assert response.mimetype == "application/pdf"
+    assert response.headers["ETag"] == f'"{certidao.conteudo_hash}"'
+
+    response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    assert client.get(f"/api/credores/{credor.id + 1000}/certidoes/{certidao.id}/conteudo").status_code == 404
+
+def test_migracao_do_conteudo_legado(test_app, session, credor_factory):
+    """Testa que o comando move a coluna base64 antiga para o armazenamento."""
+    session.execute(text("ALTER TABLE certidoes ADD COLUMN conteudo_base64 TEXT"))
+    _, certidao = criar_certidao(credor_factory, None)
+    session.execute(text("UPDATE certidoes SET conteudo_base64 = :conteudo WHERE id = :id"),
+                    {"conteudo": base64.b64encode(b"legado").decode(), "id": certidao.id})
+    session.commit()
+
+    resultado = test_app.test_cli_runner().invoke(args=["blobs", "migrar"])
+
+    assert "1 certidão(ões)" in resultado.output
+    session.expire_all()
+    certidao = session.get(Certidao, certidao.id)
+    assert certidao.conteudo == b"legado"
+    assert certidao.tamanho == len(b"legado")
+    restante = session.execute(text("SELECT conteudo_base64 FROM certidoes WHERE id = :id"), {"id": certidao.id})
+    assert restante.scalar() is None
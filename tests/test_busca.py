@@ -0,0 +1,94 @@
+import json
+import random
+
+def generate_unique_cpf():
+    """Gera um CPF único para testes"""
+    return f"{random.randint(10000000000, 99999999999)}"
+
+def buscar(client, termo, **params):
+    response = client.get('/api/credores/busca', query_string={"q": termo, **params})
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+def test_busca_ignora_acentos_e_caixa(client, session, credor_factory):
+    """Testa a busca por nome com e sem acentos, por trecho do nome."""
+    credor = credor_factory("Conceição Aparecida Gonçalves")
+
+    for termo in ("conceicao", "CONCEIÇÃO gonç", "aparec"):
+        ids = [r["id"] for r in buscar(client, termo)["resultados"]]
+        assert credor.id in ids, termo
+
+    assert buscar(client, "inexistentexyz")["resultados"] == []
+
+def test_busca_por_documento_so_digitos(client, session, credor_factory):
+    """Testa a busca por CPF/CNPJ com máscara, sem máscara e por trecho."""
+    credor = credor_factory("Empresa Documento", cpf_cnpj="98765432000110")
+
+    for termo in ("98.765.432/0001-10", "98765432", "0001"):
+        ids = [r["id"] for r in buscar(client, termo)["resultados"]]
+        assert credor.id in ids, termo
+
+def test_busca_paginada_com_prefixo_primeiro(client, session, credor_factory):
+    """Testa a paginação e que nomes iniciados pelo termo aparecem primeiro."""
+    sufixo = random.randint(0, 10**6)
+    meio = credor_factory(f"Ana Zebedeu{sufixo}")
+    inicio = credor_factory(f"Zebedeu{sufixo} Souza")
+
+    dados = buscar(client, f"zebedeu{sufixo}", limite=1)
+    assert dados["resultados"][0]["id"] == inicio.id
+    assert dados["tem_mais"] is True
+
+    dados = buscar(client, f"zebedeu{sufixo}", limite=1, pagina=2)
+    assert dados["resultados"][0]["id"] == meio.id
+    assert dados["tem_mais"] is False
+
+def test_busca_contempla_ingestao_em_lote(client):
+    """Testa que credores inseridos em massa também entram no índice."""
+    sufixo = random.randint(0, 10**6)
+    linha = json.dumps({
+        "nome": f"Lote Ândrade{sufixo}", "cpf_cnpj": generate_unique_cpf(), "email": "lote@example.com",
+        "telefone": "11999999999",
+        "precatorio": {"numero_precatorio": "1", "valor_nominal": 1.0, "foro": "TJSP",
+                       "data_publicacao": "2020-01-01"}
+    })
+    client.post('/api/credores/lote', data=linha, content_type='application/x-ndjson').get_data()
+
+    assert len(buscar(client, f"andrade{sufixo}")["resultados"]) == 1
+
+def test_pagina_inicial_usa_busca_indexada(client, session, credor_factory):
+    """Testa a busca da página inicial."""
+    credor_factory("Joaquim Busca Web")
+
+    response = client.get('/?busca=joaquim')
+
+    assert response.status_code == 200
+    assert "Joaquim Busca Web" in response.get_data(as_text=True)
+
+def test_reindexar_recria_o_indice_em_banco_existente(tmp_path):
+    """Testa que `flask busca reindexar` recria a tabela FTS5 e os triggers que faltam no banco."""
+    from sqlalchemy import text
+    from app import create_app
+    from app.extensions import db
+    from app.models.credor import Credor
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'busca.db'}",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads")
+    })
+    with app.app_context():
+        # Banco criado antes da busca indexada: sem FTS5, triggers nem colunas preenchidas
+        for comando in ("DROP TRIGGER credores_fts_ai", "DROP TRIGGER credores_fts_ad",
+                        "DROP TRIGGER credores_fts_au", "DROP TABLE credores_fts"):
+            db.session.execute(text(comando))
+        db.session.add(Credor(nome="Úrsula Reindexada", cpf_cnpj=generate_unique_cpf(),
+                              email="reindexar@example.com", telefone="11999999999"))
+        db.session.commit()
+        db.session.execute(text("UPDATE credores SET nome_busca = NULL, documento_digitos = NULL"))
+        db.session.commit()
+
+        resultado = app.test_cli_runner().invoke(args=["busca", "reindexar"])
+
+        assert "1 credor(es) normalizado(s)" in resultado.output
+        assert len(buscar(app.test_client(), "ursula reindex")["resultados"]) == 1
+        assert db.session.execute(text("SELECT count(*) FROM credores_fts WHERE credores_fts MATCH 'rsula'")).scalar() == 1
+        db.engine.dispose()
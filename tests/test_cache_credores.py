@@ -0,0 +1,110 @@
+import io
+import json
+import threading
+import time
+from werkzeug.datastructures import FileStorage
+from app.services.cache import CacheLRU, SingleFlight
+
+def contar_cargas(monkeypatch):
+    """Conta quantas vezes o detalhe do credor é carregado do banco."""
+    import app.routes.credores as rotas
+    cargas = []
+    original = rotas.serializar_credor
+
+    def serializar_contando(*args, **kwargs):
+        cargas.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(rotas, "serializar_credor", serializar_contando)
+    return cargas
+
+def test_detalhe_servido_do_cache_e_invalidado_por_upload(client, session, monkeypatch, credor_factory):
+    """Testa que o detalhe vem do cache até um documento ser enviado."""
+    credor = credor_factory("Credor Cache")
+    cargas = contar_cargas(monkeypatch)
+
+    assert client.get(f'/api/credores/{credor.id}').status_code == 200
+    assert client.get(f'/api/credores/{credor.id}').status_code == 200
+    assert len(cargas) == 1
+
+    file = FileStorage(
+        stream=io.BytesIO(b"%PDF-1.5\nconteudo de teste do documento PDF"),
+        filename="identidade.pdf",
+        content_type="application/pdf",
+    )
+    response = client.post(
+        f'/api/credores/{credor.id}/documentos',
+        data={'tipo': 'identidade', 'arquivo': file},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+
+    response_data = json.loads(client.get(f'/api/credores/{credor.id}').data)
+    assert len(cargas) == 2
+    assert len(response_data["documentos"]) == 1
+
+def test_pagina_de_detalhes_usa_cache(client, session, monkeypatch, credor_factory):
+    """Testa que a página web de detalhes usa a mesma entrada do cache que a API, sem o base64."""
+    import app.routes.web as rotas_web
+    credor = credor_factory("Credor Cache")
+    cargas = contar_cargas(monkeypatch)
+    monkeypatch.setattr(rotas_web, "serializar_credor", lambda *args: cargas.append(args) or {})
+
+    assert client.get(f'/api/credores/{credor.id}').status_code == 200
+    response = client.get(f'/credores/{credor.id}')
+    assert len(cargas) == 1
+
+    assert response.status_code == 200
+    assert "Credor Cache" in response.get_data(as_text=True)
+
+def test_permutacoes_de_fields_sao_a_mesma_variante(client, session, test_app, monkeypatch, credor_factory):
+    """Testa que a ordem de ?fields= não cria outra variante nem outra ETag, e o limite de variantes por credor."""
+    credor = credor_factory("Credor Cache")
+    cargas = contar_cargas(monkeypatch)
+
+    respostas = [client.get(f'/api/credores/{credor.id}', query_string={'fields': campos})
+                 for campos in ('nome,email,id', 'id,email,nome', 'email,nome,id,nome')]
+    assert len(cargas) == 1
+    assert len({r.headers['ETag'] for r in respostas}) == 1
+    assert len({r.data for r in respostas}) == 1
+
+    monkeypatch.setattr(test_app.extensions['cache_credores'], 'max_variantes', 2)
+    for incluir in ('precatorios', 'documentos', 'certidoes'):
+        assert client.get(f'/api/credores/{credor.id}', query_string={'include': incluir}).status_code == 200
+    _, variantes = test_app.extensions['cache_credores'].lru.get(credor.id)
+    assert [v[1] for v in variantes] == [('documentos',), ('certidoes',)]
+
+def test_lru_descarta_item_menos_usado():
+    """Testa o limite de itens do LRU."""
+    lru = CacheLRU(max_itens=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+def test_single_flight_coalesce_cargas_concorrentes():
+    """Testa que chamadas concorrentes com a mesma chave executam uma única carga."""
+    voo_unico = SingleFlight()
+    execucoes = []
+    resultados = []
+
+    def carregar():
+        execucoes.append(1)
+        time.sleep(0.1)
+        return {"id": 1}
+
+    threads = [
+        threading.Thread(target=lambda: resultados.append(voo_unico.executar(1, carregar)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(execucoes) == 1
+    assert resultados == [{"id": 1}] * 5
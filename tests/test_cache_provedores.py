@@ -0,0 +1,98 @@
+import json
+import random
+import threading
+import time
+import pytest
+import requests
+from app.services.cache_provedores import CacheRespostas
+from app.services.provedores_certidoes import cliente_certidoes
+
+def generate_unique_cpf():
+    """Gera um CPF único para testes"""
+    return f"{random.randint(10000000000, 99999999999)}"
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
+
+@pytest.fixture()
+def chamadas(monkeypatch):
+    """Provedores lentos que registram cada chamada recebida."""
+    registro = []
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        registro.append((params["cpf_cnpj"], params["tipo"]))
+        time.sleep(0.05)
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "negativa", "conteudo_base64": "eA=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+    return registro
+
+def test_segunda_busca_vem_do_cache(client, session, chamadas):
+    """Testa que buscar de novo o mesmo CPF/CNPJ não chama os provedores."""
+    cpf = generate_unique_cpf()
+
+    primeira = cliente_certidoes.buscar(cpf)
+    segunda = cliente_certidoes.buscar(cpf)
+
+    assert len(chamadas) == 4
+    assert segunda.certidoes == primeira.certidoes
+    estatisticas = json.loads(client.get("/api/credores/certidoes/cache").data)
+    assert estatisticas["federal"]["acertos"] >= 1
+    assert estatisticas["federal"]["taxa_acerto"] > 0
+
+    cliente_certidoes.invalidar_cache(cpf)
+    cliente_certidoes.buscar(cpf)
+    assert len(chamadas) == 8
+
+def test_consultas_simultaneas_coalescidas(session, chamadas, test_app):
+    """Testa que threads consultando o mesmo CPF/CNPJ compartilham uma chamada por provedor."""
+    cpf = generate_unique_cpf()
+    resultados = []
+
+    def buscar():
+        with test_app.app_context():
+            resultados.append(cliente_certidoes.buscar(cpf))
+
+    threads = [threading.Thread(target=buscar) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(chamadas) == 4
+    assert all(len(r.certidoes) == 4 for r in resultados)
+
+def test_falha_guardada_por_pouco_tempo():
+    """Testa o cache negativo: a falha é repetida sem chamada até vencer o TTL negativo."""
+    cache = CacheRespostas(ttl_negativo=0.1)
+    chamadas = []
+
+    def falhar():
+        chamadas.append(1)
+        raise requests.Timeout("emissor fora do ar")
+
+    for _ in range(3):
+        with pytest.raises(requests.Timeout):
+            cache.consultar("municipal", "123", falhar)
+    assert len(chamadas) == 1
+    assert cache.estatisticas()["municipal"]["acertos_negativos"] == 2
+
+    time.sleep(0.15)
+    assert cache.consultar("municipal", "123", lambda: [{"tipo": "municipal"}]) == [{"tipo": "municipal"}]
+
+def test_ttl_por_tipo():
+    """Testa que cada tipo de certidão expira com o seu TTL."""
+    cache = CacheRespostas(ttls={"estadual": 0.05, "federal": 60})
+    cache.consultar("estadual", "123", lambda: ["v1"])
+    cache.consultar("federal", "123", lambda: ["v1"])
+    time.sleep(0.1)
+
+    assert cache.consultar("estadual", "123", lambda: ["v2"]) == ["v2"]
+    assert cache.consultar("federal", "123", lambda: ["v2"]) == ["v1"]
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+import pytest
+import requests
+from app.extensions import db
+from app.jobs import revalidar_certidoes as job
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+from app.models.checkpoint_job import CheckpointJob
+from app.models.credor import Credor
+from app.services.coordenacao import (
+    adquirir_lease, executar_como_lider, interpretar_shard, liberar_lease,
+    registrar_heartbeat, shard_do_no
+)
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
+
+@pytest.fixture()
+def provedor_positivo(monkeypatch):
+    consultados = []
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        consultados.append(params["cpf_cnpj"])
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "positiva", "conteudo_base64": "bm92YQ=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+    return consultados
+
+def test_lease_exclusivo_ate_vencer(session):
+    """Testa que o lease de um nó só passa a outro depois de vencido."""
+    agora = datetime(2024, 1, 1, 12, 0)
+    duracao = timedelta(minutes=5)
+
+    assert adquirir_lease("job-teste", "no-a", duracao, agora)
+    assert not adquirir_lease("job-teste", "no-b", duracao, agora + timedelta(minutes=1))
+    # O dono renova e empurra o vencimento
+    assert adquirir_lease("job-teste", "no-a", duracao, agora + timedelta(minutes=4))
+    assert not adquirir_lease("job-teste", "no-b", duracao, agora + timedelta(minutes=6))
+    assert adquirir_lease("job-teste", "no-b", duracao, agora + timedelta(minutes=10))
+    assert not adquirir_lease("job-teste", "no-a", duracao, agora + timedelta(minutes=11))
+
+def test_liberar_lease_so_do_dono(session):
+    """Testa que só o dono libera o lease."""
+    assert adquirir_lease("job-liberar", "no-a")
+    liberar_lease("job-liberar", "no-b")
+    assert not adquirir_lease("job-liberar", "no-b")
+    liberar_lease("job-liberar", "no-a")
+    assert adquirir_lease("job-liberar", "no-b")
+
+def test_executar_como_lider(session):
+    """Testa que só o dono do lease executa o job."""
+    adquirir_lease("job-lider", "outro-no")
+    assert executar_como_lider("job-lider", lambda: "executado") is None
+    liberar_lease("job-lider", "outro-no")
+    assert executar_como_lider("job-lider", lambda: "executado") == "executado"
+    # Continua líder nas execuções seguintes
+    assert executar_como_lider("job-lider", lambda: "de novo") == "de novo"
+
+def test_lider_renova_o_lease_durante_a_execucao(session):
+    """Testa que uma execução mais longa que o lease não o perde para outro nó."""
+    import time
+    tentativas = []
+
+    def execucao_longa():
+        time.sleep(0.6)
+        tentativas.append(adquirir_lease("job-longo", "outro-no", timedelta(seconds=0.3)))
+        return "concluido"
+
+    assert executar_como_lider("job-longo", execucao_longa, timedelta(seconds=0.3)) == "concluido"
+    assert tentativas == [False]
+
+def test_shards_pelos_nos_vivos(session):
+    """Testa a divisão entre nós vivos, ignorando os sem heartbeat recente."""
+    agora = datetime(2024, 1, 1, 12, 0)
+    registrar_heartbeat("no-b", agora)
+    registrar_heartbeat("no-a", agora - timedelta(seconds=30))
+    registrar_heartbeat("no-morto", agora - timedelta(hours=1))
+
+    assert shard_do_no("no-a", agora) == (0, 2)
+    assert shard_do_no("no-b", agora) == (1, 2)
+    # Nó que ainda não publicou heartbeat entra na divisão
+    assert shard_do_no("no-c", agora) == (2, 3)
+
+def test_interpretar_shard():
+    assert interpretar_shard(None) is None
+    assert interpretar_shard("1/3") == (1, 3)
+    for invalido in ("3/3", "x", "1/0"):
+        with pytest.raises(ValueError):
+            interpretar_shard(invalido)
+
+def test_revalidacao_em_shards_disjuntos(session, provedor_positivo, credor_factory):
+    """Testa que os shards cobrem todos os credores, sem repetição, com checkpoints próprios."""
+    for _ in range(7):
+        credor_factory("Credor Shard", certidoes=[Certidao(tipo=TipoCertidao.FEDERAL, origem=OrigemCertidao.API,
+                                                           status=StatusCertidao.NEGATIVA)])
+    todos = sorted(session.scalars(
+        db.select(Credor.cpf_cnpj).where(Credor.certidoes.any(Certidao.origem == OrigemCertidao.API))
+    ))
+
+    relatorios = [job.revalidar_certidoes(tamanho_lote=2, reiniciar=True, shard=(i, 3)) for i in range(3)]
+
+    assert sorted(provedor_positivo) == todos
+    assert sum(r["credores"] for r in relatorios) == len(todos)
+    for i in range(3):
+        assert db.session.get(CheckpointJob, f"{job.NOME_JOB}:{i}/3").concluido_em is not None
+
+def test_revalidacao_ignorada_com_lease_de_outro_processo(session, provedor_positivo):
+    """Testa que uma segunda execução simultânea do mesmo shard não faz nada."""
+    assert adquirir_lease(job.nome_execucao((0, 2)), "outro-processo")
+
+    relatorio = job.revalidar_certidoes(reiniciar=True, shard=(0, 2))
+
+    assert relatorio == {"executado": False, "shard": f"{job.NOME_JOB}:0/2"}
+    assert provedor_positivo == []
+
+class SchedulerFalso:
+    """Registra os jobs como o APScheduler, sem threads."""
+    def __init__(self):
+        self.jobs = []
+
+    def add_job(self, func, trigger, **intervalo):
+        self.jobs.append((func, trigger, intervalo))
+
+def test_agendamento_publica_heartbeat_e_renova_como_lider(test_app, session, monkeypatch):
+    """Testa os jobs do agendador: heartbeat ao iniciar e renovação só no líder."""
+    from app.models.coordenacao import LeaseJob, NoAtivo
+    from app.services.coordenacao import identificador_no
+    renovacoes = []
+    monkeypatch.setattr("app.jobs.agendador_validade.AgendadorValidade.executar",
+                        lambda self: renovacoes.append(1) or {"credores": 0})
+    monkeypatch.setattr("atexit.register", lambda funcao: None)
+
+    scheduler = job.configurar_agendamento(test_app, SchedulerFalso())
+
+    assert session.get(NoAtivo, identificador_no()) is not None
+    (executar, _, a_cada), (heartbeat, _, _) = scheduler.jobs
+    assert a_cada == {"seconds": test_app.config["VALIDADE_INTERVALO_MINUTOS"] * 60}
+    inicio = datetime.utcnow()
+    executar()
+    assert renovacoes == [1]
+    lease = session.get(LeaseJob, "renovacao_validade")
+    assert lease.dono == identificador_no()
+    # Vale por três intervalos: o líder não perde o lease se o scheduler atrasar
+    assert lease.expira_em >= inicio + timedelta(minutes=3 * test_app.config["VALIDADE_INTERVALO_MINUTOS"])
+
+    # Outro processo com o lease: este só publica heartbeats
+    liberar_lease("renovacao_validade")
+    assert adquirir_lease("renovacao_validade", "outro-no")
+    executar()
+    assert renovacoes == [1]
+
+def test_agendador_iniciado_pela_configuracao(tmp_path):
+    pytest.importorskip("apscheduler")
+    from app import create_app
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "AGENDADOR_ATIVO": True
+    })
+    try:
+        assert app.scheduler.running and len(app.scheduler.get_jobs()) == 2
+    finally:
+        app.scheduler.shutdown(wait=False)
@@ -0,0 +1,58 @@
+import json
+from datetime import date, datetime
+import numpy as np
+from app.models.precatorio import Precatorio
+from app.services.correcao import IndiceCorrecao, obter_indice
+
+def criar_credor_com_precatorio(credor_factory, valor=1000.0, data_publicacao=datetime(2020, 1, 15)):
+    return credor_factory("Credor Correção", precatorios=[
+        Precatorio(numero_precatorio="1", valor_nominal=valor, foro="TJSP", data_publicacao=data_publicacao)
+    ])
+
+def test_fatores_acumulados_equivalem_ao_produto_mensal():
+    """Testa o fator entre dois meses e a limitação às pontas da série."""
+    indice = IndiceCorrecao("teste", ["2020-01", "2020-02", "2020-03"], [1.0, 2.0, 3.0])
+
+    assert np.isclose(indice.fator(date(2020, 1, 10), date(2020, 3, 1)), 1.01 * 1.02)
+    assert np.isclose(indice.fator(date(2020, 2, 1), date(2020, 2, 28)), 1.0)
+    # Fora da série: antes do início não corrige, depois do fim usa o último fator
+    assert np.isclose(indice.fator(date(2019, 1, 1), date(2030, 1, 1)), 1.01 * 1.02 * 1.03)
+    assert np.allclose(indice.fatores(["2020-01-01", "2020-03-01"], date(2020, 3, 1)), [1.01 * 1.02, 1.0])
+
+def test_detalhe_do_credor_com_valor_corrigido(client, session, credor_factory):
+    """Testa ?correcao= no detalhe do credor e a validação do índice."""
+    credor = criar_credor_com_precatorio(credor_factory)
+
+    response = client.get(f'/api/credores/{credor.id}?correcao=ipca_e&include=documentos')
+
+    assert response.status_code == 200
+    precatorio = json.loads(response.data)["precatorios"][0]
+    fator = obter_indice("ipca_e").fator(date(2020, 1, 15))
+    assert fator > 1
+    assert precatorio["valor_corrigido"] == round(1000.0 * fator, 2)
+
+    sem_correcao = client.get(f'/api/credores/{credor.id}')
+    assert "valor_corrigido" not in json.loads(sem_correcao.data)["precatorios"][0]
+    assert sem_correcao.headers["ETag"] != response.headers["ETag"]
+
+    assert client.get(f'/api/credores/{credor.id}?correcao=inexistente').status_code == 400
+
+def test_exportacao_e_precificacao_com_correcao(client, session, credor_factory):
+    """Testa valores corrigidos em lote na exportação e na precificação."""
+    credor = criar_credor_com_precatorio(credor_factory, valor=2000.0)
+    fator = obter_indice("selic").fator(date(2020, 1, 15))
+
+    response = client.get('/api/credores/exportar?correcao=selic')
+    linhas = [json.loads(l) for l in response.get_data(as_text=True).splitlines()]
+    exportado = next(l for l in linhas if l["id"] == credor.id)
+    assert exportado["precatorios"][0]["valor_corrigido"] == round(2000.0 * fator, 2)
+
+    response = client.post('/api/precificacao', json={
+        "precatorio_ids": [credor.precatorios[0].id],
+        "curva": {"taxa": 0},
+        "indice_correcao": "selic"
+    })
+    cenario = json.loads(response.data)["cenarios"][0]
+    assert cenario["indice_correcao"] == "selic"
+    assert cenario["valor_corrigido_total"] == round(2000.0 * fator, 2)
+    assert cenario["preco_total"] == cenario["valor_corrigido_total"]
@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from app import create_app
+from app.extensions import db
+from app.models.documento_pessoal import DocumentoPessoal
+from app.services import derivados
+from app.services.arquivos import armazenamento_arquivos, coletar_arquivos
+from app.services.derivados import caminho_derivado, coletar_derivados, gerador_derivados
+
+def imagem_jpeg(largura=3000, altura=2000):
+    """Scan grande, com ruído para não repetir conteúdo entre testes."""
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (largura, altura), os.urandom(largura * altura * 3)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def enviar_documento(client, credor_id, conteudo, nome, tipo_mime):
+    response = client.post(f"/api/credores/{credor_id}/documentos", content_type="multipart/form-data", data={
+        "tipo": "identidade",
+        "arquivo": FileStorage(stream=io.BytesIO(conteudo), filename=nome, content_type=tipo_mime)
+    })
+    assert response.status_code == 201
+    return json.loads(response.data)["documento_id"]
+
+def test_upload_gera_miniatura_e_previa(client, session, test_app, credor_factory):
+    """Testa que o upload de um scan gera os derivados reduzidos, servidos com cache imutável."""
+    credor = credor_factory("Credor Prévias")
+    documento = session.get(DocumentoPessoal,
+                            enviar_documento(client, credor.id, imagem_jpeg(), "rg.jpg", "image/jpeg"))
+    pasta = test_app.extensions["gerador_derivados"].pasta
+
+    for variante, lado in (("miniatura", 256), ("previa", 1280)):
+        with Image.open(caminho_derivado(pasta, documento.arquivo_url, variante)) as derivado:
+            assert max(derivado.size) == lado and derivado.format == "JPEG"
+
+    url = f"/api/arquivos/{documento.arquivo_url}/miniatura"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == "image/jpeg"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert len(response.data) < 64 * 1024
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert client.get(f"/api/arquivos/{documento.arquivo_url}/original").status_code == 404
+
+def test_paginas_mostram_a_previa_e_o_original_sob_demanda(client, session, monkeypatch, credor_factory):
+    credor = credor_factory("Credor Prévias")
+    monkeypatch.setattr(derivados, "renderizador_pdf", lambda: None)
+    imagem = session.get(DocumentoPessoal,
+                         enviar_documento(client, credor.id, imagem_jpeg(800, 600), "rg.jpg", "image/jpeg"))
+    pdf = session.get(DocumentoPessoal, enviar_documento(
+        client, credor.id, b"%PDF-1.5\n" + os.urandom(16).hex().encode(), "cpf.pdf", "application/pdf"))
+
+    pagina = client.get(f"/credores/{credor.id}").data.decode()
+    assert f"/api/arquivos/{imagem.arquivo_url}/miniatura" in pagina
+    # Sem o pdftoppm, o PDF fica só com o link para o original
+    assert f"/api/arquivos/{pdf.arquivo_url}/miniatura" not in pagina
+    assert f"/api/credores/{credor.id}/documentos/{pdf.id}/arquivo?v={pdf.arquivo_url[:16]}" in pagina
+    assert client.get(f"/api/arquivos/{pdf.arquivo_url}/miniatura").status_code == 404
+    assert client.get(f"/credores/{credor.id}/documentos/{pdf.id}").status_code == 302
+
+    visualizacao = client.get(f"/credores/{credor.id}/documentos/{imagem.id}").data.decode()
+    assert f"/api/arquivos/{imagem.arquivo_url}/previa" in visualizacao
+    url_original = f"/api/credores/{credor.id}/documentos/{imagem.id}/arquivo?v={imagem.arquivo_url[:16]}"
+    assert url_original in visualizacao
+    with open(armazenamento_arquivos.caminho(imagem.arquivo_url), "rb") as arquivo:
+        assert client.get(url_original).data == arquivo.read()
+
+def test_derivado_ausente_e_gerado_ao_pedir_e_coletado_com_o_original(client, session, test_app, credor_factory):
+    credor = credor_factory("Credor Prévias")
+    documento = session.get(DocumentoPessoal,
+                            enviar_documento(client, credor.id, imagem_jpeg(600, 400), "rg.jpg", "image/jpeg"))
+    pasta = test_app.extensions["gerador_derivados"].pasta
+    previa = caminho_derivado(pasta, documento.arquivo_url, "previa")
+    os.remove(previa)
+
+    assert client.get(f"/api/arquivos/{documento.arquivo_url}/previa").status_code == 200
+    assert os.path.exists(previa)
+
+    session.delete(documento)
+    session.commit()
+    coletar_arquivos()
+    assert coletar_derivados() >= 2
+    assert not os.path.exists(previa)
+
+def test_pool_de_processos_gera_fora_da_requisicao():
+    """Testa a geração no pool (spawn) e que arquivo já processado não é reenviado."""
+    pasta = tempfile.mkdtemp()
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "UPLOAD_FOLDER": pasta,
+        "DERIVADOS_WORKERS": 1
+    })
+    try:
+        with app.app_context():
+            origem = os.path.join(pasta, "scan.png")
+            Image.new("RGBA", (2000, 1000), (0, 128, 255, 128)).save(origem)
+            arquivo_id = armazenamento_arquivos.importar(origem)
+            db.session.commit()
+
+            futuro = gerador_derivados.agendar(arquivo_id)
+            assert gerador_derivados.agendar(arquivo_id) is futuro
+            assert futuro.result(timeout=120) == ["previa", "miniatura"]
+            assert gerador_derivados.agendar(arquivo_id) is None
+            with Image.open(gerador_derivados.caminho(arquivo_id, "miniatura")) as miniatura:
+                assert miniatura.size == (256, 128)
+            app.extensions["gerador_derivados"].executor.shutdown()
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
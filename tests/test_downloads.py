@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from werkzeug.datastructures import FileStorage
+from app import create_app
+from app.extensions import db
+from app.models.documento_pessoal import DocumentoPessoal, TipoDocumento
+from app.services.arquivos import armazenamento_arquivos
+
+def enviar_documento(client, credor_id, conteudo):
+    response = client.post(f"/api/credores/{credor_id}/documentos", content_type="multipart/form-data", data={
+        "tipo": "identidade",
+        "arquivo": FileStorage(stream=io.BytesIO(conteudo), filename="rg.pdf", content_type="application/pdf")
+    })
+    assert response.status_code == 201
+    return json.loads(response.data)["documento_id"]
+
+def test_download_com_range_etag_e_cache(client, session, credor_factory):
+    """Testa o download por id: Range, ETag forte pelo hash e cache de um ano só com a versão na URL."""
+    credor = credor_factory("Credor Downloads")
+    conteudo = b"%PDF-1.5\n" + os.urandom(200000)
+    documento = session.get(DocumentoPessoal, enviar_documento(client, credor.id, conteudo))
+    url = f"/api/credores/{credor.id}/documentos/{documento.id}/arquivo"
+
+    completo = client.get(url)
+    assert completo.status_code == 200 and completo.data == conteudo
+    assert completo.headers["ETag"] == f'"{documento.arquivo_url}"'
+    assert completo.headers["Accept-Ranges"] == "bytes"
+    assert completo.headers["Content-Disposition"] == f"inline; filename=identidade-{documento.id}.pdf"
+    assert completo.cache_control.no_cache and completo.cache_control.private
+
+    parte = client.get(url, headers={"Range": "bytes=100-1099"})
+    assert parte.status_code == 206
+    assert parte.data == conteudo[100:1100]
+    assert parte.headers["Content-Range"] == f"bytes 100-1099/{len(conteudo)}"
+    assert client.get(url, headers={"Range": f"bytes={len(conteudo) + 10}-"}).status_code == 416
+
+    assert client.get(url, headers={"If-None-Match": completo.headers["ETag"]}).status_code == 304
+
+    versionado = client.get(f"{url}?v={documento.arquivo_url[:16]}")
+    assert versionado.cache_control.max_age == 365 * 24 * 3600
+    assert versionado.cache_control.immutable and not versionado.cache_control.public
+    assert client.get(f"{url}?v=0000").cache_control.max_age is None
+
+def test_download_de_outro_credor_ou_sem_arquivo(client, session, credor_factory):
+    credor, outro = credor_factory("Credor Downloads"), credor_factory("Credor Downloads")
+    documento_id = enviar_documento(client, credor.id, b"%PDF-1.5\n" + os.urandom(64))
+
+    assert client.get(f"/api/credores/{outro.id}/documentos/{documento_id}/arquivo").status_code == 404
+    response = client.post(f"/api/credores/{credor.id}/certidoes", data={"tipo": "federal", "status": "negativa"})
+    certidao_id = json.loads(response.data)["certidao_id"]
+    assert client.get(f"/api/credores/{credor.id}/certidoes/{certidao_id}/arquivo").status_code == 404
+
+def test_certidao_manual_e_caminho_legado(client, session, test_app, credor_factory):
+    credor = credor_factory("Credor Downloads")
+    conteudo = b"%PDF-1.5\n" + os.urandom(128)
+    response = client.post(f"/api/credores/{credor.id}/certidoes", content_type="multipart/form-data", data={
+        "tipo": "estadual", "status": "negativa",
+        "arquivo": FileStorage(stream=io.BytesIO(conteudo), filename="certidao.pdf", content_type="application/pdf")
+    })
+    certidao_id = json.loads(response.data)["certidao_id"]
+    assert client.get(f"/api/credores/{credor.id}/certidoes/{certidao_id}/arquivo").data == conteudo
+
+    # Caminho gravado antes do armazenamento por hash (ainda não migrado)
+    legado = os.path.join(test_app.config["UPLOAD_FOLDER"], f"credor_{credor.id}", "cpf.pdf")
+    os.makedirs(os.path.dirname(legado), exist_ok=True)
+    with open(legado, "wb") as arquivo:
+        arquivo.write(conteudo)
+    documento = DocumentoPessoal(credor_id=credor.id, tipo=TipoDocumento.OUTROS, arquivo_url=legado)
+    session.add(documento)
+    session.commit()
+    response = client.get(f"/api/credores/{credor.id}/documentos/{documento.id}/arquivo")
+    assert response.data == conteudo and response.mimetype == "application/pdf"
+
+def test_modos_de_envio_pelo_servidor_web(credor_factory):
+    """Testa que nos modos x-accel-redirect e x-sendfile o app só responde os cabeçalhos."""
+    pasta = tempfile.mkdtemp()
+    try:
+        for modo, cabecalho in (("x-accel-redirect", "X-Accel-Redirect"), ("x-sendfile", "X-Sendfile")):
+            app = create_app({
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "UPLOAD_FOLDER": pasta,
+                "DERIVADOS_WORKERS": 0,
+                "ARQUIVOS_ENVIO": modo
+            })
+            client = app.test_client()
+            with app.app_context():
+                credor_id = credor_factory("Credor Downloads").id
+                documento_id = enviar_documento(client, credor_id, b"%PDF-1.5\n" + os.urandom(1000))
+                arquivo_id = db.session.get(DocumentoPessoal, documento_id).arquivo_url
+                caminho = armazenamento_arquivos.caminho(arquivo_id)
+            url = f"/api/credores/{credor_id}/documentos/{documento_id}/arquivo"
+
+            response = client.get(url, headers={"Range": "bytes=0-99"})
+            assert response.status_code == 200 and response.data == b""
+            esperado = (f"/_arquivos/{arquivo_id[:2]}/{arquivo_id[2:4]}/{arquivo_id}"
+                        if modo == "x-accel-redirect" else caminho)
+            assert response.headers[cabecalho] == esperado
+            assert response.headers["Content-Type"] == "application/pdf"
+
+            nao_modificado = client.get(url, headers={"If-None-Match": f'"{arquivo_id}"'})
+            assert nao_modificado.status_code == 304 and cabecalho not in nao_modificado.headers
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
@@ -0,0 +1,61 @@
+import json
+import sqlite3
+from app import create_app
+from app.extensions import db
+from app.services.esquema import atualizar_esquema
+
+# Esquema do banco criado pela versão inicial do projeto
+ESQUEMA_ORIGINAL = """
+CREATE TABLE credores (
+    id INTEGER NOT NULL PRIMARY KEY, nome VARCHAR(255) NOT NULL, cpf_cnpj VARCHAR(14) NOT NULL,
+    email VARCHAR(255) NOT NULL, telefone VARCHAR(20) NOT NULL);
+CREATE UNIQUE INDEX ix_credores_cpf_cnpj ON credores (cpf_cnpj);
+CREATE TABLE precatorios (
+    id INTEGER NOT NULL PRIMARY KEY, credor_id INTEGER NOT NULL REFERENCES credores (id),
+    numero_precatorio VARCHAR(50) NOT NULL, valor_nominal FLOAT NOT NULL, foro VARCHAR(100) NOT NULL,
+    data_publicacao DATETIME NOT NULL);
+CREATE TABLE documentos_pessoais (
+    id INTEGER NOT NULL PRIMARY KEY, credor_id INTEGER NOT NULL REFERENCES credores (id),
+    tipo VARCHAR(22) NOT NULL, arquivo_url VARCHAR(255) NOT NULL,
+    enviado_em DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL);
+CREATE TABLE certidoes (
+    id INTEGER NOT NULL PRIMARY KEY, credor_id INTEGER NOT NULL REFERENCES credores (id),
+    tipo VARCHAR(11) NOT NULL, origem VARCHAR(6) NOT NULL, arquivo_url VARCHAR(255), conteudo_base64 TEXT,
+    status VARCHAR(8) NOT NULL, recebida_em DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL);
+INSERT INTO credores VALUES (1, 'Credor Antigo', '12345678900', 'antigo@example.com', '11999999999');
+INSERT INTO precatorios VALUES (1, 1, '0001', 1000.0, 'TJSP', '2020-01-01 00:00:00');
+INSERT INTO certidoes (credor_id, tipo, origem, status, recebida_em)
+    VALUES (1, 'FEDERAL', 'API', 'NEGATIVA', '2024-01-01 00:00:00');
+"""
+
+def test_banco_da_versao_anterior_e_atualizado(tmp_path):
+    """Testa que um banco sem as colunas novas volta a funcionar ao subir o app, sem perder dados."""
+    caminho = tmp_path / "mercatorio.db"
+    with sqlite3.connect(caminho) as conexao:
+        conexao.executescript(ESQUEMA_ORIGINAL)
+
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{caminho}",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads")
+    })
+    client = app.test_client()
+
+    response = client.get("/api/credores/1")
+    assert response.status_code == 200
+    dados = json.loads(response.data)
+    assert dados["versao"] == 1 and dados["atualizado_em"]
+    assert dados["prontidao"] == "pendente"
+    assert dados["certidoes"][0]["expira_em"] == "2024-06-29T00:00:00"
+    assert client.get("/api/credores/1", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    busca = json.loads(client.get("/api/credores/busca", query_string={"q": "antigo 123.456"}).data)
+    assert [r["id"] for r in busca["resultados"]] == [1]
+
+    por_foro = json.loads(client.get("/api/agregados").data)["por_foro"]
+    assert por_foro == [{"foro": "TJSP", "quantidade_precatorios": 1, "valor_total": 1000.0}]
+
+    # Banco já atualizado: nada a fazer
+    with app.app_context():
+        assert atualizar_esquema() == {}
+        db.engine.dispose()
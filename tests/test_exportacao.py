@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from sqlalchemy import update
+from app.models.credor import Credor
+from app.models.precatorio import Precatorio
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+
+def criar_credor(credor_factory, nome):
+    return credor_factory(
+        nome,
+        precatorios=[Precatorio(
+            numero_precatorio="0001234-56.2020.8.26.0050",
+            valor_nominal=1000.0,
+            foro="TJSP",
+            data_publicacao=datetime(2023, 1, 1)
+        )],
+        certidoes=[Certidao(
+            tipo=TipoCertidao.FEDERAL,
+            origem=OrigemCertidao.API,
+            status=StatusCertidao.NEGATIVA,
+            conteudo_base64="Y2VydGlkYW8gdGVzdGU=",
+            recebida_em=datetime.utcnow()
+        )]
+    )
+
+def ler_exportacao(response):
+    return [json.loads(linha) for linha in response.get_data(as_text=True).splitlines()]
+
+def test_exportacao_ndjson_completa(client, session, credor_factory):
+    """Testa que cada linha traz o credor com precatórios e status de certidões, sem base64."""
+    credor = criar_credor(credor_factory, "Credor Exportação")
+
+    response = client.get('/api/credores/exportar')
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    linhas = {linha["id"]: linha for linha in ler_exportacao(response)}
+    exportado = linhas[credor.id]
+    assert exportado["nome"] == "Credor Exportação"
+    assert exportado["precatorios"][0]["valor_nominal"] == 1000.0
+    assert exportado["certidoes"][0]["status"] == "negativa"
+    assert "conteudo_base64" not in exportado["certidoes"][0]
+
+def test_exportacao_incremental_por_marca(client, session, test_app, credor_factory, monkeypatch):
+    """Testa que updated_since traz apenas credores alterados depois da marca."""
+    monkeypatch.setitem(test_app.config, "EXPORTACAO_MARGEM_SEGUNDOS", 0)
+    antigo = criar_credor(credor_factory, "Credor Antigo")
+    marca = client.get('/api/credores/exportar').headers["X-Exportacao-Marca"]
+
+    novo = criar_credor(credor_factory, "Credor Novo")
+    session.add(Certidao(
+        credor_id=antigo.id,
+        tipo=TipoCertidao.TRABALHISTA,
+        origem=OrigemCertidao.API,
+        status=StatusCertidao.POSITIVA,
+        recebida_em=datetime.utcnow()
+    ))
+    session.commit()
+
+    response = client.get(f'/api/credores/exportar?updated_since={marca}')
+
+    ids = [linha["id"] for linha in ler_exportacao(response)]
+    assert sorted(ids) == sorted([antigo.id, novo.id])
+
+def test_marca_nao_pula_alteracao_confirmada_depois_da_leitura(client, session, credor_factory):
+    """Testa que a marca vem dos dados: credor gravado com atualizado_em anterior à exportação sai na seguinte."""
+    primeiro = criar_credor(credor_factory, "Credor Confirmado")
+    marca = client.get('/api/credores/exportar').headers["X-Exportacao-Marca"]
+    assert datetime.fromisoformat(marca) < primeiro.atualizado_em
+
+    # Transação iniciada antes da exportação e confirmada só depois dela
+    atrasado = criar_credor(credor_factory, "Credor Atrasado")
+    session.execute(update(Credor.__table__).where(Credor.id == atrasado.id)
+                    .values(atualizado_em=primeiro.atualizado_em - timedelta(seconds=1)))
+    session.commit()
+
+    ids = [linha["id"] for linha in ler_exportacao(client.get(f'/api/credores/exportar?updated_since={marca}'))]
+    assert atrasado.id in ids
+
+def test_marca_com_fuso_convertida_para_utc(client, credor_factory):
+    credor = criar_credor(credor_factory, "Credor Fuso")
+    instante = credor.atualizado_em - timedelta(seconds=1)
+
+    # O mesmo instante em UTC sem fuso, em UTC com Z e em Brasília
+    for valor in (instante.isoformat(), instante.isoformat() + "Z", (instante - timedelta(hours=3)).isoformat() + "-03:00"):
+        ids = [linha["id"] for linha in ler_exportacao(client.get(f'/api/credores/exportar?updated_since={quote(valor)}'))]
+        assert credor.id in ids, valor
+    depois = (credor.atualizado_em + timedelta(hours=1) - timedelta(hours=3)).isoformat() + "-03:00"
+    ids = [linha["id"] for linha in ler_exportacao(client.get(f'/api/credores/exportar?updated_since={quote(depois)}'))]
+    assert credor.id not in ids
+
+def test_exportacao_marca_invalida(client):
+    """Testa a validação do parâmetro updated_since."""
+    assert client.get('/api/credores/exportar?updated_since=ontem').status_code == 400
@@ -0,0 +1,132 @@
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.credor import Credor
+from app.models.certidao import Certidao, CertidaoHistorico, TipoCertidao, OrigemCertidao, StatusCertidao
+from app.services.certidoes import consolidar_certidoes, registrar_certidao
+
+def contar(session, modelo, credor_id):
+    return session.scalar(select(func.count()).select_from(modelo).where(modelo.credor_id == credor_id))
+
+def test_reemissao_atualiza_a_linha_atual(session, credor_factory):
+    """Testa que cada emissão substitui a certidão atual e só mudanças vão para o histórico."""
+    credor = credor_factory("Credor Histórico")
+    primeira = registrar_certidao(credor.id, TipoCertidao.FEDERAL, OrigemCertidao.API, StatusCertidao.POSITIVA,
+                                  conteudo_base64="djE=", recebida_em=datetime(2024, 1, 1))
+    session.commit()
+
+    # Mesma resposta: só renova a data de recebimento
+    registrar_certidao(credor.id, TipoCertidao.FEDERAL, OrigemCertidao.API, StatusCertidao.POSITIVA,
+                       conteudo_base64="djE=", recebida_em=datetime(2024, 2, 1))
+    session.commit()
+    assert contar(session, CertidaoHistorico, credor.id) == 0
+
+    atual = registrar_certidao(credor.id, TipoCertidao.FEDERAL, OrigemCertidao.API, StatusCertidao.NEGATIVA,
+                               conteudo_base64="djI=", recebida_em=datetime(2024, 3, 1))
+    session.commit()
+
+    assert atual.id == primeira.id
+    assert atual.status == StatusCertidao.NEGATIVA
+    assert atual.conteudo == b"v2"
+    assert contar(session, Certidao, credor.id) == 1
+    anterior = session.scalars(select(CertidaoHistorico).where(CertidaoHistorico.credor_id == credor.id)).one()
+    assert anterior.certidao_id == atual.id
+    assert anterior.status == StatusCertidao.POSITIVA
+    assert anterior.recebida_em == datetime(2024, 2, 1)
+    assert anterior.substituida_em == datetime(2024, 3, 1)
+
+def test_indice_unico_por_credor_tipo_origem(session, credor_factory):
+    credor = credor_factory("Credor Histórico")
+    for origem in (OrigemCertidao.API, OrigemCertidao.MANUAL):
+        session.add(Certidao(credor_id=credor.id, tipo=TipoCertidao.ESTADUAL, origem=origem,
+                             status=StatusCertidao.NEGATIVA, recebida_em=datetime.utcnow()))
+    session.commit()
+
+    session.add(Certidao(credor_id=credor.id, tipo=TipoCertidao.ESTADUAL, origem=OrigemCertidao.API,
+                         status=StatusCertidao.POSITIVA, recebida_em=datetime.utcnow()))
+    with pytest.raises(IntegrityError):
+        session.commit()
+    session.rollback()
+
+def test_insercao_concorrente_vira_substituicao(session, credor_factory, monkeypatch):
+    """Testa que, se outro processo inserir a certidão entre a consulta e o INSERT, ela é substituída."""
+    credor = credor_factory("Credor Concorrente")
+    registrar_certidao(credor.id, TipoCertidao.MUNICIPAL, OrigemCertidao.API, StatusCertidao.POSITIVA,
+                       recebida_em=datetime(2024, 1, 1))
+    session.commit()
+    credor.email = "alterado@example.com"
+
+    # A consulta não vê a linha já gravada, como no processo que perdeu a corrida
+    consultas = []
+    scalars = session.scalars
+    def scalars_antes_da_insercao(consulta, *args, **kwargs):
+        consultas.append(consulta)
+        return scalars(consulta.where(Certidao.id < 0) if len(consultas) == 1 else consulta, *args, **kwargs)
+    monkeypatch.setattr(session, "scalars", scalars_antes_da_insercao)
+
+    certidao = registrar_certidao(credor.id, TipoCertidao.MUNICIPAL, OrigemCertidao.API, StatusCertidao.NEGATIVA,
+                                  recebida_em=datetime(2024, 2, 1))
+    session.commit()
+
+    assert certidao.status == StatusCertidao.NEGATIVA
+    assert contar(session, Certidao, credor.id) == 1
+    assert contar(session, CertidaoHistorico, credor.id) == 1
+    # O restante da transação não foi desfeito
+    assert session.scalar(select(Credor.email).where(Credor.id == credor.id)) == "alterado@example.com"
+
+def test_historico_paginado(client, session, credor_factory):
+    """Testa a paginação por cursor do histórico, da substituição mais recente para a mais antiga."""
+    credor = credor_factory("Credor Histórico")
+    for mes in range(1, 7):
+        status = StatusCertidao.POSITIVA if mes % 2 else StatusCertidao.NEGATIVA
+        registrar_certidao(credor.id, TipoCertidao.MUNICIPAL, OrigemCertidao.API, status,
+                           recebida_em=datetime(2024, mes, 1))
+        session.commit()
+
+    url = f"/api/credores/{credor.id}/certidoes/historico"
+    primeira = json.loads(client.get(f"{url}?limite=3").data)
+    assert [h["recebida_em"][:7] for h in primeira["historico"]] == ["2024-05", "2024-04", "2024-03"]
+
+    segunda = json.loads(client.get(f"{url}?limite=3&cursor={primeira['proximo_cursor']}").data)
+    assert [h["recebida_em"][:7] for h in segunda["historico"]] == ["2024-02", "2024-01"]
+    assert segunda["proximo_cursor"] is None
+
+    assert json.loads(client.get(f"{url}?origem=manual").data)["historico"] == []
+    assert client.get(f"{url}?tipo=inexistente").status_code == 400
+    assert client.get(f"{url}?limite=0").status_code == 400
+    assert client.get("/api/credores/99999/certidoes/historico").status_code == 404
+
+def test_consolidacao_de_certidoes_duplicadas(tmp_path, credor_factory):
+    """Testa que bancos anteriores ao índice único ficam com uma certidão atual por chave."""
+    from app import create_app
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads")
+    })
+    with app.app_context():
+        db.session.execute(text("DROP INDEX uq_certidoes_credor_tipo_origem"))
+        credor = credor_factory("Credor Legado", certidoes=[
+            Certidao(tipo=TipoCertidao.TRABALHISTA, origem=OrigemCertidao.API,
+                     status=status, recebida_em=datetime(2024, mes, 1))
+            for mes, status in ((3, StatusCertidao.NEGATIVA), (1, StatusCertidao.POSITIVA), (2, StatusCertidao.POSITIVA))
+        ])
+
+        resultado = app.test_cli_runner().invoke(args=["certidoes", "consolidar"])
+
+        assert "2 certidão(ões) movida(s)" in resultado.output
+        atual = db.session.scalars(select(Certidao).where(Certidao.credor_id == credor.id)).one()
+        assert atual.recebida_em == datetime(2024, 3, 1)
+        historico = db.session.scalars(select(CertidaoHistorico).order_by(CertidaoHistorico.recebida_em)).all()
+        assert [h.substituida_em for h in historico] == [datetime(2024, 2, 1), datetime(2024, 3, 1)]
+        assert all(h.certidao_id == atual.id for h in historico)
+
+        db.session.add(Certidao(credor_id=credor.id, tipo=TipoCertidao.TRABALHISTA, origem=OrigemCertidao.API,
+                                status=StatusCertidao.NEGATIVA, recebida_em=datetime.utcnow()))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+        db.session.remove()
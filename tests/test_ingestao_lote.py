@@ -0,0 +1,103 @@
+import json
+import random
+from app.extensions import db
+from app.models.credor import Credor
+
+def generate_unique_cpf():
+    """Gera um CPF único para testes"""
+    return f"{random.randint(10000000000, 99999999999)}"
+
+def registro(cpf, **extra):
+    dados = {
+        "nome": "Credor Lote",
+        "cpf_cnpj": cpf,
+        "email": "lote@example.com",
+        "telefone": "11999999999",
+        "precatorio": {
+            "numero_precatorio": "0001234-56.2020.8.26.0050",
+            "valor_nominal": 1000.00,
+            "foro": "TJSP",
+            "data_publicacao": "2023-10-01"
+        }
+    }
+    dados.update(extra)
+    return dados
+
+def test_lote_ndjson_com_linhas_invalidas(client, session):
+    """Testa que linhas inválidas não abortam o restante do lote NDJSON."""
+    cpfs = [generate_unique_cpf() for _ in range(3)]
+    linhas = [
+        json.dumps(registro(cpfs[0])),
+        "{json quebrado",
+        json.dumps(registro(cpfs[1], precatorio={"foro": "TJSP"})),
+        json.dumps(registro(cpfs[2])),
+        json.dumps(registro(cpfs[2]))
+    ]
+
+    response = client.post('/api/credores/lote',
+                           data="\n".join(linhas) + "\n",
+                           content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    response_data = json.loads(response.data)
+    assert response_data["total"] == 5
+    assert response_data["criados"] == 2
+    assert response_data["erros"] == 3
+
+    status = [r["status"] for r in response_data["resultados"]]
+    assert status == ["criado", "erro", "erro", "criado", "erro"]
+    assert "duplicado" in response_data["resultados"][4]["erro"]
+
+    credor = db.session.get(Credor, response_data["resultados"][0]["credor_id"])
+    assert credor.cpf_cnpj == cpfs[0]
+    assert len(credor.precatorios) == 1
+
+def test_lote_csv_em_varias_transacoes(client, session, test_app, monkeypatch):
+    """Testa a ingestão CSV com lotes menores que o total de linhas."""
+    monkeypatch.setitem(test_app.config, "INGESTAO_TAMANHO_LOTE", 2)
+    cpfs = [generate_unique_cpf() for _ in range(5)]
+
+    existente = Credor(nome="Já Existe", cpf_cnpj=cpfs[3], email="x@example.com", telefone="1")
+    session.add(existente)
+    session.commit()
+
+    linhas = ["nome,cpf_cnpj,email,telefone,numero_precatorio,valor_nominal,foro,data_publicacao"]
+    for cpf in cpfs:
+        linhas.append(f"Credor CSV,{cpf},csv@example.com,11999999999,123,2500.50,TJRJ,2022-05-10")
+
+    response = client.post('/api/credores/lote',
+                           data="\n".join(linhas),
+                           content_type='text/csv')
+
+    assert response.status_code == 200
+    response_data = json.loads(response.data)
+    assert response_data["criados"] == 4
+    # Linha do arquivo, contando o cabeçalho
+    assert response_data["resultados"][3] == {"linha": 5, "status": "erro", "erro": "CPF/CNPJ já cadastrado"}
+
+    credor = Credor.query.filter_by(cpf_cnpj=cpfs[4]).first()
+    assert credor.precatorios[0].valor_nominal == 2500.50
+    assert credor.precatorios[0].foro == "TJRJ"
+
+def test_lote_numera_linhas_do_arquivo_e_limita_tamanhos(client, session):
+    """Testa que linhas em branco contam na numeração e que campos longos demais são erro da linha."""
+    linhas = [
+        json.dumps(registro(generate_unique_cpf())),
+        "",
+        "",
+        json.dumps(registro(generate_unique_cpf(), nome="x" * 300)),
+        json.dumps(registro(generate_unique_cpf()))
+    ]
+
+    response = client.post('/api/credores/lote', data="\n".join(linhas), content_type='application/x-ndjson')
+
+    resultados = json.loads(response.data)["resultados"]
+    assert [(r["linha"], r["status"]) for r in resultados] == [(1, "criado"), (4, "erro"), (5, "criado")]
+    assert "nome deve ter no máximo 255" in resultados[1]["erro"]
+
+def test_lote_formato_nao_suportado(client):
+    """Testa a rejeição de formatos desconhecidos."""
+    response = client.post('/api/credores/lote', data="x", content_type='text/plain')
+
+    assert response.status_code == 415
+    assert "erro" in json.loads(response.data)
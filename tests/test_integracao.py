@@ -84,10 +84,14 @@ def test_fluxo_completo_credor_documentos_certidoes(client, session, test_app, m
         return MockResponse(mock_data, 200)
     
     import requests
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(requests.Session, "get", mock_get)
     
     response = client.post(f'/api/credores/{credor_id}/buscar-certidoes')
-    assert response.status_code == 201
+    assert response.status_code == 202
+    
+    # A busca é executada pelo worker da fila
+    from app.services.tarefas import processar_pendentes
+    assert processar_pendentes() == 1
     
     # 4. Consultar credor com todos os dados
     response = client.get(f'/api/credores/{credor_id}')
@@ -0,0 +1,72 @@
+import json
+import random
+from datetime import datetime
+from app.models.precatorio import Precatorio
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+
+def criar_carteira(credor_factory, foro, quantidade):
+    """Cria credores com um precatório cada no foro informado."""
+    return [
+        credor_factory(f"Credor Listagem {i}", precatorios=[Precatorio(
+            numero_precatorio=f"{i:07d}-00.2020.8.26.0050",
+            valor_nominal=1000.0 * (i + 1),
+            foro=foro,
+            data_publicacao=datetime(2020 + i, 1, 1)
+        )])
+        for i in range(quantidade)
+    ]
+
+def test_listagem_paginada_por_cursor(client, session, credor_factory):
+    """Testa que o cursor percorre todas as páginas sem repetir credores."""
+    foro = f"FORO-{random.randint(0, 10**9)}"
+    credores = criar_carteira(credor_factory, foro, 5)
+
+    ids = []
+    cursor = None
+    for _ in range(3):
+        url = f'/api/credores?foro={foro}&limite=2'
+        if cursor:
+            url += f'&cursor={cursor}'
+        response = client.get(url)
+        assert response.status_code == 200
+        response_data = json.loads(response.data)
+        ids.extend(c["id"] for c in response_data["credores"])
+        cursor = response_data["proximo_cursor"]
+
+    assert ids == [c.id for c in credores]
+    assert cursor is None
+
+def test_listagem_filtros_valor_data_e_status(client, session, credor_factory):
+    """Testa os filtros por faixa de valor, data de publicação e status de certidão."""
+    foro = f"FORO-{random.randint(0, 10**9)}"
+    credores = criar_carteira(credor_factory, foro, 4)
+
+    response = client.get(f'/api/credores?foro={foro}&valor_min=2000&valor_max=3000')
+    ids = [c["id"] for c in json.loads(response.data)["credores"]]
+    assert ids == [credores[1].id, credores[2].id]
+
+    response = client.get(f'/api/credores?foro={foro}&publicacao_inicio=2022-01-01')
+    ids = [c["id"] for c in json.loads(response.data)["credores"]]
+    assert ids == [credores[2].id, credores[3].id]
+
+    session.add(Certidao(
+        credor_id=credores[0].id,
+        tipo=TipoCertidao.FEDERAL,
+        origem=OrigemCertidao.MANUAL,
+        status=StatusCertidao.POSITIVA,
+        recebida_em=datetime.utcnow()
+    ))
+    session.commit()
+
+    response = client.get(f'/api/credores?foro={foro}&status_certidao=positiva')
+    response_data = json.loads(response.data)
+    assert [c["id"] for c in response_data["credores"]] == [credores[0].id]
+    assert "precatorios" not in response_data["credores"][0]
+
+def test_listagem_parametros_invalidos(client):
+    """Testa a validação dos parâmetros de filtro e paginação."""
+    assert client.get('/api/credores?valor_min=abc').status_code == 400
+    assert client.get('/api/credores?publicacao_fim=01/01/2020').status_code == 400
+    assert client.get('/api/credores?status_certidao=desconhecido').status_code == 400
+    assert client.get('/api/credores?limite=0').status_code == 400
+    assert client.get('/api/credores?limite=100000').status_code == 400
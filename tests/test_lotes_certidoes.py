@@ -0,0 +1,100 @@
+import json
+import threading
+from datetime import datetime
+import requests
+from app.extensions import db
+from app.jobs import revalidar_certidoes as job
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+from app.services.provedores_certidoes import AgrupadorLotes, Provedor
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
+
+class SessaoLote:
+    """Sessão falsa que responde ao endpoint de lote e registra os lotes recebidos."""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.lotes = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            self.lotes.append((json["tipo"], list(json["cpfs_cnpjs"])))
+        return MockResponse({"resultados": {
+            cpf: [{"tipo": json["tipo"], "status": "positiva", "conteudo_base64": "bG90ZQ=="}]
+            for cpf in json["cpfs_cnpjs"]
+        }}, self.status_code)
+
+def test_mock_consulta_em_lote(client):
+    """Testa o endpoint de lote da API mock."""
+    response = client.post("/api/certidoes/lote", json={"cpfs_cnpjs": ["111", "222"], "tipo": "estadual"})
+    assert response.status_code == 200
+    resultados = json.loads(response.data)["resultados"]
+    assert set(resultados) == {"111", "222"}
+    assert [c["tipo"] for c in resultados["111"]] == ["estadual"]
+
+    assert client.post("/api/certidoes/lote", json={}).status_code == 400
+    assert client.post("/api/certidoes/lote", json={"cpfs_cnpjs": ["1"] * 501}).status_code == 400
+
+def test_agrupador_respeita_tamanho_maximo():
+    """Testa que as consultas pendentes seguem em lotes de no máximo tamanho_lote."""
+    sessao = SessaoLote()
+    agrupador = AgrupadorLotes(Provedor(TipoCertidao.FEDERAL, url_lote="http://lote", tamanho_lote=3,
+                                        espera_lote=0.2), sessao)
+
+    futuros = [agrupador.enviar(str(cpf))[0] for cpf in range(7)]
+    resultados = [f.result(timeout=2) for f in futuros]
+
+    assert sorted(len(cpfs) for _, cpfs in sessao.lotes) == [1, 3, 3]
+    assert all(r[0]["status"] == "positiva" for r in resultados)
+
+def test_agrupador_coalesce_e_propaga_falha():
+    """Testa que o mesmo CPF/CNPJ pendente reaproveita a consulta e que a falha do lote chega a todos."""
+    sessao = SessaoLote(status_code=503)
+    agrupador = AgrupadorLotes(Provedor(TipoCertidao.FEDERAL, url_lote="http://lote", espera_lote=0.05), sessao)
+
+    primeiro, novo = agrupador.enviar("123")
+    repetido, repetido_novo = agrupador.enviar("123")
+    outro, _ = agrupador.enviar("456")
+
+    assert novo and not repetido_novo and repetido is primeiro
+    for futuro in (primeiro, outro):
+        assert isinstance(futuro.exception(timeout=2), requests.HTTPError)
+    assert sessao.lotes == [("federal", ["123", "456"])]
+
+def test_revalidacao_usa_consultas_em_lote(tmp_path, monkeypatch, credor_factory):
+    """Testa que o job envia o lote inteiro de credores em uma requisição por provedor."""
+    from app import create_app
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "CERTIDOES_LOTE_URL": "http://localhost:5000/api/certidoes/lote",
+        "CERTIDOES_LOTE_ESPERA": 0.2
+    })
+    sessao = SessaoLote()
+    monkeypatch.setattr(requests.Session, "post", lambda self, url, json=None, timeout=None:
+                        sessao.post(url, json, timeout))
+
+    with app.app_context():
+        cpfs = []
+        for _ in range(6):
+            credor = credor_factory("Credor Lote", certidoes=[
+                Certidao(tipo=tipo, origem=OrigemCertidao.API,
+                         status=StatusCertidao.NEGATIVA, recebida_em=datetime(2020, 1, 1))
+                for tipo in (TipoCertidao.FEDERAL, TipoCertidao.TRABALHISTA)
+            ])
+            cpfs.append(credor.cpf_cnpj)
+
+        relatorio = job.revalidar_certidoes(tamanho_lote=10, reiniciar=True, workers=1)
+
+        assert relatorio["certidoes_atualizadas"] == 12
+        assert sorted(tipo for tipo, _ in sessao.lotes) == ["federal", "trabalhista"]
+        assert all(sorted(lote) == sorted(cpfs) for _, lote in sessao.lotes)
+        db.session.remove()
@@ -0,0 +1,57 @@
+import json
+from datetime import datetime
+import numpy as np
+from app.models.precatorio import Precatorio
+from app.services.precificacao import CarteiraColunar, Cenario, CurvaDesconto, TabelaAtrasos, precificar
+
+def test_precificacao_vetorizada_com_curva_e_atrasos():
+    """Testa o desconto composto com atraso por foro e pagamentos já vencidos."""
+    carteira = CarteiraColunar(
+        ids=[1, 2, 3], credores_ids=[1, 1, 2], valores=[1000.0, 1000.0, 500.0],
+        datas_publicacao=['2024-01-01', '2024-01-01', '2010-01-01'],
+        foros=['TJSP', 'TRF3'], indices_foro=[0, 1, 0]
+    )
+    cenario = Cenario('teste', CurvaDesconto([1.0, 3.0], [0.10, 0.20]), TabelaAtrasos({'TJSP': 24}, 12))
+
+    resultado = precificar(carteira, cenario, data_base='2024-01-01')
+
+    prazos = resultado['prazos_anos']
+    assert np.allclose(prazos[:2], [730 / 365.25, 365 / 365.25])
+    taxas = np.interp(prazos[:2], [1.0, 3.0], [0.10, 0.20])
+    assert np.allclose(resultado['precos'][:2], 1000.0 * (1 + taxas) ** -prazos[:2])
+    # Pagamento estimado antes da data-base: sem desconto
+    assert resultado['precos'][2] == 500.0
+
+def test_rota_precifica_varios_cenarios(client, session, credor_factory):
+    """Testa a API em lote com dois cenários sobre os mesmos precatórios."""
+    credor = credor_factory("Credor Preço", precatorios=[
+        Precatorio(numero_precatorio="1", valor_nominal=1000.0, foro="TJSP", data_publicacao=datetime(2024, 1, 1)),
+        Precatorio(numero_precatorio="2", valor_nominal=3000.0, foro="TJRJ", data_publicacao=datetime(2024, 1, 1))
+    ])
+    ids = [p.id for p in credor.precatorios]
+
+    response = client.post('/api/precificacao', json={
+        "data_base": "2024-01-01",
+        "precatorio_ids": ids,
+        "detalhar": True,
+        "cenarios": [
+            {"nome": "sem_juros", "curva": {"taxa": 0}},
+            {"nome": "juros", "curva": {"prazos_anos": [1, 5], "taxas": [0.1, 0.1]},
+             "atrasos_por_foro": {"TJSP": 12}, "atraso_padrao_meses": 0}
+        ]
+    })
+
+    assert response.status_code == 200
+    sem_juros, juros = json.loads(response.data)["cenarios"]
+    assert sem_juros["quantidade"] == 2
+    assert sem_juros["preco_total"] == 4000.0
+    precos = {item["precatorio_id"]: item["preco"] for item in juros["itens"]}
+    assert precos[ids[0]] == round(1000.0 * 1.1 ** -(365 / 365.25), 2)
+    assert precos[ids[1]] == 3000.0
+
+def test_rota_rejeita_cenario_invalido(client):
+    """Testa a validação da curva de desconto."""
+    response = client.post('/api/precificacao', json={"curva": {"prazos_anos": [2, 1], "taxas": [0.1, 0.1]}})
+
+    assert response.status_code == 400
+    assert "crescente" in json.loads(response.data)["erro"]
@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+import requests
+from app.models.certidao import Certidao
+from app.services.tarefas import processar_pendentes
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
+
+def executar_busca(client, credor):
+    """Agenda a busca de certidões, executa a fila e retorna o estado da tarefa."""
+    response = client.post(f'/api/credores/{credor.id}/buscar-certidoes')
+    assert response.status_code == 202
+    assert processar_pendentes() == 1
+    return json.loads(client.get(json.loads(response.data)["status_url"]).data)
+
+def test_provedores_consultados_em_paralelo(client, session, monkeypatch, credor_factory):
+    """Testa que a latência é a do provedor mais lento, não a soma de todos."""
+    credor = credor_factory("Teste Provedores")
+    threads = set()
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        assert timeout is not None
+        threads.add(threading.get_ident())
+        time.sleep(0.3)
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "negativa", "conteudo_base64": "eA=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+
+    inicio = time.monotonic()
+    tarefa = executar_busca(client, credor)
+    decorrido = time.monotonic() - inicio
+
+    assert tarefa["resultado"]["total"] == 4
+    assert len(threads) == 4
+    assert decorrido < 0.9
+
+def test_falha_de_um_provedor_nao_impede_os_demais(client, session, test_app, monkeypatch, credor_factory):
+    """Testa timeouts por provedor e o registro parcial quando um emissor falha."""
+    credor = credor_factory("Teste Provedores")
+    timeouts = {}
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        timeouts[params["tipo"]] = timeout
+        if params["tipo"] == "municipal":
+            raise requests.Timeout("emissor municipal lento")
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "negativa", "conteudo_base64": "eA=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+
+    tarefa = executar_busca(client, credor)
+
+    assert tarefa["status"] == "concluida"
+    dados = tarefa["resultado"]
+    assert dados["total"] == 3
+    assert "municipal" in dados["erros"]
+    assert Certidao.query.filter_by(credor_id=credor.id).count() == 3
+    assert timeouts["federal"] == tuple(test_app.config["CERTIDOES_TIMEOUT"])
+
+def test_mock_api_filtra_por_tipo(client):
+    """Testa o mock de um emissor de um único tipo."""
+    response = client.get('/api/certidoes?cpf_cnpj=123&tipo=estadual')
+
+    certidoes = json.loads(response.data)["certidoes"]
+    assert [c["tipo"] for c in certidoes] == ["estadual"]
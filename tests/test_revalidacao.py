@@ -0,0 +1,146 @@
+from datetime import datetime
+import pytest
+import requests
+from app.extensions import db
+from app.jobs import revalidar_certidoes as job
+from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+from app.models.checkpoint_job import CheckpointJob
+from app.models.credor import Credor
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+
+    def json(self):
+        return self.json_data
+
+@pytest.fixture()
+def provedor_positivo(monkeypatch):
+    """Provedores respondendo 'positiva'; registra os CPFs consultados."""
+    consultados = []
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        consultados.append(params["cpf_cnpj"])
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "positiva", "conteudo_base64": "bm92YQ=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+    return consultados
+
+def criar_credores_com_certidao(credor_factory, quantidade):
+    credores = [
+        credor_factory(f"Credor Revalidação {i}", certidoes=[Certidao(
+            tipo=TipoCertidao.FEDERAL, origem=OrigemCertidao.API,
+            status=StatusCertidao.NEGATIVA, recebida_em=datetime(2020, 1, 1)
+        )])
+        for i in range(quantidade)
+    ]
+    return [(c.id, c.cpf_cnpj) for c in credores]
+
+def test_revalidacao_em_lotes_com_relatorio(session, provedor_positivo, credor_factory):
+    """Testa a atualização em lotes, o checkpoint concluído e o relatório de vazão."""
+    credores = criar_credores_com_certidao(credor_factory, 5)
+
+    relatorio = job.revalidar_certidoes(tamanho_lote=2, reiniciar=True)
+
+    assert relatorio["credores"] == 5
+    assert relatorio["certidoes_atualizadas"] == 5
+    assert relatorio["credores_por_segundo"] > 0
+    assert sorted(provedor_positivo) == sorted(cpf for _, cpf in credores)
+    status = {c.status for c in Certidao.query.filter(Certidao.credor_id.in_([i for i, _ in credores]))}
+    assert status == {StatusCertidao.POSITIVA}
+
+    checkpoint = db.session.get(CheckpointJob, job.NOME_JOB)
+    assert checkpoint.concluido_em is not None
+    assert checkpoint.ultimo_id == credores[-1][0]
+
+def test_execucao_interrompida_retoma_do_checkpoint(session, provedor_positivo, monkeypatch, credor_factory):
+    """Testa que uma falha após o segundo lote não reprocessa os lotes gravados."""
+    credores = criar_credores_com_certidao(credor_factory, 5)
+    invalidar = job.cache_credores.invalidar
+    lotes = []
+
+    def invalidar_e_falhar(*ids):
+        invalidar(*ids)
+        lotes.append(ids)
+        if len(lotes) == 2:
+            raise RuntimeError("queda simulada")
+
+    monkeypatch.setattr(job.cache_credores, "invalidar", invalidar_e_falhar)
+    with pytest.raises(RuntimeError):
+        job.revalidar_certidoes(tamanho_lote=2, reiniciar=True)
+    monkeypatch.setattr(job.cache_credores, "invalidar", invalidar)
+
+    del provedor_positivo[:]
+    relatorio = job.revalidar_certidoes(tamanho_lote=2)
+
+    # Todos os credores do banco nesta execução ficam após o checkpoint
+    ordenados = sorted(db.session.scalars(db.select(Credor.id)))
+    assert relatorio["retomado_de"] == ordenados[3]
+    assert relatorio["credores"] == len([i for i in ordenados if i > ordenados[3]])
+    ja_processados = {db.session.get(Credor, i).cpf_cnpj for i in ordenados[:4]}
+    assert ja_processados.isdisjoint(provedor_positivo)
+    assert credores[-1][1] in provedor_positivo
+
+def test_comando_revalidar(test_app, session, provedor_positivo, credor_factory):
+    """Testa o comando flask certidoes revalidar."""
+    criar_credores_com_certidao(credor_factory, 1)
+
+    resultado = test_app.test_cli_runner().invoke(args=["certidoes", "revalidar", "--reiniciar", "--workers", "1"])
+
+    assert "Vazão:" in resultado.output
+
+def test_token_bucket_limita_a_taxa():
+    """Testa rajada inicial e reposição das fichas com o tempo."""
+    from app.services.limite_taxa import TokenBucket
+    agora = [0.0]
+    balde = TokenBucket(taxa=2, capacidade=2, relogio=lambda: agora[0])
+
+    assert balde.tentar_adquirir() == 0
+    assert balde.tentar_adquirir() == 0
+    assert balde.tentar_adquirir() == pytest.approx(0.5)
+    agora[0] += 0.5
+    assert balde.tentar_adquirir() == 0
+
+def test_revalidacao_paralela_com_limite_por_provedor(tmp_path, monkeypatch, credor_factory):
+    """Testa o modo com vários workers, o limite de taxa do provedor e a janela."""
+    import time
+    from app import create_app
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'revalidacao.db'}",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "CERTIDOES_PROVEDORES": {"federal": {"taxa": 40, "rajada": 1}}
+    })
+    instantes = []
+
+    def mock_get(sessao, url, params=None, timeout=None):
+        instantes.append(time.monotonic())
+        return MockResponse({"certidoes": [
+            {"tipo": params["tipo"], "status": "positiva", "conteudo_base64": "bm92YQ=="}
+        ]})
+
+    monkeypatch.setattr(requests.Session, "get", mock_get)
+
+    with app.app_context():
+        credores = criar_credores_com_certidao(credor_factory, 12)
+
+        relatorio = job.revalidar_certidoes(tamanho_lote=2, reiniciar=True, workers=4)
+
+        assert relatorio["concluido"] is True
+        assert relatorio["credores"] == 12
+        assert relatorio["certidoes_atualizadas"] == 12
+        # 12 consultas a 40/s com rajada de 1: pelo menos 11 intervalos de 25 ms
+        assert max(instantes) - min(instantes) >= 11 / 40 * 0.9
+        assert {c.status for c in Certidao.query} == {StatusCertidao.POSITIVA}
+        checkpoint = db.session.get(CheckpointJob, job.NOME_JOB)
+        assert checkpoint.ultimo_id == credores[-1][0]
+        assert checkpoint.processados == 12
+
+        parcial = job.revalidar_certidoes(reiniciar=True, workers=4, janela_segundos=1e-6)
+
+        assert parcial["concluido"] is False
+        assert db.session.get(CheckpointJob, job.NOME_JOB).concluido_em is None
+        db.session.remove()
@@ -152,3 +152,104 @@ def test_criar_credor_cpf_duplicado(client, session):
     assert response.status_code == 500
     response_data = json.loads(response.data)
     assert "erro" in response_data
+
+def test_obter_credor_sem_conteudo_base64_por_padrao(client, session):
+    """Testa que o conteúdo base64 das certidões só é enviado quando pedido."""
+    from app.models.credor import Credor
+    from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+    credor = Credor(
+        nome="Credor Base64",
+        cpf_cnpj=generate_unique_cpf(),
+        email="base64@example.com",
+        telefone="11999999999"
+    )
+    credor.certidoes.append(Certidao(
+        tipo=TipoCertidao.FEDERAL,
+        origem=OrigemCertidao.API,
+        status=StatusCertidao.NEGATIVA,
+        conteudo_base64="Y2VydGlkYW8gdGVzdGU=",
+        recebida_em=datetime.utcnow()
+    ))
+    session.add(credor)
+    session.commit()
+    
+    response = client.get(f'/api/credores/{credor.id}')
+    response_data = json.loads(response.data)
+    assert len(response_data["certidoes"]) == 1
+    assert "conteudo_base64" not in response_data["certidoes"][0]
+    
+    response = client.get(f'/api/credores/{credor.id}?include=certidoes.conteudo_base64')
+    response_data = json.loads(response.data)
+    assert response_data["certidoes"][0]["conteudo_base64"] == "Y2VydGlkYW8gdGVzdGU="
+    assert "precatorios" not in response_data
+
+def test_obter_credor_campos_esparsos(client, session):
+    """Testa o recorte de campos com ?fields= e ?include=."""
+    from app.models.credor import Credor
+    from app.models.precatorio import Precatorio
+    credor = Credor(
+        nome="Credor Esparso",
+        cpf_cnpj=generate_unique_cpf(),
+        email="esparso@example.com",
+        telefone="11999999999"
+    )
+    precatorio = Precatorio(
+        numero_precatorio="0001234-56.2020.8.26.0050",
+        valor_nominal=50000.00,
+        foro="TJSP",
+        data_publicacao=datetime(2023, 10, 1)
+    )
+    credor.precatorios.append(precatorio)
+    session.add(credor)
+    session.commit()
+    
+    response = client.get(f'/api/credores/{credor.id}?fields=nome&include=precatorios')
+    
+    assert response.status_code == 200
+    response_data = json.loads(response.data)
+    assert set(response_data) == {"id", "nome", "precatorios"}
+    assert response_data["precatorios"][0]["id"] == precatorio.id
+    
+    response = client.get(f'/api/credores/{credor.id}?fields=senha')
+    assert response.status_code == 400
+    response = client.get(f'/api/credores/{credor.id}?include=processos')
+    assert response.status_code == 400
+
+def test_obter_credor_etag_e_304(client, session):
+    """Testa o GET condicional: 304 enquanto nada muda, nova ETag após escrita em filho."""
+    from app.models.credor import Credor
+    from app.models.certidao import Certidao, TipoCertidao, OrigemCertidao, StatusCertidao
+    credor = Credor(
+        nome="Credor ETag",
+        cpf_cnpj=generate_unique_cpf(),
+        email="etag@example.com",
+        telefone="11999999999"
+    )
+    session.add(credor)
+    session.commit()
+    
+    response = client.get(f'/api/credores/{credor.id}')
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    
+    response = client.get(f'/api/credores/{credor.id}', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    
+    # ETag depende do recorte pedido
+    response = client.get(f'/api/credores/{credor.id}?include=precatorios', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    
+    session.add(Certidao(
+        credor_id=credor.id,
+        tipo=TipoCertidao.FEDERAL,
+        origem=OrigemCertidao.MANUAL,
+        status=StatusCertidao.NEGATIVA,
+        recebida_em=datetime.utcnow()
+    ))
+    session.commit()
+    
+    response = client.get(f'/api/credores/{credor.id}', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(json.loads(response.data)["certidoes"]) == 1
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import requests
+from app.models.tarefa import StatusTarefa, Tarefa
+from app.services.tarefas import calcular_backoff, enfileirar, executar, reservar_proxima, tarefa
+
+falhas_restantes = {"valor": 0}
+
+@tarefa("teste_instavel")
+def tarefa_instavel(valor):
+    if falhas_restantes["valor"] > 0:
+        falhas_restantes["valor"] -= 1
+        raise ConnectionError("emissor indisponível")
+    return {"dobro": valor * 2}
+
+def reservar_e_executar(agora):
+    reservada = reservar_proxima("worker-teste", agora)
+    assert reservada is not None
+    return executar(reservada, agora)
+
+def test_busca_nao_espera_os_provedores(client, session, monkeypatch, credor_factory):
+    """Testa que a rota só agenda a busca: nenhum provedor é consultado na requisição."""
+    credor = credor_factory("Credor Fila")
+    consultas = []
+    monkeypatch.setattr(requests.Session, "get", lambda *args, **kwargs: consultas.append(args))
+
+    response = client.post(f"/api/credores/{credor.id}/buscar-certidoes")
+
+    assert response.status_code == 202
+    assert consultas == []
+    dados = json.loads(client.get(response.headers["Location"]).data)
+    assert dados["status"] == "pendente"
+    assert dados["tipo"] == "buscar_certidoes"
+    # Limpa a fila para os próximos testes
+    reservada = reservar_proxima("worker-teste")
+    reservada.status = StatusTarefa.CONCLUIDA
+    session.commit()
+
+def test_novas_tentativas_com_backoff(session, test_app):
+    """Testa que a falha volta para a fila com espera crescente até dar certo."""
+    test_app.config["TAREFAS_BACKOFF_SEGUNDOS"] = 10
+    falhas_restantes["valor"] = 2
+    nova = enfileirar("teste_instavel", valor=21)
+    agora = datetime.utcnow()
+
+    primeira = reservar_e_executar(agora)
+    assert primeira.status == StatusTarefa.PENDENTE
+    assert "emissor indisponível" in primeira.erro
+    espera_primeira = primeira.disponivel_em - agora
+    # Ainda em backoff: nada disponível
+    assert reservar_proxima("worker-teste", agora + timedelta(seconds=5)) is None
+
+    agora = primeira.disponivel_em
+    segunda = reservar_e_executar(agora)
+    assert segunda.disponivel_em - agora > espera_primeira
+
+    terceira = reservar_e_executar(segunda.disponivel_em)
+    assert terceira.id == nova.id
+    assert terceira.status == StatusTarefa.CONCLUIDA
+    assert terceira.tentativas == 3
+    assert terceira.resultado == {"dobro": 42}
+
+def test_tarefa_falha_ao_esgotar_tentativas(session):
+    falhas_restantes["valor"] = 10
+    enfileirar("teste_instavel", max_tentativas=2, valor=1)
+    agora = datetime.utcnow()
+
+    primeira = reservar_e_executar(agora)
+    final = reservar_e_executar(primeira.disponivel_em)
+
+    assert final.status == StatusTarefa.FALHOU
+    assert final.concluida_em is not None
+    falhas_restantes["valor"] = 0
+
+def test_reserva_exclusiva_e_retomada_de_worker_morto(session, test_app):
+    """Testa que a tarefa reservada não vai a outro worker, salvo após o timeout da reserva."""
+    nova = enfileirar("teste_instavel", valor=5)
+    agora = datetime.utcnow()
+
+    assert reservar_proxima("worker-a", agora).id == nova.id
+    assert reservar_proxima("worker-b", agora) is None
+
+    depois_do_timeout = agora + timedelta(seconds=test_app.config["TAREFAS_TIMEOUT_SEGUNDOS"] + 1)
+    retomada = reservar_proxima("worker-b", depois_do_timeout)
+    assert retomada.id == nova.id
+    assert retomada.reservada_por == "worker-b"
+    assert retomada.tentativas == 2
+    executar(retomada)
+
+def test_desfecho_do_worker_que_perdeu_a_reserva_e_descartado(session, test_app):
+    """Testa que o worker cuja reserva venceu não sobrescreve a execução de quem a retomou."""
+    nova = enfileirar("teste_instavel", valor=7)
+    agora = datetime.utcnow()
+    reservada = reservar_proxima("worker-lento", agora)
+    # Cópia do que o worker lento tem em memória (no mesmo processo, a sessão compartilharia o objeto)
+    lenta = SimpleNamespace(**{campo: getattr(reservada, campo) for campo in (
+        "id", "tipo", "parametros", "tentativas", "max_tentativas", "reservada_por", "reservada_em")})
+    retomada = reservar_proxima("worker-b",
+                                agora + timedelta(seconds=test_app.config["TAREFAS_TIMEOUT_SEGUNDOS"] + 1))
+
+    falhas_restantes["valor"] = 0
+    assert executar(lenta).reservada_por == "worker-b"
+    assert session.get(Tarefa, nova.id).status == StatusTarefa.EXECUTANDO
+
+    final = executar(retomada)
+    assert final.status == StatusTarefa.CONCLUIDA and final.tentativas == 2
+
+def test_reserva_vencida_na_ultima_tentativa_falha(session, test_app):
+    """Testa que a retomada de worker morto respeita max_tentativas."""
+    nova = enfileirar("teste_instavel", max_tentativas=1, valor=9)
+    agora = datetime.utcnow()
+    assert reservar_proxima("worker-morto", agora).id == nova.id
+
+    depois_do_timeout = agora + timedelta(seconds=test_app.config["TAREFAS_TIMEOUT_SEGUNDOS"] + 1)
+    assert reservar_proxima("worker-b", depois_do_timeout) is None
+    tarefa_final = session.get(Tarefa, nova.id, populate_existing=True)
+    assert tarefa_final.status == StatusTarefa.FALHOU
+    assert tarefa_final.tentativas == 1 and "Reserva vencida" in tarefa_final.erro
+
+def test_backoff_limitado():
+    class SemJitter:
+        def uniform(self, a, b):
+            return 1.0
+
+    assert calcular_backoff(1, base=10, maximo=600, aleatorio=SemJitter()) == timedelta(seconds=10)
+    assert calcular_backoff(3, base=10, maximo=600, aleatorio=SemJitter()) == timedelta(seconds=40)
+    assert calcular_backoff(20, base=10, maximo=600, aleatorio=SemJitter()) == timedelta(seconds=600)
+
+def test_comando_worker_e_tarefa_inexistente(client, test_app):
+    enfileirar("teste_instavel", valor=3)
+
+    resultado = test_app.test_cli_runner().invoke(args=["tarefas", "worker", "--uma-vez"])
+
+    assert "1 tarefa(s) executada(s)" in resultado.output
+    assert client.get("/api/tarefas/99999").status_code == 404
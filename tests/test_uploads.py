@@ -5,6 +5,7 @@ import os
 from werkzeug.datastructures import FileStorage
 import random
 from app.extensions import db
+from app.services.arquivos import armazenamento_arquivos
 
 def generate_unique_cpf():
     """Gera um CPF único para testes"""
@@ -44,8 +45,8 @@ def test_upload_documento_sucesso(client, credor_exemplo, test_app):
     assert documento.tipo.value == "identidade"
     assert documento.credor_id == credor_exemplo.id
     
-    # Verificar se o arquivo foi salvo no sistema de arquivos
-    assert os.path.exists(documento.arquivo_url)
+    # Verificar se o arquivo foi salvo no armazenamento (arquivo_url é o id)
+    assert os.path.exists(armazenamento_arquivos.caminho(documento.arquivo_url))
 
 def test_upload_documento_credor_inexistente(client):
     """Testa o upload de um documento para um credor que não existe."""
@@ -239,13 +240,7 @@ def test_upload_documento_tamanho_excedido(client, session, monkeypatch):
         content_type="application/pdf",
     )
     
-    # Patch para a função de verificação de tamanho para simular um arquivo grande
-    from app.utils.validacao_arquivos import verificar_tamanho_arquivo
-    def mock_verificar_tamanho(*args, **kwargs):
-        return False, "Arquivo muito grande: 11.0MB (máximo: 10.0MB)"
-    
-    monkeypatch.setattr("app.utils.validacao_arquivos.verificar_tamanho_arquivo", mock_verificar_tamanho)
-    
+    # O limite (UPLOAD_TAMANHO_MAXIMO) é conferido enquanto o arquivo é recebido
     data = {
         'tipo': 'identidade',
         'arquivo': file
@@ -257,7 +252,7 @@ def test_upload_documento_tamanho_excedido(client, session, monkeypatch):
         content_type='multipart/form-data'
     )
     
-    assert response.status_code == 400
+    assert response.status_code == 413
     response_data = json.loads(response.data)
     assert "erro" in response_data
     assert "Arquivo muito grande" in response_data["erro"]
@@ -310,8 +305,8 @@ def test_upload_certidao_manual_sucesso(client, session, test_app):
     assert certidao.origem.value == "manual"
     assert certidao.credor_id == credor.id
     
-    # Verificar se o arquivo foi salvo no sistema de arquivos
-    assert os.path.exists(certidao.arquivo_url)
+    # Verificar se o arquivo foi salvo no armazenamento (arquivo_url é o id)
+    assert os.path.exists(armazenamento_arquivos.caminho(certidao.arquivo_url))
 
 def test_upload_certidao_sem_campos_obrigatorios(client, session):
     """Testa o upload de uma certidão sem campos obrigatórios."""
@@ -350,3 +345,81 @@ def test_upload_certidao_sem_campos_obrigatorios(client, session):
     response_data = json.loads(response.data)
     assert "erro" in response_data
     assert "obrigatórios" in response_data["erro"]
+
+def test_upload_recebido_em_uma_passada(client, session, test_app, monkeypatch, credor_factory):
+    """Testa que o upload é gravado durante o parse, sem releitura nem temporários restantes."""
+    import hashlib
+    from app.models.documento_pessoal import DocumentoPessoal
+    from app.utils import uploads
+
+    receptores = []
+    original = uploads.ReceptorArquivo.__init__
+    def registrar(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        receptores.append(self)
+    monkeypatch.setattr(uploads.ReceptorArquivo, "__init__", registrar)
+    credor = credor_factory("Teste Upload Streaming")
+
+    file_content = b"%PDF-1.5\n" + b"x" * 200000
+    data = {
+        'tipo': 'identidade',
+        'arquivo': FileStorage(stream=io.BytesIO(file_content), filename="rg frente.pdf",
+                               content_type="application/pdf")
+    }
+    response = client.post(f'/api/credores/{credor.id}/documentos', data=data,
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 201
+    documento = db.session.get(DocumentoPessoal, json.loads(response.data)["documento_id"])
+    assert documento.arquivo_url == hashlib.sha256(file_content).hexdigest()
+    with open(armazenamento_arquivos.caminho(documento.arquivo_url), "rb") as salvo:
+        assert salvo.read() == file_content
+    [receptor] = receptores
+    assert receptor.tamanho == len(file_content)
+    assert receptor.hash == hashlib.sha256(file_content).hexdigest()
+    assert os.listdir(os.path.join(test_app.config["UPLOAD_FOLDER"], uploads.PASTA_RECEBENDO)) == []
+
+def test_upload_grande_demais_interrompe_a_leitura(client, test_app, monkeypatch, credor_factory):
+    """Testa que, passado o limite, o restante do corpo não é lido e o temporário é apagado."""
+    from werkzeug.test import EnvironBuilder
+
+    class CorpoContado(io.BytesIO):
+        lido = 0
+
+        def read(self, *args):
+            dados = super().read(*args)
+            self.lido += len(dados)
+            return dados
+
+    monkeypatch.setitem(test_app.config, "UPLOAD_TAMANHO_MAXIMO", 100 * 1024)
+    credor = credor_factory("Teste Upload Streaming")
+    ambiente = EnvironBuilder(path=f'/api/credores/{credor.id}/documentos', method='POST', data={
+        'tipo': 'identidade',
+        'arquivo': FileStorage(stream=io.BytesIO(b"%PDF-1.5\n" + b"x" * (5 * 1024 * 1024)),
+                               filename="grande.pdf", content_type="application/pdf")
+    }).get_environ()
+    corpo = CorpoContado(ambiente['wsgi.input'].read())
+    ambiente['wsgi.input'] = corpo
+
+    response = client.open(ambiente)
+
+    assert response.status_code == 413
+    assert "Arquivo muito grande" in json.loads(response.data)["erro"]
+    assert corpo.lido < 1024 * 1024
+    assert os.listdir(os.path.join(test_app.config["UPLOAD_FOLDER"], ".recebendo")) == []
+
+def test_upload_recusado_nao_deixa_arquivo(client, session, test_app, credor_factory):
+    import hashlib
+    credor = credor_factory("Teste Upload Streaming")
+    data = {
+        'tipo': 'federal',
+        'status': 'negativa',
+        'arquivo': FileStorage(stream=io.BytesIO(b"texto simples"), filename="certidao.pdf",
+                               content_type="application/pdf")
+    }
+    response = client.post(f'/api/credores/{credor.id}/certidoes', data=data,
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert not os.path.exists(armazenamento_arquivos.caminho(hashlib.sha256(b"texto simples").hexdigest()))
+    assert os.listdir(os.path.join(test_app.config["UPLOAD_FOLDER"], ".recebendo")) == []
@@ -0,0 +1,201 @@
+import base64
+import io
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, update
+from werkzeug.exceptions import ClientDisconnected
+from app.models.certidao import Certidao
+from app.models.documento_pessoal import DocumentoPessoal
+from app.models.upload_retomavel import UploadRetomavel
+from app.services.arquivos import armazenamento_arquivos
+from app.services.uploads_retomaveis import ConflitoOffset, caminho_parcial, limpar_uploads, receber_parte
+
+def metadados(**campos):
+    return ",".join(f"{chave} {base64.b64encode(valor.encode()).decode()}" for chave, valor in campos.items())
+
+def criar(client, url, tamanho, **campos):
+    return client.post(url, headers={"Upload-Length": str(tamanho), "Upload-Metadata": metadados(**campos)})
+
+def enviar(client, location, offset, parte):
+    return client.patch(location, data=parte, headers={
+        "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"
+    })
+
+class QuedaDeConexao(io.BytesIO):
+    """Corpo que se interrompe depois de entregar alguns bytes."""
+
+    def __init__(self, dados, entregar):
+        super().__init__(dados)
+        self.entregar = entregar
+
+    def read(self, tamanho=-1):
+        if self.tell() >= self.entregar:
+            raise ClientDisconnected()
+        return super().read(min(tamanho, self.entregar - self.tell()))
+
+class CorpoObservado(io.BytesIO):
+    """Corpo que chama `ao_ler` antes de entregar cada bloco."""
+
+    def __init__(self, dados, ao_ler):
+        super().__init__(dados)
+        self.ao_ler = ao_ler
+
+    def read(self, tamanho=-1):
+        self.ao_ler()
+        return super().read(tamanho)
+
+def test_upload_em_partes_cria_o_documento(client, session, credor_factory):
+    """Testa o fluxo tus: criação, PATCHs sucessivos, HEAD com o offset e o documento ao completar."""
+    credor = credor_factory("Credor Tus")
+    conteudo = b"%PDF-1.5\n" + os.urandom(300000)
+    response = criar(client, f"/api/credores/{credor.id}/documentos/uploads", len(conteudo),
+                     filename="processo.pdf", tipo="outros")
+    assert response.status_code == 201
+    assert response.headers["Tus-Resumable"] == "1.0.0"
+    location = response.headers["Location"]
+
+    meio = 120000
+    assert enviar(client, location, 0, conteudo[:meio]).headers["Upload-Offset"] == str(meio)
+    head = client.head(location)
+    assert (head.status_code, head.headers["Upload-Offset"], head.data) == (200, str(meio), b"")
+
+    final = enviar(client, location, meio, conteudo[meio:])
+    assert final.status_code == 204
+
+    estado = json.loads(client.get(location).data)
+    assert estado["concluido"] and estado["recebido"] == len(conteudo)
+    documento = session.get(DocumentoPessoal, estado["resultado_id"])
+    assert documento.credor_id == credor.id and documento.tipo.value == "outros"
+    with open(armazenamento_arquivos.caminho(documento.arquivo_url), "rb") as arquivo:
+        assert arquivo.read() == conteudo
+    assert not os.path.exists(caminho_parcial(estado["id"]))
+    assert enviar(client, location, len(conteudo), b"x").status_code == 410
+
+def test_retoma_do_offset_confirmado_apos_queda(client, session, test_app, credor_factory):
+    """Testa que os bytes recebidos antes da queda são confirmados e o PATCH com offset errado é recusado."""
+    credor = credor_factory("Credor Tus")
+    conteudo = b"%PDF-1.5\n" + os.urandom(200000)
+    location = criar(client, f"/api/credores/{credor.id}/certidoes/uploads", len(conteudo),
+                     filename="certidao.pdf", tipo="estadual", status="negativa").headers["Location"]
+    upload_id = location.rsplit("/", 1)[1]
+
+    with test_app.test_request_context():
+        upload = receber_parte(upload_id, 0, QuedaDeConexao(conteudo, 70000))
+    assert upload.recebido == 70000 and upload.recebendo_desde is None
+
+    conflito = enviar(client, location, 0, conteudo)
+    assert conflito.status_code == 409
+    assert conflito.headers["Upload-Offset"] == "70000"
+
+    assert enviar(client, location, 70000, conteudo[70000:]).status_code == 204
+    certidao = session.get(Certidao, json.loads(client.get(location).data)["resultado_id"])
+    assert (certidao.tipo.value, certidao.origem.value, certidao.status.value) == ("estadual", "manual", "negativa")
+
+def test_validacao_ao_completar(client, session, credor_factory):
+    credor = credor_factory("Credor Tus")
+    conteudo = b"texto simples, nao um PDF"
+    location = criar(client, f"/api/credores/{credor.id}/documentos/uploads", len(conteudo),
+                     filename="rg.pdf", tipo="identidade").headers["Location"]
+
+    response = enviar(client, location, 0, conteudo)
+
+    assert response.status_code == 400
+    assert "Tipo de arquivo não permitido" in json.loads(response.data)["erro"]
+    assert json.loads(client.get(location).data)["erro"]
+    assert enviar(client, location, 0, conteudo).status_code == 410
+
+def test_criacao_recusada(client, session, test_app, credor_factory):
+    credor = credor_factory("Credor Tus")
+    url = f"/api/credores/{credor.id}"
+    limite = test_app.config["UPLOADS_RETOMAVEIS_TAMANHO_MAXIMO"]
+
+    assert criar(client, f"{url}/documentos/uploads", limite + 1, filename="a.pdf", tipo="outros").status_code == 413
+    assert criar(client, f"{url}/documentos/uploads", 10, filename="a.exe", tipo="outros").status_code == 400
+    assert criar(client, f"{url}/certidoes/uploads", 10, filename="a.pdf", tipo="federal").status_code == 400
+    assert client.post(f"{url}/documentos/uploads").status_code == 400
+    assert criar(client, "/api/credores/99999/documentos/uploads", 10, filename="a.pdf").status_code == 404
+    assert client.options("/api/uploads").headers["Tus-Max-Size"] == str(limite)
+
+def test_limpeza_de_uploads_abandonados(client, session, test_app, credor_factory):
+    credor = credor_factory("Credor Tus")
+    location = criar(client, f"/api/credores/{credor.id}/documentos/uploads", 1000,
+                     filename="dossie.pdf", tipo="outros").headers["Location"]
+    enviar(client, location, 0, b"%PDF-1.5\n")
+    upload_id = location.rsplit("/", 1)[1]
+
+    removidos = limpar_uploads(agora=datetime.utcnow() + timedelta(hours=25))
+
+    assert removidos >= 1
+    assert session.get(UploadRetomavel, upload_id) is None
+    assert not os.path.exists(caminho_parcial(upload_id))
+    assert client.delete(location).status_code == 404
+
+def test_reserva_renovada_durante_o_patch(client, session, test_app, monkeypatch, credor_factory):
+    """Testa que um PATCH longo renova a reserva, para não ser tomado por outro como vencido."""
+    credor = credor_factory("Credor Tus")
+    conteudo = b"%PDF-1.5\n" + os.urandom(200000)
+    location = criar(client, f"/api/credores/{credor.id}/documentos/uploads", len(conteudo),
+                     filename="processo.pdf", tipo="outros").headers["Location"]
+    upload_id = location.rsplit("/", 1)[1]
+    monkeypatch.setitem(test_app.config, "UPLOADS_RETOMAVEIS_TIMEOUT_SEGUNDOS", 0)
+    reservas = []
+
+    def registrar_reserva():
+        reservas.append(session.scalar(select(UploadRetomavel.recebendo_desde).where(UploadRetomavel.id == upload_id)))
+
+    with test_app.test_request_context():
+        upload = receber_parte(upload_id, 0, CorpoObservado(conteudo[:100000], registrar_reserva),
+                               agora=datetime.utcnow() - timedelta(seconds=1))
+    assert upload.recebido == 100000 and upload.recebendo_desde is None
+    assert len(set(reservas)) > 1 and reservas == sorted(reservas)
+
+def test_patch_com_reserva_tomada_nao_confirma_o_offset(client, session, test_app, credor_factory):
+    credor = credor_factory("Credor Tus")
+    conteudo = b"%PDF-1.5\n" + os.urandom(200000)
+    location = criar(client, f"/api/credores/{credor.id}/documentos/uploads", len(conteudo),
+                     filename="processo.pdf", tipo="outros").headers["Location"]
+    upload_id = location.rsplit("/", 1)[1]
+
+    def tomar_reserva():
+        # Outro PATCH reserva o upload, como se este tivesse vencido
+        session.execute(update(UploadRetomavel).where(UploadRetomavel.id == upload_id)
+                        .values(recebendo_desde=datetime.utcnow() + timedelta(minutes=1)))
+        session.commit()
+
+    with test_app.test_request_context():
+        with pytest.raises(ConflitoOffset) as erro:
+            receber_parte(upload_id, 0, CorpoObservado(conteudo[:100000], tomar_reserva))
+    assert erro.value.recebido == 0
+    assert session.get(UploadRetomavel, upload_id, populate_existing=True).recebendo_desde is not None
+
+def test_patch_retomado_depois_de_tomado_nao_escreve(client, session, test_app, monkeypatch, credor_factory):
+    """
+    Testa um PATCH que fica parado além do timeout: outro PATCH toma a reserva
+    e conclui o upload, e o primeiro, ao voltar, não escreve mais nada.
+    """
+    credor = credor_factory("Credor Tus")
+    conteudo = b"%PDF-1.5\n" + os.urandom(200000)
+    location = criar(client, f"/api/credores/{credor.id}/documentos/uploads", len(conteudo),
+                     filename="processo.pdf", tipo="outros").headers["Location"]
+    upload_id = location.rsplit("/", 1)[1]
+    monkeypatch.setitem(test_app.config, "UPLOADS_RETOMAVEIS_TIMEOUT_SEGUNDOS", 0.3)
+    leituras = []
+
+    def parar_e_ser_tomado():
+        leituras.append(None)
+        if len(leituras) == 2:
+            time.sleep(0.4)
+            receber_parte(upload_id, 0, io.BytesIO(conteudo))
+
+    with test_app.test_request_context():
+        with pytest.raises(ConflitoOffset):
+            receber_parte(upload_id, 0, CorpoObservado(b"\0" * len(conteudo), parar_e_ser_tomado))
+
+    estado = json.loads(client.get(location).data)
+    assert estado["concluido"] and estado["recebido"] == len(conteudo)
+    documento = session.get(DocumentoPessoal, estado["resultado_id"])
+    with open(armazenamento_arquivos.caminho(documento.arquivo_url), "rb") as arquivo:
+        assert arquivo.read() == conteudo